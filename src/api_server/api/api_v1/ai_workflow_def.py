@@ -8,7 +8,9 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.api_server import crud
 from src.api_server.api import deps
-from src.api_server.api.errors import NotFoundError
+from src.api_server.api.errors import NotFoundError, ValidationError
+from src.api_server.crud.base import InvalidCursorError, InvalidFieldsError
+from src.api_server.libs.hs_pipeline import InvalidPipelineError
 from src.api_server.models import ai_workflow_def
 
 router = APIRouter()
@@ -26,24 +28,36 @@ async def create_ai_workflow_def(
     创建新的AI工作流定义
     """
     # TODO: 从token获取user_id
-    new_workflow_def = await crud.ai_workflow_def.create_workflow_def(
-        db,
-        obj_in=workflow_def,
-        user_id="user_id",
-    )
+    try:
+        new_workflow_def = await crud.ai_workflow_def.create_workflow_def(
+            db,
+            obj_in=workflow_def,
+            user_id="user_id",
+        )
+    except InvalidPipelineError as e:
+        raise ValidationError(message=f"Invalid Haystack pipeline: {e}")
     return {"result": new_workflow_def}
 
 
-# @router.get(
-#     "",
-#     response_model=ai_workflow_def.AIWorkflowDefsOut,
-# )
+@router.get(
+    "",
+    response_model=ai_workflow_def.AIWorkflowDefsOut,
+)
 async def get_ai_workflow_defs(
     db: AsyncSession = Depends(deps.get_session),
     # 业务过滤参数
     name: Optional[str] = Query(None, description="工作流名称过滤"),
+    search: Optional[str] = Query(
+        None,
+        description="关键词检索名称、描述与标签，经全文索引匹配全部关键词 (可为词前缀)",
+    ),
     is_active: Optional[bool] = Query(None, description="是否激活过滤"),
-    tags: Optional[str] = Query(None, description="标签过滤"),
+    tags: Optional[str] = Query(
+        None, description="标签过滤，逗号分隔，按标签精确匹配 (不区分大小写)"
+    ),
+    tags_mode: Literal["all", "any"] = Query(
+        "all", description="多个标签时，all要求包含全部标签，any包含任一即可"
+    ),
     version: Optional[str] = Query(None, description="版本过滤"),
     # 时间过滤参数
     created_after: Optional[datetime] = Query(None, description="创建时间起始过滤"),
@@ -53,32 +67,84 @@ async def get_ai_workflow_defs(
     # 分页和排序参数
     limit: int = Query(100, ge=1, le=1000, description="返回数量限制"),
     offset: int = Query(0, ge=0, description="偏移量"),
+    cursor: Optional[str] = Query(
+        None, description="上一页返回的next_cursor，与offset互斥，翻页耗时不随页数增长"
+    ),
     order_by: Literal[
-        "created_at_time", "updated_at_time", "name_str", "version_str"
-    ] = Query("updated_at_time", description="排序字段"),
+        "created_at_time", "updated_at_time", "name_str", "version_str", "relevance"
+    ] = Query("updated_at_time", description="排序字段，relevance按search的相关度排序"),
     order: Literal["asc", "desc"] = Query("desc", description="排序方向"),
+    fields: Optional[str] = Query(
+        None,
+        description=(
+            "只查询并返回这些字段，逗号分隔，如id_str,name_str,updated_at_time；"
+            "id_str与排序字段总会返回"
+        ),
+    ),
 ) -> Any:
     """
     获取所有AI工作流定义
-    支持多种过滤、分页和排序参数
+    支持多种过滤、分页和排序参数，响应中的next_cursor用于获取下一页
+    """
+    try:
+        workflow_defs, next_cursor = await crud.ai_workflow_def.get_workflow_def(
+            db,
+            user_id="user_id",
+            name=name,
+            search=search,
+            is_active=is_active,
+            tags=tags,
+            tags_mode=tags_mode,
+            version=version,
+            created_after=created_after,
+            created_before=created_before,
+            updated_after=updated_after,
+            updated_before=updated_before,
+            limit=limit,
+            offset=offset,
+            order_by=order_by,
+            order=order,
+            cursor=cursor,
+            fields=fields,
+        )
+    except InvalidCursorError as e:
+        raise ValidationError(message=f"Invalid cursor: {e}")
+    except InvalidFieldsError as e:
+        raise ValidationError(message=f"Invalid fields: {e}")
+    if fields:
+        workflow_defs = [row._asdict() for row in workflow_defs]
+    return {"result": workflow_defs, "next_cursor": next_cursor}
+
+
+@router.get(
+    "/tags",
+    response_model=ai_workflow_def.AIWorkflowDefTagCountsOut,
+)
+async def get_ai_workflow_def_tags(
+    db: AsyncSession = Depends(deps.get_session),
+    tags: Optional[str] = Query(
+        None, description="只统计包含这些标签的工作流定义，逗号分隔，用于逐级筛选"
+    ),
+    tags_mode: Literal["all", "any"] = Query(
+        "all", description="多个标签时，all要求包含全部标签，any包含任一即可"
+    ),
+    is_active: Optional[bool] = Query(None, description="是否激活过滤"),
+    limit: int = Query(100, ge=1, le=1000, description="返回标签数量限制"),
+) -> Any:
+    """
+    获取各标签的工作流定义数量 (标签分面)，按数量降序
     """
-    workflow_defs = await crud.ai_workflow_def.get_workflow_def(
+    tag_counts = await crud.ai_workflow_def.get_tag_counts(
         db,
         user_id="user_id",
-        name=name,
-        is_active=is_active,
         tags=tags,
-        version=version,
-        created_after=created_after,
-        created_before=created_before,
-        updated_after=updated_after,
-        updated_before=updated_before,
+        tags_mode=tags_mode,
+        is_active=is_active,
         limit=limit,
-        offset=offset,
-        order_by=order_by,
-        order=order,
     )
-    return {"result": list(workflow_defs)}
+    return {
+        "result": [{"tag_str": tag, "count_int": count} for tag, count in tag_counts]
+    }
 
 
 @router.get(
@@ -98,6 +164,27 @@ async def get_ai_workflow_def(
     return {"result": workflow_def}
 
 
+@router.get(
+    "/{workflow_def_id}/component_stats",
+    response_model=ai_workflow_def.AIWorkflowDefComponentStatsOut,
+)
+async def get_ai_workflow_def_component_stats(
+    workflow_def_id: str,
+    db: AsyncSession = Depends(deps.get_session),
+) -> Any:
+    """
+    获取AI工作流定义各组件的累计耗时统计，按累计墙钟时间降序
+    """
+    workflow_def = await crud.ai_workflow_def.get(db, id=workflow_def_id)
+    if not workflow_def:
+        raise NotFoundError(message="AI Workflow Definition not found")
+
+    stats = await crud.ai_workflow_def.get_component_stats(
+        db, workflow_def_id=workflow_def_id
+    )
+    return {"result": stats}
+
+
 # @router.delete(
 #     "/{workflow_def_id}",
 # )
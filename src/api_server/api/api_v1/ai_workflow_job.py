@@ -1,19 +1,170 @@
 """AI Workflow Job API endpoints."""
 
+import asyncio
 from datetime import datetime
-from typing import Any, Literal, Optional
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Tuple
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError as PydanticValidationError
+from sqlalchemy.exc import InvalidRequestError
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.api_server import crud
 from src.api_server.api import deps
-from src.api_server.api.errors import NotFoundError
+from src.api_server.api.errors import (
+    ConflictError,
+    InternalServerError,
+    NotFoundError,
+    TooManyRequestsError,
+    ValidationError,
+)
+from src.api_server.config import settings
+from src.api_server.crud.base import InvalidCursorError, InvalidFieldsError
+from src.api_server.crud.crud_ai_workflow_job import UnknownWorkflowDefError
+from src.api_server.libs.admission import admission_controller
+from src.api_server.libs.job_events import (
+    JobEvent,
+    JobEventFilter,
+    Subscription,
+    job_event_hub,
+)
 from src.api_server.models import ai_workflow_job
-from src.api_server.models.ai_workflow_job import JobStatus
+from src.api_server.models.ai_workflow_job import TERMINAL_JOB_STATUSES, JobStatus
+from src.blobstore import BlobNotFoundError, resolve_payloads
+from src.broker import publish_jobs
 
 router = APIRouter()
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def _admit(db: AsyncSession, user_id: str, count: int = 1) -> None:
+    """Raise 429 with Retry-After when ``count`` more jobs exceed the pending limits."""
+    retry_after = await admission_controller.check(db, user_id=user_id, count=count)
+    if retry_after is not None:
+        raise TooManyRequestsError(
+            message="Too many pending jobs, retry later",
+            headers={"Retry-After": str(retry_after)},
+            retry_after_seconds=retry_after,
+        )
+
+
+async def _get_job_or_dead_letter(db: AsyncSession, workflow_job_id: str):
+    """A job, or its dead-letter entry once its retries are exhausted."""
+    return await crud.ai_workflow_job.get(
+        db, id=workflow_job_id
+    ) or await crud.ai_workflow_job.get_dead_letter(db, workflow_job_id)
+
+
+def _snapshot_event(workflow_job: ai_workflow_job.AIWorkflowJob) -> JobEvent:
+    return JobEvent(
+        event="status",
+        id_str=workflow_job.id_str,
+        user_id_str=workflow_job.user_id_str,
+        ai_workflow_def_id=workflow_job.ai_workflow_def_id,
+        status_str=workflow_job.status_str,
+        progress_json=workflow_job.progress_json,
+        updated_at_time=workflow_job.updated_at_time,
+    )
+
+
+async def _stream_job_events(
+    request: Request,
+    subscription: Subscription,
+    snapshot: List[JobEvent],
+    until_terminal: bool,
+) -> AsyncIterator[str]:
+    """SSE body: current state first, then live events from the hub."""
+    sent: Dict[str, Tuple[str, Optional[str]]] = {}
+    try:
+        for event in snapshot:
+            sent[event.id_str] = (event.status_str, event.progress_json)
+            yield event.to_sse()
+        if until_terminal and all(
+            event.status_str in TERMINAL_JOB_STATUSES for event in snapshot
+        ):
+            return
+
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(), settings.JOB_EVENTS_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            # 订阅后、读取快照前发生的变更可能重复出现
+            if sent.get(event.id_str) == (event.status_str, event.progress_json):
+                continue
+            sent[event.id_str] = (event.status_str, event.progress_json)
+            yield event.to_sse()
+            if until_terminal and event.status_str in TERMINAL_JOB_STATUSES:
+                return
+    finally:
+        job_event_hub.unsubscribe(subscription)
+
+
+async def _ndjson_lines(request: Request) -> AsyncIterator[bytes]:
+    """Non-empty lines of an NDJSON request body, as they are received."""
+    buffer = b""
+    async for chunk in request.stream():
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def _iterate(items: List[Any]) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
+
+
+async def _job_batches(
+    items: AsyncIterator[Any],
+) -> AsyncIterator[List[ai_workflow_job.AIWorkflowJobCreate]]:
+    """
+    Jobs of a batch submission, validated and grouped by
+    ``JOB_BATCH_INSERT_ROWS``; NDJSON lines arrive as bytes, array items as
+    parsed JSON.
+    """
+    batch = []
+    position = 0
+    async for item in items:
+        position += 1
+        if position > settings.JOB_BATCH_MAX_JOBS:
+            raise ValidationError(
+                message=f"At most {settings.JOB_BATCH_MAX_JOBS} jobs per batch"
+            )
+        try:
+            if isinstance(item, bytes):
+                obj_in = ai_workflow_job.AIWorkflowJobCreate.model_validate_json(item)
+            else:
+                obj_in = ai_workflow_job.AIWorkflowJobCreate.model_validate(item)
+        except PydanticValidationError as e:
+            raise ValidationError(
+                message=f"Invalid job #{position}",
+                errors=e.errors(
+                    include_url=False, include_context=False, include_input=False
+                ),
+            )
+        batch.append(obj_in)
+        if len(batch) >= settings.JOB_BATCH_INSERT_ROWS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _event_stream_response(body: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @router.post(
     "",
@@ -34,14 +185,78 @@ async def create_ai_workflow_job(
         raise NotFoundError(message="AI Workflow Definition not found")
 
     # TODO: 从token获取user_id
+    # 积压超过阈值时拒绝，并给出预计的重试等待时间
+    await _admit(db, user_id="user_id")
+
     new_workflow_job = await crud.ai_workflow_job.create_workflow_job(
         db,
         obj_in=workflow_job,
         user_id="user_id",
     )
+    # 任务已提交，通知worker
+    await publish_jobs([new_workflow_job])
     return {"result": new_workflow_job}
 
 
+@router.post(
+    "/batch",
+    response_model=ai_workflow_job.AIWorkflowJobBatchOut,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": {"$ref": "#/components/schemas/AIWorkflowJobCreate"},
+                    }
+                },
+                NDJSON_MEDIA_TYPE: {
+                    "schema": {"$ref": "#/components/schemas/AIWorkflowJobCreate"}
+                },
+            },
+        }
+    },
+)
+async def create_ai_workflow_jobs(
+    request: Request,
+    db: AsyncSession = Depends(deps.get_session),
+) -> Any:
+    """
+    批量创建AI工作流任务，所有任务在同一事务中写入，返回任务ID
+    请求体为任务数组；Content-Type为application/x-ndjson时每行一个任务，边接收边写入
+    任一任务无效或其工作流定义不存在时不创建任何任务
+    """
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        items = _ndjson_lines(request)
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise ValidationError(message="Invalid JSON body")
+        if not isinstance(body, list):
+            raise ValidationError(message="Expected a JSON array of jobs")
+        if len(body) > settings.JOB_BATCH_MAX_JOBS:
+            raise ValidationError(
+                message=f"At most {settings.JOB_BATCH_MAX_JOBS} jobs per batch"
+            )
+        items = _iterate(body)
+
+    # TODO: 从token获取user_id
+    # 每批写入前做准入检查，超出上限时整个事务回滚
+    try:
+        workflow_jobs = await crud.ai_workflow_job.create_workflow_jobs(
+            db,
+            batches=_job_batches(items),
+            user_id="user_id",
+            admit=lambda count: _admit(db, user_id="user_id", count=count),
+        )
+    except UnknownWorkflowDefError as e:
+        raise NotFoundError(message=str(e))
+    await publish_jobs(workflow_jobs)
+    return {"result": [workflow_job.id_str for workflow_job in workflow_jobs]}
+
+
 @router.get(
     "",
     response_model=ai_workflow_job.AIWorkflowJobsOut,
@@ -52,6 +267,10 @@ async def get_ai_workflow_jobs(
     ai_workflow_def_id: Optional[str] = Query(None, description="工作流定义ID过滤"),
     status: Optional[str] = Query(None, description="任务状态过滤"),
     job_name: Optional[str] = Query(None, description="任务名称过滤"),
+    search: Optional[str] = Query(
+        None,
+        description="关键词检索任务名称，经全文索引匹配全部关键词 (可为词前缀)",
+    ),
     # 时间过滤参数
     created_after: Optional[datetime] = Query(None, description="创建时间起始过滤"),
     created_before: Optional[datetime] = Query(None, description="创建时间结束过滤"),
@@ -64,39 +283,139 @@ async def get_ai_workflow_jobs(
     # 分页和排序参数
     limit: int = Query(100, ge=1, le=1000, description="返回数量限制"),
     offset: int = Query(0, ge=0, description="偏移量"),
+    cursor: Optional[str] = Query(
+        None, description="上一页返回的next_cursor，与offset互斥，翻页耗时不随页数增长"
+    ),
     order_by: Literal[
         "created_at_time",
         "updated_at_time",
         "started_at_time",
         "completed_at_time",
         "execution_time_seconds",
-    ] = Query("updated_at_time", description="排序字段"),
+        "relevance",
+    ] = Query("updated_at_time", description="排序字段，relevance按search的相关度排序"),
     order: Literal["asc", "desc"] = Query("desc", description="排序方向"),
+    fields: Optional[str] = Query(
+        None,
+        description=(
+            "只查询并返回这些字段，逗号分隔，如id_str,job_name_str,status_str；"
+            "id_str与排序字段总会返回"
+        ),
+    ),
 ) -> Any:
     """
     获取所有AI工作流任务
-    支持多种过滤、分页和排序参数
+    支持多种过滤、分页和排序参数，响应中的next_cursor用于获取下一页
+    """
+    try:
+        workflow_jobs, next_cursor = await crud.ai_workflow_job.get_workflow_job(
+            db,
+            user_id="user_id",
+            ai_workflow_def_id=ai_workflow_def_id,
+            status=status,
+            job_name=job_name,
+            search=search,
+            created_after=created_after,
+            created_before=created_before,
+            updated_after=updated_after,
+            updated_before=updated_before,
+            started_after=started_after,
+            started_before=started_before,
+            completed_after=completed_after,
+            completed_before=completed_before,
+            limit=limit,
+            offset=offset,
+            order_by=order_by,
+            order=order,
+            cursor=cursor,
+            fields=fields,
+        )
+    except InvalidCursorError as e:
+        raise ValidationError(message=f"Invalid cursor: {e}")
+    except InvalidFieldsError as e:
+        raise ValidationError(message=f"Invalid fields: {e}")
+    if fields:
+        workflow_jobs = [row._asdict() for row in workflow_jobs]
+    return {"result": workflow_jobs, "next_cursor": next_cursor}
+
+
+@router.get(
+    "/dead_letter",
+    response_model=ai_workflow_job.AIWorkflowJobDeadLettersOut,
+)
+async def get_ai_workflow_job_dead_letters(
+    db: AsyncSession = Depends(deps.get_session),
+    ai_workflow_def_id: Optional[str] = Query(None, description="工作流定义ID过滤"),
+    limit: int = Query(100, ge=1, le=1000, description="返回数量限制"),
+    offset: int = Query(0, ge=0, description="偏移量"),
+) -> Any:
     """
-    workflow_jobs = await crud.ai_workflow_job.get_workflow_job(
+    获取重试耗尽、已移入死信表的AI工作流任务，按失败时间倒序
+    """
+    dead_jobs = await crud.ai_workflow_job.get_dead_letters(
         db,
         user_id="user_id",
         ai_workflow_def_id=ai_workflow_def_id,
-        status=status,
-        job_name=job_name,
-        created_after=created_after,
-        created_before=created_before,
-        updated_after=updated_after,
-        updated_before=updated_before,
-        started_after=started_after,
-        started_before=started_before,
-        completed_after=completed_after,
-        completed_before=completed_before,
         limit=limit,
         offset=offset,
-        order_by=order_by,
-        order=order,
     )
-    return {"result": list(workflow_jobs)}
+    return {"result": list(dead_jobs)}
+
+
+@router.post(
+    "/dead_letter/{workflow_job_id}/requeue",
+    response_model=ai_workflow_job.AIWorkflowJobOut,
+)
+async def requeue_ai_workflow_job_dead_letter(
+    workflow_job_id: str,
+    db: AsyncSession = Depends(deps.get_session),
+) -> Any:
+    """
+    将死信表中的任务以原ID与原数据重新排队，无需重新提交
+    """
+    workflow_job = await crud.ai_workflow_job.requeue_dead_letter(
+        db, workflow_job_id=workflow_job_id
+    )
+    if not workflow_job:
+        raise NotFoundError(message="Dead-lettered AI Workflow Job not found")
+    await publish_jobs([workflow_job])
+    return {"result": workflow_job}
+
+
+@router.get("/events")
+async def stream_ai_workflow_job_events(
+    request: Request,
+    db: AsyncSession = Depends(deps.get_session),
+    job_id: Optional[List[str]] = Query(None, description="任务ID过滤，可重复"),
+    ai_workflow_def_id: Optional[str] = Query(None, description="工作流定义ID过滤"),
+    status: Optional[List[str]] = Query(None, description="任务状态过滤，可重复"),
+    progress: bool = Query(False, description="是否推送组件级进度事件"),
+) -> Any:
+    """
+    订阅AI工作流任务事件 (Server-Sent Events)
+    推送符合过滤条件的任务状态变更，指定job_id时先推送其当前状态
+    """
+    subscription = job_event_hub.subscribe(
+        JobEventFilter(
+            job_ids=frozenset(job_id) if job_id else None,
+            user_id="user_id",
+            ai_workflow_def_id=ai_workflow_def_id,
+            statuses=frozenset(status) if status else None,
+            progress=progress,
+        )
+    )
+    try:
+        # 先订阅再读取快照，避免遗漏两者之间的变更
+        workflow_jobs = (
+            await crud.ai_workflow_job.get_multi(db, ids=job_id) if job_id else []
+        )
+    except Exception:
+        job_event_hub.unsubscribe(subscription)
+        raise
+    snapshot = [_snapshot_event(workflow_job) for workflow_job in workflow_jobs]
+    return _event_stream_response(
+        _stream_job_events(request, subscription, snapshot, until_terminal=False)
+    )
 
 
 @router.get(
@@ -106,13 +425,120 @@ async def get_ai_workflow_jobs(
 async def get_ai_workflow_job(
     workflow_job_id: str,
     db: AsyncSession = Depends(deps.get_session),
+    wait: float = Query(
+        0,
+        ge=0,
+        le=settings.JOB_WAIT_MAX_SECONDS,
+        description="等待任务进入终态的最长秒数，0表示立即返回",
+    ),
 ) -> Any:
     """
-    根据ID获取AI工作流任务
+    根据ID获取AI工作流任务，存于Blob存储的触发数据与结果数据在此读回
+    指定wait时阻塞至任务完成、失败或取消，超时则返回当前状态
+    """
+    # 先订阅再读取，避免遗漏两者之间的状态变更
+    subscription = (
+        job_event_hub.subscribe(
+            JobEventFilter(
+                job_ids=frozenset([workflow_job_id]),
+                statuses=TERMINAL_JOB_STATUSES,
+            )
+        )
+        if wait
+        else None
+    )
+    try:
+        workflow_job = await _get_job_or_dead_letter(db, workflow_job_id)
+        if not workflow_job:
+            raise NotFoundError(message="AI Workflow Job not found")
+
+        if subscription and workflow_job.status_str not in TERMINAL_JOB_STATUSES:
+            # 等待期间不占用数据库连接
+            await db.commit()
+            try:
+                await asyncio.wait_for(subscription.queue.get(), wait)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                try:
+                    await db.refresh(workflow_job)
+                except InvalidRequestError:
+                    # 重试耗尽，任务已移入死信表
+                    workflow_job = await crud.ai_workflow_job.get_dead_letter(
+                        db, workflow_job_id
+                    )
+    finally:
+        if subscription:
+            job_event_hub.unsubscribe(subscription)
+    # 列表接口只返回Blob键与大小，单个任务按需读取载荷
+    try:
+        return {"result": await resolve_payloads(workflow_job)}
+    except BlobNotFoundError as e:
+        raise InternalServerError(message=f"AI Workflow Job payload unavailable: {e}")
+
+
+@router.get("/{workflow_job_id}/events")
+async def stream_ai_workflow_job_events_by_id(
+    workflow_job_id: str,
+    request: Request,
+    db: AsyncSession = Depends(deps.get_session),
+    progress: bool = Query(False, description="是否推送组件级进度事件"),
+) -> Any:
+    """
+    订阅单个AI工作流任务的事件 (Server-Sent Events)
+    先推送当前状态，任务进入终态后结束
+    """
+    subscription = job_event_hub.subscribe(
+        JobEventFilter(job_ids=frozenset([workflow_job_id]), progress=progress)
+    )
+    try:
+        workflow_job = await _get_job_or_dead_letter(db, workflow_job_id)
+    except Exception:
+        job_event_hub.unsubscribe(subscription)
+        raise
+    if not workflow_job:
+        job_event_hub.unsubscribe(subscription)
+        raise NotFoundError(message="AI Workflow Job not found")
+
+    return _event_stream_response(
+        _stream_job_events(
+            request,
+            subscription,
+            [_snapshot_event(workflow_job)],
+            until_terminal=True,
+        )
+    )
+
+
+@router.post(
+    "/{workflow_job_id}/cancel",
+    response_model=ai_workflow_job.AIWorkflowJobOut,
+)
+async def cancel_ai_workflow_job(
+    workflow_job_id: str,
+    db: AsyncSession = Depends(deps.get_session),
+) -> Any:
+    """
+    取消AI工作流任务
+    待执行的任务不再被认领；执行中的任务由Worker中止并释放执行槽位
     """
     workflow_job = await crud.ai_workflow_job.get(db, id=workflow_job_id)
     if not workflow_job:
+        if await crud.ai_workflow_job.get_dead_letter(db, workflow_job_id):
+            raise ConflictError(message="AI Workflow Job is already failed")
         raise NotFoundError(message="AI Workflow Job not found")
+
+    cancelled = await crud.ai_workflow_job.cancel_workflow_job(
+        db, workflow_job_id=workflow_job_id
+    )
+    try:
+        await db.refresh(workflow_job)
+    except InvalidRequestError:
+        raise ConflictError(message="AI Workflow Job is already failed")
+    if not cancelled:
+        raise ConflictError(
+            message=f"AI Workflow Job is already {workflow_job.status_str}"
+        )
     return {"result": workflow_job}
 
 
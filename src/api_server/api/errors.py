@@ -77,6 +77,14 @@ class ConflictError(APIError):
     message = "Resource conflict"
 
 
+class TooManyRequestsError(APIError):
+    """Too many requests error."""
+
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    error_code = "TOO_MANY_REQUESTS"
+    message = "Too many requests"
+
+
 class InternalServerError(APIError):
     """Internal server error."""
 
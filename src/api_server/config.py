@@ -1,6 +1,6 @@
 import os
 from functools import lru_cache
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings
@@ -31,6 +31,10 @@ class Settings(BaseSettings):
         description="Database connection URI",
     )
     ECHO_SQL: bool = Field(default=False, description="Echo SQL queries")
+    DATABASE_MIGRATE_ON_STARTUP: bool = Field(
+        default=False,
+        description="Apply pending schema migrations when the API server starts",
+    )
 
     # Security
     SECRET_KEY: str = Field(
@@ -53,6 +57,253 @@ class Settings(BaseSettings):
     PORT: int = Field(default=8001, description="Server port")
     WORKERS: int = Field(default=1, description="Number of worker processes")
 
+    # Job Events
+    JOB_EVENTS_POLL_INTERVAL_SECONDS: float = Field(
+        default=0.5,
+        gt=0,
+        description="Interval of the shared change-feed query behind job event streams",
+    )
+    JOB_EVENTS_LOOKBACK_SECONDS: float = Field(
+        default=5.0,
+        ge=0,
+        description="Re-scan window for changes committed late or with clock skew",
+    )
+    JOB_EVENTS_KEEPALIVE_SECONDS: float = Field(
+        default=15.0, gt=0, description="Idle interval between SSE keep-alive comments"
+    )
+    JOB_WAIT_MAX_SECONDS: float = Field(
+        default=60.0, gt=0, description="Upper bound of the job GET ?wait= long-poll"
+    )
+
+    # Admission Control
+    ADMISSION_MAX_PENDING_JOBS: int = Field(
+        default=0,
+        ge=0,
+        description="Reject submissions while this many jobs are pending (0 = unlimited)",
+    )
+    ADMISSION_MAX_PENDING_JOBS_PER_USER: int = Field(
+        default=0,
+        ge=0,
+        description="Reject a user's submissions while they have this many pending jobs (0 = unlimited)",
+    )
+    ADMISSION_RETRY_AFTER_MAX_SECONDS: int = Field(
+        default=60, ge=1, description="Upper bound of the Retry-After sent with a 429"
+    )
+
+    # Batch Submission
+    JOB_BATCH_MAX_JOBS: int = Field(
+        default=10000,
+        ge=1,
+        description="Max jobs submitted by one POST /ai_workflow_job/batch request",
+    )
+    JOB_BATCH_INSERT_ROWS: int = Field(
+        default=500,
+        ge=1,
+        description="Jobs validated and inserted per statement of a batch submission",
+    )
+
+    # Pipeline Validation
+    PIPELINE_VALIDATE_COMPONENTS: bool = Field(
+        default=True,
+        description=(
+            "Instantiate components when validating workflow definitions; "
+            "requires component credentials in the API environment"
+        ),
+    )
+
+    # Worker Configuration
+    WORKER_PROCESSES: int = Field(
+        default=1, ge=1, description="Number of workflow worker processes"
+    )
+    WORKER_CONCURRENCY: int = Field(
+        default=8, ge=1, description="Max jobs executed concurrently per worker"
+    )
+    WORKER_CLAIM_BATCH_SIZE: int = Field(
+        default=8, ge=1, description="Max jobs claimed by a single claim query"
+    )
+    WORKER_RESULT_BATCH_SIZE: int = Field(
+        default=100, ge=1, description="Max job outcomes written back by one UPDATE"
+    )
+    WORKER_POLL_INTERVAL_SECONDS: float = Field(
+        default=1.0, gt=0, description="Idle wait before polling for new jobs"
+    )
+    WORKER_JOB_TIMEOUT_SECONDS: float = Field(
+        default=0,
+        ge=0,
+        description="Default job run timeout when neither job nor definition sets one (0 = none)",
+    )
+    WORKER_CANCEL_POLL_INTERVAL_SECONDS: float = Field(
+        default=1.0, gt=0, description="Interval between checks for cancelled jobs"
+    )
+    WORKER_LEASE_SECONDS: float = Field(
+        default=60.0,
+        gt=0,
+        description="Lease on a claimed job; an unrenewed job is recovered after it",
+    )
+    WORKER_HEARTBEAT_INTERVAL_SECONDS: float = Field(
+        default=15.0, gt=0, description="Interval between lease renewals"
+    )
+    WORKER_REAPER_INTERVAL_SECONDS: float = Field(
+        default=30.0, gt=0, description="Interval between expired-lease sweeps"
+    )
+    WORKER_MAX_ATTEMPTS: int = Field(
+        default=3,
+        ge=1,
+        description=(
+            "Claims per job before a retryable failure or an expired lease "
+            "fails it instead of requeueing; definitions may override"
+        ),
+    )
+    WORKER_RETRY_BACKOFF_SECONDS: float = Field(
+        default=2.0,
+        ge=0,
+        description="Delay before the first retry, doubled per attempt",
+    )
+    WORKER_RETRY_MAX_BACKOFF_SECONDS: float = Field(
+        default=300.0, ge=0, description="Upper bound of the retry delay"
+    )
+    WORKER_RETRY_JITTER: float = Field(
+        default=0.5,
+        ge=0,
+        le=1,
+        description="Up to this fraction of a retry delay is randomly taken off",
+    )
+    WORKER_RETRY_ON: List[str] = Field(
+        default=[
+            "TimeoutError",
+            "ConnectionError",
+            "APIConnectionError",
+            "APITimeoutError",
+            "InternalServerError",
+            "RateLimitError",
+            "ServiceUnavailableError",
+            "TimeoutException",
+            "NetworkError",
+        ],
+        description="Exception class names (JSON) whose failures are retried",
+    )
+    WORKER_RETRY_ON_STATUS: List[int] = Field(
+        default=[408, 429, 500, 502, 503, 504],
+        description="HTTP status codes (JSON) whose failures are retried",
+    )
+    WORKER_FAIR_SHARE_WEIGHTS: Dict[str, float] = Field(
+        default={},
+        description="Per-user fair-share weights (JSON), unlisted users weigh 1.0",
+    )
+    WORKER_FAIR_SHARE_MAX_USERS: int = Field(
+        default=1000, ge=1, description="Max users considered per priority class"
+    )
+    WORKER_EXECUTION_MODE: Literal["thread", "process"] = Field(
+        default="thread",
+        description="Run pipelines in a thread pool or in a subprocess pool",
+    )
+    WORKER_POOL_PROCESSES: int = Field(
+        default=0, ge=0, description="Pipeline subprocesses (0 = CPU count)"
+    )
+    WORKER_POOL_MAX_JOBS_PER_PROCESS: int = Field(
+        default=1000, ge=0, description="Recycle a subprocess after N jobs (0 = never)"
+    )
+    WORKER_POOL_MAX_MEMORY_MB: int = Field(
+        default=4096,
+        ge=0,
+        description="Recycle a subprocess above this RSS (0 = never)",
+    )
+    WORKER_BRANCH_CONCURRENCY: int = Field(
+        default=4,
+        ge=1,
+        description=(
+            "Max components of one run executing concurrently when a pipeline "
+            "has independent branches (1 = sequential); definitions may override"
+        ),
+    )
+    WORKER_BRANCH_THREADS: int = Field(
+        default=16,
+        ge=1,
+        description="Threads running blocking components of concurrent branches",
+    )
+    WORKER_EMBEDDED: bool = Field(
+        default=False, description="Run a worker inside the API server process"
+    )
+    WORKER_WARMUP_MAX_DEFS: int = Field(
+        default=8,
+        ge=0,
+        description="Pipelines built at worker start before claiming jobs (0 = no warm-up)",
+    )
+    WORKER_WARMUP_LOOKBACK_HOURS: float = Field(
+        default=24.0,
+        gt=0,
+        description="Window of job history used to rank definitions for warm-up",
+    )
+    WORKER_WARMUP_TIMEOUT_SECONDS: float = Field(
+        default=60.0, gt=0, description="Time budget of the start-up warm-up"
+    )
+    WORKER_WARMUP_MAX_MEMORY_MB: int = Field(
+        default=1024,
+        ge=0,
+        description="Estimated memory budget of the start-up warm-up (0 = cache bound only)",
+    )
+    WORKER_READY_FILE: Optional[str] = Field(
+        default=None,
+        description=(
+            "File created once the worker is warmed up and removed when it "
+            "stops, for readiness probes; may contain {worker_id}"
+        ),
+    )
+    PIPELINE_CACHE_MAX_ENTRIES: int = Field(
+        default=32, ge=1, description="Max built pipelines cached per worker"
+    )
+    PIPELINE_CACHE_MAX_MEMORY_MB: int = Field(
+        default=2048,
+        ge=0,
+        description="Estimated memory bound of the pipeline cache (0 = unbounded)",
+    )
+
+    # Job Broker
+    BROKER_BACKEND: Literal["none", "memory", "sql", "redis"] = Field(
+        default="none",
+        description="Push new jobs to workers through a broker (none = polling only)",
+    )
+    BROKER_REDIS_URL: str = Field(
+        default="redis://localhost:6379/0", description="Redis URL of the redis broker"
+    )
+    BROKER_REDIS_KEY: str = Field(
+        default="ai_workflow:jobs", description="Redis list holding job references"
+    )
+    BROKER_MAX_QUEUED_REFS: int = Field(
+        default=10000,
+        ge=1,
+        description="Newest references the memory and redis brokers keep when trimmed",
+    )
+
+    # Payload Blob Storage
+    BLOB_STORE_BACKEND: Literal["none", "local"] = Field(
+        default="none",
+        description="Store large job payloads out of the job table (none = inline)",
+    )
+    BLOB_STORE_PATH: str = Field(
+        default="blobs",
+        description="Root directory of the local blob store, shared by the API and all workers",
+    )
+    BLOB_OFFLOAD_THRESHOLD_BYTES: int = Field(
+        default=64 * 1024,
+        ge=0,
+        description="Trigger and result payloads larger than this are stored as blobs",
+    )
+    BLOB_COMPRESSION: Literal["zlib", "zstd"] = Field(
+        default="zlib",
+        description="Codec of new blobs; zstd requires the zstandard package",
+    )
+    BLOB_GC_INTERVAL_SECONDS: float = Field(
+        default=3600,
+        ge=0,
+        description="How often workers delete blobs no job references (0 = never)",
+    )
+    BLOB_GC_MIN_AGE_SECONDS: float = Field(
+        default=24 * 3600,
+        gt=0,
+        description="Blobs unused for less than this are kept; must exceed the time from storing a payload to committing its job",
+    )
+
     # Logging
     LOG_LEVEL: str = Field(default="INFO", description="Logging level")
 
@@ -74,6 +325,26 @@ class Settings(BaseSettings):
             raise ValueError(f"Log level must be one of {allowed}")
         return v.upper()
 
+    @field_validator("WORKER_HEARTBEAT_INTERVAL_SECONDS")
+    @classmethod
+    def validate_heartbeat_interval(cls, v: float, info) -> float:
+        """Heartbeats must renew a lease well before it expires."""
+        lease_seconds = info.data.get("WORKER_LEASE_SECONDS")
+        if lease_seconds is not None and v * 2 > lease_seconds:
+            raise ValueError(
+                "WORKER_HEARTBEAT_INTERVAL_SECONDS must be at most half of "
+                "WORKER_LEASE_SECONDS"
+            )
+        return v
+
+    @field_validator("BROKER_BACKEND")
+    @classmethod
+    def validate_broker_backend(cls, v: str, info) -> str:
+        """An in-process queue is only drained by an embedded worker."""
+        if v == "memory" and not info.data.get("WORKER_EMBEDDED"):
+            raise ValueError("BROKER_BACKEND=memory requires WORKER_EMBEDDED=true")
+        return v
+
     @field_validator("DATABASE_URI")
     @classmethod
     def validate_database_uri(cls, v: str) -> str:
@@ -1,6 +1,25 @@
-from typing import Generic, List, Type, TypeVar
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 from pydantic import BaseModel
+from sqlalchemy import DateTime, and_, asc, desc, or_
+from sqlalchemy.sql import Select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlmodel import SQLModel, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
@@ -9,6 +28,62 @@ CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 
+
+def upsert(
+    db: AsyncSession,
+    table: Type[SQLModel],
+    rows: List[Dict[str, Any]],
+    index_elements: List[str],
+    set_: Callable[[Any], Dict[str, Any]],
+):
+    """
+    Dialect-specific INSERT ... ON CONFLICT DO UPDATE (ON DUPLICATE KEY
+    UPDATE on MySQL). ``set_`` receives the columns of the row proposed for
+    insertion and returns the values to update an existing row with.
+    """
+    dialect = db.bind.dialect.name
+    if dialect == "mysql":
+        stmt = mysql_insert(table).values(rows)
+        return stmt.on_duplicate_key_update(set_(stmt.inserted))
+    insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+    stmt = insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements, set_=set_(stmt.excluded)
+    )
+
+
+class InvalidCursorError(ValueError):
+    """A pagination cursor that is malformed or was issued for another sort."""
+
+
+class InvalidFieldsError(ValueError):
+    """A ``fields`` projection naming something that is not a column."""
+
+
+def encode_cursor(order_by: str, order: str, value: Any, id_str: str) -> str:
+    """Opaque cursor pointing just past the row with this sort value and id."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([order_by, order, value, id_str], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order_by: str, order: str) -> Tuple[Any, str]:
+    """Sort value and id of a cursor issued for ``order_by`` and ``order``."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_order_by, cursor_order, value, id_str = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursorError("malformed cursor")
+    if (cursor_order_by, cursor_order) != (order_by, order):
+        raise InvalidCursorError(
+            f"cursor was issued for order_by={cursor_order_by}, order={cursor_order}"
+        )
+    if not isinstance(id_str, str):
+        raise InvalidCursorError("malformed cursor")
+    return value, id_str
+
+
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     def __init__(self, model: Type[ModelType]):
         self.model = model
@@ -17,6 +92,13 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         result = await db.exec(select(self.model).where(self.model.id_str == id))
         return result.first()
 
+    async def get_multi(self, db: AsyncSession, ids: List[str]) -> List[ModelType]:
+        """Get several objects by id with a single IN query."""
+        if not ids:
+            return []
+        result = await db.exec(select(self.model).where(self.model.id_str.in_(ids)))
+        return result.all()
+
     async def get_by_user_id(
         self, db: AsyncSession, user_id: str
     ) -> List[ModelType]:
@@ -25,6 +107,150 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         )
         return result.all()
 
+    def select_fields(self, fields: Optional[str], *required: str) -> Select:
+        """
+        SELECT of whole rows, or with comma-separated ``fields`` of only
+        those columns plus the ``required`` ones (the id and sort column a
+        page and its cursor need), so unselected payload columns are never
+        read. Projected rows are ``Row`` tuples with attribute access.
+
+        Raises ``InvalidFieldsError`` for a name that is not a column.
+        """
+        names = [name.strip() for name in (fields or "").split(",") if name.strip()]
+        if not names:
+            return select(self.model)
+        columns = self.model.__table__.c
+        unknown = [name for name in names if name not in columns]
+        if unknown:
+            raise InvalidFieldsError(f"unknown fields: {', '.join(unknown)}")
+        return select(*(columns[name] for name in dict.fromkeys([*required, *names])))
+
+    async def paginate(
+        self,
+        db: AsyncSession,
+        query: Select,
+        order_by: str,
+        order: str,
+        limit: int,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        rank: Optional[Any] = None,
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        """
+        One page of ``query`` sorted by ``order_by`` with ``id_str`` as the
+        tie-breaker, and the cursor of the next page (None on the last one).
+
+        With a cursor the page starts right after the row it points to, so
+        it is found through an index on (order column, id_str) at the cost
+        of the first page, however deep it is. Offsets still work, for the
+        first page or for clients that jump to a page number.
+
+        With a ``rank`` expression (search relevance, best first ascending)
+        rows are sorted by it instead of ``order_by``. A computed rank has
+        no index to seek, so its cursor carries the offset of the next page.
+        """
+        if cursor is not None and offset:
+            raise InvalidCursorError("offset cannot be combined with cursor")
+        if rank is not None:
+            return await self._paginate_ranked(
+                db, query, rank, order_by, order, limit, offset, cursor
+            )
+        order_column = getattr(self.model, order_by)
+        id_column = self.model.id_str
+        direction = asc if order == "asc" else desc
+        query = query.order_by(direction(order_column), direction(id_column))
+
+        if cursor is not None:
+            value, last_id = decode_cursor(cursor, order_by, order)
+            query = query.where(
+                self._after(db, order_column, id_column, order, value, last_id)
+            )
+        elif offset:
+            query = query.offset(offset)
+
+        rows = list((await db.exec(query.limit(limit + 1))).all())
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, encode_cursor(
+            order_by, order, getattr(last, order_by), last.id_str
+        )
+
+    async def _paginate_ranked(
+        self,
+        db: AsyncSession,
+        query: Select,
+        rank: Any,
+        order_by: str,
+        order: str,
+        limit: int,
+        offset: int,
+        cursor: Optional[str],
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        if cursor is not None:
+            offset, _ = decode_cursor(cursor, order_by, order)
+            if type(offset) is not int or offset < 0:
+                raise InvalidCursorError("malformed cursor")
+        query = query.order_by(rank, self.model.id_str).offset(offset)
+        rows = list((await db.exec(query.limit(limit + 1))).all())
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor(order_by, order, offset + limit, rows[-1].id_str)
+
+    @staticmethod
+    def _after(
+        db: AsyncSession,
+        order_column: Any,
+        id_column: Any,
+        order: str,
+        value: Any,
+        last_id: str,
+    ):
+        """
+        Rows sorting after (value, last_id). The ORDER BY is left plain so
+        an index can serve it, hence NULLs of a nullable column are placed
+        where the database puts them: first in ascending order, except on
+        PostgreSQL.
+        """
+        nulls_first = (db.bind.dialect.name != "postgresql") == (order == "asc")
+        if value is None:
+            # 游标位于NULL区间内
+            if order == "asc":
+                in_nulls = and_(order_column.is_(None), id_column > last_id)
+            else:
+                in_nulls = and_(order_column.is_(None), id_column < last_id)
+            if nulls_first:
+                return or_(in_nulls, order_column.is_not(None))
+            return in_nulls
+
+        if isinstance(order_column.type, DateTime):
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise InvalidCursorError("malformed cursor")
+        # 冗余的 >=/<= 条件让数据库直接定位到游标处的索引位置
+        if order == "asc":
+            after = and_(
+                order_column >= value,
+                or_(
+                    order_column > value,
+                    and_(order_column == value, id_column > last_id),
+                ),
+            )
+        else:
+            after = and_(
+                order_column <= value,
+                or_(
+                    order_column < value,
+                    and_(order_column == value, id_column < last_id),
+                ),
+            )
+        if nulls_first or not order_column.nullable:
+            return after
+        return or_(after, order_column.is_(None))
+
     async def remove(self, db: AsyncSession, id: str) -> ModelType | None:
         """Soft delete by setting is_deleted_flag to True."""
         obj = await self.get(db, id=id)
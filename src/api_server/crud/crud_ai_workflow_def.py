@@ -1,16 +1,24 @@
 """CRUD operations for AI Workflow Definition."""
 
+import asyncio
+import json
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy import ScalarResult, asc, desc
+from sqlalchemy import ScalarResult, case, delete, desc, func
 from sqlmodel import and_, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.api_server.crud.base import CRUDBase
+from src.api_server.config import settings
+from src.api_server.crud.base import CRUDBase, upsert
+from src.api_server.libs import hs_pipeline
+from src.api_server.libs.tags import parse_tags
 from src.api_server.models.ai_workflow_def import (
+    DEF_FULLTEXT,
     AIWorkflowDef,
+    AIWorkflowDefComponentStats,
     AIWorkflowDefCreate,
+    AIWorkflowDefTag,
     AIWorkflowDefUpdate,
 )
 
@@ -20,15 +28,33 @@ class CRUDAIWorkflowDef(
 ):
     """CRUD operations for AI Workflow Definition."""
 
+    async def compile_hs_yaml(self, hs_yaml_content: str) -> Dict[str, Any]:
+        """
+        Validate and pre-compile Haystack YAML into the stored columns.
+
+        Raises ``hs_pipeline.InvalidPipelineError`` for a broken pipeline.
+        """
+        compiled = await asyncio.to_thread(
+            hs_pipeline.compile_pipeline,
+            hs_yaml_content,
+            settings.PIPELINE_VALIDATE_COMPONENTS,
+        )
+        return {
+            "hs_yaml_hash_str": compiled["yaml_hash"],
+            "hs_graph_json": json.dumps(compiled, ensure_ascii=False),
+        }
+
     async def create_workflow_def(
         self, db: AsyncSession, obj_in: AIWorkflowDefCreate, user_id: str
     ) -> AIWorkflowDef:
         """Create a new AI workflow definition."""
         obj_in_data = obj_in.model_dump()
         obj_in_data["user_id_str"] = user_id
+        obj_in_data.update(await self.compile_hs_yaml(obj_in.hs_yaml_content))
         new_workflow_def = AIWorkflowDef(**obj_in_data)
 
         db.add(new_workflow_def)
+        await self._sync_tags(db, new_workflow_def)
         await db.commit()
         await db.refresh(new_workflow_def)
         return new_workflow_def
@@ -39,8 +65,10 @@ class CRUDAIWorkflowDef(
         user_id: str,
         is_deleted: bool = False,
         name: Optional[str] = None,
+        search: Optional[str] = None,
         is_active: Optional[bool] = None,
         tags: Optional[str] = None,
+        tags_mode: str = "all",
         version: Optional[str] = None,
         created_after: Optional[datetime] = None,
         created_before: Optional[datetime] = None,
@@ -50,12 +78,28 @@ class CRUDAIWorkflowDef(
         offset: int = 0,
         order_by: str = "updated_at_time",
         order: str = "desc",
-    ) -> ScalarResult[AIWorkflowDef]:
-        """Get AI workflow definitions with filters, pagination and sorting."""
-        query = select(self.model).where(
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None,
+    ) -> Tuple[List[AIWorkflowDef], Optional[str]]:
+        """
+        Get AI workflow definitions with filters, pagination and sorting, and
+        the cursor of the next page.
+
+        ``search`` matches keywords through the full-text index, and
+        ``order_by="relevance"`` sorts its matches best first.
+
+        With comma-separated ``fields`` only those columns are read, and
+        the rows are ``Row`` tuples instead of models.
+
+        Raises ``InvalidCursorError`` for a cursor issued for another sort,
+        ``InvalidFieldsError`` for a field that is not a column.
+        """
+        sort_column = order_by if hasattr(self.model, order_by) else "updated_at_time"
+        query = self.select_fields(fields, "id_str", sort_column).where(
             self.model.user_id_str == user_id,
             self.model.is_deleted_flag == is_deleted,
         )
+        query, rank = DEF_FULLTEXT.search(query, db.bind.dialect.name, search)
 
         where_clause = []
 
@@ -64,8 +108,13 @@ class CRUDAIWorkflowDef(
             where_clause.append(self.model.name_str.contains(name))
         if is_active is not None:
             where_clause.append(self.model.is_active_flag == is_active)
-        if tags:
-            where_clause.append(self.model.tags_str.contains(tags))
+        tag_list = parse_tags(tags)
+        if tag_list:
+            where_clause.append(
+                self.model.id_str.in_(
+                    self._tagged_def_ids(user_id, tag_list, tags_mode == "all")
+                )
+            )
         if version:
             where_clause.append(self.model.version_str.contains(version))
 
@@ -82,18 +131,21 @@ class CRUDAIWorkflowDef(
         if where_clause:
             query = query.where(and_(*where_clause))
 
-        # 排序
-        order_column = getattr(self.model, order_by, self.model.updated_at_time)
-        if order == "asc":
-            query = query.order_by(asc(order_column))
-        else:
-            query = query.order_by(desc(order_column))
-
-        # 分页
-        query = query.offset(offset).limit(limit)
-
-        workflow_defs = await db.exec(query)
-        return workflow_defs
+        # 排序与分页
+        if order_by != "relevance" or rank is None:
+            rank = None
+            if not hasattr(self.model, order_by):
+                order_by = "updated_at_time"
+        return await self.paginate(
+            db,
+            query,
+            order_by=order_by,
+            order=order,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            rank=rank,
+        )
 
     async def update_workflow_def(
         self,
@@ -102,31 +154,194 @@ class CRUDAIWorkflowDef(
         obj_in: AIWorkflowDefUpdate,
     ) -> AIWorkflowDef:
         """Update an AI workflow definition."""
-        for k, v in obj_in.model_dump(exclude_unset=True).items():
+        update_data = obj_in.model_dump(exclude_unset=True)
+        if update_data.get("hs_yaml_content") is not None:
+            update_data.update(
+                await self.compile_hs_yaml(update_data["hs_yaml_content"])
+            )
+
+        for k, v in update_data.items():
             if hasattr(workflow_def, k):
                 setattr(workflow_def, k, v)
 
         db.add(workflow_def)
+        if "tags_str" in update_data:
+            await self._sync_tags(db, workflow_def)
         await db.commit()
         await db.refresh(workflow_def)
         return workflow_def
 
+    async def remove(self, db: AsyncSession, id: str) -> Optional[AIWorkflowDef]:
+        """Soft delete, dropping the definition from tag filters and facets."""
+        await db.exec(
+            delete(AIWorkflowDefTag).where(AIWorkflowDefTag.ai_workflow_def_id == id)
+        )
+        return await super().remove(db, id=id)
+
+    async def delete(self, db: AsyncSession, id: str) -> None:
+        await db.exec(
+            delete(AIWorkflowDefTag).where(AIWorkflowDefTag.ai_workflow_def_id == id)
+        )
+        await super().delete(db, id=id)
+
+    async def get_tag_counts(
+        self,
+        db: AsyncSession,
+        user_id: str,
+        tags: Optional[str] = None,
+        tags_mode: str = "all",
+        is_active: Optional[bool] = None,
+        limit: int = 100,
+    ) -> List[Tuple[str, int]]:
+        """
+        ``(tag, definitions)`` facets of a user's definitions, most used
+        first. With ``tags``, only definitions matching them are counted.
+        """
+        count = func.count().label("count_int")
+        query = (
+            select(AIWorkflowDefTag.tag_str, count)
+            .where(AIWorkflowDefTag.user_id_str == user_id)
+            .group_by(AIWorkflowDefTag.tag_str)
+            .order_by(desc(count), AIWorkflowDefTag.tag_str)
+            .limit(limit)
+        )
+        tag_list = parse_tags(tags)
+        if tag_list:
+            query = query.where(
+                AIWorkflowDefTag.ai_workflow_def_id.in_(
+                    self._tagged_def_ids(user_id, tag_list, tags_mode == "all")
+                )
+            )
+        if is_active is not None:
+            query = query.join(
+                self.model, self.model.id_str == AIWorkflowDefTag.ai_workflow_def_id
+            ).where(self.model.is_active_flag == is_active)
+        result = await db.exec(query)
+        return [(tag, count) for tag, count in result.all()]
+
+    @staticmethod
+    def _tagged_def_ids(user_id: str, tags: List[str], match_all: bool):
+        """Ids of a user's definitions carrying all (or any) of ``tags``."""
+        query = select(AIWorkflowDefTag.ai_workflow_def_id).where(
+            AIWorkflowDefTag.user_id_str == user_id,
+            AIWorkflowDefTag.tag_str.in_(tags),
+        )
+        if match_all and len(tags) > 1:
+            query = query.group_by(AIWorkflowDefTag.ai_workflow_def_id).having(
+                func.count() == len(tags)
+            )
+        return query
+
+    @staticmethod
+    async def _sync_tags(db: AsyncSession, workflow_def: AIWorkflowDef) -> None:
+        """Replace a definition's tag rows with the tags of its ``tags_str``."""
+        await db.exec(
+            delete(AIWorkflowDefTag).where(
+                AIWorkflowDefTag.ai_workflow_def_id == workflow_def.id_str
+            )
+        )
+        db.add_all(
+            AIWorkflowDefTag(
+                ai_workflow_def_id=workflow_def.id_str,
+                tag_str=tag,
+                user_id_str=workflow_def.user_id_str,
+            )
+            for tag in parse_tags(workflow_def.tags_str)
+        )
+
     async def get_active_workflow_defs(
-        self, db: AsyncSession, user_id: str
+        self,
+        db: AsyncSession,
+        user_id: Optional[str] = None,
+        ids: Optional[List[str]] = None,
     ) -> ScalarResult[AIWorkflowDef]:
-        """Get all active workflow definitions for a user."""
+        """Get active workflow definitions, of a user and/or among ``ids``."""
         query = (
             select(self.model)
             .where(
-                self.model.user_id_str == user_id,
                 self.model.is_deleted_flag == False,
                 self.model.is_active_flag == True,
             )
             .order_by(desc(self.model.updated_at_time))
         )
+        if user_id is not None:
+            query = query.where(self.model.user_id_str == user_id)
+        if ids is not None:
+            query = query.where(self.model.id_str.in_(ids))
 
         workflow_defs = await db.exec(query)
         return workflow_defs
 
+    async def add_component_stats(
+        self, db: AsyncSession, stats: Dict[str, Dict[str, List[float]]]
+    ) -> None:
+        """
+        Add per-component run totals to the aggregates of several
+        definitions with a single upsert.
+
+        ``stats`` maps definition id -> component name -> ``[calls,
+        wall_seconds, cpu_seconds, output_bytes, max_wall_seconds]``.
+        """
+        now = datetime.utcnow()
+        rows = [
+            {
+                "ai_workflow_def_id": def_id,
+                "component_name_str": name,
+                "calls_int": int(calls),
+                "wall_seconds": wall,
+                "cpu_seconds": cpu,
+                "output_bytes_int": int(output_bytes),
+                "max_wall_seconds": max_wall,
+                "updated_at_time": now,
+            }
+            # 固定加锁顺序，避免并发事务死锁
+            for def_id, components in sorted(stats.items())
+            for name, (calls, wall, cpu, output_bytes, max_wall) in sorted(
+                components.items()
+            )
+        ]
+        if not rows:
+            return
+        table = AIWorkflowDefComponentStats
+        await db.exec(
+            upsert(
+                db,
+                table,
+                rows,
+                index_elements=[table.ai_workflow_def_id, table.component_name_str],
+                set_=lambda new: {
+                    **{
+                        column: getattr(table, column) + getattr(new, column)
+                        for column in (
+                            "calls_int",
+                            "wall_seconds",
+                            "cpu_seconds",
+                            "output_bytes_int",
+                        )
+                    },
+                    "max_wall_seconds": case(
+                        (
+                            new.max_wall_seconds > table.max_wall_seconds,
+                            new.max_wall_seconds,
+                        ),
+                        else_=table.max_wall_seconds,
+                    ),
+                    "updated_at_time": new.updated_at_time,
+                },
+            )
+        )
+        await db.commit()
+
+    async def get_component_stats(
+        self, db: AsyncSession, workflow_def_id: str
+    ) -> List[AIWorkflowDefComponentStats]:
+        """Per-component timing aggregates of a definition, slowest first."""
+        result = await db.exec(
+            select(AIWorkflowDefComponentStats)
+            .where(AIWorkflowDefComponentStats.ai_workflow_def_id == workflow_def_id)
+            .order_by(desc(AIWorkflowDefComponentStats.wall_seconds))
+        )
+        return result.all()
+
 
 ai_workflow_def = CRUDAIWorkflowDef(AIWorkflowDef)
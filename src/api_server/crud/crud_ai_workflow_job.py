@@ -1,19 +1,60 @@
 """CRUD operations for AI Workflow Job."""
 
-from datetime import datetime
-from typing import Optional
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import (
+    Any,
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Collection,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 
-from sqlalchemy import ScalarResult, asc, desc
+from sqlalchemy import (
+    Boolean,
+    DateTime,
+    Row,
+    ScalarResult,
+    asc,
+    bindparam,
+    case,
+    delete,
+    desc,
+    func,
+    insert,
+    literal,
+    or_,
+    text,
+    union_all,
+    update,
+)
 from sqlmodel import and_, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.api_server.crud.base import CRUDBase
+from src.api_server.crud.base import CRUDBase, upsert
+from src.api_server.models.ai_workflow_def import AIWorkflowDef
 from src.api_server.models.ai_workflow_job import (
+    GLOBAL_BACKLOG_KEY,
+    GLOBAL_BACKLOG_SHARDS,
+    JOB_FULLTEXT,
     AIWorkflowJob,
+    AIWorkflowJobBacklog,
     AIWorkflowJobCreate,
+    AIWorkflowJobDeadLetter,
     AIWorkflowJobUpdate,
     JobStatus,
+    global_backlog_key,
 )
+from src.blobstore import store_payload
+
+
+class UnknownWorkflowDefError(LookupError):
+    """Submitted jobs reference workflow definitions that do not exist."""
 
 
 class CRUDAIWorkflowJob(
@@ -24,16 +65,83 @@ class CRUDAIWorkflowJob(
     async def create_workflow_job(
         self, db: AsyncSession, obj_in: AIWorkflowJobCreate, user_id: str
     ) -> AIWorkflowJob:
-        """Create a new AI workflow job."""
-        obj_in_data = obj_in.model_dump()
-        obj_in_data["user_id_str"] = user_id
-        new_workflow_job = AIWorkflowJob(**obj_in_data)
+        """
+        Create a new AI workflow job, its trigger data in the blob store
+        when it is above the offload threshold.
+        """
+        new_workflow_job = await self._new_workflow_job(obj_in, user_id)
 
         db.add(new_workflow_job)
+        await self._adjust_backlog(db, {user_id: 1})
         await db.commit()
         await db.refresh(new_workflow_job)
         return new_workflow_job
 
+    async def create_workflow_jobs(
+        self,
+        db: AsyncSession,
+        batches: AsyncIterable[List[AIWorkflowJobCreate]],
+        user_id: str,
+        admit: Optional[Callable[[int], Awaitable[None]]] = None,
+    ) -> List[AIWorkflowJob]:
+        """
+        Create the jobs of ``batches`` in one transaction. Each batch costs
+        one IN query for the workflow definitions it references first and
+        one executemany INSERT, instead of a lookup, an insert and a refresh
+        per job.
+
+        ``admit`` is awaited before each INSERT with the number of jobs
+        created so far plus the batch's, and raises to reject them.
+
+        Raises ``UnknownWorkflowDefError`` for a job whose definition does
+        not exist; then, as when ``batches`` or ``admit`` raise, no job is
+        created.
+        """
+        table = self.model.__table__
+        known_def_ids: Set[str] = set()
+        workflow_jobs: List[AIWorkflowJob] = []
+        try:
+            async for batch in batches:
+                def_ids = {obj_in.ai_workflow_def_id for obj_in in batch}
+                def_ids -= known_def_ids
+                if def_ids:
+                    result = await db.exec(
+                        select(AIWorkflowDef.id_str).where(
+                            AIWorkflowDef.id_str.in_(def_ids)
+                        )
+                    )
+                    known_def_ids.update(result)
+                    unknown = def_ids - known_def_ids
+                    if unknown:
+                        raise UnknownWorkflowDefError(
+                            f"AI Workflow Definition not found: "
+                            f"{', '.join(sorted(unknown))}"
+                        )
+                if admit is not None:
+                    await admit(len(workflow_jobs) + len(batch))
+                new_jobs = [
+                    await self._new_workflow_job(obj_in, user_id) for obj_in in batch
+                ]
+                if new_jobs:
+                    await db.exec(
+                        insert(table),
+                        params=[
+                            {
+                                column.name: getattr(job, column.name)
+                                for column in table.c
+                            }
+                            for job in new_jobs
+                        ],
+                    )
+                workflow_jobs.extend(new_jobs)
+            if workflow_jobs:
+                await self._adjust_backlog(db, {user_id: len(workflow_jobs)})
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+        return workflow_jobs
+
     async def get_workflow_job(
         self,
         db: AsyncSession,
@@ -42,6 +150,7 @@ class CRUDAIWorkflowJob(
         ai_workflow_def_id: Optional[str] = None,
         status: Optional[str] = None,
         job_name: Optional[str] = None,
+        search: Optional[str] = None,
         created_after: Optional[datetime] = None,
         created_before: Optional[datetime] = None,
         updated_after: Optional[datetime] = None,
@@ -54,12 +163,28 @@ class CRUDAIWorkflowJob(
         offset: int = 0,
         order_by: str = "updated_at_time",
         order: str = "desc",
-    ) -> ScalarResult[AIWorkflowJob]:
-        """Get AI workflow jobs with filters, pagination and sorting."""
-        query = select(self.model).where(
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None,
+    ) -> Tuple[List[AIWorkflowJob], Optional[str]]:
+        """
+        Get AI workflow jobs with filters, pagination and sorting, and
+        the cursor of the next page.
+
+        ``search`` matches keywords through the full-text index, and
+        ``order_by="relevance"`` sorts its matches best first.
+
+        With comma-separated ``fields`` only those columns are read, and
+        the rows are ``Row`` tuples instead of models.
+
+        Raises ``InvalidCursorError`` for a cursor issued for another sort,
+        ``InvalidFieldsError`` for a field that is not a column.
+        """
+        sort_column = order_by if hasattr(self.model, order_by) else "updated_at_time"
+        query = self.select_fields(fields, "id_str", sort_column).where(
             self.model.user_id_str == user_id,
             self.model.is_deleted_flag == is_deleted,
         )
+        query, rank = JOB_FULLTEXT.search(query, db.bind.dialect.name, search)
 
         where_clause = []
 
@@ -92,18 +217,21 @@ class CRUDAIWorkflowJob(
         if where_clause:
             query = query.where(and_(*where_clause))
 
-        # 排序
-        order_column = getattr(self.model, order_by, self.model.updated_at_time)
-        if order == "asc":
-            query = query.order_by(asc(order_column))
-        else:
-            query = query.order_by(desc(order_column))
-
-        # 分页
-        query = query.offset(offset).limit(limit)
-
-        workflow_jobs = await db.exec(query)
-        return workflow_jobs
+        # 排序与分页
+        if order_by != "relevance" or rank is None:
+            rank = None
+            if not hasattr(self.model, order_by):
+                order_by = "updated_at_time"
+        return await self.paginate(
+            db,
+            query,
+            order_by=order_by,
+            order=order,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            rank=rank,
+        )
 
     async def update_workflow_job(
         self,
@@ -155,5 +283,755 @@ class CRUDAIWorkflowJob(
         workflow_jobs = await db.exec(query)
         return workflow_jobs
 
+    async def get_busiest_workflow_def_ids(
+        self, db: AsyncSession, since: datetime, limit: int
+    ) -> List[str]:
+        """
+        Active definitions with the most jobs created since ``since``,
+        busiest first. Inactive and deleted definitions are left out before
+        the limit, so busy ones cannot crowd the active ones out.
+        """
+        job_count = func.count()
+        result = await db.exec(
+            select(self.model.ai_workflow_def_id)
+            .join(AIWorkflowDef, AIWorkflowDef.id_str == self.model.ai_workflow_def_id)
+            .where(
+                self.model.created_at_time >= since,
+                self.model.is_deleted_flag == False,
+                AIWorkflowDef.is_deleted_flag == False,
+                AIWorkflowDef.is_active_flag == True,
+            )
+            .group_by(self.model.ai_workflow_def_id)
+            .order_by(job_count.desc())
+            .limit(limit)
+        )
+        return list(result)
+
+    async def get_top_pending_priority(
+        self, db: AsyncSession, below: Optional[int] = None
+    ) -> Optional[int]:
+        """
+        Highest priority class with jobs ready to run (optionally below
+        ``below``).
+        """
+        query = select(func.max(self.model.priority_int)).where(
+            self.model.status_str == JobStatus.PENDING,
+            self.model.is_deleted_flag == False,
+            self._is_due(datetime.utcnow()),
+        )
+        if below is not None:
+            query = query.where(self.model.priority_int < below)
+        result = await db.exec(query)
+        return result.first()
+
+    async def get_pending_user_ids(
+        self,
+        db: AsyncSession,
+        priority: int,
+        max_users: int,
+        after: Optional[str] = None,
+    ) -> List[str]:
+        """
+        Distinct users with jobs ready to run in one priority class.
+
+        A recursive CTE walks ``ix_ai_workflow_job_claim`` one ``MIN()`` seek
+        per user (a loose index scan), so the cost depends on the number of
+        active users, not on the size of the pending backlog.
+
+        The walk starts after the user ``after`` and wraps around, so a
+        caller that passes the last user of the previous window rotates
+        through all users even when there are more than ``max_users``.
+        """
+        now = datetime.utcnow()
+        user_ids = await self._walk_pending_users(
+            db, priority, max_users, now, after=after
+        )
+        if after is not None and len(user_ids) < max_users:
+            user_ids += await self._walk_pending_users(
+                db, priority, max_users - len(user_ids), now, until=after
+            )
+        return user_ids
+
+    async def _walk_pending_users(
+        self,
+        db: AsyncSession,
+        priority: int,
+        max_users: int,
+        now: datetime,
+        after: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[str]:
+        """Users in ``(after, until]`` in id order, one index seek each."""
+        table = self.model.__tablename__
+        bounds = ""
+        if until is not None:
+            bounds += " AND j.user_id_str <= :until"
+        first = bounds + (" AND j.user_id_str > :after" if after is not None else "")
+        query = text(f"""
+            WITH RECURSIVE pending_users(user_id_str, n) AS (
+                SELECT MIN(j.user_id_str), 1 FROM {table} j
+                WHERE j.status_str = :status AND j.priority_int = :priority
+                  AND j.is_deleted_flag = :deleted
+                  AND (j.not_before_time IS NULL OR j.not_before_time <= :now)
+                  {first}
+                UNION ALL
+                SELECT (
+                    SELECT MIN(j.user_id_str) FROM {table} j
+                    WHERE j.status_str = :status
+                      AND j.priority_int = :priority
+                      AND j.user_id_str > pending_users.user_id_str
+                      AND j.is_deleted_flag = :deleted
+                      AND (j.not_before_time IS NULL OR j.not_before_time <= :now)
+                      {bounds}
+                ), n + 1
+                FROM pending_users
+                WHERE pending_users.user_id_str IS NOT NULL AND n < :max_users
+            )
+            SELECT user_id_str FROM pending_users WHERE user_id_str IS NOT NULL
+            """).bindparams(
+            bindparam("now", type_=DateTime()), bindparam("deleted", type_=Boolean())
+        )
+        params = {
+            "status": JobStatus.PENDING.value,
+            "priority": priority,
+            "deleted": False,
+            "max_users": max_users,
+            "now": now,
+        }
+        if after is not None:
+            params["after"] = after
+        if until is not None:
+            params["until"] = until
+        result = await db.exec(query, params=params)
+        return list(result.scalars())
+
+    async def claim_pending_jobs(
+        self,
+        db: AsyncSession,
+        limit: int,
+        ai_workflow_def_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        priority: Optional[int] = None,
+        worker_id: Optional[str] = None,
+        lease_seconds: Optional[float] = None,
+    ) -> List[AIWorkflowJob]:
+        """
+        Atomically claim up to ``limit`` pending jobs and mark them running.
+
+        SQLite has no row locks, so the claim is a single ``UPDATE`` of the
+        pending rows a subquery selects; SQLite serialises writers, so a row
+        can only flip once. MySQL/MatrixOne lock the candidate rows
+        with ``FOR UPDATE SKIP LOCKED`` so concurrent workers skip each
+        other's rows instead of blocking on or double-claiming them.
+
+        Jobs whose ``not_before_time`` lies in the future, such as failed jobs
+        backing off before a retry, are skipped.
+
+        ``user_id`` and ``priority`` restrict the claim to one fair-share
+        queue, an index range on ``ix_ai_workflow_job_claim``;
+        ``ai_workflow_def_id`` restricts it to one definition, used to top up
+        a micro-batch.
+
+        Claimed jobs are leased to ``worker_id`` for ``lease_seconds``; the
+        worker keeps the lease alive with ``renew_leases``.
+        The backlog counters are updated in the same transaction.
+        """
+        now = datetime.utcnow()
+        candidates = (
+            select(self.model.id_str)
+            .where(
+                self.model.status_str == JobStatus.PENDING,
+                self.model.is_deleted_flag == False,
+                self._is_due(now),
+            )
+            .order_by(asc(self.model.created_at_time))
+            .limit(limit)
+        )
+        if ai_workflow_def_id:
+            candidates = candidates.where(
+                self.model.ai_workflow_def_id == ai_workflow_def_id
+            )
+        if user_id is not None:
+            candidates = candidates.where(self.model.user_id_str == user_id)
+        if priority is not None:
+            candidates = candidates.where(self.model.priority_int == priority)
+        claim = (
+            update(self.model)
+            .values(
+                status_str=JobStatus.RUNNING,
+                started_at_time=now,
+                updated_at_time=now,
+                worker_id_str=worker_id,
+                lease_expires_at_time=(
+                    now + timedelta(seconds=lease_seconds) if lease_seconds else None
+                ),
+                attempt_int=self.model.attempt_int + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        if db.bind.dialect.name == "sqlite":
+            result = await db.exec(
+                # 子查询已只选取待执行的任务；外层再判断状态会使SQLite改用
+                # 状态索引逐行扫描全部待执行任务，而不是按主键查找
+                claim.where(
+                    self.model.id_str.in_(candidates.scalar_subquery())
+                ).returning(self.model.id_str, self.model.user_id_str)
+            )
+            claimed = list(result)
+        else:
+            result = await db.exec(
+                candidates.add_columns(self.model.user_id_str).with_for_update(
+                    skip_locked=True
+                )
+            )
+            claimed = list(result)
+            if claimed:
+                await db.exec(
+                    claim.where(self.model.id_str.in_([row[0] for row in claimed]))
+                )
+        if claimed:
+            claimed_per_user = Counter(row[1] for row in claimed)
+            await self._adjust_backlog(
+                db, {user: -n for user, n in claimed_per_user.items()}, claimed=True
+            )
+        await db.commit()
+
+        if not claimed:
+            return []
+        claimed_ids = [row[0] for row in claimed]
+        workflow_jobs = await db.exec(
+            select(self.model)
+            .where(self.model.id_str.in_(claimed_ids))
+            .order_by(asc(self.model.created_at_time))
+        )
+        return list(workflow_jobs)
+
+    async def renew_leases(
+        self,
+        db: AsyncSession,
+        worker_id: str,
+        job_ids: List[str],
+        lease_seconds: float,
+    ) -> int:
+        """
+        Extend the leases a worker holds with a single UPDATE.
+
+        Returns how many leases were renewed; fewer than ``len(job_ids)``
+        means some jobs were reaped and now belong to someone else.
+        """
+        if not job_ids:
+            return 0
+        now = datetime.utcnow()
+        result = await db.exec(
+            update(self.model)
+            .where(
+                self.model.id_str.in_(job_ids),
+                self.model.worker_id_str == worker_id,
+                self.model.status_str == JobStatus.RUNNING,
+            )
+            .values(lease_expires_at_time=now + timedelta(seconds=lease_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount
+
+    async def get_expired_lease_defs(self, db: AsyncSession) -> List[AIWorkflowDef]:
+        """Definitions of the running jobs whose lease has expired."""
+        result = await db.exec(
+            select(AIWorkflowDef).where(
+                AIWorkflowDef.id_str.in_(
+                    select(self.model.ai_workflow_def_id)
+                    .where(*self._lease_expired(datetime.utcnow()))
+                    .distinct()
+                )
+            )
+        )
+        return list(result)
+
+    async def reap_expired_leases(
+        self,
+        db: AsyncSession,
+        max_attempts: int,
+        def_max_attempts: Optional[Dict[str, int]] = None,
+    ) -> Tuple[int, int]:
+        """
+        Recover running jobs whose lease has expired, i.e. whose worker died.
+
+        Jobs with attempts left go back to pending; the rest are failed and
+        moved to the dead-letter table so a job that keeps crashing its
+        worker isn't retried forever. A job's attempt limit is its
+        definition's entry in ``def_max_attempts``, ``max_attempts`` for
+        definitions without one. Both are conditional UPDATEs, so
+        concurrent reapers recover a job only once. Returns (requeued,
+        failed).
+        """
+        now = datetime.utcnow()
+        expired = self._lease_expired(now)
+        attempt_limit = (
+            case(
+                def_max_attempts,
+                value=self.model.ai_workflow_def_id,
+                else_=max_attempts,
+            )
+            if def_max_attempts
+            else max_attempts
+        )
+        requeued = await self._update_rows(
+            db,
+            update(self.model).values(
+                status_str=JobStatus.PENDING,
+                worker_id_str=None,
+                lease_expires_at_time=None,
+                started_at_time=None,
+                updated_at_time=now,
+            ),
+            (*expired, self.model.attempt_int < attempt_limit),
+            self.model.user_id_str,
+        )
+        if requeued:
+            await self._adjust_backlog(db, Counter(row[1] for row in requeued))
+        failed = await self._update_rows(
+            db,
+            update(self.model).values(
+                status_str=JobStatus.FAILED,
+                error_message_text="Lease expired: worker stopped heartbeating",
+                lease_expires_at_time=None,
+                completed_at_time=now,
+                updated_at_time=now,
+            ),
+            (*expired, self.model.attempt_int >= attempt_limit),
+        )
+        if failed:
+            await self._move_to_dead_letter(db, [row[0] for row in failed])
+        await db.commit()
+        return len(requeued), len(failed)
+
+    async def finish_leased_jobs(
+        self,
+        db: AsyncSession,
+        worker_id: str,
+        outcomes: Dict[str, Dict[str, Any]],
+        dead_letter: Collection[str] = (),
+    ) -> List[str]:
+        """
+        Write the outcomes of several jobs, keyed by job id, with a single
+        UPDATE setting each column through a CASE on the id, and move the
+        ``dead_letter`` ones to the dead-letter table, in one transaction.
+
+        An outcome only moves a job from running to completed or failed,
+        and only while ``worker_id`` still holds its lease, so a stale
+        writer never overwrites a job that was reaped, requeued, cancelled
+        or finished by another worker. Jobs another transaction is updating,
+        such as a lease renewal, are waited for, not skipped. Returns the
+        ids of the jobs written; the outcomes of the others are discarded.
+        """
+        if not outcomes:
+            return []
+        for workflow_job_id, values in outcomes.items():
+            if values.get("status_str") not in (JobStatus.COMPLETED, JobStatus.FAILED):
+                raise ValueError(
+                    f"Job {workflow_job_id} cannot be finished as "
+                    f"{values.get('status_str')!r}"
+                )
+
+        columns = self.model.__table__.c
+        names = dict.fromkeys(name for values in outcomes.values() for name in values)
+        # 每列一个按ID取值的CASE，未给出该列的任务保持原值
+        assignments = {
+            name: case(
+                {
+                    workflow_job_id: literal(values[name], columns[name].type)
+                    for workflow_job_id, values in outcomes.items()
+                    if name in values
+                },
+                value=self.model.id_str,
+                else_=columns[name],
+            )
+            for name in names
+        }
+        rows = await self._update_rows(
+            db,
+            update(self.model).values(
+                **assignments,
+                lease_expires_at_time=None,
+                updated_at_time=datetime.utcnow(),
+            ),
+            (
+                self.model.id_str.in_(list(outcomes)),
+                self.model.worker_id_str == worker_id,
+                self.model.status_str == JobStatus.RUNNING,
+            ),
+            # 正在续约或保存进度的任务需等待其提交，不能跳过
+            skip_locked=False,
+        )
+        written = [row[0] for row in rows]
+        dead_job_ids = [job_id for job_id in written if job_id in dead_letter]
+        if dead_job_ids:
+            await self._move_to_dead_letter(db, dead_job_ids)
+        await db.commit()
+        return written
+
+    async def retry_leased_job(
+        self,
+        db: AsyncSession,
+        workflow_job: AIWorkflowJob,
+        worker_id: str,
+        not_before: datetime,
+        error_message: str,
+    ) -> bool:
+        """
+        Put a failed job back to pending, claimable from ``not_before`` on,
+        if ``worker_id`` still holds its lease. The error is kept for
+        inspection until the next attempt's outcome replaces it.
+        """
+        result = await db.exec(
+            update(self.model)
+            .where(*self._leased_by(workflow_job.id_str, worker_id))
+            .values(
+                status_str=JobStatus.PENDING,
+                not_before_time=not_before,
+                error_message_text=error_message,
+                worker_id_str=None,
+                lease_expires_at_time=None,
+                started_at_time=None,
+                progress_json=None,
+                updated_at_time=datetime.utcnow(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            await self._adjust_backlog(db, {workflow_job.user_id_str: 1})
+        await db.commit()
+        return result.rowcount == 1
+
+    async def cancel_workflow_job(self, db: AsyncSession, workflow_job_id: str) -> bool:
+        """
+        Cancel a pending or running job.
+
+        A conditional UPDATE, so a job that finishes concurrently is either
+        cancelled or completed, never both. Returns False when the job had
+        already reached a final status. A running job's worker notices the
+        status through ``get_cancelled_job_ids`` and aborts it.
+        """
+        now = datetime.utcnow()
+        cancel = (
+            update(self.model)
+            .where(self.model.id_str == workflow_job_id)
+            .values(
+                status_str=JobStatus.CANCELLED,
+                lease_expires_at_time=None,
+                completed_at_time=now,
+                updated_at_time=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        # 待执行的任务离开积压，需同步计数
+        result = await db.exec(cancel.where(self.model.status_str == JobStatus.PENDING))
+        if result.rowcount == 1:
+            user_id = await db.scalar(
+                select(self.model.user_id_str).where(
+                    self.model.id_str == workflow_job_id
+                )
+            )
+            await self._adjust_backlog(db, {user_id: -1})
+        else:
+            result = await db.exec(
+                cancel.where(self.model.status_str == JobStatus.RUNNING)
+            )
+        await db.commit()
+        return result.rowcount == 1
+
+    async def get_cancelled_job_ids(
+        self, db: AsyncSession, job_ids: List[str]
+    ) -> List[str]:
+        """Which of a worker's jobs have been cancelled, in one primary-key query."""
+        if not job_ids:
+            return []
+        result = await db.exec(
+            select(self.model.id_str).where(
+                self.model.id_str.in_(job_ids),
+                self.model.status_str == JobStatus.CANCELLED,
+            )
+        )
+        return list(result)
+
+    async def save_progress(
+        self, db: AsyncSession, worker_id: str, progress: Dict[str, str]
+    ) -> int:
+        """Write several running jobs' ``progress_json`` with a single UPDATE."""
+        if not progress:
+            return 0
+        result = await db.exec(
+            update(self.model)
+            .where(
+                self.model.id_str.in_(list(progress)),
+                self.model.worker_id_str == worker_id,
+                self.model.status_str == JobStatus.RUNNING,
+            )
+            .values(
+                progress_json=case(progress, value=self.model.id_str),
+                updated_at_time=datetime.utcnow(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount
+
+    async def get_changed_jobs(
+        self, db: AsyncSession, since: datetime, limit: int = 5000
+    ) -> List[Row]:
+        """
+        Status and progress of jobs updated at or after ``since``, oldest
+        first; the change feed behind job event streams. Jobs moved to the
+        dead-letter table are included, their final failure is the move.
+        """
+        changes = union_all(
+            *(
+                select(
+                    model.id_str,
+                    model.user_id_str,
+                    model.ai_workflow_def_id,
+                    model.status_str,
+                    model.progress_json,
+                    model.updated_at_time,
+                ).where(model.updated_at_time >= since)
+                for model in (self.model, AIWorkflowJobDeadLetter)
+            )
+        ).subquery()
+        result = await db.exec(
+            select(*changes.c).order_by(asc(changes.c.updated_at_time)).limit(limit)
+        )
+        return list(result)
+
+    async def get_dead_letter(
+        self, db: AsyncSession, workflow_job_id: str
+    ) -> Optional[AIWorkflowJobDeadLetter]:
+        result = await db.exec(
+            select(AIWorkflowJobDeadLetter).where(
+                AIWorkflowJobDeadLetter.id_str == workflow_job_id
+            )
+        )
+        return result.first()
+
+    async def get_dead_letters(
+        self,
+        db: AsyncSession,
+        user_id: str,
+        ai_workflow_def_id: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> ScalarResult[AIWorkflowJobDeadLetter]:
+        """Dead-lettered jobs of a user, most recently failed first."""
+        model = AIWorkflowJobDeadLetter
+        query = select(model).where(model.user_id_str == user_id)
+        if ai_workflow_def_id:
+            query = query.where(model.ai_workflow_def_id == ai_workflow_def_id)
+        return await db.exec(
+            query.order_by(desc(model.updated_at_time)).offset(offset).limit(limit)
+        )
+
+    async def requeue_dead_letter(
+        self, db: AsyncSession, workflow_job_id: str
+    ) -> Optional[AIWorkflowJob]:
+        """
+        Move a dead-lettered job back to ``ai_workflow_job`` as a fresh
+        pending job with the same id and payload.
+        """
+        dead_job = await self.get_dead_letter(db, workflow_job_id)
+        if dead_job is None:
+            return None
+        workflow_job = self.model(
+            **dead_job.model_dump(
+                exclude={
+                    "result_data_json",
+                    "result_data_blob_str",
+                    "result_data_size_int",
+                    "error_message_text",
+                    "started_at_time",
+                    "completed_at_time",
+                    "execution_time_seconds",
+                    "not_before_time",
+                    "worker_id_str",
+                    "attempt_int",
+                    "progress_json",
+                }
+            )
+        )
+        workflow_job.status_str = JobStatus.PENDING
+        workflow_job.updated_at_time = datetime.utcnow()
+        await db.delete(dead_job)
+        # 先删除再插入，避免同一主键在会话中冲突
+        await db.flush()
+        db.add(workflow_job)
+        await self._adjust_backlog(db, {workflow_job.user_id_str: 1})
+        await db.commit()
+        await db.refresh(workflow_job)
+        return workflow_job
+
+    async def get_backlog(
+        self, db: AsyncSession, user_id: str
+    ) -> Dict[str, AIWorkflowJobBacklog]:
+        """
+        The global and ``user_id``'s backlog counters, keyed by user; the
+        global one sums the shards of the global counter.
+        """
+        shards = [f"{GLOBAL_BACKLOG_KEY}{n}" for n in range(GLOBAL_BACKLOG_SHARDS)]
+        result = await db.exec(
+            select(AIWorkflowJobBacklog).where(
+                AIWorkflowJobBacklog.user_id_str.in_([*shards, user_id])
+            )
+        )
+        backlog = {}
+        total = AIWorkflowJobBacklog(user_id_str=GLOBAL_BACKLOG_KEY)
+        for row in result:
+            if row.user_id_str == user_id:
+                backlog[user_id] = row
+            else:
+                total.pending_int += row.pending_int
+                total.claimed_total_int += row.claimed_total_int
+                backlog[GLOBAL_BACKLOG_KEY] = total
+        return backlog
+
+    async def get_blob_keys(self, db: AsyncSession) -> Set[str]:
+        """Blob keys referenced by jobs and dead-lettered jobs."""
+        columns = [
+            column
+            for table in (self.model, AIWorkflowJobDeadLetter)
+            for column in (table.trigger_data_blob_str, table.result_data_blob_str)
+        ]
+        result = await db.exec(
+            union_all(*(select(column).where(column.isnot(None)) for column in columns))
+        )
+        return set(result.scalars())
+
+    async def _new_workflow_job(
+        self, obj_in: AIWorkflowJobCreate, user_id: str
+    ) -> AIWorkflowJob:
+        obj_in_data = obj_in.model_dump()
+        obj_in_data["user_id_str"] = user_id
+        obj_in_data.update(
+            await store_payload("trigger_data", obj_in_data["trigger_data_json"])
+        )
+        return AIWorkflowJob(**obj_in_data)
+
+    def _is_due(self, now: datetime):
+        return or_(
+            self.model.not_before_time == None,
+            self.model.not_before_time <= now,
+        )
+
+    def _lease_expired(self, now: datetime) -> tuple:
+        return (
+            self.model.status_str == JobStatus.RUNNING,
+            self.model.lease_expires_at_time < now,
+        )
+
+    def _leased_by(self, workflow_job_id: str, worker_id: str) -> tuple:
+        return (
+            self.model.id_str == workflow_job_id,
+            self.model.worker_id_str == worker_id,
+            self.model.status_str == JobStatus.RUNNING,
+        )
+
+    async def _update_rows(
+        self,
+        db: AsyncSession,
+        stmt,
+        conditions: tuple,
+        *columns,
+        skip_locked: bool = True,
+    ) -> List[Row]:
+        """
+        Apply a bulk UPDATE to the rows matching ``conditions`` and return
+        the id and ``columns`` of each row it changed: with ``RETURNING``
+        where the database supports it, elsewhere by locking the rows with
+        ``SELECT ... FOR UPDATE`` first. ``skip_locked`` leaves rows another
+        transaction holds to a later pass, which suits sweeps like the
+        reaper; without it those rows are waited for.
+        """
+        stmt = stmt.execution_options(synchronize_session=False)
+        if db.bind.dialect.update_returning:
+            result = await db.exec(
+                stmt.where(*conditions).returning(self.model.id_str, *columns)
+            )
+            return list(result)
+        result = await db.exec(
+            select(self.model.id_str, *columns)
+            .where(*conditions)
+            # 按主键顺序加锁，避免与其他批量更新互相死锁
+            .order_by(self.model.id_str)
+            .with_for_update(skip_locked=skip_locked)
+        )
+        rows = list(result)
+        if rows:
+            await db.exec(
+                stmt.where(*conditions, self.model.id_str.in_([row[0] for row in rows]))
+            )
+        return rows
+
+    async def _move_to_dead_letter(self, db: AsyncSession, job_ids: List[str]) -> None:
+        """Copy jobs to the dead-letter table and delete them, in the caller's transaction."""
+        columns = [column.name for column in AIWorkflowJobDeadLetter.__table__.columns]
+        source = self.model.__table__
+        await db.exec(
+            insert(AIWorkflowJobDeadLetter).from_select(
+                columns,
+                select(*(source.c[name] for name in columns)).where(
+                    source.c.id_str.in_(job_ids)
+                ),
+            )
+        )
+        await db.exec(
+            delete(self.model)
+            .where(self.model.id_str.in_(job_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+    async def _adjust_backlog(
+        self, db: AsyncSession, pending: Dict[str, int], claimed: bool = False
+    ) -> None:
+        """
+        Apply per-user pending deltas, and their sums to the users' shards
+        of the global counter, in the caller's transaction. ``claimed``
+        counts negative deltas as claims towards the drain rate. The
+        counters are kept whether or not this process enforces admission
+        limits, so they stay exact for the processes that do.
+        """
+        deltas = dict(pending)
+        for user, delta in pending.items():
+            shard = global_backlog_key(user)
+            deltas[shard] = deltas.get(shard, 0) + delta
+        await self._upsert_backlog(
+            db,
+            [
+                {
+                    "user_id_str": user,
+                    "pending_int": delta,
+                    "claimed_total_int": -delta if claimed else 0,
+                }
+                # 固定加锁顺序，避免并发事务死锁
+                for user, delta in sorted(deltas.items())
+            ],
+        )
+
+    async def _upsert_backlog(
+        self, db: AsyncSession, rows: List[Dict[str, Any]]
+    ) -> None:
+        table = AIWorkflowJobBacklog
+        await db.exec(
+            upsert(
+                db,
+                table,
+                rows,
+                index_elements=[table.user_id_str],
+                set_=lambda new: {
+                    column: getattr(table, column) + getattr(new, column)
+                    for column in rows[0]
+                    if column != "user_id_str"
+                },
+            )
+        )
+
 
 ai_workflow_job = CRUDAIWorkflowJob(AIWorkflowJob)
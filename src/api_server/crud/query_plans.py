@@ -0,0 +1,415 @@
+"""
+Check that the CRUD list queries are served by indexes.
+
+    python -m src.api_server.crud.query_plans
+
+Builds a scratch SQLite database with the schema migrations, runs each
+list query and each query of the worker's claim loop through its CRUD
+method, and reads ``EXPLAIN QUERY PLAN`` of the SQL it issued. A query
+fails the check when it does not use the index it was designed for, when
+it scans a table instead of searching an index, where an index is meant
+to provide the order when it sorts its rows in a temporary B-tree, and
+for a cursor page when it does not seek to the cursor in the index.
+Exits non-zero on failure.
+"""
+
+import asyncio
+import os
+import re
+import sys
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, List, Tuple, Union
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.api_server import crud
+from src.api_server.migrations import run_migrations
+from src.api_server.models.ai_workflow_def import AIWorkflowDef, AIWorkflowDefTag
+from src.api_server.models.ai_workflow_job import (
+    AIWorkflowJob,
+    AIWorkflowJobDeadLetter,
+    JobStatus,
+)
+
+USER_ID = "user_id"
+DEF_ID = "def-1"
+USER_JOB_INDEXES = (
+    "ix_ai_workflow_job_user_updated",
+    "ix_ai_workflow_job_user_status",
+    "ix_ai_workflow_job_user_def",
+)
+
+_FTS5_MATCH = re.compile(r"VIRTUAL TABLE INDEX \d+:\S*M")
+
+
+@dataclass
+class Case:
+    name: str
+    run: Callable[[AsyncSession], Awaitable[Any]]
+    # 查询计划中应出现的索引 (全文检索为FTS5虚拟表)，多个时任一即可
+    index: Union[str, Tuple[str, ...]]
+    # 排序应由索引提供，不允许临时B-tree排序
+    index_ordered: bool = True
+    # 游标翻页应在索引中按范围定位，而不是从第一行逐行跳过
+    seeks_cursor: bool = False
+    # 先由索引选出行ID，再按主键查找各行
+    by_id: bool = False
+    # 检查该用例最后执行的哪类语句
+    statement: str = "SELECT"
+
+
+async def _next_cursor(db: AsyncSession, list_method: Callable, **kwargs) -> str:
+    _, cursor = await list_method(db, user_id=USER_ID, limit=1, **kwargs)
+    return cursor
+
+
+def _cases() -> List[Case]:
+    jobs = crud.ai_workflow_job
+    defs = crud.ai_workflow_def
+
+    async def job_page(db: AsyncSession, **kwargs: Any) -> Any:
+        return await jobs.get_workflow_job(db, user_id=USER_ID, limit=10, **kwargs)
+
+    async def job_cursor_page(db: AsyncSession, **kwargs: Any) -> Any:
+        cursor = await _next_cursor(db, jobs.get_workflow_job, **kwargs)
+        return await job_page(db, cursor=cursor, **kwargs)
+
+    async def def_page(db: AsyncSession, **kwargs: Any) -> Any:
+        return await defs.get_workflow_def(db, user_id=USER_ID, limit=10, **kwargs)
+
+    async def def_cursor_page(db: AsyncSession) -> Any:
+        cursor = await _next_cursor(db, defs.get_workflow_def)
+        return await def_page(db, cursor=cursor)
+
+    return [
+        Case("jobs", job_page, "ix_ai_workflow_job_user_updated"),
+        Case(
+            "jobs next page",
+            job_cursor_page,
+            "ix_ai_workflow_job_user_updated",
+            seeks_cursor=True,
+        ),
+        Case(
+            "jobs by status",
+            lambda db: job_page(db, status=JobStatus.COMPLETED),
+            "ix_ai_workflow_job_user_status",
+        ),
+        Case(
+            "jobs by status, next page",
+            lambda db: job_cursor_page(db, status=JobStatus.COMPLETED),
+            "ix_ai_workflow_job_user_status",
+            seeks_cursor=True,
+        ),
+        Case(
+            "jobs by def",
+            lambda db: job_page(db, ai_workflow_def_id=DEF_ID),
+            "ix_ai_workflow_job_user_def",
+        ),
+        Case(
+            "jobs by def, next page",
+            lambda db: job_cursor_page(db, ai_workflow_def_id=DEF_ID),
+            "ix_ai_workflow_job_user_def",
+            seeks_cursor=True,
+        ),
+        # 其他排序字段不单独建索引 (任务表是热表)：由任一以用户开头的
+        # 索引过滤后排序
+        *(
+            Case(
+                f"jobs by {order_by}",
+                lambda db, order_by=order_by: job_page(db, order_by=order_by),
+                USER_JOB_INDEXES,
+                index_ordered=False,
+            )
+            for order_by in (
+                "created_at_time",
+                "started_at_time",
+                "completed_at_time",
+                "execution_time_seconds",
+            )
+        ),
+        Case(
+            "jobs completed in range",
+            lambda db: job_page(
+                db,
+                order_by="completed_at_time",
+                completed_after=datetime.utcnow() - timedelta(days=1),
+                completed_before=datetime.utcnow(),
+            ),
+            USER_JOB_INDEXES,
+            index_ordered=False,
+        ),
+        Case(
+            "jobs by status (legacy)",
+            lambda db: jobs.get_jobs_by_status(db, USER_ID, JobStatus.COMPLETED),
+            "ix_ai_workflow_job_user_status",
+        ),
+        Case(
+            "jobs by def (legacy)",
+            lambda db: jobs.get_jobs_by_workflow_def(db, USER_ID, DEF_ID),
+            "ix_ai_workflow_job_user_def",
+        ),
+        Case(
+            "jobs, selected fields",
+            lambda db: job_page(db, fields="id_str,job_name_str,status_str"),
+            "ix_ai_workflow_job_user_updated",
+        ),
+        Case(
+            "jobs by keyword",
+            lambda db: job_page(db, search="job", order_by="relevance"),
+            "ai_workflow_job_fts",
+            index_ordered=False,
+        ),
+        Case(
+            "busiest defs",
+            lambda db: jobs.get_busiest_workflow_def_ids(
+                db, since=datetime.utcnow() - timedelta(hours=24), limit=8
+            ),
+            "ix_ai_workflow_job_created_def",
+            index_ordered=False,
+        ),
+        Case(
+            "dead letters",
+            lambda db: jobs.get_dead_letters(db, user_id=USER_ID, limit=10),
+            "ix_ai_workflow_job_dead_letter_user",
+        ),
+        Case(
+            "changed jobs",
+            lambda db: jobs.get_changed_jobs(
+                db, since=datetime.utcnow() - timedelta(seconds=5)
+            ),
+            "ix_ai_workflow_job_updated",
+            index_ordered=False,
+        ),
+        Case(
+            "top pending priority",
+            lambda db: jobs.get_top_pending_priority(db),
+            "ix_ai_workflow_job_claim",
+        ),
+        Case(
+            "pending users",
+            lambda db: jobs.get_pending_user_ids(db, priority=5, max_users=100),
+            "ix_ai_workflow_job_claim",
+            statement="WITH",
+        ),
+        Case(
+            "pending users from a cursor",
+            lambda db: jobs.get_pending_user_ids(
+                db, priority=5, max_users=100, after=USER_ID
+            ),
+            "ix_ai_workflow_job_claim",
+            statement="WITH",
+        ),
+        Case(
+            "claim for a user",
+            lambda db: jobs.claim_pending_jobs(
+                db, limit=1, user_id=USER_ID, priority=5, worker_id="plans"
+            ),
+            "ix_ai_workflow_job_claim",
+            by_id=True,
+            statement="UPDATE",
+        ),
+        Case(
+            "expired lease definitions",
+            jobs.get_expired_lease_defs,
+            "ix_ai_workflow_job_lease",
+        ),
+        Case(
+            "expired leases",
+            lambda db: jobs.reap_expired_leases(db, max_attempts=3),
+            "ix_ai_workflow_job_lease",
+            statement="UPDATE",
+        ),
+        Case("defs", def_page, "ix_ai_workflow_def_user_updated"),
+        Case(
+            "defs next page",
+            def_cursor_page,
+            "ix_ai_workflow_def_user_updated",
+            seeks_cursor=True,
+        ),
+        Case(
+            "defs by tags (all)",
+            lambda db: def_page(db, tags="rag,chat"),
+            "ix_ai_workflow_def_tag_user_tag",
+        ),
+        Case(
+            "defs by tags (any)",
+            lambda db: def_page(db, tags="rag,chat", tags_mode="any"),
+            "ix_ai_workflow_def_tag_user_tag",
+        ),
+        Case(
+            "defs by keyword",
+            lambda db: def_page(db, search="rag"),
+            "ai_workflow_def_fts",
+            index_ordered=False,
+        ),
+        Case(
+            "defs by keyword, by relevance",
+            lambda db: def_page(db, search="rag chat", order_by="relevance"),
+            "ai_workflow_def_fts",
+            index_ordered=False,
+        ),
+        Case(
+            "tag facets",
+            lambda db: defs.get_tag_counts(db, user_id=USER_ID),
+            "ix_ai_workflow_def_tag_user_tag",
+            index_ordered=False,
+        ),
+        Case(
+            "tag facets within tags",
+            lambda db: defs.get_tag_counts(db, user_id=USER_ID, tags="rag"),
+            "ix_ai_workflow_def_tag_user_tag",
+            index_ordered=False,
+        ),
+        Case(
+            "active defs",
+            lambda db: defs.get_active_workflow_defs(db, user_id=USER_ID),
+            "ix_ai_workflow_def_user_updated",
+        ),
+    ]
+
+
+async def _seed(bind: AsyncEngine) -> None:
+    now = datetime.utcnow()
+    async with AsyncSession(bind) as db:
+        for i in range(3):
+            db.add(
+                AIWorkflowDef(
+                    id_str=f"def-{i}",
+                    name_str=f"def {i}",
+                    hs_yaml_content="components: {}",
+                    tags_str="rag,chat",
+                    user_id_str=USER_ID,
+                )
+            )
+            for tag in ("rag", "chat"):
+                db.add(
+                    AIWorkflowDefTag(
+                        ai_workflow_def_id=f"def-{i}", tag_str=tag, user_id_str=USER_ID
+                    )
+                )
+            for status in (JobStatus.PENDING, JobStatus.COMPLETED):
+                db.add(
+                    AIWorkflowJob(
+                        ai_workflow_def_id=f"def-{i}",
+                        job_name_str="job",
+                        trigger_data_json="{}",
+                        status_str=status,
+                        user_id_str=USER_ID,
+                        created_at_time=now,
+                        started_at_time=now,
+                        completed_at_time=now,
+                        execution_time_seconds=1.0,
+                    )
+                )
+            db.add(
+                AIWorkflowJobDeadLetter(
+                    ai_workflow_def_id=DEF_ID,
+                    job_name_str="job",
+                    trigger_data_json="{}",
+                    status_str=JobStatus.FAILED,
+                    user_id_str=USER_ID,
+                )
+            )
+        await db.commit()
+
+
+def _plan_problems(plan: List[str], case: Case) -> List[str]:
+    problems = []
+    indexes = (case.index,) if isinstance(case.index, str) else case.index
+    names = "|".join(re.escape(index) for index in indexes)
+    uses_index = re.compile(rf"^(SEARCH|SCAN) .*\b({names})\b")
+    if not any(uses_index.search(detail) for detail in plan):
+        problems.append(f"does not use {' or '.join(indexes)}")
+    for detail in plan:
+        # "SCAN t" 为全表扫描，"SCAN t USING INDEX ix" 为不带过滤条件的全索引扫描；
+        # FTS5表带MATCH条件 (idxStr含M) 时是倒排索引查找
+        if (
+            detail.startswith("SCAN ")
+            and "ai_workflow" in detail
+            and not _FTS5_MATCH.search(detail)
+        ):
+            problems.append(detail)
+        if case.index_ordered and detail.startswith("USE TEMP B-TREE FOR ORDER BY"):
+            problems.append(detail)
+    if case.by_id and not any(
+        detail.startswith("SEARCH ") and "(id_str=?)" in detail for detail in plan
+    ):
+        problems.append("rows are not looked up by primary key")
+    if case.seeks_cursor and not any(
+        detail.startswith("SEARCH ") and ("<?" in detail or ">?" in detail)
+        for detail in plan
+    ):
+        problems.append("no index range seek to the cursor")
+    return problems
+
+
+async def check(bind: AsyncEngine) -> List[Tuple[str, List[str], List[str]]]:
+    """
+    ``(case, plan, problems)`` of the last statement of its kind each case
+    issued.
+    """
+    statements: List[Tuple[str, Any]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany) -> None:
+        statements.append((statement, parameters))
+
+    results = []
+    async with AsyncSession(bind) as db:
+        for case in _cases():
+            event.listen(bind.sync_engine, "before_cursor_execute", capture)
+            try:
+                await case.run(db)
+            finally:
+                event.remove(bind.sync_engine, "before_cursor_execute", capture)
+            statement, parameters = [
+                (statement, parameters)
+                for statement, parameters in statements
+                if statement.lstrip().upper().startswith(case.statement)
+            ][-1]
+            statements.clear()
+            async with bind.connect() as conn:
+                rows = await conn.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters
+                )
+                plan = [row[-1] for row in rows]
+            results.append((case.name, plan, _plan_problems(plan, case)))
+    return results
+
+
+async def check_scratch_database(
+    directory: str,
+) -> List[Tuple[str, List[str], List[str]]]:
+    """Build the scratch database in ``directory`` and check every case."""
+    bind = create_async_engine(
+        f"sqlite+aiosqlite:///{os.path.join(directory, 'plans.db')}"
+    )
+    try:
+        await run_migrations(bind)
+        await _seed(bind)
+        return await check(bind)
+    finally:
+        await bind.dispose()
+
+
+async def main() -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        results = await check_scratch_database(tmp)
+
+    failed = 0
+    for name, plan, problems in results:
+        print(f"{'FAIL' if problems else 'ok':<5} {name}")
+        for detail in plan:
+            print(f"        {detail}")
+        failed += bool(problems)
+    if failed:
+        print(f"{failed} queries are not index-backed", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
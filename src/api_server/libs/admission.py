@@ -0,0 +1,118 @@
+"""Admission control for job submission, driven by the backlog counters."""
+
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.api_server import crud
+from src.api_server.config import settings
+from src.api_server.models.ai_workflow_job import (
+    GLOBAL_BACKLOG_KEY,
+    AIWorkflowJobBacklog,
+)
+
+# 消化速率的采样间隔与平滑系数
+RATE_SAMPLE_INTERVAL_SECONDS = 1.0
+RATE_SMOOTHING = 0.3
+# 间隔过长的样本不代表当前速率，只作为新的起点
+RATE_SAMPLE_MAX_AGE_SECONDS = 60.0
+# 跟踪消化速率的用户数上限
+MAX_TRACKED_RATES = 10000
+
+
+@dataclass
+class DrainRate:
+    """Smoothed claims per second of one backlog counter."""
+
+    sampled_at: float
+    claimed_total: int
+    per_second: Optional[float] = None
+
+
+class AdmissionController:
+    """
+    Rejects a submission while the pending backlog, globally or of the
+    submitting user, is at its limit.
+
+    Depths come from the ``ai_workflow_job_backlog`` counters that job
+    creation, claims, cancellation and requeues keep up to date, so a check
+    is two primary-key reads. ``Retry-After`` is the time the workers need
+    to drain the excess at the rate they are actually claiming jobs,
+    estimated from the growth of the counters' claim totals between checks.
+    """
+
+    def __init__(
+        self,
+        max_pending: int,
+        max_pending_per_user: int,
+        retry_after_max: int,
+    ) -> None:
+        self.max_pending = max_pending
+        self.max_pending_per_user = max_pending_per_user
+        self.retry_after_max = retry_after_max
+        self._rates: "OrderedDict[str, DrainRate]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_pending or self.max_pending_per_user)
+
+    async def check(
+        self, db: AsyncSession, user_id: str, count: int = 1
+    ) -> Optional[int]:
+        """Seconds the client should wait, or None when ``count`` jobs are admitted."""
+        if not self.enabled:
+            return None
+        backlog = await crud.ai_workflow_job.get_backlog(db, user_id=user_id)
+        retry_after = None
+        for key, limit in (
+            (GLOBAL_BACKLOG_KEY, self.max_pending),
+            (user_id, self.max_pending_per_user),
+        ):
+            # 尚无计数行表示没有待执行任务
+            counters = backlog.get(key) or AIWorkflowJobBacklog(user_id_str=key)
+            per_second = self._drain_rate(key, counters.claimed_total_int)
+            excess = counters.pending_int + count - limit
+            if limit and excess > 0:
+                wait = self._retry_after(excess, per_second)
+                retry_after = max(retry_after or 0, wait)
+        return retry_after
+
+    def _retry_after(self, excess: int, per_second: Optional[float]) -> int:
+        if not per_second:
+            return self.retry_after_max
+        return min(self.retry_after_max, max(1, math.ceil(excess / per_second)))
+
+    def _drain_rate(self, key: str, claimed_total: int) -> Optional[float]:
+        now = time.monotonic()
+        rate = self._rates.get(key)
+        if rate is None:
+            self._rates[key] = DrainRate(sampled_at=now, claimed_total=claimed_total)
+            if len(self._rates) > MAX_TRACKED_RATES:
+                self._rates.popitem(last=False)
+            return None
+
+        self._rates.move_to_end(key)
+        elapsed = now - rate.sampled_at
+        if elapsed < RATE_SAMPLE_INTERVAL_SECONDS:
+            return rate.per_second
+        if elapsed <= RATE_SAMPLE_MAX_AGE_SECONDS:
+            sample = (claimed_total - rate.claimed_total) / elapsed
+            rate.per_second = (
+                sample
+                if rate.per_second is None
+                else RATE_SMOOTHING * sample + (1 - RATE_SMOOTHING) * rate.per_second
+            )
+        rate.sampled_at = now
+        rate.claimed_total = claimed_total
+        return rate.per_second
+
+
+admission_controller = AdmissionController(
+    max_pending=settings.ADMISSION_MAX_PENDING_JOBS,
+    max_pending_per_user=settings.ADMISSION_MAX_PENDING_JOBS_PER_USER,
+    retry_after_max=settings.ADMISSION_RETRY_AFTER_MAX_SECONDS,
+)
@@ -0,0 +1,241 @@
+"""
+Keyword search over text columns of a table.
+
+SQLite keeps a contentless FTS5 table in sync with the table through
+triggers, MySQL uses a FULLTEXT index. Other databases fall back to LIKE, which works but
+scans the table.
+"""
+
+import itertools
+import re
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import (
+    Table,
+    and_,
+    column,
+    event,
+    inspect,
+    literal_column,
+    or_,
+    table,
+)
+from sqlalchemy.dialects.mysql import match as mysql_match
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.selectable import Join
+
+# 单次检索最多使用的关键词数
+SEARCH_MAX_TERMS = 16
+
+_TERM = re.compile(r"\w+")
+
+
+class _CrossJoin(Join):
+    """A join SQLite must run with its left side as the outer loop."""
+
+    inherit_cache = True
+
+
+@compiles(_CrossJoin, "sqlite")
+def _compile_cross_join(
+    join: _CrossJoin, compiler: Any, from_linter: Any = None, **kw: Any
+) -> str:
+    # 同SQLCompiler.visit_join，连接关键字为CROSS JOIN，可以嵌套
+    if from_linter:
+        from_linter.edges.update(
+            itertools.product(join.left._from_objects, join.right._from_objects)
+        )
+    kw.pop("asfrom", None)
+    left = compiler.process(join.left, asfrom=True, from_linter=from_linter, **kw)
+    right = compiler.process(join.right, asfrom=True, from_linter=from_linter, **kw)
+    onclause = compiler.process(join.onclause, from_linter=from_linter, **kw)
+    return f"{left} CROSS JOIN {right} ON {onclause}"
+
+
+def search_terms(text: Optional[str]) -> List[str]:
+    """
+    Distinct lower-cased words of a search text, punctuation and search
+    operators dropped, so user input never reaches the database as query
+    syntax.
+    """
+    terms = []
+    for term in _TERM.findall((text or "").lower()):
+        if term not in terms:
+            terms.append(term)
+    return terms[:SEARCH_MAX_TERMS]
+
+
+@dataclass(frozen=True)
+class FullTextIndex:
+    """Full-text index of ``columns`` of ``table``; see ``fulltext_index``."""
+
+    table: Table
+    columns: Tuple[str, ...]
+
+    @property
+    def name(self) -> str:
+        """Name of the FTS5 table on SQLite and of the index on MySQL."""
+        return f"{self.table.name}_fts"
+
+    @property
+    def key_table_name(self) -> str:
+        """SQLite table mapping the FTS5 rowids to the table's primary keys."""
+        return f"{self.table.name}_fts_key"
+
+    @property
+    def key(self) -> str:
+        (primary_key,) = self.table.primary_key.columns
+        return primary_key.name
+
+    def create(self, connection: Connection) -> None:
+        """Create the index if missing; a new FTS5 table starts empty."""
+        quote = connection.dialect.identifier_preparer.quote
+        columns = ", ".join(quote(name) for name in self.columns)
+        if connection.dialect.name == "mysql":
+            existing = inspect(connection).get_indexes(self.table.name)
+            if all(index["name"] != self.name for index in existing):
+                connection.exec_driver_sql(
+                    f"CREATE FULLTEXT INDEX {quote(self.name)} "
+                    f"ON {quote(self.table.name)} ({columns})"
+                )
+            return
+        if connection.dialect.name != "sqlite":
+            return
+
+        fts, source = quote(self.name), quote(self.table.name)
+        keys, key = quote(self.key_table_name), quote(self.key)
+        new = ", ".join(f"new.{quote(name)}" for name in self.columns)
+        old = ", ".join(f"old.{quote(name)}" for name in self.columns)
+        insert_new = (
+            f"INSERT INTO {fts}(rowid, {columns}) SELECT fts_rowid, {new} "
+            f"FROM {keys} WHERE {key} = new.{key};"
+        )
+        delete_old = (
+            f"INSERT INTO {fts}({fts}, rowid, {columns}) "
+            f"SELECT 'delete', fts_rowid, {old} FROM {keys} WHERE {key} = old.{key};"
+        )
+        # 表的主键为文本，隐式rowid可能被VACUUM重新编号；FTS5表按键表的
+        # INTEGER PRIMARY KEY编号，键表再对应到主键
+        connection.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {keys} ("
+            f"fts_rowid INTEGER PRIMARY KEY, {key} TEXT NOT NULL UNIQUE)"
+        )
+        # 无内容表：FTS5只保存倒排索引，文本仍从原表读取
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{columns}, content='', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {quote(self.name + '_insert')} "
+            f"AFTER INSERT ON {source} BEGIN "
+            f"INSERT INTO {keys}({key}) VALUES (new.{key}); {insert_new} END"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {quote(self.name + '_delete')} "
+            f"AFTER DELETE ON {source} BEGIN {delete_old} "
+            f"DELETE FROM {keys} WHERE {key} = old.{key}; END"
+        )
+        # 只在被索引的列变化时更新，状态等其他列的更新不触及FTS5表
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {quote(self.name + '_update')} "
+            f"AFTER UPDATE OF {columns} ON {source} "
+            f"BEGIN {delete_old} {insert_new} END"
+        )
+
+    def rebuild(self, connection: Connection) -> None:
+        """Re-index every row of the table (SQLite; MySQL maintains its own)."""
+        if connection.dialect.name != "sqlite":
+            return
+        quote = connection.dialect.identifier_preparer.quote
+        fts, source = quote(self.name), quote(self.table.name)
+        keys, key = quote(self.key_table_name), quote(self.key)
+        columns = ", ".join(quote(name) for name in self.columns)
+        source_columns = ", ".join(f"s.{quote(name)}" for name in self.columns)
+        connection.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('delete-all')")
+        connection.exec_driver_sql(f"DELETE FROM {keys}")
+        connection.exec_driver_sql(
+            f"INSERT INTO {keys}({key}) SELECT {key} FROM {source}"
+        )
+        connection.exec_driver_sql(
+            f"INSERT INTO {fts}(rowid, {columns}) "
+            f"SELECT k.fts_rowid, {source_columns} "
+            f"FROM {keys} AS k JOIN {source} AS s ON s.{key} = k.{key}"
+        )
+
+    def drop(self, connection: Connection) -> None:
+        """Drop the FTS5 and key tables; the triggers go with the indexed table."""
+        if connection.dialect.name == "sqlite":
+            quote = connection.dialect.identifier_preparer.quote
+            for name in (self.name, self.key_table_name):
+                connection.exec_driver_sql(f"DROP TABLE IF EXISTS {quote(name)}")
+
+    def search(
+        self, query: Select, dialect: str, text: Optional[str]
+    ) -> Tuple[Select, Optional[Any]]:
+        """
+        ``query`` narrowed to the rows containing every word of ``text`` as
+        a word or word prefix, and a relevance expression that sorts the
+        best matches first in ascending order. The expression is None when
+        ``text`` has no words or the database cannot rank.
+        """
+        terms = search_terms(text)
+        if not terms:
+            return query, None
+        columns = [self.table.c[name] for name in self.columns]
+
+        if dialect == "sqlite":
+            fts = table(self.name, column("rowid"), column("rank"))
+            keys = table(self.key_table_name, column("fts_rowid"), column(self.key))
+            expression = " ".join(f'"{term}"*' for term in terms)
+            # 先查FTS5表再按键取行：否则SQLite为省去排序会沿用户索引
+            # 逐行探测FTS5表，关键词越少见越慢
+            query = query.select_from(
+                _CrossJoin(
+                    _CrossJoin(fts, keys, keys.c.fts_rowid == fts.c.rowid),
+                    self.table,
+                    self.table.c[self.key] == keys.c[self.key],
+                )
+            ).where(literal_column(self.name).op("MATCH")(expression))
+            # FTS5的rank为bm25得分，越小越相关
+            return query, fts.c.rank
+        if dialect == "mysql":
+            expression = " ".join(f"+{term}*" for term in terms)
+            relevance = mysql_match(*columns, against=expression).in_boolean_mode()
+            return query.where(relevance), -relevance
+
+        return (
+            query.where(
+                and_(
+                    *(
+                        or_(*(text_column.contains(term) for text_column in columns))
+                        for term in terms
+                    )
+                )
+            ),
+            None,
+        )
+
+
+# 各模型声明的全文索引，供迁移为已有的表创建
+FULLTEXT_INDEXES: List[FullTextIndex] = []
+
+
+def fulltext_index(table: Table, *columns: str) -> FullTextIndex:
+    """
+    Full-text index of ``columns`` of a model table. It is created and
+    dropped with the table by ``create_all()``/``drop_all()``; migrations
+    add it to existing tables through ``FULLTEXT_INDEXES``.
+    """
+    index = FullTextIndex(table, columns)
+    event.listen(
+        table, "after_create", lambda target, connection, **kw: index.create(connection)
+    )
+    event.listen(
+        table, "before_drop", lambda target, connection, **kw: index.drop(connection)
+    )
+    FULLTEXT_INDEXES.append(index)
+    return index
@@ -0,0 +1,313 @@
+"""Haystack pipeline definition validation and compilation."""
+
+import hashlib
+import json
+import random
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Literal, Optional
+
+import networkx as nx
+import yaml
+from haystack import Pipeline
+from haystack.core.errors import DeserializationError, PipelineError
+from haystack.marshal import YamlMarshaller
+
+# 编译结果格式版本，格式变化时递增，旧版本的编译结果将被忽略
+COMPILED_FORMAT_VERSION = 1
+
+
+class InvalidPipelineError(ValueError):
+    """Raised when ``hs_yaml_content`` is not a valid Haystack pipeline."""
+
+
+@dataclass(frozen=True)
+class BatchingConfig:
+    """
+    Per-definition micro-batching, declared under ``metadata.batching`` in
+    the pipeline YAML.
+
+    ``sequential`` runs coalesced jobs back to back on one warm pipeline;
+    ``concat`` concatenates the jobs' list inputs into a single run and
+    splits list outputs back per job.
+    """
+
+    max_size: int = 16
+    window_ms: int = 10
+    mode: Literal["sequential", "concat"] = "sequential"
+
+
+def parse_batching_config(
+    metadata: Optional[Dict[str, Any]],
+) -> Optional[BatchingConfig]:
+    """Batching config from pipeline metadata; None when batching is off."""
+    raw = (metadata or {}).get("batching")
+    if raw is None:
+        return None
+    if not isinstance(raw, dict):
+        raise InvalidPipelineError("metadata.batching must be a mapping")
+
+    defaults = BatchingConfig()
+    max_size = raw.get("max_size", defaults.max_size)
+    window_ms = raw.get("window_ms", defaults.window_ms)
+    mode = raw.get("mode", defaults.mode)
+    if not isinstance(max_size, int) or max_size < 1:
+        raise InvalidPipelineError("metadata.batching.max_size must be >= 1")
+    if not isinstance(window_ms, int) or window_ms < 0:
+        raise InvalidPipelineError("metadata.batching.window_ms must be >= 0")
+    if mode not in ("sequential", "concat"):
+        raise InvalidPipelineError(
+            "metadata.batching.mode must be 'sequential' or 'concat'"
+        )
+    if max_size == 1:
+        return None
+    return BatchingConfig(max_size=max_size, window_ms=window_ms, mode=mode)
+
+
+def parse_timeout_seconds(metadata: Optional[Dict[str, Any]]) -> Optional[float]:
+    """Per-definition run timeout from ``metadata.timeout_seconds``."""
+    timeout_seconds = (metadata or {}).get("timeout_seconds")
+    if timeout_seconds is None:
+        return None
+    if (
+        isinstance(timeout_seconds, bool)
+        or not isinstance(timeout_seconds, (int, float))
+        or timeout_seconds <= 0
+    ):
+        raise InvalidPipelineError("metadata.timeout_seconds must be > 0")
+    return float(timeout_seconds)
+
+
+def parse_branch_concurrency(metadata: Optional[Dict[str, Any]]) -> Optional[int]:
+    """
+    Per-definition limit on concurrently running components from
+    ``metadata.branch_concurrency``; 1 runs the pipeline sequentially.
+    """
+    branch_concurrency = (metadata or {}).get("branch_concurrency")
+    if branch_concurrency is None:
+        return None
+    if (
+        isinstance(branch_concurrency, bool)
+        or not isinstance(branch_concurrency, int)
+        or branch_concurrency < 1
+    ):
+        raise InvalidPipelineError("metadata.branch_concurrency must be >= 1")
+    return branch_concurrency
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Retries of failed runs, declared per definition under ``metadata.retry``
+    in the pipeline YAML; keys left out fall back to the worker defaults.
+
+    A failure is retried when an error in its cause chain is (a subclass
+    of) a class named in ``retry_on`` or carries an HTTP status listed in
+    ``retry_on_status``, and the job has been claimed fewer than
+    ``max_attempts`` times. The delay doubles per attempt from
+    ``backoff_seconds`` up to ``max_backoff_seconds``; ``jitter`` takes a
+    random share of up to that fraction off it, so retries of jobs that
+    failed together spread out.
+    """
+
+    max_attempts: int = 3
+    backoff_seconds: float = 2.0
+    max_backoff_seconds: float = 300.0
+    jitter: float = 0.5
+    retry_on: FrozenSet[str] = frozenset()
+    retry_on_status: FrozenSet[int] = frozenset()
+
+    def is_retryable(
+        self, error_types: FrozenSet[str], status_codes: FrozenSet[int]
+    ) -> bool:
+        return bool(self.retry_on & error_types or self.retry_on_status & status_codes)
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before the attempt after ``attempt``."""
+        delay = min(
+            self.max_backoff_seconds, self.backoff_seconds * 2 ** max(attempt - 1, 0)
+        )
+        return delay * (1 - self.jitter * random.random())
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def parse_retry_policy(
+    metadata: Optional[Dict[str, Any]], default: RetryPolicy = RetryPolicy()
+) -> RetryPolicy:
+    """Retry policy from pipeline metadata, on top of ``default``."""
+    raw = (metadata or {}).get("retry")
+    if raw is None:
+        return default
+    if not isinstance(raw, dict):
+        raise InvalidPipelineError("metadata.retry must be a mapping")
+
+    max_attempts = raw.get("max_attempts", default.max_attempts)
+    backoff_seconds = raw.get("backoff_seconds", default.backoff_seconds)
+    max_backoff_seconds = raw.get("max_backoff_seconds", default.max_backoff_seconds)
+    jitter = raw.get("jitter", default.jitter)
+    retry_on = raw.get("retry_on", default.retry_on)
+    retry_on_status = raw.get("retry_on_status", default.retry_on_status)
+    if (
+        not isinstance(max_attempts, int)
+        or isinstance(max_attempts, bool)
+        or max_attempts < 1
+    ):
+        raise InvalidPipelineError("metadata.retry.max_attempts must be >= 1")
+    if not _is_number(backoff_seconds) or backoff_seconds < 0:
+        raise InvalidPipelineError("metadata.retry.backoff_seconds must be >= 0")
+    if not _is_number(max_backoff_seconds) or max_backoff_seconds < backoff_seconds:
+        raise InvalidPipelineError(
+            "metadata.retry.max_backoff_seconds must be >= backoff_seconds"
+        )
+    if not _is_number(jitter) or not 0 <= jitter <= 1:
+        raise InvalidPipelineError("metadata.retry.jitter must be between 0 and 1")
+    if not isinstance(retry_on, (list, frozenset)) or not all(
+        isinstance(name, str) for name in retry_on
+    ):
+        raise InvalidPipelineError(
+            "metadata.retry.retry_on must be a list of exception class names"
+        )
+    if not isinstance(retry_on_status, (list, frozenset)) or not all(
+        isinstance(code, int) and not isinstance(code, bool) for code in retry_on_status
+    ):
+        raise InvalidPipelineError(
+            "metadata.retry.retry_on_status must be a list of HTTP status codes"
+        )
+    return RetryPolicy(
+        max_attempts=max_attempts,
+        backoff_seconds=float(backoff_seconds),
+        max_backoff_seconds=float(max_backoff_seconds),
+        jitter=float(jitter),
+        retry_on=frozenset(retry_on),
+        retry_on_status=frozenset(retry_on_status),
+    )
+
+
+def content_hash(hs_yaml_content: str) -> str:
+    """SHA-256 of a definition's YAML."""
+    return hashlib.sha256(hs_yaml_content.encode("utf-8")).hexdigest()
+
+
+def _parse_yaml(hs_yaml_content: str) -> Dict[str, Any]:
+    try:
+        data = YamlMarshaller().unmarshal(hs_yaml_content)
+    except (yaml.YAMLError, TypeError) as e:
+        raise InvalidPipelineError(f"Invalid pipeline YAML: {e}") from e
+
+    if not isinstance(data, dict):
+        raise InvalidPipelineError("Pipeline YAML must be a mapping")
+    components = data.get("components")
+    if not isinstance(components, dict) or not components:
+        raise InvalidPipelineError("Pipeline must declare at least one component")
+    for name, component_data in components.items():
+        if not isinstance(component_data, dict) or not isinstance(
+            component_data.get("type"), str
+        ):
+            raise InvalidPipelineError(f"Component '{name}' is missing its 'type'")
+        if not isinstance(component_data.get("init_parameters", {}), dict):
+            raise InvalidPipelineError(
+                f"Component '{name}' has invalid 'init_parameters'"
+            )
+
+    connections = data.setdefault("connections", [])
+    if not isinstance(connections, list):
+        raise InvalidPipelineError("Pipeline 'connections' must be a list")
+    for connection in connections:
+        if not isinstance(connection, dict):
+            raise InvalidPipelineError(f"Invalid connection: {connection}")
+        for end in ("sender", "receiver"):
+            value = connection.get(end)
+            if not isinstance(value, str):
+                raise InvalidPipelineError(f"Missing {end} in connection: {connection}")
+            if value.split(".", 1)[0] not in components:
+                raise InvalidPipelineError(
+                    f"Connection {end} '{value}' references an unknown component"
+                )
+    return data
+
+
+def component_graph(data: Dict[str, Any]) -> nx.DiGraph:
+    """Component-level dependency graph of a pipeline dict."""
+    graph = nx.DiGraph()
+    graph.add_nodes_from(data["components"])
+    graph.add_edges_from(
+        (c["sender"].split(".", 1)[0], c["receiver"].split(".", 1)[0])
+        for c in data.get("connections") or []
+    )
+    return graph
+
+
+def _topological_order(data: Dict[str, Any]) -> List[str]:
+    """
+    Component execution order. Haystack allows loops, so strongly connected
+    components are collapsed first and their members listed together.
+    """
+    graph = component_graph(data)
+    condensed = nx.condensation(graph)
+    return [
+        name
+        for scc in nx.lexicographical_topological_sort(
+            condensed, key=lambda n: min(condensed.nodes[n]["members"])
+        )
+        for name in sorted(condensed.nodes[scc]["members"])
+    ]
+
+
+def compile_pipeline(hs_yaml_content: str, instantiate: bool = True) -> Dict[str, Any]:
+    """
+    Validate a pipeline definition and return its compiled form.
+
+    With ``instantiate`` the components are constructed (not warmed up) and
+    connected, which also checks init parameters and socket types. The
+    stored dict is the parsed YAML either way: a component's ``to_dict()``
+    may not round-trip its init parameters.
+    """
+    data = _parse_yaml(hs_yaml_content)
+    parse_batching_config(data.get("metadata"))
+    parse_timeout_seconds(data.get("metadata"))
+    parse_retry_policy(data.get("metadata"))
+    parse_branch_concurrency(data.get("metadata"))
+
+    if instantiate:
+        try:
+            Pipeline.from_dict(data)
+        except (PipelineError, DeserializationError) as e:
+            raise InvalidPipelineError(str(e)) from e
+
+    return {
+        "format_version": COMPILED_FORMAT_VERSION,
+        "yaml_hash": content_hash(hs_yaml_content),
+        "pipeline": data,
+        "topological_order": _topological_order(data),
+    }
+
+
+def load_compiled(
+    hs_graph_json: Optional[str], hs_yaml_content: str
+) -> Optional[Dict[str, Any]]:
+    """
+    Return the compiled form if it is current for ``hs_yaml_content``,
+    otherwise None so the caller falls back to parsing the YAML.
+    """
+    if not hs_graph_json:
+        return None
+    try:
+        compiled = json.loads(hs_graph_json)
+    except ValueError:
+        return None
+    if compiled.get("format_version") != COMPILED_FORMAT_VERSION or compiled.get(
+        "yaml_hash"
+    ) != content_hash(hs_yaml_content):
+        return None
+    return compiled
+
+
+def pipeline_metadata(
+    hs_yaml_content: str, hs_graph_json: Optional[str] = None
+) -> Dict[str, Any]:
+    """The pipeline's ``metadata`` mapping, from the compiled form if current."""
+    compiled = load_compiled(hs_graph_json, hs_yaml_content)
+    data = compiled["pipeline"] if compiled else _parse_yaml(hs_yaml_content)
+    return data.get("metadata") or {}
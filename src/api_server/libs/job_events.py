@@ -0,0 +1,196 @@
+"""In-process fan-out of job status and progress changes to subscribers."""
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, FrozenSet, Literal, Optional, Set, Tuple
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 单次变更查询的最大行数，超出时下一轮从最后一行继续
+CHANGE_FEED_BATCH_SIZE = 5000
+# 订阅者队列上限，消费过慢时丢弃最旧的事件
+SUBSCRIPTION_QUEUE_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class JobEvent:
+    """A status transition or a progress update of one job."""
+
+    event: Literal["status", "progress"]
+    id_str: str
+    user_id_str: str
+    ai_workflow_def_id: str
+    status_str: str
+    progress_json: Optional[str]
+    updated_at_time: datetime
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id_str": self.id_str,
+            "ai_workflow_def_id": self.ai_workflow_def_id,
+            "status_str": self.status_str,
+            "progress": json.loads(self.progress_json) if self.progress_json else None,
+            "updated_at_time": self.updated_at_time.isoformat(),
+        }
+
+    def to_sse(self) -> str:
+        """Server-Sent Events frame."""
+        data = json.dumps(self.to_dict(), ensure_ascii=False)
+        return f"event: {self.event}\ndata: {data}\n\n"
+
+
+@dataclass(frozen=True)
+class JobEventFilter:
+    """Which events a subscriber receives; unset fields match everything."""
+
+    job_ids: Optional[FrozenSet[str]] = None
+    user_id: Optional[str] = None
+    ai_workflow_def_id: Optional[str] = None
+    statuses: Optional[FrozenSet[str]] = None
+    progress: bool = False
+
+    def matches(self, event: JobEvent) -> bool:
+        return (
+            (self.progress or event.event == "status")
+            and (self.job_ids is None or event.id_str in self.job_ids)
+            and (self.user_id is None or event.user_id_str == self.user_id)
+            and (
+                self.ai_workflow_def_id is None
+                or event.ai_workflow_def_id == self.ai_workflow_def_id
+            )
+            and (self.statuses is None or event.status_str in self.statuses)
+        )
+
+
+class Subscription:
+    """A subscriber's filter and its queue of pending events."""
+
+    def __init__(self, event_filter: JobEventFilter) -> None:
+        self.filter = event_filter
+        self.queue: "asyncio.Queue[JobEvent]" = asyncio.Queue(
+            maxsize=SUBSCRIPTION_QUEUE_SIZE
+        )
+
+    def put(self, event: JobEvent) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class JobEventHub:
+    """
+    Shared watcher of job changes for every subscriber in this process.
+
+    While anyone is subscribed, one change-feed query per poll interval
+    reads the jobs updated since the last one (via ``updated_at_time``) and
+    fans the changes out to matching subscribers, so N clients watching the
+    same or different jobs cost one query per tick instead of N polls. The
+    feed re-reads a lookback window to catch changes committed late or
+    stamped by a worker with a skewed clock, deduplicated per job.
+    """
+
+    def __init__(self, poll_interval: float, lookback_seconds: float) -> None:
+        self.poll_interval = poll_interval
+        self.lookback = timedelta(seconds=lookback_seconds)
+
+        self._subscriptions: Set[Subscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._since: Optional[datetime] = None
+        self._last_seen: Dict[str, Tuple[str, Optional[str], datetime]] = {}
+
+    def subscribe(self, event_filter: JobEventFilter) -> Subscription:
+        """Start receiving events; pair with ``unsubscribe``."""
+        subscription = Subscription(event_filter)
+        self._subscriptions.add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    async def close(self) -> None:
+        self._subscriptions.clear()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        """Poll the change feed while there are subscribers."""
+        # 无人订阅期间的变更不回放，从回看窗口起读取
+        self._since = datetime.utcnow() - self.lookback
+        self._last_seen.clear()
+        while self._subscriptions:
+            caught_up = True
+            try:
+                caught_up = await self._poll()
+            except Exception:
+                logger.exception("Failed to poll job changes")
+            # 积压未读完时立即继续，不等待轮询间隔
+            if caught_up:
+                await asyncio.sleep(self.poll_interval)
+
+    async def _poll(self) -> bool:
+        """Publish one batch of the change feed; False while a backlog remains."""
+        async with session_maker() as db:
+            rows = await crud.ai_workflow_job.get_changed_jobs(
+                db, since=self._since, limit=CHANGE_FEED_BATCH_SIZE
+            )
+
+        for row in rows:
+            seen = self._last_seen.get(row.id_str)
+            if seen is not None and seen[:2] == (row.status_str, row.progress_json):
+                continue
+            self._last_seen[row.id_str] = (
+                row.status_str,
+                row.progress_json,
+                row.updated_at_time,
+            )
+            self._publish(
+                JobEvent(
+                    event=(
+                        "status"
+                        if seen is None or seen[0] != row.status_str
+                        else "progress"
+                    ),
+                    id_str=row.id_str,
+                    user_id_str=row.user_id_str,
+                    ai_workflow_def_id=row.ai_workflow_def_id,
+                    status_str=row.status_str,
+                    progress_json=row.progress_json,
+                    updated_at_time=row.updated_at_time,
+                )
+            )
+
+        if len(rows) == CHANGE_FEED_BATCH_SIZE:
+            # 积压时从最后一行继续，不回看
+            self._since = rows[-1].updated_at_time
+        elif rows:
+            self._since = max(self._since, rows[-1].updated_at_time - self.lookback)
+        # 回看窗口之外的去重记录不再需要
+        horizon = self._since - self.lookback
+        self._last_seen = {
+            job_id: seen
+            for job_id, seen in self._last_seen.items()
+            if seen[2] >= horizon
+        }
+        return len(rows) < CHANGE_FEED_BATCH_SIZE
+
+    def _publish(self, event: JobEvent) -> None:
+        for subscription in self._subscriptions:
+            if subscription.filter.matches(event):
+                subscription.put(event)
+
+
+job_event_hub = JobEventHub(
+    poll_interval=settings.JOB_EVENTS_POLL_INTERVAL_SECONDS,
+    lookback_seconds=settings.JOB_EVENTS_LOOKBACK_SECONDS,
+)
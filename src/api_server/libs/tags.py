@@ -0,0 +1,21 @@
+"""Normalization of the comma-separated tags of workflow definitions."""
+
+from typing import List, Optional
+
+# 单个标签的最大长度，与ai_workflow_def_tag.tag_str一致
+TAG_MAX_LENGTH = 100
+
+
+def parse_tags(tags_str: Optional[str]) -> List[str]:
+    """
+    Distinct tags of a ``tags_str`` in order of appearance: split on commas,
+    stripped, lower-cased and cut to ``TAG_MAX_LENGTH``; empty ones dropped.
+    Tag filters compare these exactly, so "RAG" matches "rag" but not
+    "dragon".
+    """
+    tags = []
+    for tag in (tags_str or "").split(","):
+        tag = tag.strip().lower()[:TAG_MAX_LENGTH]
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import sys
 from contextlib import asynccontextmanager
@@ -6,9 +7,10 @@ from pathlib import Path
 import colorlog
 import sentry_sdk
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.docs import get_swagger_ui_html
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from src.api_server.api.api_v1 import api_router
@@ -19,8 +21,11 @@ from src.api_server.api.errors import (
     http_exception_handler,
 )
 from src.api_server.config import settings
+from src.api_server.libs.job_events import job_event_hub
+from src.api_server.migrations import run_migrations
 from src.api_server.utils.logging_config import setup_logging as configure_logging
 from src.api_server.utils.middleware import SecurityHeadersMiddleware, TimingMiddleware
+from src.broker import get_broker
 
 
 def setup_sentry() -> None:
@@ -49,10 +54,29 @@ async def lifespan(app: FastAPI):
         await create_tables()
         logger.info("Database tables created/updated")
 
+    if settings.DATABASE_MIGRATE_ON_STARTUP:
+        applied = await run_migrations()
+        logger.info(f"Applied {len(applied)} schema migration(s)")
+
+    worker = worker_task = None
+    if settings.WORKER_EMBEDDED:
+        from src.worker.worker import Worker
+
+        worker = app.state.worker = Worker()
+        worker_task = asyncio.create_task(worker.run())
+        logger.info("Embedded worker started")
+
     yield
 
     # Shutdown
     logger.info("Application shutting down...")
+    if worker_task is not None:
+        worker.stop()
+        await worker_task
+    await job_event_hub.close()
+    broker = get_broker()
+    if broker is not None:
+        await broker.close()
 
 
 def create_app() -> FastAPI:
@@ -131,6 +155,15 @@ async def health_check():
     }
 
 
+@app.get("/health/ready", tags=["health"])
+async def readiness_check(request: Request):
+    """Readiness endpoint: 503 until the embedded worker has warmed up."""
+    worker = getattr(request.app.state, "worker", None)
+    if worker is not None and not worker.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    return {"status": "ready"}
+
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_PREFIX)
 
@@ -0,0 +1,511 @@
+"""
+Schema migrations for databases not managed by ``create_tables()``.
+
+    python -m src.api_server.migrations          # apply pending migrations
+    python -m src.api_server.migrations --list   # show applied and pending
+    python -m src.api_server.migrations --recount-backlog  # recount the backlog
+
+``create_tables()`` only runs in development and only creates missing
+tables. Migrations run once per database, in order, and are recorded in
+``schema_migration``. Every step checks what already exists, so a
+database created by ``create_tables()`` is brought up to date without
+errors. Run it as a deploy step, or set ``DATABASE_MIGRATE_ON_STARTUP``.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Sequence, Set
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    MetaData,
+    String,
+    Table,
+    bindparam,
+    delete,
+    insert,
+    func,
+    inspect,
+    literal,
+    select,
+    text,
+    type_coerce,
+    update,
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import SQLModel
+
+from src.api_server.api.deps import engine
+from src.api_server.config import settings
+from src.api_server.libs import hs_pipeline
+from src.api_server.libs.fulltext import FULLTEXT_INDEXES
+from src.api_server.libs.tags import parse_tags
+from src.api_server.models import ai_workflow_def, ai_workflow_job  # noqa: F401
+from src.api_server.models.ai_workflow_job import JobStatus, global_backlog_key
+
+logger = logging.getLogger(__name__)
+
+# 回填数据时每批处理的行数
+BACKFILL_BATCH_SIZE = 1000
+# SQLAlchemy在SQLite中保存DateTime所用的文本格式
+_DATETIME_TEXT_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# 存于Blob存储的任务载荷的键与大小列
+_PAYLOAD_BLOB_COLUMNS = (
+    "trigger_data_blob_str",
+    "trigger_data_size_int",
+    "result_data_blob_str",
+    "result_data_size_int",
+)
+
+# 迁移记录表不属于SQLModel.metadata，create_tables()/drop_tables()不会处理它
+_metadata = MetaData()
+schema_migration = Table(
+    "schema_migration",
+    _metadata,
+    Column("version_str", String(32), primary_key=True),
+    Column("description_text", String(255), nullable=False),
+    Column("applied_at_time", DateTime, nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: str
+    description: str
+    apply: Callable[[Connection], None]
+
+
+def _create_tables(connection: Connection) -> None:
+    SQLModel.metadata.create_all(connection)
+
+
+def _create_indexes(*names: str) -> Callable[[Connection], None]:
+    """A step creating indexes declared on the models that do not exist yet."""
+    indexes = {
+        index.name: index
+        for table in SQLModel.metadata.tables.values()
+        for index in table.indexes
+    }
+    missing = [name for name in names if name not in indexes]
+    if missing:
+        raise ValueError(f"Indexes not declared on any model: {missing}")
+
+    def apply(connection: Connection) -> None:
+        for name in names:
+            index: Index = indexes[name]
+            index.create(connection, checkfirst=True)
+
+    return apply
+
+
+def _add_columns(table_name: str, *names: str) -> Callable[[Connection], None]:
+    """
+    A step adding columns declared on a model that do not exist yet. NOT NULL
+    columns need a scalar default on the model, which existing rows get.
+    """
+
+    def apply(connection: Connection) -> None:
+        table = SQLModel.metadata.tables[table_name]
+        existing = {
+            column["name"] for column in inspect(connection).get_columns(table_name)
+        }
+        quote = connection.dialect.identifier_preparer.quote
+        for name in names:
+            if name in existing:
+                continue
+            column = table.c[name]
+            ddl = (
+                f"ALTER TABLE {quote(table_name)} ADD COLUMN {quote(name)} "
+                f"{column.type.compile(dialect=connection.dialect)}"
+            )
+            if not column.nullable:
+                if column.default is None or not column.default.is_scalar:
+                    raise ValueError(
+                        f"NOT NULL column {table_name}.{name} has no scalar default"
+                    )
+                default = literal(column.default.arg, column.type).compile(
+                    dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+                )
+                ddl += f" NOT NULL DEFAULT {default}"
+            connection.exec_driver_sql(ddl)
+
+    return apply
+
+
+def _parse_timestamp(value: str) -> Optional[datetime]:
+    """Naive UTC datetime of an ISO 8601 string, None when it is not one."""
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _normalize_timestamp_text(connection: Connection, table: Table, name: str) -> None:
+    """Rewrite the ISO timestamps of a text column in one sortable format."""
+    column = table.c[name]
+    raw = type_coerce(column, String)
+    rewrite = (
+        update(table)
+        .where(table.c.id_str == bindparam("_id"))
+        .values({name: bindparam("_value", type_=String)})
+    )
+    invalid = 0
+    last_id = ""
+    while True:
+        rows = connection.execute(
+            select(table.c.id_str, raw)
+            .where(table.c.id_str > last_id, column.is_not(None))
+            .order_by(table.c.id_str)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        changes = []
+        for id_str, value in rows:
+            # 列已是日期时间类型时驱动直接返回datetime
+            if not isinstance(value, str):
+                continue
+            parsed = _parse_timestamp(value)
+            text = parsed.strftime(_DATETIME_TEXT_FORMAT) if parsed else None
+            if text is None:
+                invalid += 1
+            if text != value:
+                changes.append({"_id": id_str, "_value": text})
+        if changes:
+            connection.execute(rewrite, changes)
+    if invalid:
+        logger.warning(f"Cleared {invalid} unparseable {table.name}.{name} values")
+
+
+def _timestamp_columns(table_name: str, *names: str) -> Callable[[Connection], None]:
+    """
+    A step turning text columns of ISO timestamps into datetime columns.
+    Values are first rewritten in the text format SQLAlchemy stores
+    datetimes in on SQLite, so they compare chronologically there;
+    unparseable ones become NULL. MySQL and PostgreSQL then convert the
+    column type, which SQLite's dynamic typing does not need.
+    """
+
+    def apply(connection: Connection) -> None:
+        table = SQLModel.metadata.tables[table_name]
+        column_types = {
+            column["name"]: column["type"]
+            for column in inspect(connection).get_columns(table_name)
+        }
+        quote = connection.dialect.identifier_preparer.quote
+        for name in names:
+            _normalize_timestamp_text(connection, table, name)
+            if isinstance(column_types[name], DateTime):
+                continue
+            if connection.dialect.name == "mysql":
+                connection.exec_driver_sql(
+                    f"ALTER TABLE {quote(table_name)} MODIFY {quote(name)} DATETIME NULL"
+                )
+            elif connection.dialect.name == "postgresql":
+                connection.exec_driver_sql(
+                    f"ALTER TABLE {quote(table_name)} ALTER COLUMN {quote(name)} "
+                    f"TYPE TIMESTAMP WITHOUT TIME ZONE USING {quote(name)}::timestamp"
+                )
+
+    return apply
+
+
+def _backfill_def_tags(connection: Connection) -> None:
+    """Create the tag table and fill it from the definitions' ``tags_str``."""
+    defs = SQLModel.metadata.tables["ai_workflow_def"]
+    tags = SQLModel.metadata.tables["ai_workflow_def_tag"]
+    tags.create(connection, checkfirst=True)
+    last_id = ""
+    while True:
+        rows = connection.execute(
+            select(defs.c.id_str, defs.c.user_id_str, defs.c.tags_str)
+            .where(defs.c.id_str > last_id, defs.c.is_deleted_flag == False)
+            .order_by(defs.c.id_str)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        # 先删除再写入，已由create_tables()建表并写入标签的库也可执行
+        connection.execute(
+            delete(tags).where(tags.c.ai_workflow_def_id.in_([row[0] for row in rows]))
+        )
+        values = [
+            {"ai_workflow_def_id": def_id, "tag_str": tag, "user_id_str": user_id}
+            for def_id, user_id, tags_str in rows
+            for tag in parse_tags(tags_str)
+        ]
+        if values:
+            connection.execute(insert(tags), values)
+
+
+def _backfill_compiled_pipelines(connection: Connection) -> None:
+    """Compile the definitions stored before their compiled form was kept."""
+    defs = SQLModel.metadata.tables["ai_workflow_def"]
+    invalid = 0
+    last_id = ""
+    while True:
+        rows = connection.execute(
+            select(defs.c.id_str, defs.c.hs_yaml_content)
+            .where(defs.c.id_str > last_id, defs.c.hs_graph_json.is_(None))
+            .order_by(defs.c.id_str)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        changes = []
+        for id_str, hs_yaml_content in rows:
+            try:
+                compiled = hs_pipeline.compile_pipeline(
+                    hs_yaml_content, settings.PIPELINE_VALIDATE_COMPONENTS
+                )
+            except hs_pipeline.InvalidPipelineError as e:
+                # 无法编译的定义保持为空，Worker执行时回退为解析YAML
+                logger.warning(f"Skipped compiling workflow def {id_str}: {e}")
+                invalid += 1
+                continue
+            changes.append(
+                {
+                    "_id": id_str,
+                    "_hash": compiled["yaml_hash"],
+                    "_graph": json.dumps(compiled, ensure_ascii=False),
+                }
+            )
+        if changes:
+            connection.execute(
+                update(defs)
+                .where(defs.c.id_str == bindparam("_id"))
+                .values(
+                    hs_yaml_hash_str=bindparam("_hash"),
+                    hs_graph_json=bindparam("_graph"),
+                ),
+                changes,
+            )
+    if invalid:
+        logger.warning(f"Left {invalid} invalid workflow definitions uncompiled")
+
+
+def recount_backlog(connection: Connection) -> int:
+    """
+    Recount the pending-job backlog counters from the job table, for
+    databases that predate the counters or were changed behind the API's
+    back; returns the global pending count.
+
+    Jobs and counters change together in one transaction everywhere else,
+    so the job table is locked until the caller commits: with ``LOCK
+    TABLE`` on PostgreSQL, a locking read on MySQL, and on SQLite by the
+    write that zeroes the counters taking the database lock before the
+    count.
+    """
+    jobs = SQLModel.metadata.tables["ai_workflow_job"]
+    backlog = SQLModel.metadata.tables["ai_workflow_job_backlog"]
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        connection.execute(text("LOCK TABLE ai_workflow_job IN SHARE MODE"))
+    connection.execute(update(backlog).values(pending_int=0))
+    query = (
+        select(jobs.c.user_id_str, func.count())
+        .where(jobs.c.status_str == JobStatus.PENDING, jobs.c.is_deleted_flag == False)
+        .group_by(jobs.c.user_id_str)
+    )
+    if dialect == "mysql":
+        query = query.with_for_update(read=True)
+    counts = dict(connection.execute(query).all())
+    pending = sum(counts.values())
+    for user_id, n in list(counts.items()):
+        shard = global_backlog_key(user_id)
+        counts[shard] = counts.get(shard, 0) + n
+
+    existing = set(connection.execute(select(backlog.c.user_id_str)).scalars())
+    updates = [
+        {"_user": user_id, "_pending": n}
+        for user_id, n in sorted(counts.items())
+        if user_id in existing
+    ]
+    if updates:
+        connection.execute(
+            update(backlog)
+            .where(backlog.c.user_id_str == bindparam("_user"))
+            .values(pending_int=bindparam("_pending")),
+            updates,
+        )
+    inserts = [
+        {"user_id_str": user_id, "pending_int": n, "claimed_total_int": 0}
+        for user_id, n in sorted(counts.items())
+        if user_id not in existing
+    ]
+    if inserts:
+        connection.execute(insert(backlog), inserts)
+    return pending
+
+
+def _create_fulltext_indexes(connection: Connection) -> None:
+    """Create the full-text indexes and index the rows already there."""
+    for index in FULLTEXT_INDEXES:
+        index.create(connection)
+        index.rebuild(connection)
+
+
+def _steps(*steps: Callable[[Connection], None]) -> Callable[[Connection], None]:
+    def apply(connection: Connection) -> None:
+        for step in steps:
+            step(connection)
+
+    return apply
+
+
+MIGRATIONS: Sequence[Migration] = (
+    Migration("0001", "create missing tables", _create_tables),
+    Migration(
+        "0002",
+        "composite indexes for the list queries",
+        _create_indexes(
+            "ix_ai_workflow_job_user_updated",
+            "ix_ai_workflow_job_user_status",
+            "ix_ai_workflow_job_user_def",
+            "ix_ai_workflow_job_created_def",
+            "ix_ai_workflow_job_dead_letter_user",
+            "ix_ai_workflow_def_user_updated",
+        ),
+    ),
+    Migration(
+        "0003",
+        "typed job start/completion times",
+        _steps(
+            _timestamp_columns(
+                "ai_workflow_job", "started_at_time", "completed_at_time"
+            ),
+            _timestamp_columns(
+                "ai_workflow_job_dead_letter", "started_at_time", "completed_at_time"
+            ),
+        ),
+    ),
+    Migration("0004", "normalized definition tags", _backfill_def_tags),
+    Migration("0005", "full-text search indexes", _create_fulltext_indexes),
+    Migration(
+        "0006",
+        "out-of-line job payloads",
+        _steps(
+            *(
+                _add_columns(table_name, *_PAYLOAD_BLOB_COLUMNS)
+                for table_name in ("ai_workflow_job", "ai_workflow_job_dead_letter")
+            )
+        ),
+    ),
+    Migration(
+        "0007",
+        "job scheduling, lease and timing columns; compiled definitions",
+        _steps(
+            _add_columns(
+                "ai_workflow_job",
+                "priority_int",
+                "timeout_seconds",
+                "not_before_time",
+                "worker_id_str",
+                "lease_expires_at_time",
+                "attempt_int",
+                "progress_json",
+                "timings_json",
+            ),
+            _add_columns("ai_workflow_job_dead_letter", "timings_json"),
+            _add_columns("ai_workflow_def", "hs_yaml_hash_str", "hs_graph_json"),
+            _create_indexes(
+                "ix_ai_workflow_job_claim",
+                "ix_ai_workflow_job_lease",
+                "ix_ai_workflow_job_updated",
+            ),
+            _backfill_compiled_pipelines,
+        ),
+    ),
+    Migration(
+        "0008",
+        "job ids of broker queue references",
+        _add_columns("ai_workflow_job_queue", "ai_workflow_job_id"),
+    ),
+    Migration("0009", "pending-job backlog counters", recount_backlog),
+)
+
+
+def _applied_versions(connection: Connection) -> Set[str]:
+    _metadata.create_all(connection)
+    return set(connection.execute(select(schema_migration.c.version_str)).scalars())
+
+
+def _migrate(connection: Connection) -> List[str]:
+    applied = _applied_versions(connection)
+    done = []
+    for migration in MIGRATIONS:
+        if migration.version in applied:
+            continue
+        logger.info(f"Applying migration {migration.version}: {migration.description}")
+        migration.apply(connection)
+        connection.execute(
+            schema_migration.insert().values(
+                version_str=migration.version,
+                description_text=migration.description,
+                applied_at_time=datetime.utcnow(),
+            )
+        )
+        done.append(migration.version)
+    return done
+
+
+async def run_migrations(bind: AsyncEngine = engine) -> List[str]:
+    """Apply pending migrations in one transaction; returns their versions."""
+    async with bind.begin() as conn:
+        return await conn.run_sync(_migrate)
+
+
+async def pending_migrations(bind: AsyncEngine = engine) -> List[Migration]:
+    async with bind.begin() as conn:
+        applied = await conn.run_sync(_applied_versions)
+    return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+
+async def run_backlog_recount(bind: AsyncEngine = engine) -> int:
+    """Recount the backlog counters in one transaction; returns the pending count."""
+    async with bind.begin() as conn:
+        return await conn.run_sync(recount_backlog)
+
+
+async def main(list_only: bool, recount: bool) -> None:
+    try:
+        if recount:
+            pending = await run_backlog_recount()
+            print(f"Recounted the backlog counters: {pending} job(s) pending")
+            return
+        if list_only:
+            pending = {migration.version for migration in await pending_migrations()}
+            for migration in MIGRATIONS:
+                state = "pending" if migration.version in pending else "applied"
+                print(f"{migration.version}  {state:<8} {migration.description}")
+            return
+        applied = await run_migrations()
+        print(f"Applied {len(applied)} migration(s): {', '.join(applied) or '-'}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--list", action="store_true", help="show migration state")
+    parser.add_argument(
+        "--recount-backlog",
+        action="store_true",
+        help="recount the pending-job backlog counters from the job table",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.list, args.recount_backlog))
@@ -1,9 +1,12 @@
 """AI Workflow Definition models."""
 
+from datetime import datetime
 from typing import List, Optional
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
+from src.api_server.libs.fulltext import fulltext_index
 from src.api_server.models.base import (
     BaseResponse,
     DateTimeMixin,
@@ -11,6 +14,7 @@ from src.api_server.models.base import (
     IDMixin,
     IsDeletedMixin,
     UserMixin,
+    partial_model,
 )
 
 
@@ -41,6 +45,75 @@ class AIWorkflowDef(
     
     __tablename__ = "ai_workflow_def"
 
+    hs_yaml_hash_str: Optional[str] = Field(default=None, max_length=64, description="Haystack YAML内容哈希")
+    hs_graph_json: Optional[str] = Field(default=None, description="预编译的pipeline图，JSON格式")
+
+    __table_args__ = (
+        # 定义列表：按用户过滤，按更新时间+id_str翻页
+        Index(
+            "ix_ai_workflow_def_user_updated",
+            "user_id_str",
+            "is_deleted_flag",
+            "updated_at_time",
+            "id_str",
+        ),
+    )
+
+
+# 定义关键词检索：SQLite为FTS5表，MySQL为FULLTEXT索引
+DEF_FULLTEXT = fulltext_index(
+    AIWorkflowDef.__table__, "name_str", "description_text", "tags_str"
+)
+
+
+class AIWorkflowDefComponentStats(SQLModel, table=True):
+    """Per-component timing totals of a definition's pipeline runs."""
+    
+    __tablename__ = "ai_workflow_def_component_stats"
+
+    ai_workflow_def_id: str = Field(primary_key=True, max_length=36, description="工作流定义ID")
+    component_name_str: str = Field(primary_key=True, max_length=255, description="组件名称")
+    calls_int: int = Field(default=0, description="累计调用次数")
+    wall_seconds: float = Field(default=0.0, description="累计墙钟时间（秒）")
+    cpu_seconds: float = Field(default=0.0, description="累计CPU时间（秒）")
+    max_wall_seconds: float = Field(default=0.0, description="单次调用最长墙钟时间（秒）")
+    output_bytes_int: int = Field(default=0, description="累计输出大小（估算字节数）")
+    updated_at_time: datetime = Field(default_factory=datetime.utcnow, description="最后更新时间")
+
+
+class AIWorkflowDefComponentStatsOut(BaseResponse):
+    """Per-component timing aggregates of an AI Workflow Definition."""
+    
+    result: List[AIWorkflowDefComponentStats]
+
+
+class AIWorkflowDefTag(SQLModel, table=True):
+    """Normalized tags of a definition, kept in sync with its ``tags_str``."""
+    
+    __tablename__ = "ai_workflow_def_tag"
+
+    ai_workflow_def_id: str = Field(primary_key=True, max_length=36, description="工作流定义ID")
+    tag_str: str = Field(primary_key=True, max_length=100, description="标签，去除首尾空白并转为小写")
+    user_id_str: str = Field(max_length=100, description="DC user id")
+
+    __table_args__ = (
+        # 按用户+标签精确查找定义，及按用户统计各标签的定义数
+        Index("ix_ai_workflow_def_tag_user_tag", "user_id_str", "tag_str", "ai_workflow_def_id"),
+    )
+
+
+class AIWorkflowDefTagCount(SQLModel):
+    """Number of definitions carrying a tag."""
+    
+    tag_str: str = Field(description="标签")
+    count_int: int = Field(description="带有该标签的工作流定义数")
+
+
+class AIWorkflowDefTagCountsOut(BaseResponse):
+    """Tag facets of a user's AI Workflow Definitions."""
+    
+    result: List[AIWorkflowDefTagCount]
+
 
 class AIWorkflowDefCreate(AIWorkflowDefBase):
     """Create AI Workflow Definition schema."""
@@ -64,7 +137,12 @@ class AIWorkflowDefOut(BaseResponse):
     result: AIWorkflowDef
 
 
+# 列表接口的行：指定fields时只包含所选字段
+AIWorkflowDefFields = partial_model(AIWorkflowDef, "AIWorkflowDefFields")
+
+
 class AIWorkflowDefsOut(BaseResponse):
     """Multiple AI Workflow Definitions response."""
     
-    result: List[AIWorkflowDef]
+    result: List[AIWorkflowDefFields]
+    next_cursor: Optional[str] = Field(default=None, description="下一页游标，已是最后一页时为空")
@@ -1,10 +1,14 @@
 """AI Workflow Job models."""
 
+import zlib
+from datetime import datetime
 from enum import Enum
 from typing import List, Optional
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
+from src.api_server.libs.fulltext import fulltext_index
 from src.api_server.models.base import (
     BaseResponse,
     DateTimeMixin,
@@ -12,6 +16,7 @@ from src.api_server.models.base import (
     IDMixin,
     IsDeletedMixin,
     UserMixin,
+    partial_model,
 )
 
 
@@ -25,6 +30,13 @@ class JobStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
+# 任务的终态，进入后不再变化 (取值为字符串，与status_str直接比较)
+TERMINAL_JOB_STATUSES = frozenset(
+    status.value
+    for status in (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+)
+
+
 class AIWorkflowJobBase(SQLModel):
     """Base model for AI Workflow Job."""
     
@@ -32,10 +44,13 @@ class AIWorkflowJobBase(SQLModel):
     job_name_str: str = Field(max_length=255, description="任务名称")
     trigger_data_json: str = Field(description="触发数据，JSON格式")
     status_str: str = Field(default=JobStatus.PENDING, max_length=50, description="任务状态")
+    priority_int: int = Field(default=5, ge=0, le=9, description="任务优先级，0-9，数值越大越优先")
+    timeout_seconds: Optional[float] = Field(default=None, gt=0, description="执行超时时间（秒），为空时使用工作流定义或全局默认值")
+    not_before_time: Optional[datetime] = Field(default=None, description="最早执行时间，为空表示立即执行；失败重试时为退避结束时间")
     result_data_json: Optional[str] = Field(default=None, description="结果数据，JSON格式")
     error_message_text: Optional[str] = Field(default=None, max_length=2000, description="错误信息")
-    started_at_time: Optional[str] = Field(default=None, description="开始时间")
-    completed_at_time: Optional[str] = Field(default=None, description="完成时间")
+    started_at_time: Optional[datetime] = Field(default=None, description="开始时间")
+    completed_at_time: Optional[datetime] = Field(default=None, description="完成时间")
     execution_time_seconds: Optional[float] = Field(default=None, description="执行时间（秒）")
 
     class Config:
@@ -55,6 +70,137 @@ class AIWorkflowJob(
     
     __tablename__ = "ai_workflow_job"
 
+    # 租约：认领任务的worker需在到期前续约，否则任务由reaper回收
+    worker_id_str: Optional[str] = Field(default=None, max_length=255, description="执行任务的Worker ID")
+    lease_expires_at_time: Optional[datetime] = Field(default=None, description="租约到期时间")
+    attempt_int: int = Field(default=0, description="已认领执行的次数")
+    progress_json: Optional[str] = Field(default=None, description="执行进度（已完成的组件），JSON格式")
+    timings_json: Optional[str] = Field(default=None, description="各组件耗时，JSON格式：{组件名: [调用次数, 墙钟毫秒, CPU毫秒, 输出字节数]}")
+    # 超过阈值的载荷存于Blob存储，此时对应的 *_json 列为空字符串
+    trigger_data_blob_str: Optional[str] = Field(default=None, max_length=64, description="触发数据的Blob键（内容SHA-256），为空表示存于trigger_data_json")
+    trigger_data_size_int: Optional[int] = Field(default=None, description="Blob存储的触发数据大小（未压缩字节数）")
+    result_data_blob_str: Optional[str] = Field(default=None, max_length=64, description="结果数据的Blob键（内容SHA-256），为空表示存于result_data_json")
+    result_data_size_int: Optional[int] = Field(default=None, description="Blob存储的结果数据大小（未压缩字节数）")
+
+    __table_args__ = (
+        # Worker按 优先级 -> 用户 -> 创建时间 认领任务
+        Index(
+            "ix_ai_workflow_job_claim",
+            "status_str",
+            "priority_int",
+            "user_id_str",
+            "created_at_time",
+        ),
+        # Reaper按租约到期时间查找失联的任务
+        Index("ix_ai_workflow_job_lease", "status_str", "lease_expires_at_time"),
+        # 任务事件推送按更新时间扫描变更
+        Index("ix_ai_workflow_job_updated", "updated_at_time"),
+        # 任务列表：按用户过滤，按更新时间+id_str翻页 (游标分页依赖该顺序)；
+        # 按其他字段排序的列表也由它按用户过滤后再排序。任务表是热表，
+        # 每个二级索引都会加重认领、心跳与结果写回，不为每种排序各建索引
+        Index(
+            "ix_ai_workflow_job_user_updated",
+            "user_id_str",
+            "is_deleted_flag",
+            "updated_at_time",
+            "id_str",
+        ),
+        # 任务列表按状态或工作流定义过滤
+        Index(
+            "ix_ai_workflow_job_user_status",
+            "user_id_str",
+            "is_deleted_flag",
+            "status_str",
+            "updated_at_time",
+            "id_str",
+        ),
+        Index(
+            "ix_ai_workflow_job_user_def",
+            "user_id_str",
+            "is_deleted_flag",
+            "ai_workflow_def_id",
+            "updated_at_time",
+            "id_str",
+        ),
+        # Worker预热按创建时间统计各工作流定义的任务数
+        Index("ix_ai_workflow_job_created_def", "created_at_time", "ai_workflow_def_id"),
+    )
+
+
+# 任务关键词检索：SQLite为FTS5表，MySQL为FULLTEXT索引
+JOB_FULLTEXT = fulltext_index(AIWorkflowJob.__table__, "job_name_str")
+
+
+class AIWorkflowJobDeadLetter(
+    AIWorkflowJobBase,
+    DeclarativeBase,
+    UserMixin,
+    IDMixin,
+    IsDeletedMixin,
+    DateTimeMixin,
+    table=True,
+):
+    """Jobs whose retries are exhausted, moved out of ``ai_workflow_job``."""
+    
+    __tablename__ = "ai_workflow_job_dead_letter"
+
+    worker_id_str: Optional[str] = Field(default=None, max_length=255, description="最后执行任务的Worker ID")
+    attempt_int: int = Field(default=0, description="已认领执行的次数")
+    progress_json: Optional[str] = Field(default=None, description="执行进度（已完成的组件），JSON格式")
+    timings_json: Optional[str] = Field(default=None, description="各组件耗时，JSON格式：{组件名: [调用次数, 墙钟毫秒, CPU毫秒, 输出字节数]}")
+    # 超过阈值的载荷存于Blob存储，此时对应的 *_json 列为空字符串
+    trigger_data_blob_str: Optional[str] = Field(default=None, max_length=64, description="触发数据的Blob键（内容SHA-256），为空表示存于trigger_data_json")
+    trigger_data_size_int: Optional[int] = Field(default=None, description="Blob存储的触发数据大小（未压缩字节数）")
+    result_data_blob_str: Optional[str] = Field(default=None, max_length=64, description="结果数据的Blob键（内容SHA-256），为空表示存于result_data_json")
+    result_data_size_int: Optional[int] = Field(default=None, description="Blob存储的结果数据大小（未压缩字节数）")
+
+    __table_args__ = (
+        # updated_at_time为移入死信表的时间，任务事件推送按其扫描
+        Index("ix_ai_workflow_job_dead_letter_updated", "updated_at_time"),
+        Index("ix_ai_workflow_job_dead_letter_def", "ai_workflow_def_id", "updated_at_time"),
+        # 死信列表按用户过滤
+        Index("ix_ai_workflow_job_dead_letter_user", "user_id_str", "updated_at_time"),
+    )
+
+
+class AIWorkflowJobDeadLettersOut(BaseResponse):
+    """Multiple dead-lettered AI Workflow Jobs response."""
+    
+    result: List[AIWorkflowJobDeadLetter]
+
+
+class AIWorkflowJobQueueItem(SQLModel, table=True):
+    """Job reference queued for workers by the SQL job broker."""
+    
+    __tablename__ = "ai_workflow_job_queue"
+
+    id_int: Optional[int] = Field(default=None, primary_key=True, description="自增主键，决定出队顺序")
+    ai_workflow_job_id: Optional[str] = Field(default=None, max_length=36, description="任务ID，用于清理已不再待执行的任务的引用")
+    payload_json: str = Field(description="任务引用，JSON格式")
+    enqueued_at_time: datetime = Field(default_factory=datetime.utcnow, description="入队时间")
+
+
+# 全局积压计数所在行的user_id_str
+GLOBAL_BACKLOG_KEY = "*"
+# 全局计数分片数：各用户的增减写入按用户ID散列的分片行 ('*0'、'*1'…)，
+# 避免所有事务争用同一行；读取时求和
+GLOBAL_BACKLOG_SHARDS = 16
+
+
+def global_backlog_key(user_id: str) -> str:
+    """The shard of the global backlog counter that ``user_id``'s changes go to."""
+    return f"{GLOBAL_BACKLOG_KEY}{zlib.crc32(user_id.encode()) % GLOBAL_BACKLOG_SHARDS}"
+
+
+class AIWorkflowJobBacklog(SQLModel, table=True):
+    """Pending-job counters per user, maintained with every status change."""
+    
+    __tablename__ = "ai_workflow_job_backlog"
+
+    user_id_str: str = Field(primary_key=True, max_length=255, description="用户ID，'*0'…'*15'为全局计数的分片")
+    pending_int: int = Field(default=0, description="待执行任务数")
+    claimed_total_int: int = Field(default=0, description="累计被认领的任务数，用于估算消化速率")
+
 
 class AIWorkflowJobCreate(AIWorkflowJobBase):
     """Create AI Workflow Job schema."""
@@ -67,10 +213,15 @@ class AIWorkflowJobUpdate(SQLModel):
     job_name_str: Optional[str] = Field(default=None, max_length=255, description="任务名称")
     trigger_data_json: Optional[str] = Field(default=None, description="触发数据，JSON格式")
     status_str: Optional[str] = Field(default=None, max_length=50, description="任务状态")
+    priority_int: Optional[int] = Field(default=None, ge=0, le=9, description="任务优先级，0-9，数值越大越优先")
+    timeout_seconds: Optional[float] = Field(default=None, gt=0, description="执行超时时间（秒），为空时使用工作流定义或全局默认值")
+    not_before_time: Optional[datetime] = Field(default=None, description="最早执行时间，为空表示立即执行")
     result_data_json: Optional[str] = Field(default=None, description="结果数据，JSON格式")
+    result_data_blob_str: Optional[str] = Field(default=None, max_length=64, description="结果数据的Blob键（内容SHA-256）")
+    result_data_size_int: Optional[int] = Field(default=None, description="Blob存储的结果数据大小（未压缩字节数）")
     error_message_text: Optional[str] = Field(default=None, max_length=2000, description="错误信息")
-    started_at_time: Optional[str] = Field(default=None, description="开始时间")
-    completed_at_time: Optional[str] = Field(default=None, description="完成时间")
+    started_at_time: Optional[datetime] = Field(default=None, description="开始时间")
+    completed_at_time: Optional[datetime] = Field(default=None, description="完成时间")
     execution_time_seconds: Optional[float] = Field(default=None, description="执行时间（秒）")
 
 
@@ -80,7 +231,18 @@ class AIWorkflowJobOut(BaseResponse):
     result: AIWorkflowJob
 
 
+class AIWorkflowJobBatchOut(BaseResponse):
+    """Batch-created AI Workflow Jobs response."""
+    
+    result: List[str] = Field(description="创建的任务ID，与提交顺序一致")
+
+
+# 列表接口的行：指定fields时只包含所选字段
+AIWorkflowJobFields = partial_model(AIWorkflowJob, "AIWorkflowJobFields")
+
+
 class AIWorkflowJobsOut(BaseResponse):
     """Multiple AI Workflow Jobs response."""
     
-    result: List[AIWorkflowJob]
+    result: List[AIWorkflowJobFields]
+    next_cursor: Optional[str] = Field(default=None, description="下一页游标，已是最后一页时为空")
@@ -1,11 +1,12 @@
 import uuid
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional, Type
 
-from pydantic import BaseModel
+import pydantic
+from pydantic import BaseModel, create_model, model_serializer
 from sqlalchemy import Column, String, Boolean, DateTime
 from sqlalchemy.ext.declarative import declarative_base
-from sqlmodel import Field
+from sqlmodel import Field, SQLModel
 
 DeclarativeBase = declarative_base()
 
@@ -41,3 +42,32 @@ class UserMixin:
 class BaseResponse(BaseModel):
     code: int = 0
     message: str = "success"
+
+
+class PartialRow(BaseModel):
+    """A row holding any subset of its table's columns."""
+
+    @model_serializer(mode="wrap")
+    def _serialize_given_fields(self, handler: Any) -> Dict[str, Any]:
+        # 只输出查询选取的字段，未选取的字段不以null出现在响应中
+        data = handler(self)
+        return {name: value for name, value in data.items() if name in self.model_fields_set}
+
+
+def partial_model(model: Type[SQLModel], name: str) -> Type[PartialRow]:
+    """
+    Response model of ``model`` rows with every column optional, for list
+    endpoints whose ``fields`` parameter selects only some of them.
+    """
+    return create_model(
+        name,
+        __base__=PartialRow,
+        __doc__=f"{model.__name__} with only the selected columns.",
+        **{
+            field_name: (
+                Optional[field.annotation],
+                pydantic.Field(default=None, description=field.description),
+            )
+            for field_name, field in model.model_fields.items()
+        },
+    )
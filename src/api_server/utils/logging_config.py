@@ -48,6 +48,11 @@ def get_logging_config() -> Dict[str, Any]:
                 "handlers": ["console"],
                 "propagate": False,
             },
+            "src.worker": {
+                "level": settings.LOG_LEVEL,
+                "handlers": ["console"],
+                "propagate": False,
+            },
             "uvicorn": {
                 "level": "INFO",
                 "handlers": ["console"],
@@ -0,0 +1,84 @@
+"""Out-of-line storage of large job trigger and result payloads."""
+
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from src.api_server.config import settings
+from src.blobstore.base import BlobNotFoundError, BlobStore
+
+__all__ = [
+    "BlobNotFoundError",
+    "BlobStore",
+    "get_blob_store",
+    "load_payload",
+    "resolve_payloads",
+    "store_payload",
+]
+
+# 可存于Blob存储的任务载荷，对应 {name}_json / {name}_blob_str / {name}_size_int 列
+PAYLOADS = ("trigger_data", "result_data")
+
+
+@lru_cache()
+def get_blob_store() -> Optional[BlobStore]:
+    """The configured blob store, shared per process; None when disabled."""
+    if settings.BLOB_STORE_BACKEND == "local":
+        from src.blobstore.local import LocalBlobStore
+
+        return LocalBlobStore(settings.BLOB_STORE_PATH, settings.BLOB_COMPRESSION)
+    return None
+
+
+async def store_payload(name: str, payload: Optional[str]) -> Dict[str, Any]:
+    """
+    Column values of the ``name`` payload of a job. A payload above
+    ``BLOB_OFFLOAD_THRESHOLD_BYTES`` goes to the blob store and the row
+    keeps its key and size, with an empty ``{name}_json``; smaller ones,
+    or all of them without a store, stay inline.
+    """
+    values = {
+        f"{name}_json": payload,
+        f"{name}_blob_str": None,
+        f"{name}_size_int": None,
+    }
+    store = get_blob_store()
+    if store is None or payload is None:
+        return values
+    data = payload.encode()
+    if len(data) <= settings.BLOB_OFFLOAD_THRESHOLD_BYTES:
+        return values
+    values.update(
+        {
+            f"{name}_json": "",
+            f"{name}_blob_str": await store.put(data),
+            f"{name}_size_int": len(data),
+        }
+    )
+    return values
+
+
+async def load_payload(inline: Optional[str], blob_key: Optional[str]) -> Optional[str]:
+    """A payload, read from the blob store when the row only holds its key."""
+    if not blob_key:
+        return inline
+    store = get_blob_store()
+    if store is None:
+        raise BlobNotFoundError(
+            f"Payload is stored as blob {blob_key} but BLOB_STORE_BACKEND=none"
+        )
+    return (await store.get(blob_key)).decode()
+
+
+async def resolve_payloads(job: Any) -> Dict[str, Any]:
+    """
+    A job row as a dict with its out-of-line payloads read back inline.
+    The row itself is left untouched, so a session never writes them back.
+    """
+    values = job.model_dump()
+    for name in PAYLOADS:
+        blob_key = values.get(f"{name}_blob_str")
+        if blob_key:
+            values[f"{name}_json"] = await load_payload(
+                values[f"{name}_json"], blob_key
+            )
+    return values
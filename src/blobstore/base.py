@@ -0,0 +1,132 @@
+"""Content-addressed blob store interface for large job payloads."""
+
+import abc
+import asyncio
+import hashlib
+import time
+import zlib
+from typing import Awaitable, Callable, Collection, List
+
+# zstd帧的魔数，读取时据此识别编码，旧blob不受编码配置变更影响
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+class BlobNotFoundError(LookupError):
+    """A payload references a blob that is not in the store."""
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "BLOB_COMPRESSION=zstd requires the zstandard package"
+        ) from None
+    return zstandard
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return _zstandard().ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress(blob: bytes) -> bytes:
+    """Content of a blob written with any codec."""
+    if blob[:4] == _ZSTD_MAGIC:
+        return _zstandard().ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+def blob_key(data: bytes) -> str:
+    """Key of a blob: the SHA-256 of its uncompressed content."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore(abc.ABC):
+    """
+    Compressed payloads keyed by the hash of their content. Storing a
+    payload that is already there only returns its key, so identical
+    payloads are kept once, and a blob never changes once written.
+
+    Backends implement ``touch``, ``read`` and ``write`` on compressed
+    bytes, and ``scan`` and ``delete`` for garbage collection; hashing and
+    compression run off the event loop.
+    """
+
+    def __init__(self, codec: str = "zlib") -> None:
+        if codec == "zstd":
+            _zstandard()
+        self.codec = codec
+
+    async def put(self, data: bytes) -> str:
+        """Store a payload; returns its key."""
+        key = await asyncio.to_thread(blob_key, data)
+        # 复用已有blob时刷新其时间，使回收不会删除即将被新行引用的blob
+        if not await self.touch(key):
+            await self.write(key, await asyncio.to_thread(compress, data, self.codec))
+        return key
+
+    async def get(self, key: str) -> bytes:
+        """Content of a blob; raises ``BlobNotFoundError`` when missing."""
+        return await asyncio.to_thread(decompress, await self.read(key))
+
+    async def collect_garbage(
+        self,
+        keys_in_use: Callable[[], Awaitable[Collection[str]]],
+        min_age_seconds: float,
+    ) -> int:
+        """
+        Delete blobs no row references; returns how many were deleted.
+
+        Only blobs neither written nor reused by ``put`` for
+        ``min_age_seconds`` are candidates, and the references are read
+        after the candidates are listed, so a blob stored for a row that is
+        not committed yet survives as long as the row commits within that
+        age. A candidate reused meanwhile is kept too.
+        """
+        cutoff = time.time() - min_age_seconds
+        candidates = await self.scan(cutoff)
+        if not candidates:
+            return 0
+        in_use = set(await keys_in_use())
+        deleted = 0
+        for key in candidates:
+            if key not in in_use and await self.delete(key, cutoff):
+                deleted += 1
+        return deleted
+
+    @abc.abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Whether the blob is stored."""
+
+    @abc.abstractmethod
+    async def touch(self, key: str) -> bool:
+        """Mark a blob as just used; False when it is not stored."""
+
+    @abc.abstractmethod
+    async def scan(self, older_than: float) -> List[str]:
+        """Keys of the blobs last written or touched before ``older_than``."""
+
+    @abc.abstractmethod
+    async def delete(self, key: str, older_than: float) -> bool:
+        """
+        Delete a blob unless it was written or touched since ``older_than``;
+        returns whether it was deleted.
+        """
+
+    @abc.abstractmethod
+    async def read(self, key: str) -> bytes:
+        """Compressed bytes of a blob; raises ``BlobNotFoundError``."""
+
+    @abc.abstractmethod
+    async def write(self, key: str, blob: bytes) -> None:
+        """
+        Store compressed bytes under ``key``. Must be atomic: a reader sees
+        the whole blob or none, also when writers of the same key race.
+        """
+
+    async def close(self) -> None:
+        """Release resources."""
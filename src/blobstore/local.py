@@ -0,0 +1,100 @@
+"""Blob store on a local or shared filesystem."""
+
+import asyncio
+import os
+import tempfile
+from typing import List
+
+from src.blobstore.base import BlobNotFoundError, BlobStore
+
+
+class LocalBlobStore(BlobStore):
+    """
+    One file per blob under ``root``, in two levels of directories named
+    after the first hex digits of the key to keep directories small. The
+    API and every worker must see the same ``root``, e.g. a network mount
+    when they run on several machines.
+    """
+
+    def __init__(self, root: str, codec: str = "zlib") -> None:
+        super().__init__(codec)
+        self.root = os.path.abspath(root)
+
+    def path(self, key: str) -> str:
+        if len(key) < 5 or not key.isalnum():
+            raise BlobNotFoundError(f"Invalid blob key {key!r}")
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self.path(key))
+
+    async def touch(self, key: str) -> bool:
+        return await asyncio.to_thread(self._touch, self.path(key))
+
+    async def scan(self, older_than: float) -> List[str]:
+        return await asyncio.to_thread(self._scan, older_than)
+
+    async def delete(self, key: str, older_than: float) -> bool:
+        return await asyncio.to_thread(self._delete, self.path(key), older_than)
+
+    async def read(self, key: str) -> bytes:
+        return await asyncio.to_thread(self._read, self.path(key))
+
+    async def write(self, key: str, blob: bytes) -> None:
+        await asyncio.to_thread(self._write, self.path(key), blob)
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _scan(self, older_than: float) -> List[str]:
+        keys = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                # 跳过写入中的临时文件
+                if name.startswith(".tmp-"):
+                    continue
+                try:
+                    if os.stat(os.path.join(directory, name)).st_mtime < older_than:
+                        keys.append(name)
+                except FileNotFoundError:
+                    pass
+        return keys
+
+    @staticmethod
+    def _delete(path: str, older_than: float) -> bool:
+        try:
+            if os.stat(path).st_mtime >= older_than:
+                return False
+            os.unlink(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise BlobNotFoundError(f"Blob {os.path.basename(path)} not found")
+
+    @staticmethod
+    def _write(path: str, blob: bytes) -> None:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # 写入临时文件后原子重命名，并发写入同一blob时内容相同，后写者覆盖即可
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,58 @@
+"""Push delivery of new jobs from the API to workers."""
+
+import logging
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from src.api_server.config import settings
+from src.broker.base import JobBroker, JobRef
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["JobBroker", "JobRef", "get_broker", "publish_jobs"]
+
+
+@lru_cache()
+def get_broker() -> Optional[JobBroker]:
+    """The configured broker, shared per process; None when disabled."""
+    backend = settings.BROKER_BACKEND
+    if backend == "memory":
+        from src.broker.memory import MemoryBroker
+
+        return MemoryBroker(settings.BROKER_MAX_QUEUED_REFS)
+    if backend == "sql":
+        from src.api_server.api.deps import session_maker
+        from src.broker.sql import SQLBroker
+
+        return SQLBroker(session_maker)
+    if backend == "redis":
+        from src.broker.redis import RedisBroker
+
+        return RedisBroker(
+            settings.BROKER_REDIS_URL,
+            settings.BROKER_REDIS_KEY,
+            max_refs=settings.BROKER_MAX_QUEUED_REFS,
+        )
+    return None
+
+
+async def publish_jobs(jobs: Iterable) -> None:
+    """
+    Publish references to committed jobs. Failures are only logged: the
+    jobs are already stored and workers still find them by polling.
+    """
+    broker = get_broker()
+    if broker is None:
+        return
+    refs = [
+        JobRef(
+            id_str=job.id_str,
+            ai_workflow_def_id=job.ai_workflow_def_id,
+            priority_int=job.priority_int,
+        )
+        for job in jobs
+    ]
+    try:
+        await broker.enqueue(refs)
+    except Exception:
+        logger.exception(f"Failed to publish {len(refs)} jobs to the broker")
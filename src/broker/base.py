@@ -0,0 +1,55 @@
+"""Job broker interface shared by the API and the workers."""
+
+import abc
+import json
+from dataclasses import asdict, dataclass
+from typing import List
+
+
+@dataclass(frozen=True)
+class JobRef:
+    """Lightweight reference to a committed job, published on creation."""
+
+    id_str: str
+    ai_workflow_def_id: str
+    priority_int: int = 5
+
+    def dumps(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, payload: str) -> "JobRef":
+        return cls(**json.loads(payload))
+
+
+class JobBroker(abc.ABC):
+    """
+    Push delivery of new jobs from the API to workers.
+
+    The job row stays the source of truth: a delivered reference wakes one
+    worker, which then claims jobs from the database in priority and
+    fair-share order. A lost or duplicated reference therefore costs at
+    most a poll interval or an empty claim, never a lost or doubled job.
+    """
+
+    @abc.abstractmethod
+    async def enqueue(self, refs: List[JobRef]) -> None:
+        """Publish references to committed jobs."""
+
+    @abc.abstractmethod
+    async def dequeue(self, max_items: int, timeout: float) -> List[JobRef]:
+        """
+        Take up to ``max_items`` references, waiting up to ``timeout``
+        seconds for the first one; an empty list means the wait timed out.
+        """
+
+    async def trim(self) -> int:
+        """
+        Drop stale references, which pile up when jobs are claimed by
+        polling rather than through the broker; workers call this
+        periodically. Returns how many were dropped.
+        """
+        return 0
+
+    async def close(self) -> None:
+        """Release connections."""
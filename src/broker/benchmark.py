@@ -0,0 +1,147 @@
+"""
+Compare the job broker backends on enqueue/dequeue latency and throughput.
+
+    python -m src.broker.benchmark --jobs 2000
+    python -m src.broker.benchmark --backends redis --redis-url redis://host:6379/0
+
+The SQL backend runs against a temporary SQLite database, the Redis
+backend against the local stand-in server unless ``--redis-url`` is given.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.api_server.models.ai_workflow_job import AIWorkflowJobQueueItem
+from src.broker.base import JobBroker, JobRef
+from src.broker.memory import MemoryBroker
+from src.broker.redis import RedisBroker
+from src.broker.resp_server import start_server
+from src.broker.sql import SQLBroker
+
+BACKENDS = ("memory", "sql", "redis")
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def _ref(i: int) -> JobRef:
+    return JobRef(id_str=str(i), ai_workflow_def_id="benchmark")
+
+
+async def run_benchmark(broker: JobBroker, jobs: int, batch: int) -> Dict[str, float]:
+    """
+    Enqueue ``jobs`` references one at a time (as the API does), drain them
+    in batches of ``batch``, then measure the enqueue-to-delivery latency
+    of a worker blocked in ``dequeue``.
+    """
+    latencies = []
+    start = time.perf_counter()
+    for i in range(jobs):
+        t0 = time.perf_counter()
+        await broker.enqueue([_ref(i)])
+        latencies.append(time.perf_counter() - t0)
+    enqueue_seconds = time.perf_counter() - start
+
+    received = 0
+    start = time.perf_counter()
+    while received < jobs:
+        received += len(await broker.dequeue(batch, 1.0))
+    dequeue_seconds = time.perf_counter() - start
+
+    round_trips = []
+    for i in range(min(jobs, 200)):
+        waiter = asyncio.create_task(broker.dequeue(1, 5.0))
+        # 让消费者先进入阻塞等待
+        await asyncio.sleep(0.002)
+        t0 = time.perf_counter()
+        await broker.enqueue([_ref(i)])
+        await waiter
+        round_trips.append(time.perf_counter() - t0)
+
+    return {
+        "enqueue_per_s": jobs / enqueue_seconds,
+        "enqueue_p50_ms": statistics.median(latencies) * 1000,
+        "enqueue_p99_ms": _percentile(latencies, 0.99) * 1000,
+        "dequeue_per_s": jobs / dequeue_seconds,
+        "delivery_p50_ms": statistics.median(round_trips) * 1000,
+        "delivery_p99_ms": _percentile(round_trips, 0.99) * 1000,
+    }
+
+
+async def _with_memory(
+    bench: Callable[[JobBroker], Awaitable[Dict]], redis_url: Optional[str]
+) -> Dict:
+    return await bench(MemoryBroker())
+
+
+async def _with_sql(
+    bench: Callable[[JobBroker], Awaitable[Dict]], redis_url: Optional[str]
+) -> Dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(tmp, 'broker.db')}"
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(AIWorkflowJobQueueItem.__table__.create)
+        session_factory = async_sessionmaker(
+            engine, class_=AsyncSession, expire_on_commit=False
+        )
+        try:
+            return await bench(SQLBroker(session_factory))
+        finally:
+            await engine.dispose()
+
+
+async def _with_redis(
+    bench: Callable[[JobBroker], Awaitable[Dict]], redis_url: Optional[str]
+) -> Dict:
+    server = None
+    if redis_url is None:
+        server = await start_server("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        redis_url = f"redis://127.0.0.1:{port}/0"
+    broker = RedisBroker(redis_url, f"ai_workflow:benchmark:{os.getpid()}")
+    try:
+        return await bench(broker)
+    finally:
+        await broker.close()
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+
+
+async def main(
+    backends: List[str], jobs: int, batch: int, redis_url: Optional[str]
+) -> None:
+    runners = {"memory": _with_memory, "sql": _with_sql, "redis": _with_redis}
+    columns = None
+    for name in backends:
+        result = await runners[name](
+            lambda broker: run_benchmark(broker, jobs, batch), redis_url
+        )
+        if columns is None:
+            columns = list(result)
+            print(f"{'backend':<8}" + "".join(f"{c:>17}" for c in columns))
+        print(f"{name:<8}" + "".join(f"{result[c]:>17.2f}" for c in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--redis-url", default=None)
+    cli_args = parser.parse_args()
+    asyncio.run(
+        main(cli_args.backends, cli_args.jobs, cli_args.batch, cli_args.redis_url)
+    )
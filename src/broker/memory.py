@@ -0,0 +1,39 @@
+"""In-process job broker for single-node setups."""
+
+import asyncio
+from typing import List
+
+from src.broker.base import JobBroker, JobRef
+
+
+class MemoryBroker(JobBroker):
+    """
+    An ``asyncio.Queue`` shared by the API and a worker embedded in the
+    same process (``WORKER_EMBEDDED``); references don't survive a restart,
+    the worker's poll picks those jobs up instead.
+    """
+
+    def __init__(self, max_refs: int = 10000) -> None:
+        self.max_refs = max_refs
+        self._queue: "asyncio.Queue[JobRef]" = asyncio.Queue()
+
+    async def enqueue(self, refs: List[JobRef]) -> None:
+        for ref in refs:
+            self._queue.put_nowait(ref)
+
+    async def dequeue(self, max_items: int, timeout: float) -> List[JobRef]:
+        try:
+            refs = [await asyncio.wait_for(self._queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while len(refs) < max_items and not self._queue.empty():
+            refs.append(self._queue.get_nowait())
+        return refs
+
+    async def trim(self) -> int:
+        """Drop the oldest references beyond ``max_refs``."""
+        dropped = 0
+        while self._queue.qsize() > self.max_refs:
+            self._queue.get_nowait()
+            dropped += 1
+        return dropped
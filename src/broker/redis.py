@@ -0,0 +1,49 @@
+"""Job broker backed by a Redis list."""
+
+from typing import List
+
+from src.broker.base import JobBroker, JobRef
+from src.broker.resp import RespConnection, parse_url
+
+
+class RedisBroker(JobBroker):
+    """
+    LPUSH on enqueue, BRPOP on dequeue, so waiting workers are woken by the
+    server instead of polling. Dequeue uses its own connection because
+    BRPOP holds it for the whole wait.
+    """
+
+    def __init__(self, url: str, key: str, max_refs: int = 10000) -> None:
+        host, port, db, password = parse_url(url)
+        self.key = key
+        self.max_refs = max_refs
+        self._push = RespConnection(host, port, db, password)
+        self._pop = RespConnection(host, port, db, password)
+
+    async def enqueue(self, refs: List[JobRef]) -> None:
+        if refs:
+            await self._push.execute("LPUSH", self.key, *(ref.dumps() for ref in refs))
+
+    async def dequeue(self, max_items: int, timeout: float) -> List[JobRef]:
+        # BRPOP的超时为0表示永久阻塞
+        reply = await self._pop.execute("BRPOP", self.key, max(timeout, 0.01))
+        if reply is None:
+            return []
+        payloads = [reply[1]]
+        if max_items > 1:
+            payloads.extend(
+                await self._pop.execute("RPOP", self.key, max_items - 1) or []
+            )
+        return [JobRef.loads(payload) for payload in payloads]
+
+    async def trim(self) -> int:
+        """Drop the oldest references beyond ``max_refs`` (the list's tail)."""
+        length = await self._push.execute("LLEN", self.key)
+        if length <= self.max_refs:
+            return 0
+        await self._push.execute("LTRIM", self.key, 0, self.max_refs - 1)
+        return length - self.max_refs
+
+    async def close(self) -> None:
+        await self._push.close()
+        await self._pop.close()
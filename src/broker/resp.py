@@ -0,0 +1,131 @@
+"""Minimal asyncio client for the Redis serialization protocol (RESP2)."""
+
+import asyncio
+from typing import Any, Optional, Tuple
+from urllib.parse import urlparse
+
+
+class RespError(Exception):
+    """Error reply from the server; the connection stays usable."""
+
+
+def encode_command(*args: Any) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Connection closed by server")
+    prefix, payload = line[:1], line[1:-2]
+    if prefix == b"+":
+        return payload.decode("utf-8")
+    if prefix == b"-":
+        raise RespError(payload.decode("utf-8"))
+    if prefix == b":":
+        return int(payload)
+    if prefix == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if prefix == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"Invalid RESP reply: {line!r}")
+
+
+def parse_url(url: str) -> Tuple[str, int, int, Optional[str]]:
+    """``redis://[:password@]host[:port][/db]`` -> (host, port, db, password)."""
+    parsed = urlparse(url)
+    if parsed.scheme != "redis":
+        raise ValueError(f"Unsupported broker URL scheme: {parsed.scheme}")
+    db = int(parsed.path.lstrip("/") or 0)
+    return parsed.hostname or "localhost", parsed.port or 6379, db, parsed.password
+
+
+class RespConnection:
+    """
+    One lazily (re)connected connection, one command at a time.
+
+    A command that fails mid-flight drops the connection, since its reply
+    would otherwise be read by the next command. A cancelled command only
+    drops it while the reply is still outstanding; cancelling a caller
+    before its command is sent, or after its reply was read, keeps it.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        db: int = 0,
+        password: Optional[str] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+        # 已发送命令、尚未读完回复
+        self._awaiting_reply = False
+
+    async def execute(self, *args: Any) -> Any:
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    await self._connect()
+                return await self._roundtrip(*args)
+            except RespError:
+                raise
+            except asyncio.CancelledError:
+                if self._awaiting_reply:
+                    self._reset()
+                raise
+            except BaseException:
+                self._reset()
+                raise
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._roundtrip("AUTH", self.password)
+        if self.db:
+            await self._roundtrip("SELECT", self.db)
+
+    async def _roundtrip(self, *args: Any) -> Any:
+        self._awaiting_reply = True
+        self._writer.write(encode_command(*args))
+        await self._writer.drain()
+        try:
+            reply = await read_reply(self._reader)
+        except RespError:
+            # 错误回复已完整读取
+            self._awaiting_reply = False
+            raise
+        self._awaiting_reply = False
+        return reply
+
+    def _reset(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        self._awaiting_reply = False
+
+    async def close(self) -> None:
+        async with self._lock:
+            writer = self._writer
+            self._reset()
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
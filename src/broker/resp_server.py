@@ -0,0 +1,210 @@
+"""
+Local stand-in for a Redis server, speaking just enough RESP for the job
+broker: list commands with blocking pop. For development and benchmarks
+only; nothing is persisted.
+
+    python -m src.broker.resp_server --port 6399
+"""
+
+import argparse
+import asyncio
+import logging
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from src.broker.resp import RespError, read_reply
+
+logger = logging.getLogger(__name__)
+
+
+def encode_reply(value: Any) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RespError):
+        return b"-%s\r\n" % str(value).encode("utf-8")
+    if isinstance(value, bool):
+        return b":%d\r\n" % int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode("utf-8")
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode_reply(v) for v in value)
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+# BRPOP超时的空回复
+NIL_ARRAY = b"*-1\r\n"
+
+
+class RespServer:
+    """
+    In-memory lists keyed by name, with BRPOP waiters served in order.
+
+    Each connection's commands are read by their own task, so a client
+    that disconnects during BRPOP is noticed at once: its waiter is
+    dropped, and a value handed to it meanwhile goes back to the list.
+    """
+
+    def __init__(self) -> None:
+        self._lists: Dict[bytes, Deque[bytes]] = defaultdict(deque)
+        self._waiters: Dict[bytes, Deque[asyncio.Future]] = defaultdict(deque)
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        closed = asyncio.Event()
+        commands: asyncio.Queue = asyncio.Queue()
+        reading = asyncio.create_task(self._read_commands(reader, commands, closed))
+        try:
+            while True:
+                command = await commands.get()
+                if command is None:
+                    break
+                writer.write(await self._dispatch(command, closed))
+                await writer.drain()
+        except ConnectionResetError:
+            pass
+        finally:
+            reading.cancel()
+            writer.close()
+
+    @staticmethod
+    async def _read_commands(
+        reader: asyncio.StreamReader, commands: asyncio.Queue, closed: asyncio.Event
+    ) -> None:
+        try:
+            while True:
+                commands.put_nowait(await read_reply(reader))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            closed.set()
+            commands.put_nowait(None)
+
+    async def _dispatch(self, command: List[bytes], closed: asyncio.Event) -> bytes:
+        name, args = command[0].upper().decode(), command[1:]
+        try:
+            if name == "BRPOP":
+                return await self._brpop(args[:-1], float(args[-1]), closed)
+            handler = getattr(self, f"_cmd_{name.lower()}", None)
+            if handler is None:
+                raise RespError(f"ERR unknown command '{name}'")
+            return encode_reply(handler(*args))
+        except RespError as e:
+            return encode_reply(e)
+        except (TypeError, ValueError, IndexError):
+            return encode_reply(RespError(f"ERR wrong arguments for '{name}'"))
+
+    def _cmd_ping(self, *args: bytes) -> Any:
+        return args[0] if args else "PONG"
+
+    def _cmd_auth(self, *args: bytes) -> str:
+        return "OK"
+
+    def _cmd_select(self, db: bytes) -> str:
+        return "OK"
+
+    def _cmd_flushdb(self) -> str:
+        self._lists.clear()
+        return "OK"
+
+    def _cmd_lpush(self, key: bytes, *values: bytes) -> int:
+        items = self._lists[key]
+        items.extendleft(values)
+        length = len(items)
+        self._serve_waiters(key)
+        return length
+
+    def _serve_waiters(self, key: bytes) -> None:
+        items, waiters = self._lists[key], self._waiters[key]
+        while waiters and items:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(items.pop())
+
+    def _cmd_rpop(self, key: bytes, count: Optional[bytes] = None) -> Any:
+        items = self._lists.get(key)
+        if count is None:
+            return items.pop() if items else None
+        if not items:
+            return None
+        return [items.pop() for _ in range(min(int(count), len(items)))]
+
+    def _cmd_llen(self, key: bytes) -> int:
+        return len(self._lists.get(key, ()))
+
+    def _cmd_ltrim(self, key: bytes, start: bytes, stop: bytes) -> str:
+        items = self._lists.get(key)
+        if items:
+            length = len(items)
+            # 与Redis相同，负下标从末尾计数，stop包含在内
+            begin, end = (
+                int(index) + length if int(index) < 0 else int(index)
+                for index in (start, stop)
+            )
+            kept = list(items)[max(begin, 0) : end + 1]
+            items.clear()
+            items.extend(kept)
+        return "OK"
+
+    def _cmd_del(self, *keys: bytes) -> int:
+        return sum(self._lists.pop(key, None) is not None for key in keys)
+
+    async def _brpop(
+        self, keys: List[bytes], timeout: float, closed: asyncio.Event
+    ) -> bytes:
+        for key in keys:
+            if self._lists.get(key):
+                return encode_reply([key, self._lists[key].pop()])
+
+        # 只支持单个key的阻塞等待，足够job broker使用
+        key = keys[0]
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[key].append(waiter)
+        closing = asyncio.create_task(closed.wait())
+        try:
+            await asyncio.wait(
+                (waiter, closing),
+                timeout=timeout or None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        finally:
+            closing.cancel()
+            if waiter in self._waiters[key]:
+                self._waiters[key].remove(waiter)
+            if not waiter.done():
+                waiter.cancel()
+        if not waiter.done() or waiter.cancelled():
+            return NIL_ARRAY
+        if closed.is_set():
+            # 客户端已断开，值放回list尾部，交给下一个等待者
+            self._lists[key].append(waiter.result())
+            self._serve_waiters(key)
+            return NIL_ARRAY
+        return encode_reply([key, waiter.result()])
+
+
+async def start_server(host: str = "127.0.0.1", port: int = 6399) -> asyncio.Server:
+    return await asyncio.start_server(RespServer().handle, host, port)
+
+
+async def _serve(host: str, port: int) -> None:
+    server = await start_server(host, port)
+    logger.info(f"RESP stand-in listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    cli_args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(cli_args.host, cli_args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,116 @@
+"""Job broker backed by a queue table in the application database."""
+
+import asyncio
+import time
+from typing import Callable, List
+
+from sqlalchemy import asc, delete, exists
+from sqlmodel import select
+
+from src.api_server.models.ai_workflow_job import (
+    AIWorkflowJob,
+    AIWorkflowJobQueueItem,
+    JobStatus,
+)
+from src.broker.base import JobBroker, JobRef
+
+# 队列为空时的轮询间隔 (秒)，自此指数退避，最长为dequeue的超时
+MIN_RETRY_INTERVAL = 0.01
+
+
+class SQLBroker(JobBroker):
+    """
+    ``ai_workflow_job_queue`` as a FIFO: enqueue inserts, dequeue deletes
+    the oldest rows and returns them in one statement (``DELETE ...
+    RETURNING`` on SQLite, ``FOR UPDATE SKIP LOCKED`` elsewhere), so each
+    reference is delivered to one worker. Needs no extra infrastructure;
+    waiting for the first reference polls the small queue table with a
+    read-only query. The polls back off to one per ``dequeue`` timeout
+    while the queue stays empty, across calls, so an idle worker costs no
+    more than polling the job table. After a delivery they start fast
+    again, for the next references of a burst.
+    """
+
+    def __init__(self, session_factory: Callable) -> None:
+        self.session_factory = session_factory
+        # 连续空轮询的当前间隔，跨dequeue调用保持，取到引用后复位
+        self._retry_interval = MIN_RETRY_INTERVAL
+
+    async def enqueue(self, refs: List[JobRef]) -> None:
+        if not refs:
+            return
+        async with self.session_factory() as db:
+            db.add_all(
+                AIWorkflowJobQueueItem(
+                    ai_workflow_job_id=ref.id_str, payload_json=ref.dumps()
+                )
+                for ref in refs
+            )
+            await db.commit()
+
+    async def dequeue(self, max_items: int, timeout: float) -> List[JobRef]:
+        deadline = time.monotonic() + timeout
+        while True:
+            payloads = await self._take(max_items)
+            if payloads:
+                self._retry_interval = MIN_RETRY_INTERVAL
+                return [JobRef.loads(payload) for payload in payloads]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            await asyncio.sleep(min(self._retry_interval, remaining))
+            self._retry_interval = min(
+                self._retry_interval * 2, max(timeout, MIN_RETRY_INTERVAL)
+            )
+            # 超时后不再查询：调用方随即从任务表认领，会看到期间提交的任务
+            if time.monotonic() >= deadline:
+                return []
+
+    async def trim(self) -> int:
+        """Delete references to jobs that are no longer pending."""
+        model = AIWorkflowJobQueueItem
+        async with self.session_factory() as db:
+            result = await db.exec(
+                delete(model)
+                .where(
+                    ~exists().where(
+                        AIWorkflowJob.id_str == model.ai_workflow_job_id,
+                        AIWorkflowJob.status_str == JobStatus.PENDING,
+                    )
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        return result.rowcount
+
+    async def _take(self, max_items: int) -> List[str]:
+        model = AIWorkflowJobQueueItem
+        oldest = select(model.id_int).order_by(asc(model.id_int)).limit(max_items)
+        async with self.session_factory() as db:
+            # 队列为空时只读查询即返回，不加写锁也不写入
+            if (await db.exec(select(model.id_int).limit(1))).first() is None:
+                return []
+            if db.bind.dialect.name == "sqlite":
+                result = await db.exec(
+                    delete(model)
+                    .where(model.id_int.in_(oldest.scalar_subquery()))
+                    .returning(model.payload_json)
+                )
+                payloads = list(result.scalars())
+            else:
+                result = await db.exec(
+                    select(model.id_int, model.payload_json)
+                    .with_for_update(skip_locked=True)
+                    .order_by(asc(model.id_int))
+                    .limit(max_items)
+                )
+                rows = list(result)
+                payloads = [row.payload_json for row in rows]
+                if rows:
+                    await db.exec(
+                        delete(model).where(
+                            model.id_int.in_([row.id_int for row in rows])
+                        )
+                    )
+            await db.commit()
+        return payloads
@@ -0,0 +1,180 @@
+"""Micro-batching of jobs that target the same pipeline."""
+
+import logging
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from haystack.core.pipeline.base import PipelineBase
+
+from src.api_server.libs.hs_pipeline import (
+    BatchingConfig,
+    InvalidPipelineError,
+    parse_batching_config,
+    pipeline_metadata,
+)
+from src.worker import executor
+
+logger = logging.getLogger(__name__)
+
+# 每个任务的执行结果：结果JSON，或该任务的异常
+JobOutcome = Union[str, Exception]
+
+
+class NotBatchableError(ValueError):
+    """Jobs' inputs or outputs cannot be merged into / split from one run."""
+
+
+@lru_cache(maxsize=256)
+def batching_config(
+    hs_yaml_content: str, hs_graph_json: Optional[str] = None
+) -> Optional[BatchingConfig]:
+    """Batching config of a definition, memoised per YAML/graph content."""
+    try:
+        return parse_batching_config(pipeline_metadata(hs_yaml_content, hs_graph_json))
+    except InvalidPipelineError as e:
+        logger.warning(f"Ignoring batching config: {e}")
+        return None
+
+
+class BatchStats:
+    """Achieved batch sizes, for logging and metrics."""
+
+    def __init__(self) -> None:
+        self.sizes: Counter = Counter()
+
+    def record(self, size: int) -> None:
+        self.sizes[size] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        batches = sum(self.sizes.values())
+        jobs = sum(size * count for size, count in self.sizes.items())
+        return {
+            "batches": batches,
+            "jobs": jobs,
+            "mean_size": jobs / batches if batches else 0.0,
+            "max_size": max(self.sizes, default=0),
+            "size_histogram": dict(sorted(self.sizes.items())),
+        }
+
+
+def _flatten(data: Dict[str, Any], component_names: set) -> Dict[Tuple[str, ...], Any]:
+    """``{component: {input: v}}`` / ``{input: v}`` -> ``{path: v}``."""
+    flat = {}
+    for key, value in data.items():
+        if key in component_names and isinstance(value, dict):
+            for input_name, input_value in value.items():
+                flat[(key, input_name)] = input_value
+        else:
+            flat[(key,)] = value
+    return flat
+
+
+def _unflatten(flat: Dict[Tuple[str, ...], Any]) -> Dict[str, Any]:
+    data: Dict[str, Any] = {}
+    for path, value in flat.items():
+        if len(path) == 2:
+            data.setdefault(path[0], {})[path[1]] = value
+        else:
+            data[path[0]] = value
+    return data
+
+
+def merge_inputs(
+    pipeline: PipelineBase, datas: List[Dict[str, Any]]
+) -> Tuple[Dict[str, Any], List[int]]:
+    """
+    Merge jobs' run inputs for a ``concat`` batch.
+
+    List inputs are concatenated and every job must contribute the same
+    number of items to each of them; any other input must be equal across
+    jobs. Returns the merged input and each job's item count.
+    """
+    component_names = {name for name, _ in pipeline.walk()}
+    flats = [_flatten(data, component_names) for data in datas]
+    if any(flat.keys() != flats[0].keys() for flat in flats):
+        raise NotBatchableError("jobs provide different pipeline inputs")
+
+    merged: Dict[Tuple[str, ...], Any] = {}
+    sizes: List[Optional[int]] = [None] * len(flats)
+    for path in flats[0]:
+        values = [flat[path] for flat in flats]
+        if all(isinstance(v, list) for v in values):
+            for i, v in enumerate(values):
+                if sizes[i] is None:
+                    sizes[i] = len(v)
+                elif sizes[i] != len(v):
+                    raise NotBatchableError("list inputs of a job differ in length")
+            merged[path] = [item for v in values for item in v]
+        elif all(v == values[0] for v in values):
+            merged[path] = values[0]
+        else:
+            raise NotBatchableError(f"input {'.'.join(path)} differs across jobs")
+
+    if any(size is None for size in sizes):
+        raise NotBatchableError("pipeline has no list input to batch on")
+    return _unflatten(merged), sizes
+
+
+def split_outputs(result: Dict[str, Any], sizes: List[int]) -> List[Dict[str, Any]]:
+    """
+    Fan a ``concat`` run's output back out per job: list outputs are split by
+    each job's item count, non-list outputs (e.g. usage meta) are shared.
+    """
+    total = sum(sizes)
+    outputs: List[Dict[str, Any]] = [{} for _ in sizes]
+    for component_name, component_output in result.items():
+        for output_name, value in component_output.items():
+            if not isinstance(value, list):
+                for output in outputs:
+                    output.setdefault(component_name, {})[output_name] = value
+                continue
+            if len(value) != total:
+                raise NotBatchableError(
+                    f"output {component_name}.{output_name} has {len(value)} "
+                    f"items for {total} inputs"
+                )
+            offset = 0
+            for output, size in zip(outputs, sizes):
+                output.setdefault(component_name, {})[output_name] = value[
+                    offset : offset + size
+                ]
+                offset += size
+    return outputs
+
+
+def _run_sequential(
+    pipeline: PipelineBase, datas: List[Dict[str, Any]]
+) -> List[JobOutcome]:
+    outcomes: List[JobOutcome] = []
+    for data in datas:
+        try:
+            outcomes.append(executor.dump_result(executor.run_pipeline(pipeline, data)))
+        except Exception as e:
+            outcomes.append(e)
+    return outcomes
+
+
+def run_batch(
+    pipeline: PipelineBase, datas: List[Dict[str, Any]], config: BatchingConfig
+) -> List[JobOutcome]:
+    """
+    Run a batch of jobs on one pipeline; blocks, call off the event loop.
+
+    A ``concat`` batch that cannot be merged, fails, or produces outputs
+    that cannot be split is re-run sequentially so each job gets its own
+    result or error.
+    """
+    if config.mode == "concat" and len(datas) > 1:
+        try:
+            merged, sizes = merge_inputs(pipeline, datas)
+            result = executor.run_pipeline(pipeline, merged)
+            return [
+                executor.dump_result(output) for output in split_outputs(result, sizes)
+            ]
+        except Exception as e:
+            logger.warning(
+                f"Concat batch of {len(datas)} jobs fell back to sequential: "
+                f"{executor.format_error(e)}"
+            )
+    return _run_sequential(pipeline, datas)
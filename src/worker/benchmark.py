@@ -0,0 +1,143 @@
+"""
+Measure the per-component overhead of the worker's timing instrumentation.
+
+    python -m src.worker.benchmark --documents 10
+    python -m src.worker.benchmark --documents 200 --max-overhead-us 50
+
+The overhead is what ``ComponentTracer`` adds to one component span whose
+output is ``--documents`` embedded documents, with progress and timings
+collected, against the tracer it wraps. Both are timed in alternating
+rounds so machine noise affects them alike. A pipeline of pass-through
+components is also run both ways for context. Exits non-zero when the
+overhead exceeds ``--max-overhead-us``.
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from haystack import Document, Pipeline, component, tracing
+from haystack.tracing import Tracer
+
+from src.worker.progress import (
+    COMPONENT_NAME_TAG,
+    COMPONENT_OUTPUT_TAG,
+    COMPONENT_RUN_OPERATION,
+    ComponentTracer,
+    ProgressTracker,
+)
+from src.worker.timings import ComponentTimings
+
+
+@component
+class PassThrough:
+    """Returns its documents unchanged."""
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]) -> Dict[str, List[Document]]:
+        return {"documents": documents}
+
+
+def build_chain(components: int) -> Pipeline:
+    pipeline = Pipeline()
+    for i in range(components):
+        pipeline.add_component(f"c{i}", PassThrough())
+        if i:
+            pipeline.connect(f"c{i - 1}.documents", f"c{i}.documents")
+    return pipeline
+
+
+def _paired_medians(
+    baseline: Callable[[], None],
+    measured: Callable[[], None],
+    rounds: int,
+    repeat: int,
+) -> Tuple[float, float]:
+    """Median seconds per call of each, timed in alternating rounds."""
+    samples: Tuple[List[float], List[float]] = ([], [])
+    for _ in range(rounds):
+        for fn, out in ((baseline, samples[0]), (measured, samples[1])):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                fn()
+            out.append((time.perf_counter() - start) / repeat)
+    return statistics.median(samples[0]), statistics.median(samples[1])
+
+
+def _component_span(tracer: Tracer, output: Dict[str, Any]) -> None:
+    """The tracer calls Haystack makes around one component run."""
+    with tracer.trace(COMPONENT_RUN_OPERATION, tags={COMPONENT_NAME_TAG: "c"}) as span:
+        span.set_tag("haystack.component.visits", 1)
+        span.set_content_tag(COMPONENT_OUTPUT_TAG, output)
+
+
+def main(components: int, rounds: int, documents: int, max_overhead_us: float) -> int:
+    docs = [
+        Document(content="x" * 500, meta={"source": "benchmark"}, embedding=[0.1] * 768)
+        for _ in range(documents)
+    ]
+    output = {"documents": docs}
+    wrapped = tracing.tracer.actual_tracer
+    tracer = ComponentTracer(wrapped)
+    progress = ProgressTracker()
+    timings = ComponentTimings()
+
+    with progress.track("benchmark", total=1), timings.collect():
+        span_base, span_timed = _paired_medians(
+            lambda: _component_span(wrapped, output),
+            lambda: _component_span(tracer, output),
+            rounds=rounds,
+            repeat=200,
+        )
+    progress.discard("benchmark")
+
+    pipeline = build_chain(components)
+    data = {"c0": {"documents": docs}}
+
+    def instrumented_run() -> None:
+        tracing.tracer.actual_tracer = tracer
+        run_timings = ComponentTimings()
+        try:
+            with progress.track("benchmark", total=components), run_timings.collect():
+                pipeline.run(data)
+            run_timings.to_json()
+        finally:
+            tracing.tracer.actual_tracer = wrapped
+            progress.discard("benchmark")
+
+    run_base, run_timed = _paired_medians(
+        lambda: pipeline.run(data), instrumented_run, rounds=rounds, repeat=1
+    )
+
+    overhead_us = (span_timed - span_base) * 1e6
+    print(
+        f"{'documents':>10}{'span_us':>10}{'timed_span_us':>15}{'overhead_us':>13}"
+        f"{'pipeline_ms':>13}{'timed_pipeline_ms':>19}"
+    )
+    print(
+        f"{documents:>10}{span_base * 1e6:>10.1f}{span_timed * 1e6:>15.1f}"
+        f"{overhead_us:>13.1f}{run_base * 1000:>13.3f}{run_timed * 1000:>19.3f}"
+    )
+    if overhead_us > max_overhead_us:
+        print(f"overhead above the {max_overhead_us:g}us bound", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--components", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--max-overhead-us", type=float, default=50.0)
+    cli_args = parser.parse_args()
+    sys.exit(
+        main(
+            cli_args.components,
+            cli_args.rounds,
+            cli_args.documents,
+            cli_args.max_overhead_us,
+        )
+    )
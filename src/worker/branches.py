@@ -0,0 +1,180 @@
+"""Concurrent execution of the independent branches of a pipeline."""
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Mapping, Optional
+
+import networkx as nx
+from haystack import AsyncPipeline, tracing
+from haystack.core.errors import PipelineRuntimeError
+from haystack.core.pipeline.base import (
+    _COMPONENT_INPUT,
+    _COMPONENT_OUTPUT,
+    _COMPONENT_VISITS,
+    PipelineBase,
+)
+from haystack.core.pipeline.utils import _deepcopy_with_exceptions
+
+from src.api_server.config import settings
+from src.api_server.libs import hs_pipeline
+from src.worker.progress import COMPONENT_CPU_TAG
+
+logger = logging.getLogger(__name__)
+
+_branch_pool: Optional[ThreadPoolExecutor] = None
+_branch_pool_lock = threading.Lock()
+
+
+def branch_pool() -> ThreadPoolExecutor:
+    """Threads shared by the blocking components of all concurrent runs."""
+    global _branch_pool
+    if _branch_pool is None:
+        with _branch_pool_lock:
+            if _branch_pool is None:
+                _branch_pool = ThreadPoolExecutor(
+                    max_workers=settings.WORKER_BRANCH_THREADS,
+                    thread_name_prefix="branch",
+                )
+    return _branch_pool
+
+
+def has_parallel_branches(graph: nx.DiGraph) -> bool:
+    """
+    True when the graph is acyclic and not a single chain, i.e. some
+    components neither feed nor depend on each other. Pipelines with loops
+    run sequentially.
+    """
+    if len(graph) < 2 or not nx.is_directed_acyclic_graph(graph):
+        return False
+    order = list(nx.topological_sort(graph))
+    return any(not graph.has_edge(a, b) for a, b in zip(order, order[1:]))
+
+
+def branch_concurrency(data: Dict[str, Any]) -> int:
+    """
+    Components of one run of a pipeline dict allowed to execute at once;
+    1 when it has nothing to run concurrently.
+    """
+    limit = (
+        hs_pipeline.parse_branch_concurrency(data.get("metadata"))
+        or settings.WORKER_BRANCH_CONCURRENCY
+    )
+    if limit <= 1 or not has_parallel_branches(hs_pipeline.component_graph(data)):
+        return 1
+    return limit
+
+
+def _run_timed(instance: Any, inputs: Dict[str, Any], span: tracing.Span) -> Any:
+    """Run a blocking component, reporting its thread's CPU time to the span."""
+    cpu = time.thread_time()
+    try:
+        return instance.run(**inputs)
+    finally:
+        span.set_tag(COMPONENT_CPU_TAG, time.thread_time() - cpu)
+
+
+class BranchPipeline(AsyncPipeline):
+    """
+    Pipeline whose independent branches run concurrently. Scheduling is
+    Haystack's ``AsyncPipeline``: a component starts once its inputs are
+    ready and merge points wait for every branch feeding them. Components
+    with ``run_async`` are awaited on the run's event loop and blocking ones
+    run on the shared branch pool.
+
+    On top of that, a run behaves like the sequential ``Pipeline``: errors
+    are wrapped in ``PipelineRuntimeError`` whichever way the component
+    ran, and a variadic socket receives its inputs in the order sequential
+    execution would produce them rather than in branch completion order.
+    """
+
+    # 单次运行中同时执行的组件数上限，由executor.build_pipeline设置
+    concurrency_limit: int = 4
+
+    def run_concurrently(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Run on a private event loop. Blocks; call off the event loop."""
+        return asyncio.run(
+            self.run_async(data=data, concurrency_limit=self.concurrency_limit)
+        )
+
+    def _sender_ranks(self) -> Dict[str, int]:
+        ranks = self.__dict__.get("_ranks")
+        if ranks is None:
+            ranks = self._ranks = {
+                name: rank
+                for rank, name in enumerate(
+                    nx.lexicographical_topological_sort(self.graph)
+                )
+            }
+        return ranks
+
+    def _consume_component_inputs(
+        self,
+        component_name: str,
+        component: Dict,
+        inputs: Dict,
+        is_resume: bool = False,
+    ) -> Dict[str, Any]:
+        # 顺序执行时组件按字典序拓扑序运行，用户输入最先到达
+        ranks = self._sender_ranks()
+        for socket_inputs in inputs.get(component_name, {}).values():
+            if len(socket_inputs) > 1:
+                socket_inputs.sort(
+                    key=lambda sent: (
+                        -1
+                        if sent["sender"] is None
+                        else ranks.get(sent["sender"], len(ranks))
+                    )
+                )
+        return PipelineBase._consume_component_inputs(
+            component_name, component, inputs, is_resume
+        )
+
+    @staticmethod
+    async def _run_component_async(
+        component_name: str,
+        component: Dict[str, Any],
+        component_inputs: Dict[str, Any],
+        component_visits: Dict[str, int],
+        parent_span: Optional[tracing.Span] = None,
+    ) -> Mapping[str, Any]:
+        instance = component["instance"]
+        with PipelineBase._create_component_span(
+            component_name=component_name,
+            instance=instance,
+            inputs=component_inputs,
+            parent_span=parent_span,
+        ) as span:
+            span.set_content_tag(
+                _COMPONENT_INPUT, _deepcopy_with_exceptions(component_inputs)
+            )
+            logger.debug(f"Running component {component_name}")
+            try:
+                if getattr(instance, "__haystack_supports_async__", False):
+                    outputs = await instance.run_async(**component_inputs)
+                else:
+                    ctx = contextvars.copy_context()
+                    outputs = await asyncio.get_running_loop().run_in_executor(
+                        branch_pool(),
+                        ctx.run,
+                        _run_timed,
+                        instance,
+                        component_inputs,
+                        span,
+                    )
+            except Exception as error:
+                raise PipelineRuntimeError.from_exception(
+                    component_name, instance.__class__, error
+                ) from error
+
+            component_visits[component_name] += 1
+            if not isinstance(outputs, Mapping):
+                raise PipelineRuntimeError.from_invalid_output(
+                    component_name, instance.__class__, outputs
+                )
+            span.set_tag(_COMPONENT_VISITS, component_visits[component_name])
+            span.set_content_tag(_COMPONENT_OUTPUT, outputs)
+            return outputs
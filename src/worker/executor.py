@@ -0,0 +1,156 @@
+"""Haystack pipeline execution helpers."""
+
+import dataclasses
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from haystack import Pipeline
+from haystack.core.pipeline.base import PipelineBase
+from haystack.marshal import YamlMarshaller
+
+from src.api_server.libs import hs_pipeline
+from src.worker.branches import BranchPipeline, branch_concurrency
+
+logger = logging.getLogger(__name__)
+
+
+# 错误签名：异常链上的类名 (含基类) 与HTTP状态码，用于匹配重试策略
+ErrorSignature = Tuple[FrozenSet[str], FrozenSet[int]]
+
+
+class PipelineRunError(Exception):
+    """
+    A pipeline failure reported from a subprocess, already formatted; the
+    original exception may not pickle, so its signature travels with it.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        error_types: FrozenSet[str] = frozenset(),
+        status_codes: FrozenSet[int] = frozenset(),
+    ) -> None:
+        super().__init__(message, error_types, status_codes)
+        self.error_types = error_types
+        self.status_codes = status_codes
+
+    def __str__(self) -> str:
+        return self.args[0]
+
+    @classmethod
+    def wrap(cls, e: BaseException) -> "PipelineRunError":
+        return cls(format_error(e), *error_signature(e))
+
+
+def format_error(e: BaseException) -> str:
+    """Error text stored in ``error_message_text``."""
+    if isinstance(e, PipelineRunError):
+        return str(e)
+    return f"{type(e).__name__}: {e}"
+
+
+def error_signature(e: BaseException) -> ErrorSignature:
+    """
+    Class names, including base classes, and HTTP status codes of an error
+    and of the errors that caused it: Haystack wraps a component's error
+    in ``PipelineRuntimeError``, and HTTP clients keep the status on the
+    error or on its response.
+    """
+    if isinstance(e, PipelineRunError):
+        return e.error_types, e.status_codes
+    error_types, status_codes = set(), set()
+    seen = set()
+    error: Optional[BaseException] = e
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        error_types.update(cls.__name__ for cls in type(error).__mro__)
+        for holder in (error, getattr(error, "response", None)):
+            status_code = getattr(holder, "status_code", None)
+            if isinstance(status_code, int):
+                status_codes.add(status_code)
+        error = error.__cause__ or error.__context__
+    return frozenset(error_types), frozenset(status_codes)
+
+
+def build_pipeline(
+    hs_yaml_content: str, hs_graph_json: Optional[str] = None
+) -> PipelineBase:
+    """
+    Build a Haystack pipeline, preferring the graph pre-compiled at write
+    time over re-parsing and re-validating the YAML. Pipelines with
+    independent branches are built to run them concurrently.
+    """
+    compiled = hs_pipeline.load_compiled(hs_graph_json, hs_yaml_content)
+    if compiled is not None:
+        data = compiled["pipeline"]
+    else:
+        data = YamlMarshaller().unmarshal(hs_yaml_content)
+    concurrency = branch_concurrency(data)
+    if concurrency > 1:
+        pipeline = BranchPipeline.from_dict(data)
+        pipeline.concurrency_limit = concurrency
+        return pipeline
+    return Pipeline.from_dict(data)
+
+
+@lru_cache(maxsize=256)
+def definition_timeout(
+    hs_yaml_content: str, hs_graph_json: Optional[str] = None
+) -> Optional[float]:
+    """Run timeout of a definition, memoised per YAML/graph content."""
+    try:
+        return hs_pipeline.parse_timeout_seconds(
+            hs_pipeline.pipeline_metadata(hs_yaml_content, hs_graph_json)
+        )
+    except hs_pipeline.InvalidPipelineError as e:
+        logger.warning(f"Ignoring timeout config: {e}")
+        return None
+
+
+@lru_cache(maxsize=256)
+def retry_policy(
+    hs_yaml_content: str,
+    hs_graph_json: Optional[str],
+    default: hs_pipeline.RetryPolicy,
+) -> hs_pipeline.RetryPolicy:
+    """Retry policy of a definition, memoised per YAML/graph content."""
+    try:
+        return hs_pipeline.parse_retry_policy(
+            hs_pipeline.pipeline_metadata(hs_yaml_content, hs_graph_json), default
+        )
+    except hs_pipeline.InvalidPipelineError as e:
+        logger.warning(f"Ignoring retry config: {e}")
+        return default
+
+
+def load_trigger_data(trigger_data_json: str) -> Dict[str, Any]:
+    """Parse a job's trigger data into pipeline run input."""
+    data = json.loads(trigger_data_json) if trigger_data_json else {}
+    if not isinstance(data, dict):
+        raise ValueError("trigger_data_json must be a JSON object")
+    return data
+
+
+def run_pipeline(pipeline: PipelineBase, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a pipeline synchronously. Blocks; call off the event loop."""
+    if isinstance(pipeline, BranchPipeline):
+        return pipeline.run_concurrently(data)
+    return pipeline.run(data=data)
+
+
+def _to_jsonable(obj: Any) -> Any:
+    """Fallback encoder for Haystack dataclasses (Document, ChatMessage, ...)."""
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    return str(obj)
+
+
+def dump_result(result: Dict[str, Any]) -> str:
+    """Serialize pipeline output for ``result_data_json``."""
+    return json.dumps(result, default=_to_jsonable, ensure_ascii=False)
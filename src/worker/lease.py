@@ -0,0 +1,112 @@
+"""Job leases: heartbeats for held jobs and recovery of expired ones."""
+
+import asyncio
+import logging
+import time
+from typing import List, Set
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.libs.hs_pipeline import RetryPolicy
+from src.worker import executor
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseKeeper:
+    """
+    Keeps the leases of a worker's running jobs alive and reaps dead ones.
+
+    Every heartbeat tick renews all held leases with one UPDATE, however
+    many jobs the worker runs. Every reaper interval it also requeues (or
+    fails) jobs whose lease expired, so a crashed worker's jobs are
+    recovered within about ``lease_seconds + reaper_interval`` by any
+    surviving worker. A reaped job is retried up to the attempt limit of
+    its definition's retry policy, ``retry_policy`` when it sets none.
+    """
+
+    def __init__(
+        self,
+        worker_id: str,
+        lease_seconds: float,
+        heartbeat_interval: float,
+        reaper_interval: float,
+        retry_policy: RetryPolicy,
+    ) -> None:
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.reaper_interval = reaper_interval
+        self.retry_policy = retry_policy
+
+        self._held: Set[str] = set()
+
+    def hold(self, job_id: str) -> None:
+        self._held.add(job_id)
+
+    def release(self, job_id: str) -> None:
+        self._held.discard(job_id)
+
+    def job_ids(self) -> List[str]:
+        return list(self._held)
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        """Heartbeat/reaper loop; runs until ``stop_event`` is set."""
+        next_reap = time.monotonic()
+        while not stop_event.is_set():
+            await self.heartbeat()
+            if time.monotonic() >= next_reap:
+                await self.reap()
+                next_reap = time.monotonic() + self.reaper_interval
+            try:
+                await asyncio.wait_for(stop_event.wait(), self.heartbeat_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def heartbeat(self) -> None:
+        """Renew every held lease with a single UPDATE."""
+        job_ids = list(self._held)
+        if not job_ids:
+            return
+        try:
+            async with session_maker() as db:
+                renewed = await crud.ai_workflow_job.renew_leases(
+                    db,
+                    worker_id=self.worker_id,
+                    job_ids=job_ids,
+                    lease_seconds=self.lease_seconds,
+                )
+        except Exception:
+            logger.exception("Failed to renew job leases")
+            return
+        if renewed < len(job_ids):
+            # 续约不及时，部分任务已被回收，其结果将不会写回
+            logger.warning(
+                f"Lost {len(job_ids) - renewed} of {len(job_ids)} job leases"
+            )
+
+    async def reap(self) -> None:
+        """Requeue or fail jobs whose worker stopped heartbeating."""
+        try:
+            async with session_maker() as db:
+                workflow_defs = await crud.ai_workflow_job.get_expired_lease_defs(db)
+                requeued, failed = await crud.ai_workflow_job.reap_expired_leases(
+                    db,
+                    max_attempts=self.retry_policy.max_attempts,
+                    def_max_attempts={
+                        workflow_def.id_str: executor.retry_policy(
+                            workflow_def.hs_yaml_content,
+                            workflow_def.hs_graph_json,
+                            self.retry_policy,
+                        ).max_attempts
+                        for workflow_def in workflow_defs
+                    },
+                )
+        except Exception:
+            logger.exception("Failed to reap expired job leases")
+            return
+        if requeued or failed:
+            logger.warning(
+                f"Recovered jobs with expired leases: {requeued} requeued, "
+                f"{failed} failed"
+            )
@@ -0,0 +1,60 @@
+"""Workflow worker entry point."""
+
+import asyncio
+import logging
+import multiprocessing
+import signal
+
+from src.api_server.config import settings
+from src.api_server.utils.logging_config import setup_logging
+from src.worker.worker import Worker
+
+logger = logging.getLogger(__name__)
+
+
+async def serve() -> None:
+    """Run a single worker until SIGINT/SIGTERM."""
+    worker = Worker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        if worker.broker is not None:
+            await worker.broker.close()
+
+
+def run_worker_process() -> None:
+    """Process target: configure logging and run one worker."""
+    setup_logging()
+    asyncio.run(serve())
+
+
+def run_worker() -> None:
+    """Run ``WORKER_PROCESSES`` worker processes side by side."""
+    if settings.WORKER_PROCESSES == 1:
+        run_worker_process()
+        return
+
+    setup_logging()
+    logger.info(f"Spawning {settings.WORKER_PROCESSES} worker processes")
+    # spawn: 子进程各自创建数据库连接池，不继承父进程的连接
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=run_worker_process, name=f"worker-{i}")
+        for i in range(settings.WORKER_PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # 子进程与父进程同属一个进程组，已各自收到SIGINT并优雅退出
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    run_worker()
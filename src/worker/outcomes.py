@@ -0,0 +1,111 @@
+"""Job outcomes: group-committed write-back of finished jobs."""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+
+logger = logging.getLogger(__name__)
+
+# 整批写入的尝试次数，仍失败时逐个任务写入，只有出错的任务写入失败
+BATCH_WRITE_ATTEMPTS = 2
+# 整批重试前的等待时间（秒）
+BATCH_RETRY_DELAY_SECONDS = 0.1
+
+
+@dataclass
+class _PendingOutcome:
+    values: Dict[str, Any]
+    dead_letter: bool
+    written: "asyncio.Future[bool]"
+
+
+class OutcomeWriter:
+    """
+    Writes finished jobs' outcomes back in batches.
+
+    Outcomes are written by a single flush task, one UPDATE and commit per
+    batch of up to ``max_batch`` jobs, however many jobs finish at once.
+    A flush starts as soon as the previous one is done, so a lone outcome
+    is written without delay, and outcomes that arrive during a write share
+    the next one instead of each paying a round-trip and a commit. A batch
+    that fails is retried, then written job by job, so one bad outcome
+    only fails its own job.
+    """
+
+    def __init__(self, worker_id: str, max_batch: int) -> None:
+        self.worker_id = worker_id
+        self.max_batch = max_batch
+
+        self._pending: Dict[str, _PendingOutcome] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def write(
+        self, job_id: str, values: Dict[str, Any], dead_letter: bool = False
+    ) -> bool:
+        """
+        Write a job's outcome column values, with ``dead_letter`` moving the
+        job to the dead-letter table. Returns False when the worker's lease
+        on the job was lost and the outcome discarded; raises when the
+        batch could not be written.
+        """
+        written = asyncio.get_running_loop().create_future()
+        self._pending[job_id] = _PendingOutcome(values, dead_letter, written)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+        return await written
+
+    async def _flush(self) -> None:
+        while self._pending:
+            batch: Dict[str, _PendingOutcome] = {}
+            for job_id in list(self._pending)[: self.max_batch]:
+                batch[job_id] = self._pending.pop(job_id)
+            for attempt in range(1, BATCH_WRITE_ATTEMPTS + 1):
+                try:
+                    written = await self._write_batch(batch)
+                except Exception:
+                    logger.warning(
+                        f"Failed to write back {len(batch)} job outcomes "
+                        f"(attempt {attempt}/{BATCH_WRITE_ATTEMPTS})",
+                        exc_info=True,
+                    )
+                    if attempt < BATCH_WRITE_ATTEMPTS:
+                        await asyncio.sleep(BATCH_RETRY_DELAY_SECONDS)
+                    continue
+                logger.debug(f"Wrote back {len(written)}/{len(batch)} job outcomes")
+                self._resolve(batch, written)
+                break
+            else:
+                await self._write_each(batch)
+
+    async def _write_each(self, batch: Dict[str, _PendingOutcome]) -> None:
+        for job_id, pending in batch.items():
+            try:
+                written = await self._write_batch({job_id: pending})
+            except Exception as e:
+                # 任务被取消时不再等待写入结果
+                if not pending.written.done():
+                    pending.written.set_exception(e)
+                continue
+            self._resolve({job_id: pending}, written)
+
+    async def _write_batch(self, batch: Dict[str, _PendingOutcome]) -> Set[str]:
+        async with session_maker() as db:
+            written = await crud.ai_workflow_job.finish_leased_jobs(
+                db,
+                worker_id=self.worker_id,
+                outcomes={job_id: pending.values for job_id, pending in batch.items()},
+                dead_letter={
+                    job_id for job_id, pending in batch.items() if pending.dead_letter
+                },
+            )
+        return set(written)
+
+    @staticmethod
+    def _resolve(batch: Dict[str, _PendingOutcome], written: Set[str]) -> None:
+        for job_id, pending in batch.items():
+            if not pending.written.done():
+                pending.written.set_result(job_id in written)
@@ -0,0 +1,180 @@
+"""Per-worker LRU cache of built Haystack pipelines."""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from haystack.core.pipeline.base import PipelineBase
+
+from src.api_server.libs.hs_pipeline import content_hash
+from src.worker import executor
+
+logger = logging.getLogger(__name__)
+
+
+def rss_bytes() -> int:
+    """Current resident set size, or 0 where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+@dataclass
+class _CacheEntry:
+    pipeline: PipelineBase
+    size_bytes: int
+
+
+@dataclass
+class PipelineCacheStats:
+    hits: int = 0
+    misses: int = 0
+    builds: int = 0
+    build_seconds: float = 0.0
+    evictions: int = 0
+    invalidations: int = 0
+
+
+class PipelineCache:
+    """
+    LRU cache of built and warmed-up pipelines keyed by (def id, YAML hash).
+
+    Bounded by entry count and by an estimated memory footprint, measured
+    as the RSS growth while a pipeline is built and warmed up. Concurrent
+    misses for the same key build it only once, while different keys build
+    in parallel; overlapping builds count each other's growth, so their
+    estimates err on the large side. A lookup with a new YAML
+    hash for a known definition drops the stale pipeline, so edits made via
+    ``update_workflow_def`` take effect on the next job.
+    """
+
+    def __init__(self, max_entries: int, max_memory_bytes: int = 0) -> None:
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.stats = PipelineCacheStats()
+
+        self._entries: "OrderedDict[Tuple[str, str], _CacheEntry]" = OrderedDict()
+        self._hash_by_def_id: Dict[str, str] = {}
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        # 每个键一把构建锁，构建结束后移除
+        self._build_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self,
+        def_id: str,
+        hs_yaml_content: str,
+        hs_graph_json: Optional[str] = None,
+    ) -> PipelineBase:
+        """Return the cached pipeline for a definition, building it on a miss."""
+        key = (def_id, content_hash(hs_yaml_content))
+        pipeline = self._lookup(key)
+        if pipeline is not None:
+            return pipeline
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+        try:
+            with build_lock:
+                # 等待构建锁期间可能已被其他线程构建
+                pipeline = self._lookup(key, count=False)
+                if pipeline is not None:
+                    return pipeline
+
+                start = time.perf_counter()
+                rss_before = rss_bytes()
+                pipeline = executor.build_pipeline(hs_yaml_content, hs_graph_json)
+                pipeline.warm_up()
+                size_bytes = max(rss_bytes() - rss_before, 0)
+                build_seconds = time.perf_counter() - start
+
+                with self._lock:
+                    self.stats.builds += 1
+                    self.stats.build_seconds += build_seconds
+                    self._insert(key, _CacheEntry(pipeline, size_bytes))
+        finally:
+            with self._lock:
+                # 仍在等待的线程持有同一把锁，获得锁后命中缓存
+                if self._build_locks.get(key) is build_lock:
+                    del self._build_locks[key]
+
+        logger.info(
+            f"Built pipeline for workflow def {def_id} in {build_seconds:.3f}s "
+            f"(~{size_bytes / 1024 / 1024:.1f} MB)"
+        )
+        return pipeline
+
+    def invalidate(self, def_id: str) -> None:
+        """Drop any cached pipeline for a definition."""
+        with self._lock:
+            stale_hash = self._hash_by_def_id.get(def_id)
+            if stale_hash is not None:
+                self._remove((def_id, stale_hash))
+                self.stats.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._hash_by_def_id.clear()
+            self._memory_bytes = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters plus current occupancy, for logging and metrics."""
+        with self._lock:
+            return {
+                **asdict(self.stats),
+                "entries": len(self._entries),
+                "memory_bytes": self._memory_bytes,
+            }
+
+    def _lookup(
+        self, key: Tuple[str, str], count: bool = True
+    ) -> Optional[PipelineBase]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if count:
+                    self.stats.hits += 1
+                return entry.pipeline
+
+            if count:
+                self.stats.misses += 1
+            def_id, yaml_hash = key
+            stale_hash = self._hash_by_def_id.get(def_id)
+            if stale_hash is not None and stale_hash != yaml_hash:
+                # 定义的YAML已更新，旧pipeline失效
+                self._remove((def_id, stale_hash))
+                self.stats.invalidations += 1
+            return None
+
+    def _insert(self, key: Tuple[str, str], entry: _CacheEntry) -> None:
+        self._entries[key] = entry
+        self._hash_by_def_id[key[0]] = key[1]
+        self._memory_bytes += entry.size_bytes
+
+        # 至少保留刚插入的条目
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries
+            or (self.max_memory_bytes and self._memory_bytes > self.max_memory_bytes)
+        ):
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.stats.evictions += 1
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._memory_bytes -= entry.size_bytes
+        if self._hash_by_def_id.get(key[0]) == key[1]:
+            del self._hash_by_def_id[key[0]]
@@ -0,0 +1,250 @@
+"""Subprocess pool for running CPU-bound pipelines off the worker's GIL."""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import weakref
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.sharedctypes import Synchronized
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.api_server.config import settings
+from src.api_server.models.ai_workflow_def import AIWorkflowDef
+from src.api_server.utils.logging_config import setup_logging
+from src.api_server.libs.hs_pipeline import BatchingConfig
+from src.worker import batching, executor
+from src.worker.pipeline_cache import PipelineCache, rss_bytes
+from src.worker.progress import install_tracer
+from src.worker.timings import ComponentTimings
+
+logger = logging.getLogger(__name__)
+
+# 子进程内的pipeline缓存，由_init_process创建
+_process_cache: Optional[PipelineCache] = None
+
+
+def _init_process(pid: Synchronized) -> None:
+    """
+    Subprocess initializer: report our PID to the pool and create the
+    process-local pipeline cache.
+    """
+    global _process_cache
+    pid.value = os.getpid()
+    setup_logging()
+    # Ctrl-C由父进程处理，子进程跟随父进程的shutdown退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    install_tracer()
+    _process_cache = PipelineCache(
+        max_entries=settings.PIPELINE_CACHE_MAX_ENTRIES,
+        max_memory_bytes=settings.PIPELINE_CACHE_MAX_MEMORY_MB * 1024 * 1024,
+    )
+
+
+def _run_job(
+    def_id: str,
+    hs_yaml_content: str,
+    hs_graph_json: Optional[str],
+    data: Dict[str, Any],
+) -> Tuple[Tuple[str, ComponentTimings], int]:
+    """
+    Subprocess target: run a pipeline, return its JSON result and component
+    timings, and our RSS.
+    """
+    timings = ComponentTimings()
+    try:
+        pipeline = _process_cache.get(def_id, hs_yaml_content, hs_graph_json)
+        with timings.collect():
+            result = executor.run_pipeline(pipeline, data)
+        result_data_json = executor.dump_result(result)
+    except Exception as e:
+        # 原始异常未必可以pickle，转换为消息后返回父进程
+        raise executor.PipelineRunError.wrap(e) from None
+    return (result_data_json, timings), rss_bytes()
+
+
+def _run_batch(
+    def_id: str,
+    hs_yaml_content: str,
+    hs_graph_json: Optional[str],
+    datas: List[Dict[str, Any]],
+    config: BatchingConfig,
+) -> Tuple[Tuple[List[batching.JobOutcome], ComponentTimings], int]:
+    """
+    Subprocess target: run a micro-batch, return per-job outcomes and the
+    batch's component timings, and our RSS.
+    """
+    try:
+        pipeline = _process_cache.get(def_id, hs_yaml_content, hs_graph_json)
+    except Exception as e:
+        raise executor.PipelineRunError.wrap(e) from None
+    timings = ComponentTimings()
+    with timings.collect():
+        batch_outcomes = batching.run_batch(pipeline, datas, config)
+    outcomes = [
+        (
+            executor.PipelineRunError.wrap(outcome)
+            if isinstance(outcome, Exception)
+            else outcome
+        )
+        for outcome in batch_outcomes
+    ]
+    return (outcomes, timings), rss_bytes()
+
+
+def _warm_up(
+    def_id: str, hs_yaml_content: str, hs_graph_json: Optional[str]
+) -> Tuple[int, int]:
+    """Subprocess target: cache a pipeline, return its RSS growth and our RSS."""
+    rss_before = rss_bytes()
+    try:
+        _process_cache.get(def_id, hs_yaml_content, hs_graph_json)
+    except Exception as e:
+        raise executor.PipelineRunError.wrap(e) from None
+    rss = rss_bytes()
+    return max(rss - rss_before, 0), rss
+
+
+class PipelineProcessPool:
+    """
+    Pool of long-lived, single-process executors with definition affinity.
+
+    Each slot is one subprocess with its own warm pipeline cache. Jobs are
+    routed by rendezvous hashing on the definition id, so a definition keeps
+    landing on the same subprocess; when that slot is busy the job spills to
+    the next-ranked idle slot. A subprocess is replaced after
+    ``max_jobs_per_process`` jobs, once its RSS exceeds ``max_memory_bytes``,
+    or if it crashes. A job that is cancelled or times out has its
+    subprocess terminated.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        max_jobs_per_process: int = 0,
+        max_memory_bytes: int = 0,
+    ) -> None:
+        self.processes = processes
+        self.max_jobs_per_process = max_jobs_per_process
+        self.max_memory_bytes = max_memory_bytes
+
+        self._mp_context = multiprocessing.get_context("spawn")
+        self._pids: "weakref.WeakKeyDictionary[ProcessPoolExecutor, Synchronized]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._slots: List[ProcessPoolExecutor] = [
+            self._new_executor() for _ in range(processes)
+        ]
+        self._inflight: List[int] = [0] * processes
+        # 因取消任务而被终止的executor，其中排队的任务需重新提交
+        self._terminated: "weakref.WeakSet[ProcessPoolExecutor]" = weakref.WeakSet()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # 子进程启动时写入其PID；按任务数替换子进程后由新进程覆盖
+        pid = self._mp_context.Value("i", 0)
+        slot_executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=self._mp_context,
+            initializer=_init_process,
+            initargs=(pid,),
+            max_tasks_per_child=self.max_jobs_per_process or None,
+        )
+        self._pids[slot_executor] = pid
+        return slot_executor
+
+    def _pick_slot(self, def_id: str) -> int:
+        ranked = sorted(
+            range(self.processes),
+            key=lambda i: zlib.crc32(f"{def_id}:{i}".encode()),
+            reverse=True,
+        )
+        # 按亲和度顺序选择负载最低的slot
+        return min(ranked, key=lambda i: self._inflight[i])
+
+    async def run(
+        self, workflow_def: AIWorkflowDef, data: Dict[str, Any]
+    ) -> Tuple[str, ComponentTimings]:
+        """
+        Run a job's pipeline in a subprocess, return its JSON result and
+        component timings.
+        """
+        return await self._submit(workflow_def, _run_job, data)
+
+    async def run_batch(
+        self,
+        workflow_def: AIWorkflowDef,
+        datas: List[Dict[str, Any]],
+        config: BatchingConfig,
+    ) -> Tuple[List[batching.JobOutcome], ComponentTimings]:
+        """Run a micro-batch in one subprocess; see ``batching.run_batch``."""
+        return await self._submit(workflow_def, _run_batch, datas, config)
+
+    async def warm_up(self, workflow_def: AIWorkflowDef) -> int:
+        """
+        Build a definition's pipeline in the subprocess its jobs are routed
+        to while the pool is idle; returns the estimated footprint in bytes.
+        """
+        return await self._submit(workflow_def, _warm_up)
+
+    async def _submit(self, workflow_def: AIWorkflowDef, fn, *args) -> Any:
+        while True:
+            slot = self._pick_slot(workflow_def.id_str)
+            slot_executor = self._slots[slot]
+            self._inflight[slot] += 1
+            future = slot_executor.submit(
+                fn,
+                workflow_def.id_str,
+                workflow_def.hs_yaml_content,
+                workflow_def.hs_graph_json,
+                *args,
+            )
+            try:
+                result, rss = await asyncio.wrap_future(future)
+                break
+            except BrokenProcessPool:
+                if slot_executor in self._terminated:
+                    # 被同一slot中其他任务的取消波及，重新提交
+                    continue
+                self._recycle(slot, slot_executor, "subprocess crashed")
+                raise
+            except asyncio.CancelledError:
+                if not future.cancel():
+                    # 任务被取消或超时且已在执行：终止子进程，立即释放其CPU和内存
+                    self._terminate(slot, slot_executor)
+                raise
+            finally:
+                self._inflight[slot] -= 1
+
+        if self.max_memory_bytes and rss > self.max_memory_bytes:
+            self._recycle(
+                slot, slot_executor, f"RSS {rss / 1024 / 1024:.0f} MB over ceiling"
+            )
+        return result
+
+    def _terminate(self, slot: int, slot_executor: ProcessPoolExecutor) -> None:
+        self._terminated.add(slot_executor)
+        pid = self._pids[slot_executor].value
+        if pid:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        self._recycle(slot, slot_executor, "running job cancelled")
+
+    def _recycle(
+        self, slot: int, slot_executor: ProcessPoolExecutor, reason: str
+    ) -> None:
+        if self._slots[slot] is not slot_executor:
+            # 已被其他任务替换
+            return
+        logger.info(f"Recycling pipeline subprocess slot {slot}: {reason}")
+        self._slots[slot] = self._new_executor()
+        # 已提交的任务继续在旧进程中执行完毕
+        slot_executor.shutdown(wait=False)
+
+    def shutdown(self) -> None:
+        for slot_executor in self._slots:
+            slot_executor.shutdown(wait=True)
@@ -0,0 +1,187 @@
+"""Per-component progress of running jobs, captured via Haystack tracing."""
+
+import contextlib
+import contextvars
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from haystack import tracing
+from haystack.tracing import Span, Tracer
+
+COMPONENT_RUN_OPERATION = "haystack.component.run"
+COMPONENT_NAME_TAG = "haystack.component.name"
+COMPONENT_OUTPUT_TAG = "haystack.component.output"
+# 组件不在span所在线程中执行时，由执行线程测得的CPU时间
+COMPONENT_CPU_TAG = "ai_workflow.component.cpu_seconds"
+
+
+@dataclass
+class ComponentRun:
+    """One finished component run of the job in the current context."""
+
+    name: str
+    wall_seconds: float
+    cpu_seconds: float
+    output: Any
+
+
+# 当前线程正在执行的任务的组件回调，由ProgressTracker.track与ComponentTimings.collect设置
+_on_component_done: contextvars.ContextVar[Optional[Callable[[ComponentRun], None]]] = (
+    contextvars.ContextVar("on_component_done", default=None)
+)
+
+
+@contextlib.contextmanager
+def on_component_done(callback: Callable[[ComponentRun], None]) -> Iterator[None]:
+    """Report component runs in this context to ``callback``, then to any outer one."""
+    outer = _on_component_done.get()
+
+    def chained(run: ComponentRun) -> None:
+        callback(run)
+        if outer is not None:
+            outer(run)
+
+    token = _on_component_done.set(chained)
+    try:
+        yield
+    finally:
+        _on_component_done.reset(token)
+
+
+class _OutputCapturingSpan(Span):
+    """
+    Keeps the component output Haystack hands to the span, and the CPU time
+    reported by a thread the component was offloaded to.
+    """
+
+    def __init__(self, wrapped: Span) -> None:
+        self.wrapped = wrapped
+        self.output: Any = None
+        self.cpu_seconds: Optional[float] = None
+
+    def set_tag(self, key: str, value: Any) -> None:
+        if key == COMPONENT_CPU_TAG:
+            self.cpu_seconds = value
+        self.wrapped.set_tag(key, value)
+
+    def set_content_tag(self, key: str, value: Any) -> None:
+        if key == COMPONENT_OUTPUT_TAG:
+            self.output = value
+        self.wrapped.set_content_tag(key, value)
+
+    def raw_span(self) -> Any:
+        return self.wrapped.raw_span()
+
+    def get_correlation_data_for_logs(self) -> Dict[str, Any]:
+        return self.wrapped.get_correlation_data_for_logs()
+
+
+class ComponentTracer(Tracer):
+    """
+    Haystack tracer that reports finished component runs, with their wall
+    time, CPU time and output, to the job running in the current context.
+    Spans are delegated to the previously installed tracer so
+    OpenTelemetry/Datadog tracing keeps working, and outside a job nothing
+    is measured.
+    """
+
+    def __init__(self, wrapped: Tracer) -> None:
+        self.wrapped = wrapped
+
+    @contextlib.contextmanager
+    def trace(
+        self,
+        operation_name: str,
+        tags: Optional[Dict[str, Any]] = None,
+        parent_span: Optional[Span] = None,
+    ) -> Iterator[Span]:
+        callback = _on_component_done.get()
+        if callback is None or operation_name != COMPONENT_RUN_OPERATION:
+            with self.wrapped.trace(
+                operation_name, tags=tags, parent_span=parent_span
+            ) as span:
+                yield span
+            return
+
+        # 组件通常在当前线程中同步执行，线程CPU时间即组件的CPU时间
+        wall, cpu = time.perf_counter(), time.thread_time()
+        with self.wrapped.trace(
+            operation_name, tags=tags, parent_span=parent_span
+        ) as span:
+            capturing_span = _OutputCapturingSpan(span)
+            yield capturing_span
+        callback(
+            ComponentRun(
+                name=(tags or {}).get(COMPONENT_NAME_TAG, ""),
+                wall_seconds=time.perf_counter() - wall,
+                cpu_seconds=(
+                    capturing_span.cpu_seconds
+                    if capturing_span.cpu_seconds is not None
+                    else time.thread_time() - cpu
+                ),
+                output=capturing_span.output,
+            )
+        )
+
+    def current_span(self) -> Optional[Span]:
+        return self.wrapped.current_span()
+
+
+def install_tracer() -> None:
+    """Wrap the global Haystack tracer once per process."""
+    if not isinstance(tracing.tracer.actual_tracer, ComponentTracer):
+        tracing.enable_tracing(ComponentTracer(tracing.tracer.actual_tracer))
+
+
+class ProgressTracker:
+    """
+    Components completed so far per running job.
+
+    Pipeline threads record progress; the worker periodically collects the
+    jobs whose progress changed and writes them in one batched UPDATE.
+    """
+
+    def __init__(self) -> None:
+        self._progress: Dict[str, Dict[str, Any]] = {}
+        self._dirty: set = set()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def track(self, job_id: str, total: int) -> Iterator[None]:
+        """Attribute component runs in this context to ``job_id``."""
+        with self._lock:
+            self._progress[job_id] = {"completed": [], "total": total}
+
+        def record(run: ComponentRun) -> None:
+            with self._lock:
+                progress = self._progress.get(job_id)
+                if progress is not None:
+                    progress["completed"].append(run.name)
+                    self._dirty.add(job_id)
+
+        with on_component_done(record):
+            yield
+
+    def pop(self, job_id: str) -> Optional[str]:
+        """Final progress JSON of a job, which stops being tracked."""
+        with self._lock:
+            self._dirty.discard(job_id)
+            progress = self._progress.pop(job_id, None)
+        return json.dumps(progress, ensure_ascii=False) if progress else None
+
+    def discard(self, job_id: str) -> None:
+        self.pop(job_id)
+
+    def collect(self) -> Dict[str, str]:
+        """Progress JSON of the jobs that changed since the last collect."""
+        with self._lock:
+            changed = {
+                job_id: json.dumps(self._progress[job_id], ensure_ascii=False)
+                for job_id in self._dirty
+                if job_id in self._progress
+            }
+            self._dirty.clear()
+        return changed
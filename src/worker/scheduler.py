@@ -0,0 +1,61 @@
+"""Fair-share scheduling of claim slots across users."""
+
+import heapq
+from typing import Dict, List, Optional
+
+
+class FairShareScheduler:
+    """
+    Weighted fair queuing across ``user_id_str`` within a priority class.
+
+    Each user has a virtual time that advances by ``1 / weight`` per job it
+    is served, and free slots go to the users with the lowest virtual time.
+    A user that (re)appears starts at the current minimum, so idle periods
+    don't bank credit and a tenant with a huge backlog can't starve others.
+    Ties go to the user listed first.
+    """
+
+    def __init__(
+        self, weights: Optional[Dict[str, float]] = None, default_weight: float = 1.0
+    ) -> None:
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self._virtual_time: Dict[str, float] = {}
+
+    def weight(self, user_id: str) -> float:
+        return self.weights.get(user_id, self.default_weight)
+
+    def allocate(self, user_ids: List[str], slots: int) -> Dict[str, int]:
+        """Split ``slots`` across the users that currently have pending jobs."""
+        if not user_ids or slots <= 0:
+            return {}
+
+        active = set(user_ids)
+        # 不再排队的用户不保留虚拟时间
+        for user_id in list(self._virtual_time):
+            if user_id not in active:
+                del self._virtual_time[user_id]
+        floor = min(self._virtual_time.values(), default=0.0)
+        for user_id in user_ids:
+            self._virtual_time.setdefault(user_id, floor)
+
+        heap = [
+            (self._virtual_time[user_id], position, user_id)
+            for position, user_id in enumerate(user_ids)
+        ]
+        heapq.heapify(heap)
+        allocation: Dict[str, int] = {}
+        for _ in range(slots):
+            virtual_time, position, user_id = heapq.heappop(heap)
+            allocation[user_id] = allocation.get(user_id, 0) + 1
+            heapq.heappush(
+                heap, (virtual_time + 1 / self.weight(user_id), position, user_id)
+            )
+        return allocation
+
+    def record(self, user_id: str, jobs: int) -> None:
+        """Charge a user for jobs actually claimed."""
+        if jobs:
+            self._virtual_time[user_id] = self._virtual_time.get(
+                user_id, 0.0
+            ) + jobs / self.weight(user_id)
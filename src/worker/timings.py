@@ -0,0 +1,138 @@
+"""Per-component wall time, CPU time and output size of pipeline runs."""
+
+import contextlib
+import itertools
+import json
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.worker.progress import ComponentRun, on_component_done
+
+# 估算输出大小时的最大嵌套深度，更深的内容不计入
+SIZE_ESTIMATE_MAX_DEPTH = 6
+# 长列表只估算前N项，再按长度外推
+SIZE_ESTIMATE_SAMPLE = 2
+
+_SCALAR_SIZES = {type(None): 4, bool: 5, int: 8, float: 8}
+
+# ComponentTimings中每个组件的统计项下标
+CALLS, WALL, CPU, OUTPUT_BYTES, MAX_WALL = range(5)
+
+
+def estimate_size(obj: Any, depth: int = 0) -> int:
+    """
+    Rough serialized size of a component output in bytes, without
+    serializing it. Lists of numbers (embeddings) are counted by length
+    and longer lists of anything else are extrapolated from their first
+    items, so the cost stays flat in the size of the output.
+    """
+    cls = type(obj)
+    if cls is str or cls is bytes:
+        return len(obj)
+    size = _SCALAR_SIZES.get(cls)
+    if size is not None:
+        return size
+    if depth >= SIZE_ESTIMATE_MAX_DEPTH:
+        return 0
+    if isinstance(obj, dict):
+        size = 0
+        for key, value in obj.items():
+            size += len(key) if type(key) is str else 8
+            size += estimate_size(value, depth + 1)
+        return size
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        if not obj:
+            return 0
+        sample = list(itertools.islice(obj, SIZE_ESTIMATE_SAMPLE))
+        if type(sample[0]) is float:
+            return 8 * len(obj)
+        sampled = sum(estimate_size(item, depth + 1) for item in sample)
+        return sampled * len(obj) // len(sample)
+    if isinstance(obj, (str, bytes)):
+        return len(obj)
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if hasattr(obj, "__dict__"):
+        return estimate_size(vars(obj), depth + 1)
+    return 8
+
+
+class ComponentTimings:
+    """
+    Calls, wall time, CPU time, estimated output size and slowest call per
+    component, summed over the runs collected into it. Plain data, so a
+    subprocess can send it back with the job's result.
+    """
+
+    def __init__(self) -> None:
+        self.components: Dict[str, List[float]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.components)
+
+    @contextlib.contextmanager
+    def collect(self) -> Iterator[None]:
+        """Record the component runs in this context."""
+        with on_component_done(self.record):
+            yield
+
+    def record(self, run: ComponentRun) -> None:
+        stats = self.components.get(run.name)
+        if stats is None:
+            stats = self.components[run.name] = [0, 0.0, 0.0, 0, 0.0]
+        stats[CALLS] += 1
+        stats[WALL] += run.wall_seconds
+        stats[CPU] += run.cpu_seconds
+        stats[OUTPUT_BYTES] += estimate_size(run.output)
+        stats[MAX_WALL] = max(stats[MAX_WALL], run.wall_seconds)
+
+    def merge(self, other: "ComponentTimings") -> None:
+        for name, other_stats in other.components.items():
+            stats = self.components.get(name)
+            if stats is None:
+                self.components[name] = list(other_stats)
+                continue
+            for i in (CALLS, WALL, CPU, OUTPUT_BYTES):
+                stats[i] += other_stats[i]
+            stats[MAX_WALL] = max(stats[MAX_WALL], other_stats[MAX_WALL])
+
+    def to_json(self) -> Optional[str]:
+        """``{component: [calls, wall_ms, cpu_ms, output_bytes]}`` for the job row."""
+        if not self.components:
+            return None
+        return json.dumps(
+            {
+                name: [
+                    int(stats[CALLS]),
+                    round(stats[WALL] * 1000, 3),
+                    round(stats[CPU] * 1000, 3),
+                    int(stats[OUTPUT_BYTES]),
+                ]
+                for name, stats in self.components.items()
+            },
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+
+
+class ComponentStatsBuffer:
+    """
+    Timings of finished runs per definition, buffered on the event loop
+    until the worker writes them to the aggregate table in one statement.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[str, ComponentTimings] = {}
+
+    def record(self, def_id: str, timings: Optional[ComponentTimings]) -> None:
+        if not timings:
+            return
+        pending = self._pending.get(def_id)
+        if pending is None:
+            pending = self._pending[def_id] = ComponentTimings()
+        pending.merge(timings)
+
+    def collect(self) -> Dict[str, Dict[str, List[float]]]:
+        """``{def_id: {component: stats}}`` recorded since the last collect."""
+        pending, self._pending = self._pending, {}
+        return {def_id: timings.components for def_id, timings in pending.items()}
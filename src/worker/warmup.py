@@ -0,0 +1,108 @@
+"""Start-up warm-up: build the busiest active pipelines before claiming jobs."""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.models.ai_workflow_def import AIWorkflowDef
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmUpReport:
+    candidates: int = 0
+    warmed: int = 0
+    failed: int = 0
+    memory_bytes: int = 0
+    seconds: float = 0.0
+    # 预热提前结束的原因: "timeout" 或 "memory"
+    stopped_by: Optional[str] = None
+
+
+async def load_candidates(max_defs: int, lookback_hours: float) -> List[AIWorkflowDef]:
+    """Active definitions with the most recent jobs, busiest first."""
+    since = datetime.utcnow() - timedelta(hours=lookback_hours)
+    async with session_maker() as db:
+        def_ids = await crud.ai_workflow_job.get_busiest_workflow_def_ids(
+            db, since=since, limit=max_defs
+        )
+        if not def_ids:
+            return []
+        workflow_defs = {
+            workflow_def.id_str: workflow_def
+            for workflow_def in await crud.ai_workflow_def.get_active_workflow_defs(
+                db, ids=def_ids
+            )
+        }
+    return [workflow_defs[def_id] for def_id in def_ids if def_id in workflow_defs]
+
+
+def _discard_result(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Late warm-up build failed: {task.exception()}")
+
+
+async def warm_up(
+    build: Callable[[AIWorkflowDef], Awaitable[int]],
+    max_defs: int,
+    lookback_hours: float,
+    timeout: float,
+    max_memory_bytes: int = 0,
+) -> WarmUpReport:
+    """
+    Build the pipelines of the busiest active definitions, one at a time,
+    until all are built or the time or memory budget is spent.
+
+    ``build`` caches one definition's pipeline where jobs will find it and
+    returns its estimated footprint in bytes. The memory budget is checked
+    before each build, so the last pipeline may take the estimate past it.
+    A build still running when the time budget runs out is left to finish
+    in the background rather than cancelled, which in process mode would
+    kill the subprocess along with the pipelines it has already cached. A
+    definition that fails to build is skipped; its jobs will report the
+    error when they run.
+    """
+    report = WarmUpReport()
+    if max_defs <= 0:
+        return report
+
+    start = time.perf_counter()
+    deadline = start + timeout
+    try:
+        workflow_defs = await asyncio.wait_for(
+            load_candidates(max_defs, lookback_hours), timeout
+        )
+    except Exception:
+        logger.exception("Failed to load workflow definitions to warm up")
+        workflow_defs = []
+    report.candidates = len(workflow_defs)
+
+    for workflow_def in workflow_defs:
+        if max_memory_bytes and report.memory_bytes >= max_memory_bytes:
+            report.stopped_by = "memory"
+            break
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            report.stopped_by = "timeout"
+            break
+        build_task = asyncio.create_task(build(workflow_def))
+        done, _ = await asyncio.wait({build_task}, timeout=remaining)
+        if not done:
+            build_task.add_done_callback(_discard_result)
+            report.stopped_by = "timeout"
+            break
+        try:
+            report.memory_bytes += build_task.result()
+            report.warmed += 1
+        except Exception:
+            logger.exception(f"Failed to warm up workflow def {workflow_def.id_str}")
+            report.failed += 1
+
+    report.seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,766 @@
+"""Workflow worker: claims pending jobs and executes their pipelines."""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from typing import Any, Coroutine, Dict, List, Optional, Set, Tuple
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.config import settings
+from src.api_server.libs.hs_pipeline import BatchingConfig, RetryPolicy
+from src.api_server.models.ai_workflow_def import AIWorkflowDef
+from src.api_server.models.ai_workflow_job import (
+    AIWorkflowJob,
+    AIWorkflowJobUpdate,
+    JobStatus,
+)
+from src.blobstore import get_blob_store, load_payload, store_payload
+from src.broker import JobBroker, get_broker
+from src.worker import batching, executor, warmup
+from src.worker.lease import LeaseKeeper
+from src.worker.outcomes import OutcomeWriter
+from src.worker.pipeline_cache import PipelineCache, rss_bytes
+from src.worker.process_pool import PipelineProcessPool
+from src.worker.progress import ProgressTracker, install_tracer
+from src.worker.scheduler import FairShareScheduler
+from src.worker.timings import ComponentStatsBuffer, ComponentTimings
+
+logger = logging.getLogger(__name__)
+
+# error_message_text 列长度上限
+ERROR_MESSAGE_MAX_LENGTH = 2000
+# 等待broker投递时，外层超时比dequeue自身的超时多出的时间 (秒)
+BROKER_DEQUEUE_GRACE_SECONDS = 1.0
+
+
+class Worker:
+    """
+    Claims pending jobs from the database and runs them on the event loop.
+
+    Before claiming anything, the worker builds the pipelines of the
+    definitions with the most recent jobs within a time and memory budget,
+    and only then reports itself ready, so no job pays a cold start.
+    Only as many jobs as there are free slots are claimed, so claimed jobs
+    never sit idle in one process while another worker could run them. Jobs
+    of a definition with ``metadata.batching`` are coalesced into
+    micro-batches, each of which occupies a single slot. Which jobs are
+    claimed is decided by strict priority classes and, within a class, by
+    weighted fair share across users. Claimed jobs are leased to this
+    worker and kept alive by heartbeats until their outcome is written;
+    outcomes of jobs finishing together share one UPDATE and commit.
+    Failures the retry policy deems transient are requeued with backoff.
+    With a job broker configured, an idle worker is woken by new jobs
+    instead of waiting out the poll interval. Cancelled jobs are aborted as
+    soon as the cancellation watch sees them, and a job that exceeds its
+    timeout is failed. In thread mode the components each job has
+    completed are reported as its progress. Each run's per-component wall
+    time, CPU time and output size is stored with the job and added to its
+    definition's aggregates.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = settings.WORKER_CONCURRENCY,
+        claim_batch_size: int = settings.WORKER_CLAIM_BATCH_SIZE,
+        poll_interval: float = settings.WORKER_POLL_INTERVAL_SECONDS,
+        worker_id: Optional[str] = None,
+        pipeline_cache: Optional[PipelineCache] = None,
+        broker: Optional[JobBroker] = None,
+    ) -> None:
+        self.concurrency = concurrency
+        self.claim_batch_size = claim_batch_size
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.pipeline_cache = pipeline_cache or PipelineCache(
+            max_entries=settings.PIPELINE_CACHE_MAX_ENTRIES,
+            max_memory_bytes=settings.PIPELINE_CACHE_MAX_MEMORY_MB * 1024 * 1024,
+        )
+        self.broker = broker or get_broker()
+        self.process_pool: Optional[PipelineProcessPool] = None
+        self.progress = ProgressTracker()
+        self.component_stats = ComponentStatsBuffer()
+        if settings.WORKER_EXECUTION_MODE == "process":
+            self.process_pool = PipelineProcessPool(
+                processes=settings.WORKER_POOL_PROCESSES or os.cpu_count() or 1,
+                max_jobs_per_process=settings.WORKER_POOL_MAX_JOBS_PER_PROCESS,
+                max_memory_bytes=settings.WORKER_POOL_MAX_MEMORY_MB * 1024 * 1024,
+            )
+        else:
+            install_tracer()
+
+        self.retry_policy = RetryPolicy(
+            max_attempts=settings.WORKER_MAX_ATTEMPTS,
+            backoff_seconds=settings.WORKER_RETRY_BACKOFF_SECONDS,
+            max_backoff_seconds=settings.WORKER_RETRY_MAX_BACKOFF_SECONDS,
+            jitter=settings.WORKER_RETRY_JITTER,
+            retry_on=frozenset(settings.WORKER_RETRY_ON),
+            retry_on_status=frozenset(settings.WORKER_RETRY_ON_STATUS),
+        )
+        self.batch_stats = batching.BatchStats()
+        self.scheduler = FairShareScheduler(settings.WORKER_FAIR_SHARE_WEIGHTS)
+        # 各优先级上次调度窗口中最后被服务的用户，下次从其后开始取用户
+        self._user_cursors: Dict[int, str] = {}
+        self.leases = LeaseKeeper(
+            worker_id=self.worker_id,
+            lease_seconds=settings.WORKER_LEASE_SECONDS,
+            heartbeat_interval=settings.WORKER_HEARTBEAT_INTERVAL_SECONDS,
+            reaper_interval=settings.WORKER_REAPER_INTERVAL_SECONDS,
+            retry_policy=self.retry_policy,
+        )
+        self.outcomes = OutcomeWriter(
+            worker_id=self.worker_id, max_batch=settings.WORKER_RESULT_BATCH_SIZE
+        )
+
+        self.ready = False
+        self.warm_up_report: Optional[warmup.WarmUpReport] = None
+        self._ready_file = (
+            settings.WORKER_READY_FILE.format(worker_id=self.worker_id)
+            if settings.WORKER_READY_FILE
+            else None
+        )
+
+        self._tasks: Set[asyncio.Task] = set()
+        self._job_tasks: Dict[str, asyncio.Task] = {}
+        self._stop_event: Optional[asyncio.Event] = None
+
+    def stop(self) -> None:
+        """Stop claiming new jobs; running jobs are allowed to finish."""
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    async def run(self) -> None:
+        """Main loop: claim jobs while there is capacity, until stopped."""
+        self._stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # 同步的pipeline.run在线程池中执行。取消或超时的任务其线程仍运行至
+        # pipeline返回，另留等量线程，使释放的槽位上的新任务不必排在其后
+        loop.set_default_executor(
+            ThreadPoolExecutor(
+                max_workers=self.concurrency * 2, thread_name_prefix="pipeline"
+            )
+        )
+        logger.info(f"Worker {self.worker_id} started (concurrency={self.concurrency})")
+        # 停止认领后仍需为执行中的任务续约、检查取消，直到全部完成
+        background_stop_event = asyncio.Event()
+        background_tasks = [
+            asyncio.create_task(self.leases.run(background_stop_event)),
+            asyncio.create_task(self._watch_jobs(background_stop_event)),
+        ]
+
+        await self._warm_up()
+        if not self._stop_event.is_set():
+            self._set_ready(True)
+
+        while not self._stop_event.is_set():
+            free_slots = self.concurrency - len(self._tasks)
+            if free_slots <= 0:
+                await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            try:
+                jobs = await self._claim_scheduled(
+                    min(free_slots, self.claim_batch_size)
+                )
+            except Exception:
+                logger.exception("Failed to claim pending jobs")
+                jobs = []
+
+            if not jobs:
+                await self._idle()
+                continue
+
+            await self._dispatch(jobs)
+
+        self._set_ready(False)
+        if self._tasks:
+            logger.info(f"Waiting for {len(self._tasks)} running jobs to finish")
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        background_stop_event.set()
+        await asyncio.gather(*background_tasks)
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+        logger.info(
+            f"Worker {self.worker_id} stopped, "
+            f"pipeline cache: {self.pipeline_cache.snapshot()}, "
+            f"batches: {self.batch_stats.snapshot()}"
+        )
+
+    async def _warm_up(self) -> None:
+        """Run the start-up warm-up, abandoning it when the worker is stopped."""
+        if self.process_pool is not None:
+            build = self.process_pool.warm_up
+            capacity = self.pipeline_cache.max_entries * self.process_pool.processes
+        else:
+            build = self._warm_pipeline
+            capacity = self.pipeline_cache.max_entries
+        # 超出缓存容量的预热会淘汰先前预热的pipeline
+        warm_up_task = asyncio.create_task(
+            warmup.warm_up(
+                build,
+                max_defs=min(settings.WORKER_WARMUP_MAX_DEFS, capacity),
+                lookback_hours=settings.WORKER_WARMUP_LOOKBACK_HOURS,
+                timeout=settings.WORKER_WARMUP_TIMEOUT_SECONDS,
+                max_memory_bytes=settings.WORKER_WARMUP_MAX_MEMORY_MB * 1024 * 1024,
+            )
+        )
+        stop_task = asyncio.create_task(self._stop_event.wait())
+        await asyncio.wait(
+            [warm_up_task, stop_task], return_when=asyncio.FIRST_COMPLETED
+        )
+        stop_task.cancel()
+        if not warm_up_task.done():
+            warm_up_task.cancel()
+            await asyncio.gather(warm_up_task, return_exceptions=True)
+            logger.info("Warm-up abandoned, worker is stopping")
+            return
+
+        report = self.warm_up_report = warm_up_task.result()
+        if report.candidates:
+            budget = f", {report.stopped_by} budget spent" if report.stopped_by else ""
+            logger.info(
+                f"Warmed up {report.warmed}/{report.candidates} pipelines "
+                f"in {report.seconds:.2f}s "
+                f"(~{report.memory_bytes / 1024 / 1024:.1f} MB{budget})"
+            )
+
+    async def _warm_pipeline(self, workflow_def: AIWorkflowDef) -> int:
+        def build() -> int:
+            rss_before = rss_bytes()
+            self._cached_pipeline(workflow_def)
+            return max(rss_bytes() - rss_before, 0)
+
+        return await asyncio.to_thread(build)
+
+    def _set_ready(self, ready: bool) -> None:
+        """Flip readiness and create or remove the readiness file."""
+        self.ready = ready
+        if ready:
+            logger.info(f"Worker {self.worker_id} is ready")
+        if self._ready_file is None:
+            return
+        try:
+            if ready:
+                with open(self._ready_file, "w") as f:
+                    json.dump(
+                        {
+                            "worker_id": self.worker_id,
+                            "pid": os.getpid(),
+                            "warm_up": (
+                                asdict(self.warm_up_report)
+                                if self.warm_up_report
+                                else None
+                            ),
+                        },
+                        f,
+                    )
+            elif os.path.exists(self._ready_file):
+                os.remove(self._ready_file)
+        except OSError:
+            logger.exception(f"Failed to update ready file {self._ready_file}")
+
+    async def _idle(self) -> None:
+        """
+        Sleep for the poll interval, waking early on stop or when the broker
+        delivers a job reference. References only wake the worker; what to
+        run is still decided by the claim.
+        """
+        waiters = [asyncio.create_task(self._stop_event.wait())]
+        timeout = self.poll_interval
+        if self.broker is not None:
+            waiters.append(asyncio.create_task(self._wait_for_jobs()))
+            # dequeue在轮询间隔后自行返回；外层超时只防broker卡住，
+            # 否则每次都会取消进行中的BRPOP，其已弹出的引用随之丢失
+            timeout += BROKER_DEQUEUE_GRACE_SECONDS
+        _, pending = await asyncio.wait(
+            waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _wait_for_jobs(self) -> None:
+        try:
+            refs = await self.broker.dequeue(self.claim_batch_size, self.poll_interval)
+        except Exception:
+            logger.exception("Failed to dequeue from the job broker")
+            # 避免broker故障时立即返回导致空转
+            await asyncio.sleep(self.poll_interval)
+            return
+        if refs:
+            logger.debug(f"Woken by {len(refs)} job references")
+
+    async def _claim_scheduled(
+        self, limit: int, ai_workflow_def_id: Optional[str] = None
+    ) -> List[AIWorkflowJob]:
+        """
+        Claim up to ``limit`` jobs: highest priority class first, slots within
+        a class shared across its users by the fair-share scheduler. With
+        more than ``WORKER_FAIR_SHARE_MAX_USERS`` users in a class, each
+        claim looks at the window of users after the last one served.
+
+        ``ai_workflow_def_id`` restricts the claim to one definition's jobs,
+        to top up a micro-batch. Only the highest priority class with ready
+        jobs is served then, so a top-up never takes a definition's jobs
+        ahead of higher-priority work, and users still get only the slots
+        the scheduler allocates them.
+        """
+        jobs: List[AIWorkflowJob] = []
+        async with session_maker() as db:
+            priority = await crud.ai_workflow_job.get_top_pending_priority(db)
+            while priority is not None and len(jobs) < limit:
+                user_ids = await crud.ai_workflow_job.get_pending_user_ids(
+                    db,
+                    priority=priority,
+                    max_users=settings.WORKER_FAIR_SHARE_MAX_USERS,
+                    after=self._user_cursors.get(priority),
+                )
+                allocation = self.scheduler.allocate(user_ids, limit - len(jobs))
+                claimed_count, drained, served = 0, False, set()
+                for user_id, slots in allocation.items():
+                    claimed = await crud.ai_workflow_job.claim_pending_jobs(
+                        db,
+                        limit=slots,
+                        ai_workflow_def_id=ai_workflow_def_id,
+                        user_id=user_id,
+                        priority=priority,
+                        worker_id=self.worker_id,
+                        lease_seconds=settings.WORKER_LEASE_SECONDS,
+                    )
+                    for job in claimed:
+                        self.leases.hold(job.id_str)
+                    self.scheduler.record(user_id, len(claimed))
+                    if claimed:
+                        served.add(user_id)
+                    jobs += claimed
+                    claimed_count += len(claimed)
+                    drained = drained or len(claimed) < slots
+                self._advance_user_cursor(priority, user_ids, served)
+                if ai_workflow_def_id:
+                    break
+                if claimed_count and drained:
+                    # 部分用户的队列已取空，剩余名额先分给同一优先级的其他用户
+                    continue
+                priority = await crud.ai_workflow_job.get_top_pending_priority(
+                    db, below=priority
+                )
+        return jobs
+
+    def _advance_user_cursor(
+        self, priority: int, user_ids: List[str], served: Set[str]
+    ) -> None:
+        if len(user_ids) < settings.WORKER_FAIR_SHARE_MAX_USERS:
+            # 所有用户都在窗口内，无需轮转
+            self._user_cursors.pop(priority, None)
+        elif served:
+            self._user_cursors[priority] = max(served, key=user_ids.index)
+
+    def _spawn(
+        self, coro: Coroutine[Any, Any, None], job_id: Optional[str] = None
+    ) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if job_id is not None:
+            # 单个任务可被取消；微批中的任务共享一次执行，只丢弃其结果
+            self._job_tasks[job_id] = task
+            task.add_done_callback(lambda _: self._job_tasks.pop(job_id, None))
+
+    async def _watch_jobs(self, stop_event: asyncio.Event) -> None:
+        """
+        Per tick, one query for cancelled jobs among the held ones and one
+        UPDATE for the jobs whose progress changed. Every reaper interval,
+        the broker drops stale references (see ``JobBroker.trim``), and
+        every ``BLOB_GC_INTERVAL_SECONDS`` unreferenced blobs are deleted.
+        """
+        next_trim = next_blob_gc = time.monotonic()
+        while not stop_event.is_set():
+            await self._flush_progress()
+            await self._flush_component_stats()
+            if self.broker is not None and time.monotonic() >= next_trim:
+                await self._trim_broker()
+                next_trim = time.monotonic() + settings.WORKER_REAPER_INTERVAL_SECONDS
+            if settings.BLOB_GC_INTERVAL_SECONDS and time.monotonic() >= next_blob_gc:
+                await self._collect_blobs()
+                next_blob_gc = time.monotonic() + settings.BLOB_GC_INTERVAL_SECONDS
+            job_ids = self.leases.job_ids()
+            if job_ids:
+                try:
+                    async with session_maker() as db:
+                        cancelled = await crud.ai_workflow_job.get_cancelled_job_ids(
+                            db, job_ids=job_ids
+                        )
+                except Exception:
+                    logger.exception("Failed to check for cancelled jobs")
+                    cancelled = []
+                for job_id in cancelled:
+                    self._cancel(job_id)
+            try:
+                await asyncio.wait_for(
+                    stop_event.wait(), settings.WORKER_CANCEL_POLL_INTERVAL_SECONDS
+                )
+            except asyncio.TimeoutError:
+                pass
+        await self._flush_component_stats()
+
+    async def _trim_broker(self) -> None:
+        try:
+            trimmed = await self.broker.trim()
+        except Exception:
+            logger.exception("Failed to trim the job broker queue")
+            return
+        if trimmed:
+            logger.debug(
+                f"Dropped {trimmed} broker references to jobs no longer pending"
+            )
+
+    async def _collect_blobs(self) -> None:
+        store = get_blob_store()
+        if store is None:
+            return
+
+        async def keys_in_use() -> Set[str]:
+            async with session_maker() as db:
+                return await crud.ai_workflow_job.get_blob_keys(db)
+
+        try:
+            deleted = await store.collect_garbage(
+                keys_in_use, settings.BLOB_GC_MIN_AGE_SECONDS
+            )
+        except Exception:
+            logger.exception("Failed to delete unreferenced blobs")
+            return
+        if deleted:
+            logger.info(f"Deleted {deleted} blobs no job references")
+
+    async def _flush_progress(self) -> None:
+        progress = self.progress.collect()
+        if not progress:
+            return
+        try:
+            async with session_maker() as db:
+                await crud.ai_workflow_job.save_progress(
+                    db, worker_id=self.worker_id, progress=progress
+                )
+        except Exception:
+            logger.exception("Failed to save job progress")
+
+    async def _flush_component_stats(self) -> None:
+        stats = self.component_stats.collect()
+        if not stats:
+            return
+        try:
+            async with session_maker() as db:
+                await crud.ai_workflow_def.add_component_stats(db, stats=stats)
+        except Exception:
+            logger.exception("Failed to save component timings")
+
+    def _cancel(self, job_id: str) -> None:
+        """Abort a cancelled job and free its slot."""
+        logger.info(f"Job {job_id} was cancelled")
+        self.leases.release(job_id)
+        self.progress.discard(job_id)
+        task = self._job_tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+
+    @staticmethod
+    def _timeout(workflow_def: AIWorkflowDef, job: AIWorkflowJob) -> Optional[float]:
+        """Job timeout, else the definition's, else the global default."""
+        return (
+            job.timeout_seconds
+            or executor.definition_timeout(
+                workflow_def.hs_yaml_content, workflow_def.hs_graph_json
+            )
+            or settings.WORKER_JOB_TIMEOUT_SECONDS
+            or None
+        )
+
+    @staticmethod
+    async def _with_timeout(coro: Coroutine[Any, Any, Any], timeout: Optional[float]):
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Job timed out after {timeout:g}s") from None
+
+    async def _dispatch(self, jobs: List[AIWorkflowJob]) -> None:
+        """Start one task per job, or one per micro-batch of a definition."""
+        groups: Dict[str, List[AIWorkflowJob]] = defaultdict(list)
+        for job in jobs:
+            groups[job.ai_workflow_def_id].append(job)
+
+        try:
+            async with session_maker() as db:
+                workflow_defs = {
+                    workflow_def.id_str: workflow_def
+                    for workflow_def in await crud.ai_workflow_def.get_multi(
+                        db, ids=list(groups)
+                    )
+                    if not workflow_def.is_deleted_flag
+                }
+        except Exception as e:
+            logger.exception("Failed to load workflow definitions")
+            start = time.perf_counter()
+            for job in jobs:
+                self._spawn(self._fail(job, None, e, start))
+            return
+
+        for def_id, group in groups.items():
+            workflow_def = workflow_defs.get(def_id)
+            config = (
+                batching.batching_config(
+                    workflow_def.hs_yaml_content, workflow_def.hs_graph_json
+                )
+                if workflow_def
+                else None
+            )
+            if config:
+                self._spawn(self._execute_batch(workflow_def, group, config))
+            else:
+                for job in group:
+                    self._spawn(self._execute(job, workflow_def), job_id=job.id_str)
+
+    async def _execute(
+        self, job: AIWorkflowJob, workflow_def: Optional[AIWorkflowDef]
+    ) -> None:
+        """Run one claimed job and write back its outcome."""
+        start = time.perf_counter()
+        try:
+            if workflow_def is None:
+                raise LookupError(
+                    f"AI Workflow Definition {job.ai_workflow_def_id} not found"
+                )
+
+            data = await self._trigger_data(job)
+            if self.process_pool is not None:
+                run = self.process_pool.run(workflow_def, data)
+            else:
+                # 线程无法被中止：取消或超时后释放槽位，线程在pipeline返回后结束
+                run = asyncio.to_thread(
+                    self._run_pipeline, workflow_def, data, job.id_str
+                )
+            result_data_json, timings = await self._with_timeout(
+                run, self._timeout(workflow_def, job)
+            )
+        except Exception as e:
+            logger.exception(f"Job {job.id_str} failed")
+            await self._fail(job, workflow_def, e, start)
+            return
+        self.component_stats.record(workflow_def.id_str, timings)
+        await self._finish(
+            job, self._completed(result_data_json), start, timings=timings
+        )
+
+    async def _execute_batch(
+        self,
+        workflow_def: AIWorkflowDef,
+        jobs: List[AIWorkflowJob],
+        config: BatchingConfig,
+    ) -> None:
+        """Coalesce jobs of one definition for up to the window, then run them."""
+        if len(jobs) < config.max_size and config.window_ms:
+            await asyncio.sleep(config.window_ms / 1000)
+            try:
+                jobs += await self._claim_scheduled(
+                    config.max_size - len(jobs), ai_workflow_def_id=workflow_def.id_str
+                )
+            except Exception:
+                logger.exception("Failed to top up micro-batch")
+
+        start = time.perf_counter()
+        batch_jobs, datas = [], []
+        for job in jobs:
+            try:
+                datas.append(await self._trigger_data(job))
+                batch_jobs.append(job)
+            except Exception as e:
+                await self._fail(job, workflow_def, e, start)
+        if not batch_jobs:
+            return
+
+        self.batch_stats.record(len(batch_jobs))
+        timeouts = [self._timeout(workflow_def, job) for job in batch_jobs]
+        timeout = None if None in timeouts else max(timeouts)
+        try:
+            if self.process_pool is not None:
+                run = self.process_pool.run_batch(workflow_def, datas, config)
+            else:
+                run = asyncio.to_thread(self._run_batch, workflow_def, datas, config)
+            outcomes, timings = await self._with_timeout(run, timeout)
+        except Exception as e:
+            logger.exception(f"Batch of {len(batch_jobs)} jobs failed")
+            outcomes, timings = [e] * len(batch_jobs), None
+        # 批内任务共享一次执行，各自记录整批的组件耗时
+        self.component_stats.record(workflow_def.id_str, timings)
+
+        await asyncio.gather(
+            *(
+                (
+                    self._fail(job, workflow_def, outcome, start)
+                    if isinstance(outcome, Exception)
+                    else self._finish(
+                        job, self._completed(outcome), start, timings=timings
+                    )
+                )
+                for job, outcome in zip(batch_jobs, outcomes)
+            )
+        )
+
+    @staticmethod
+    async def _trigger_data(job: AIWorkflowJob) -> Dict[str, Any]:
+        return executor.load_trigger_data(
+            await load_payload(job.trigger_data_json, job.trigger_data_blob_str)
+        )
+
+    @staticmethod
+    async def _stored_result(result_data_json: str) -> Dict[str, Any]:
+        """Result columns, with a large result moved to the blob store."""
+        try:
+            return await store_payload("result_data", result_data_json)
+        except Exception:
+            logger.exception("Failed to store job result as a blob, keeping it inline")
+            return {
+                "result_data_json": result_data_json,
+                "result_data_blob_str": None,
+                "result_data_size_int": None,
+            }
+
+    @staticmethod
+    def _completed(result_data_json: str) -> Dict[str, Any]:
+        return {"status_str": JobStatus.COMPLETED, "result_data_json": result_data_json}
+
+    @staticmethod
+    def _failed(e: BaseException) -> Dict[str, Any]:
+        return {
+            "status_str": JobStatus.FAILED,
+            "error_message_text": executor.format_error(e)[:ERROR_MESSAGE_MAX_LENGTH],
+        }
+
+    async def _fail(
+        self,
+        job: AIWorkflowJob,
+        workflow_def: Optional[AIWorkflowDef],
+        e: BaseException,
+        start: float,
+    ) -> None:
+        """
+        Requeue a failed job after its backoff when the definition's retry
+        policy allows another attempt; a retryable failure without attempts
+        left goes to the dead-letter table, any other failure stays failed.
+        """
+        policy = (
+            executor.retry_policy(
+                workflow_def.hs_yaml_content,
+                workflow_def.hs_graph_json,
+                self.retry_policy,
+            )
+            if workflow_def
+            else self.retry_policy
+        )
+        if not policy.is_retryable(*executor.error_signature(e)):
+            await self._finish(job, self._failed(e), start)
+            return
+        if job.attempt_int >= policy.max_attempts:
+            logger.warning(
+                f"Job {job.id_str} failed {job.attempt_int} times, dead-lettering"
+            )
+            await self._finish(job, self._failed(e), start, dead_letter=True)
+            return
+
+        delay = policy.delay(job.attempt_int)
+        logger.info(
+            f"Retrying job {job.id_str} in {delay:.1f}s "
+            f"(attempt {job.attempt_int}/{policy.max_attempts})"
+        )
+        try:
+            async with session_maker() as db:
+                requeued = await crud.ai_workflow_job.retry_leased_job(
+                    db,
+                    job,
+                    worker_id=self.worker_id,
+                    not_before=datetime.utcnow() + timedelta(seconds=delay),
+                    error_message=self._failed(e)["error_message_text"],
+                )
+            if not requeued:
+                logger.warning(f"Lease on job {job.id_str} was lost, not retrying")
+        except Exception:
+            logger.exception(f"Failed to requeue job {job.id_str} for retry")
+        finally:
+            self.leases.release(job.id_str)
+            self.progress.discard(job.id_str)
+
+    async def _finish(
+        self,
+        job: AIWorkflowJob,
+        outcome: Dict[str, Any],
+        start: float,
+        dead_letter: bool = False,
+        timings: Optional[ComponentTimings] = None,
+    ) -> None:
+        """Write back a job's outcome and timing, then release its lease."""
+        if outcome.get("result_data_json") is not None:
+            outcome = {
+                **outcome,
+                **await self._stored_result(outcome["result_data_json"]),
+            }
+        values = AIWorkflowJobUpdate(
+            **outcome,
+            completed_at_time=datetime.utcnow(),
+            execution_time_seconds=time.perf_counter() - start,
+        ).model_dump(exclude_unset=True)
+        progress_json = self.progress.pop(job.id_str)
+        if progress_json is not None:
+            values["progress_json"] = progress_json
+        if timings:
+            values["timings_json"] = timings.to_json()
+        try:
+            written = await self.outcomes.write(
+                job.id_str, values, dead_letter=dead_letter
+            )
+            if not written:
+                logger.warning(
+                    f"Lease on job {job.id_str} was lost, discarding its result"
+                )
+        except Exception:
+            logger.exception(f"Failed to write back result of job {job.id_str}")
+        finally:
+            self.leases.release(job.id_str)
+            self.progress.discard(job.id_str)
+
+    def _cached_pipeline(self, workflow_def: AIWorkflowDef):
+        return self.pipeline_cache.get(
+            workflow_def.id_str,
+            workflow_def.hs_yaml_content,
+            workflow_def.hs_graph_json,
+        )
+
+    def _run_pipeline(
+        self, workflow_def: AIWorkflowDef, data: dict, job_id: str
+    ) -> Tuple[str, ComponentTimings]:
+        """
+        Thread-pool target: run the cached pipeline, return its JSON result
+        and component timings.
+        """
+        pipeline = self._cached_pipeline(workflow_def)
+        timings = ComponentTimings()
+        with self.progress.track(job_id, total=len(pipeline.graph.nodes)):
+            with timings.collect():
+                result = executor.run_pipeline(pipeline, data)
+        return executor.dump_result(result), timings
+
+    def _run_batch(
+        self, workflow_def: AIWorkflowDef, datas: List[dict], config: BatchingConfig
+    ) -> Tuple[List[batching.JobOutcome], ComponentTimings]:
+        """Thread-pool target: run a micro-batch on the cached pipeline."""
+        pipeline = self._cached_pipeline(workflow_def)
+        timings = ComponentTimings()
+        with timings.collect():
+            outcomes = batching.run_batch(pipeline, datas, config)
+        return outcomes, timings
@@ -0,0 +1,101 @@
+"""
+Shared fixtures. The settings and the database engine are created when
+``src`` is first imported, so the environment is set up here, before any
+test module imports it: every test gets the same SQLite file, recreated
+empty by the ``database`` fixture.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+_tmp_dir = Path(tempfile.mkdtemp(prefix="ai-workflow-tests-"))
+DATABASE_PATH = _tmp_dir / "test.db"
+
+os.environ["DATABASE_URI"] = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+# 生产环境下应用启动时不自动建表，由fixture负责
+os.environ["ENVIRONMENT"] = "production"
+os.environ["BLOB_STORE_PATH"] = str(_tmp_dir / "blobs")
+os.environ["HAYSTACK_TELEMETRY_ENABLED"] = "False"
+
+import pytest  # noqa: E402
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+
+from src.api_server.api.deps import (  # noqa: E402
+    async_session_maker,
+    create_tables,
+    engine,
+)
+from src.api_server import crud  # noqa: E402
+from src.api_server.libs.job_events import job_event_hub  # noqa: E402
+from src.api_server.main import app  # noqa: E402
+from src.api_server.models.ai_workflow_def import (  # noqa: E402
+    AIWorkflowDef,
+    AIWorkflowDefCreate,
+)
+
+# 最简单的可执行pipeline：PromptBuilder按模板渲染触发数据
+PIPELINE_YAML = """\
+components:
+  prompt:
+    type: haystack.components.builders.prompt_builder.PromptBuilder
+    init_parameters:
+      template: "Hello {{ name }}"
+      required_variables: ["name"]
+connections: []
+"""
+
+
+@pytest.fixture
+async def empty_database():
+    """A database file with no tables, disposed after the test."""
+    await engine.dispose()
+    DATABASE_PATH.unlink(missing_ok=True)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+async def database(empty_database):
+    """A database with all tables created, as ``create_tables()`` does."""
+    await create_tables()
+    yield empty_database
+
+
+@pytest.fixture
+async def db(database):
+    session = async_session_maker()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+@pytest.fixture
+async def client(database):
+    """An API client; the app's lifespan (worker, migrations) is not run."""
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as http_client:
+        yield http_client
+
+
+@pytest.fixture
+async def fast_job_event_hub(monkeypatch):
+    """The app's job event hub, polling the change feed every 20 ms."""
+    monkeypatch.setattr(job_event_hub, "poll_interval", 0.02)
+    yield job_event_hub
+    await job_event_hub.close()
+
+
+@pytest.fixture
+async def workflow_def(db) -> AIWorkflowDef:
+    return await crud.ai_workflow_def.create_workflow_def(
+        db,
+        AIWorkflowDefCreate(
+            name_str="greeting",
+            description_text="Greets the name in the trigger data",
+            hs_yaml_content=PIPELINE_YAML,
+        ),
+        user_id="user_id",
+    )
@@ -0,0 +1,171 @@
+import json
+from collections import OrderedDict
+
+import pytest
+from sqlmodel import select
+
+from src.api_server import crud
+from src.api_server.config import settings
+from src.api_server.libs import admission
+from src.api_server.libs.admission import AdmissionController, admission_controller
+from src.api_server.migrations import run_backlog_recount
+from src.api_server.models.ai_workflow_job import (
+    GLOBAL_BACKLOG_KEY,
+    GLOBAL_BACKLOG_SHARDS,
+    AIWorkflowJob,
+    AIWorkflowJobBacklog,
+    JobStatus,
+    global_backlog_key,
+)
+
+JOBS_URL = "/api/v1/ai_workflow_job"
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """Enable admission control with the given global and per-user limits."""
+
+    def enable(max_pending: int = 0, max_pending_per_user: int = 0) -> None:
+        for name, value in (
+            ("ADMISSION_MAX_PENDING_JOBS", max_pending),
+            ("ADMISSION_MAX_PENDING_JOBS_PER_USER", max_pending_per_user),
+        ):
+            monkeypatch.setattr(settings, name, value)
+        monkeypatch.setattr(admission_controller, "max_pending", max_pending)
+        monkeypatch.setattr(
+            admission_controller, "max_pending_per_user", max_pending_per_user
+        )
+        monkeypatch.setattr(admission_controller, "_rates", OrderedDict())
+
+    return enable
+
+
+async def _submit(client, workflow_def, count: int = 1):
+    job = {
+        "ai_workflow_def_id": workflow_def.id_str,
+        "job_name_str": "job",
+        "trigger_data_json": '{"name": "a"}',
+    }
+    if count == 1:
+        return await client.post(JOBS_URL, json=job)
+    return await client.post(f"{JOBS_URL}/batch", json=[job] * count)
+
+
+async def _pending(db, user_id: str = "user_id"):
+    backlog = await crud.ai_workflow_job.get_backlog(db, user_id=user_id)
+    return {key: counters.pending_int for key, counters in backlog.items()}
+
+
+async def test_submissions_over_the_limit_are_rejected(
+    client, db, workflow_def, limits
+):
+    limits(max_pending=3)
+
+    assert (await _submit(client, workflow_def, count=2)).status_code == 200
+    assert (await _submit(client, workflow_def)).status_code == 200
+    response = await _submit(client, workflow_def)
+
+    assert response.status_code == 429
+    # 尚无认领速率样本时给出上限
+    assert response.headers["Retry-After"] == str(
+        settings.ADMISSION_RETRY_AFTER_MAX_SECONDS
+    )
+    assert response.json()["error_code"] == "TOO_MANY_REQUESTS"
+    assert await _pending(db) == {GLOBAL_BACKLOG_KEY: 3, "user_id": 3}
+
+
+async def test_batches_are_admitted_as_a_whole(client, workflow_def, limits):
+    limits(max_pending_per_user=4)
+
+    # 尚无计数行时同样受上限约束
+    assert (await _submit(client, workflow_def, count=5)).status_code == 429
+
+    assert (await _submit(client, workflow_def, count=3)).status_code == 200
+    assert (await _submit(client, workflow_def, count=2)).status_code == 429
+    assert (await _submit(client, workflow_def)).status_code == 200
+
+
+async def test_streamed_batches_are_admitted_chunk_by_chunk(
+    client, workflow_def, limits, monkeypatch
+):
+    limits(max_pending_per_user=4)
+    monkeypatch.setattr(settings, "JOB_BATCH_INSERT_ROWS", 2)
+    job = {
+        "ai_workflow_def_id": workflow_def.id_str,
+        "job_name_str": "job",
+        "trigger_data_json": '{"name": "a"}',
+    }
+
+    response = await client.post(
+        f"{JOBS_URL}/batch",
+        content="\n".join([json.dumps(job)] * 6),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    # 已写入的批次随事务回滚
+    assert (await client.get(JOBS_URL)).json()["result"] == []
+    assert (await _submit(client, workflow_def, count=4)).status_code == 200
+
+
+async def test_claims_and_cancellations_drain_the_backlog(
+    client, db, workflow_def, limits
+):
+    limits(max_pending=10)
+    await _submit(client, workflow_def, count=4)
+
+    await crud.ai_workflow_job.claim_pending_jobs(db, limit=2, worker_id="worker-1")
+    job = (
+        await db.exec(
+            select(AIWorkflowJob).where(AIWorkflowJob.status_str == JobStatus.PENDING)
+        )
+    ).first()
+    await crud.ai_workflow_job.cancel_workflow_job(db, job.id_str)
+
+    assert await _pending(db) == {GLOBAL_BACKLOG_KEY: 1, "user_id": 1}
+    backlog = await crud.ai_workflow_job.get_backlog(db, user_id="user_id")
+    assert backlog[GLOBAL_BACKLOG_KEY].claimed_total_int == 2
+
+
+async def test_global_counter_is_sharded_by_user(db, workflow_def, limits):
+    limits(max_pending=100)
+    users = [f"user-{i}" for i in range(40)]
+    for user in users:
+        await crud.ai_workflow_job._adjust_backlog(db, {user: 1})
+    await db.commit()
+
+    rows = {
+        row.user_id_str: row.pending_int
+        for row in await db.exec(select(AIWorkflowJobBacklog))
+    }
+    shards = {key: n for key, n in rows.items() if key.startswith(GLOBAL_BACKLOG_KEY)}
+    assert 1 < len(shards) <= GLOBAL_BACKLOG_SHARDS
+    assert shards[global_backlog_key(users[0])] >= 1
+    assert (await _pending(db, users[0]))[GLOBAL_BACKLOG_KEY] == len(users)
+
+
+async def test_recount_matches_the_maintained_counters(
+    client, db, database, workflow_def
+):
+    await _submit(client, workflow_def, count=5)
+    await crud.ai_workflow_job.claim_pending_jobs(db, limit=1, worker_id="worker-1")
+    maintained = await _pending(db)
+    # 计数被绕过API的修改打乱
+    await crud.ai_workflow_job._adjust_backlog(db, {"user_id": 7, "other": 2})
+    await db.commit()
+
+    assert await run_backlog_recount(database) == 4
+
+    db.expire_all()
+    assert await _pending(db) == maintained == {GLOBAL_BACKLOG_KEY: 4, "user_id": 4}
+    assert (await _pending(db, "other"))["other"] == 0
+
+
+async def test_counters_are_maintained_without_admission(client, db, workflow_def):
+    assert not admission_controller.enabled
+
+    assert (await _submit(client, workflow_def, count=3)).status_code == 200
+    await crud.ai_workflow_job.claim_pending_jobs(db, limit=1, worker_id="worker-1")
+
+    assert await _pending(db) == {GLOBAL_BACKLOG_KEY: 2, "user_id": 2}
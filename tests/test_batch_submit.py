@@ -0,0 +1,100 @@
+import json
+
+from sqlmodel import select
+
+from src.api_server.api.api_v1.ai_workflow_job import NDJSON_MEDIA_TYPE
+from src.api_server.api.deps import session_maker
+from src.api_server.config import settings
+from src.api_server.models.ai_workflow_job import AIWorkflowJob
+
+
+def _jobs(workflow_def, count: int, **fields) -> list:
+    return [
+        {
+            "ai_workflow_def_id": workflow_def.id_str,
+            "job_name_str": f"job-{i}",
+            "trigger_data_json": json.dumps({"prompt": {"name": str(i)}}),
+            **fields,
+        }
+        for i in range(count)
+    ]
+
+
+def _ndjson(jobs: list) -> bytes:
+    return "\n".join(json.dumps(job) for job in jobs).encode() + b"\n"
+
+
+async def _stored_jobs() -> list:
+    async with session_maker() as db:
+        return list(await db.exec(select(AIWorkflowJob)))
+
+
+async def test_jobs_are_created_in_one_request(client, workflow_def, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_BATCH_INSERT_ROWS", 2)
+
+    response = await client.post(
+        "/api/v1/ai_workflow_job/batch", json=_jobs(workflow_def, 5)
+    )
+
+    assert response.status_code == 200
+    ids = response.json()["result"]
+    stored = {job.id_str: job for job in await _stored_jobs()}
+    assert sorted(ids) == sorted(stored) and len(ids) == 5
+    # 返回的ID与提交顺序一致
+    assert [stored[id_str].job_name_str for id_str in ids] == [
+        f"job-{i}" for i in range(5)
+    ]
+
+
+async def test_ndjson_is_streamed_in(client, workflow_def, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_BATCH_INSERT_ROWS", 2)
+
+    response = await client.post(
+        "/api/v1/ai_workflow_job/batch",
+        content=_ndjson(_jobs(workflow_def, 5)),
+        headers={"Content-Type": NDJSON_MEDIA_TYPE},
+    )
+
+    assert response.status_code == 200
+    assert len(response.json()["result"]) == 5
+    assert len(await _stored_jobs()) == 5
+
+
+async def test_unknown_definitions_create_nothing(client, workflow_def, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_BATCH_INSERT_ROWS", 2)
+    jobs = _jobs(workflow_def, 4) + _jobs(workflow_def, 1, ai_workflow_def_id="nope")
+
+    response = await client.post(
+        "/api/v1/ai_workflow_job/batch",
+        content=_ndjson(jobs),
+        headers={"Content-Type": NDJSON_MEDIA_TYPE},
+    )
+
+    assert response.status_code == 404
+    assert "nope" in response.json()["message"]
+    assert await _stored_jobs() == []
+
+
+async def test_invalid_batches_are_rejected(client, workflow_def, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_BATCH_MAX_JOBS", 3)
+    invalid = _jobs(workflow_def, 2)
+    del invalid[1]["job_name_str"]
+
+    for kwargs, message in (
+        ({"json": {"jobs": []}}, "Expected a JSON array"),
+        ({"content": b"[", "headers": {}}, "Invalid JSON body"),
+        ({"json": _jobs(workflow_def, 4)}, "At most 3 jobs"),
+        ({"json": invalid}, "Invalid job #2"),
+        (
+            {
+                "content": _ndjson(_jobs(workflow_def, 4)),
+                "headers": {"Content-Type": NDJSON_MEDIA_TYPE},
+            },
+            "At most 3 jobs",
+        ),
+    ):
+        response = await client.post("/api/v1/ai_workflow_job/batch", **kwargs)
+        assert response.status_code == 422, message
+        assert message in response.json()["message"]
+
+    assert await _stored_jobs() == []
@@ -0,0 +1,173 @@
+import asyncio
+import json
+
+import pytest
+from haystack import Pipeline
+from haystack.core.errors import PipelineRuntimeError
+from sqlmodel import select
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.libs.hs_pipeline import BatchingConfig
+from src.api_server.models.ai_workflow_def import AIWorkflowDefCreate
+from src.api_server.models.ai_workflow_job import (
+    AIWorkflowJob,
+    AIWorkflowJobCreate,
+    JobStatus,
+)
+from src.worker import batching
+from src.worker.batching import NotBatchableError
+from src.worker.worker import Worker
+from tests.conftest import PIPELINE_YAML
+from tests.utils import wait_until
+
+CLEANER = "haystack.components.preprocessors.text_cleaner.TextCleaner"
+
+# 输入输出均为列表，可将多个任务拼接为一次运行
+CLEANER_YAML = f"""\
+components:
+  cleaner:
+    type: {CLEANER}
+    init_parameters:
+      convert_to_lowercase: true
+connections: []
+metadata:
+  batching:
+    max_size: 8
+    window_ms: 50
+    mode: concat
+"""
+
+CONCAT = BatchingConfig(max_size=8, mode="concat")
+
+
+@pytest.fixture(scope="module")
+def cleaner():
+    return Pipeline.loads(CLEANER_YAML)
+
+
+@pytest.fixture(scope="module")
+def prompt_builder():
+    return Pipeline.loads(PIPELINE_YAML)
+
+
+def test_list_inputs_are_concatenated_and_outputs_split(cleaner):
+    datas = [{"cleaner": {"texts": ["A", "B"]}}, {"cleaner": {"texts": ["C"]}}]
+
+    merged, sizes = batching.merge_inputs(cleaner, datas)
+
+    assert merged == {"cleaner": {"texts": ["A", "B", "C"]}}
+    assert sizes == [2, 1]
+    result = {"cleaner": {"texts": ["a", "b", "c"], "meta": "shared"}}
+    assert batching.split_outputs(result, sizes) == [
+        {"cleaner": {"texts": ["a", "b"], "meta": "shared"}},
+        {"cleaner": {"texts": ["c"], "meta": "shared"}},
+    ]
+
+
+@pytest.mark.parametrize(
+    "datas",
+    [
+        [{"cleaner": {"texts": ["a"]}}, {"cleaner": {"texts": ["b"], "x": 1}}],
+        [{"cleaner": {"texts": ["a"], "x": 1}}, {"cleaner": {"texts": ["b"], "x": 2}}],
+        [{"cleaner": {"texts": "a"}}, {"cleaner": {"texts": "a"}}],
+    ],
+)
+def test_unmergeable_inputs_are_rejected(cleaner, datas):
+    with pytest.raises(NotBatchableError):
+        batching.merge_inputs(cleaner, datas)
+
+
+def test_outputs_of_the_wrong_length_cannot_be_split():
+    with pytest.raises(NotBatchableError):
+        batching.split_outputs({"cleaner": {"texts": ["a"]}}, [1, 1])
+
+
+def test_concat_batch_runs_once_for_all_jobs(cleaner, monkeypatch):
+    runs = []
+    run = cleaner.run
+    monkeypatch.setattr(cleaner, "run", lambda data: runs.append(data) or run(data))
+
+    outcomes = batching.run_batch(
+        cleaner,
+        [{"cleaner": {"texts": ["A"]}}, {"cleaner": {"texts": ["B", "C"]}}],
+        CONCAT,
+    )
+
+    assert len(runs) == 1
+    assert [json.loads(outcome) for outcome in outcomes] == [
+        {"cleaner": {"texts": ["a"]}},
+        {"cleaner": {"texts": ["b", "c"]}},
+    ]
+
+
+def test_unbatchable_jobs_fall_back_to_sequential_runs(prompt_builder):
+    outcomes = batching.run_batch(
+        prompt_builder,
+        [{"prompt": {"name": "a"}}, {"prompt": {}}, {"prompt": {"name": "c"}}],
+        CONCAT,
+    )
+
+    assert json.loads(outcomes[0]) == {"prompt": {"prompt": "Hello a"}}
+    # 单个任务失败不影响批内其他任务
+    assert isinstance(outcomes[1], (ValueError, PipelineRuntimeError))
+    assert json.loads(outcomes[2]) == {"prompt": {"prompt": "Hello c"}}
+
+
+def test_batching_config_is_read_from_metadata():
+    assert batching.batching_config(CLEANER_YAML) == BatchingConfig(
+        max_size=8, window_ms=50, mode="concat"
+    )
+    assert batching.batching_config(PIPELINE_YAML) is None
+
+
+async def _completed(count: int) -> bool:
+    async with session_maker() as db:
+        jobs = list(
+            await db.exec(
+                select(AIWorkflowJob).where(
+                    AIWorkflowJob.status_str == JobStatus.COMPLETED
+                )
+            )
+        )
+    return len(jobs) == count
+
+
+async def test_worker_coalesces_jobs_of_a_definition(db):
+    workflow_def = await crud.ai_workflow_def.create_workflow_def(
+        db,
+        AIWorkflowDefCreate(name_str="cleaner", hs_yaml_content=CLEANER_YAML),
+        user_id="user_id",
+    )
+    await crud.ai_workflow_job.create_workflow_jobs(
+        db,
+        batches=_single_batch(workflow_def.id_str, 6),
+        user_id="user_id",
+    )
+    worker = Worker(concurrency=1, poll_interval=0.05, worker_id="worker-1")
+
+    run = asyncio.create_task(worker.run())
+    try:
+        await wait_until(lambda: _completed(6))
+    finally:
+        worker.stop()
+        await run
+
+    assert worker.batch_stats.snapshot()["max_size"] > 1
+    async with session_maker() as session:
+        jobs = list(await session.exec(select(AIWorkflowJob)))
+    for job in jobs:
+        texts = json.loads(job.trigger_data_json)["cleaner"]["texts"]
+        result = json.loads(job.result_data_json)
+        assert result["cleaner"]["texts"] == [text.lower() for text in texts]
+
+
+async def _single_batch(def_id: str, count: int):
+    yield [
+        AIWorkflowJobCreate(
+            ai_workflow_def_id=def_id,
+            job_name_str=f"job-{i}",
+            trigger_data_json=json.dumps({"cleaner": {"texts": [f"Text {i}"]}}),
+        )
+        for i in range(count)
+    ]
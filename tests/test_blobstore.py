@@ -0,0 +1,172 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+from sqlmodel import select
+
+from src import blobstore
+from src.api_server.api.deps import session_maker
+from src.api_server.config import settings
+from src.api_server.models.ai_workflow_job import AIWorkflowJob, JobStatus
+from src.blobstore import BlobNotFoundError, load_payload, store_payload
+from src.blobstore.base import decompress
+from src.blobstore.local import LocalBlobStore
+from src.worker.worker import Worker
+from tests.utils import wait_until
+
+THRESHOLD = 1024
+
+
+@pytest.fixture
+def blob_store(tmp_path, monkeypatch):
+    """A local blob store under ``tmp_path`` offloading payloads over 1 KB."""
+    monkeypatch.setattr(settings, "BLOB_STORE_BACKEND", "local")
+    monkeypatch.setattr(settings, "BLOB_STORE_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "BLOB_OFFLOAD_THRESHOLD_BYTES", THRESHOLD)
+    blobstore.get_blob_store.cache_clear()
+    yield blobstore.get_blob_store()
+    blobstore.get_blob_store.cache_clear()
+
+
+def _files(root) -> list:
+    return [name for _, _, names in os.walk(root) for name in names]
+
+
+async def test_blobs_are_stored_once_per_content(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    data = b"payload " * 1000
+
+    key = await store.put(data)
+
+    assert await store.put(data) == key
+    assert await store.get(key) == data
+    assert _files(tmp_path) == [key]
+    assert len(await store.read(key)) < len(data)
+    for missing in (key[::-1], "../etc", "abc"):
+        with pytest.raises(BlobNotFoundError):
+            await store.get(missing)
+
+
+async def test_blobs_of_either_codec_are_read(tmp_path):
+    pytest.importorskip("zstandard")
+    data = b"payload " * 1000
+
+    zlib_key = await LocalBlobStore(str(tmp_path / "zlib")).put(data)
+    zstd_store = LocalBlobStore(str(tmp_path / "zstd"), codec="zstd")
+    zstd_key = await zstd_store.put(data)
+
+    assert zlib_key == zstd_key
+    assert decompress(await zstd_store.read(zstd_key)) == data
+
+
+async def test_only_large_payloads_are_offloaded(blob_store):
+    small = json.dumps({"name": "a"})
+    large = json.dumps({"name": "a" * THRESHOLD})
+
+    assert await store_payload("trigger_data", small) == {
+        "trigger_data_json": small,
+        "trigger_data_blob_str": None,
+        "trigger_data_size_int": None,
+    }
+    values = await store_payload("trigger_data", large)
+    assert values["trigger_data_json"] == ""
+    assert values["trigger_data_size_int"] == len(large)
+    assert await load_payload("", values["trigger_data_blob_str"]) == large
+
+
+async def _completed() -> bool:
+    async with session_maker() as db:
+        jobs = list(await db.exec(select(AIWorkflowJob)))
+    return bool(jobs) and all(job.status_str == JobStatus.COMPLETED for job in jobs)
+
+
+async def test_large_payloads_round_trip_through_a_job(
+    client, workflow_def, blob_store
+):
+    name = "x" * (2 * THRESHOLD)
+    response = await client.post(
+        "/api/v1/ai_workflow_job",
+        json={
+            "ai_workflow_def_id": workflow_def.id_str,
+            "job_name_str": "large",
+            "trigger_data_json": json.dumps({"prompt": {"name": name}}),
+        },
+    )
+    job_id = response.json()["result"]["id_str"]
+    worker = Worker(concurrency=1, poll_interval=0.05, worker_id="worker-1")
+
+    run = asyncio.create_task(worker.run())
+    try:
+        await wait_until(_completed)
+    finally:
+        worker.stop()
+        await run
+
+    async with session_maker() as db:
+        row = await db.get(AIWorkflowJob, job_id)
+    assert (row.trigger_data_json, row.result_data_json) == ("", "")
+    assert row.trigger_data_blob_str and row.result_data_blob_str
+
+    # 列表只返回Blob键与大小，单个任务读回载荷
+    response = await client.get("/api/v1/ai_workflow_job")
+    (listed,) = response.json()["result"]
+    assert listed["result_data_json"] == ""
+    assert listed["result_data_size_int"] > 2 * THRESHOLD
+    response = await client.get(f"/api/v1/ai_workflow_job/{job_id}")
+    job = response.json()["result"]
+    assert json.loads(job["trigger_data_json"]) == {"prompt": {"name": name}}
+    assert json.loads(job["result_data_json"]) == {
+        "prompt": {"prompt": f"Hello {name}"}
+    }
+
+
+async def test_missing_blob_store_is_reported(
+    client, workflow_def, blob_store, monkeypatch
+):
+    response = await client.post(
+        "/api/v1/ai_workflow_job",
+        json={
+            "ai_workflow_def_id": workflow_def.id_str,
+            "job_name_str": "large",
+            "trigger_data_json": json.dumps({"name": "x" * (2 * THRESHOLD)}),
+        },
+    )
+    job_id = response.json()["result"]["id_str"]
+    monkeypatch.setattr(settings, "BLOB_STORE_BACKEND", "none")
+    blobstore.get_blob_store.cache_clear()
+
+    response = await client.get(f"/api/v1/ai_workflow_job/{job_id}")
+
+    assert response.status_code == 500
+    assert "BLOB_STORE_BACKEND=none" in response.json()["message"]
+
+
+async def test_unreferenced_blobs_are_collected(
+    client, workflow_def, blob_store, monkeypatch
+):
+    response = await client.post(
+        "/api/v1/ai_workflow_job",
+        json={
+            "ai_workflow_def_id": workflow_def.id_str,
+            "job_name_str": "large",
+            "trigger_data_json": json.dumps({"name": "x" * (2 * THRESHOLD)}),
+        },
+    )
+    async with session_maker() as db:
+        row = await db.get(AIWorkflowJob, response.json()["result"]["id_str"])
+    orphan = await blob_store.put(b"orphan")
+    reused = await blob_store.put(b"reused")
+    an_hour_ago = time.time() - 3600
+    for key in (row.trigger_data_blob_str, orphan, reused):
+        os.utime(blob_store.path(key), (an_hour_ago, an_hour_ago))
+    # 重新存入的blob视为刚被使用，即使还没有任务引用它
+    await blob_store.put(b"reused")
+    monkeypatch.setattr(settings, "BLOB_GC_MIN_AGE_SECONDS", 60)
+
+    await Worker(worker_id="worker-1")._collect_blobs()
+
+    assert sorted(_files(blob_store.root)) == sorted(
+        [row.trigger_data_blob_str, reused]
+    )
@@ -0,0 +1,109 @@
+import time
+
+import pytest
+from haystack import Pipeline, component
+from haystack.core.errors import PipelineRuntimeError
+
+from src.worker import executor
+from src.worker.branches import BranchPipeline
+
+
+@component
+class Tag:
+    """Prefixes the text with its tag, after sleeping ``delay`` seconds."""
+
+    def __init__(self, tag: str, delay: float = 0.0) -> None:
+        self.tag = tag
+        self.delay = delay
+
+    @component.output_types(value=str)
+    def run(self, text: str):
+        time.sleep(self.delay)
+        return {"value": f"{self.tag}:{text}"}
+
+
+@component
+class Fail:
+    """Raises on every run."""
+
+    @component.output_types(value=str)
+    def run(self, text: str):
+        raise ValueError("boom")
+
+
+def _component(type_name: str, **init_parameters) -> str:
+    return f"    type: {type_name}\n    init_parameters: {init_parameters or {}}\n"
+
+
+def diamond_yaml(
+    left: str = _component("tests.test_branches.Tag", tag="left", delay=0.3),
+    right: str = _component("tests.test_branches.Tag", tag="right"),
+    branch_concurrency: int = 4,
+) -> str:
+    """
+    source -> left, right -> join. The left branch comes first in sequential
+    order but, being slower, finishes last when run concurrently.
+    """
+    return (
+        "components:\n"
+        "  source:\n"
+        + _component("tests.test_branches.Tag", tag="source")
+        + "  left:\n"
+        + left
+        + "  right:\n"
+        + right
+        + "  join:\n"
+        + _component("haystack.components.joiners.string_joiner.StringJoiner")
+        + "connections:\n"
+        "  - sender: source.value\n"
+        "    receiver: left.text\n"
+        "  - sender: source.value\n"
+        "    receiver: right.text\n"
+        "  - sender: left.value\n"
+        "    receiver: join.strings\n"
+        "  - sender: right.value\n"
+        "    receiver: join.strings\n"
+        f"metadata:\n  branch_concurrency: {branch_concurrency}\n"
+    )
+
+
+def _run(hs_yaml_content: str, expected_type: type):
+    pipeline = executor.build_pipeline(hs_yaml_content)
+    assert type(pipeline) is expected_type
+    return executor.run_pipeline(pipeline, {"source": {"text": "x"}})
+
+
+def test_diamond_runs_branches_concurrently():
+    concurrent_yaml = diamond_yaml(
+        right=_component("tests.test_branches.Tag", tag="right", delay=0.3)
+    )
+
+    started = time.perf_counter()
+    _run(concurrent_yaml, BranchPipeline)
+
+    assert time.perf_counter() - started < 0.55
+
+
+def test_concurrent_run_matches_sequential_run():
+    sequential = _run(diamond_yaml(branch_concurrency=1), Pipeline)
+    concurrent = _run(diamond_yaml(), BranchPipeline)
+
+    # 变长输入按顺序执行时的次序排列，而非分支完成的次序
+    assert sequential == {"join": {"strings": ["left:source:x", "right:source:x"]}}
+    assert concurrent == sequential
+
+
+@pytest.mark.parametrize(
+    "branch_concurrency, expected_type", [(1, Pipeline), (4, BranchPipeline)]
+)
+def test_component_errors_are_wrapped(branch_concurrency, expected_type):
+    hs_yaml_content = diamond_yaml(
+        right=_component("tests.test_branches.Fail"),
+        branch_concurrency=branch_concurrency,
+    )
+
+    with pytest.raises(PipelineRuntimeError) as error:
+        _run(hs_yaml_content, expected_type)
+
+    assert error.value.component_name == "right"
+    assert isinstance(error.value.__cause__, ValueError)
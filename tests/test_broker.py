@@ -0,0 +1,203 @@
+import asyncio
+
+import pytest
+from sqlmodel import func, select
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.models.ai_workflow_job import AIWorkflowJobQueueItem
+from src.broker import sql
+from src.broker.base import JobRef
+from src.broker.memory import MemoryBroker
+from src.broker.redis import RedisBroker
+from src.broker.resp import RespConnection
+from src.broker.resp_server import RespServer
+from src.broker.sql import SQLBroker
+from src.worker.worker import Worker
+from tests.utils import create_jobs, wait_until
+
+KEY = "ai_workflow:jobs"
+
+
+def _refs(count: int, prefix: str = "job"):
+    return [
+        JobRef(id_str=f"{prefix}-{i}", ai_workflow_def_id="def") for i in range(count)
+    ]
+
+
+async def _queue_length() -> int:
+    async with session_maker() as db:
+        return await db.scalar(select(func.count()).select_from(AIWorkflowJobQueueItem))
+
+
+@pytest.fixture
+async def resp_server():
+    """A RESP stand-in on a free port; yields (state, port)."""
+    state = RespServer()
+    server = await asyncio.start_server(state.handle, "127.0.0.1", 0)
+    async with server:
+        yield state, server.sockets[0].getsockname()[1]
+
+
+@pytest.fixture
+def sql_broker(database):
+    return SQLBroker(session_maker)
+
+
+@pytest.fixture
+async def redis_broker(resp_server):
+    _, port = resp_server
+    broker = RedisBroker(f"redis://127.0.0.1:{port}/0", KEY)
+    yield broker
+    await broker.close()
+
+
+@pytest.fixture(params=["memory", "sql", "redis"])
+def broker(request):
+    if request.param == "memory":
+        return MemoryBroker()
+    return request.getfixturevalue(f"{request.param}_broker")
+
+
+async def test_refs_are_delivered_once_in_order(broker):
+    refs = _refs(5)
+
+    await broker.enqueue(refs)
+
+    assert await broker.dequeue(3, timeout=1) == refs[:3]
+    assert await broker.dequeue(10, timeout=1) == refs[3:]
+    assert await broker.dequeue(10, timeout=0.05) == []
+
+
+async def test_waiting_dequeue_is_woken_by_enqueue(broker):
+    waiting = asyncio.create_task(broker.dequeue(10, timeout=5))
+    await asyncio.sleep(0.05)
+
+    await broker.enqueue(_refs(1))
+
+    assert await asyncio.wait_for(waiting, 1) == _refs(1)
+
+
+async def test_sql_broker_backs_off_to_the_timeout_while_idle(sql_broker, monkeypatch):
+    takes = []
+    take = sql_broker._take
+
+    async def counting_take(max_items):
+        takes.append(max_items)
+        return await take(max_items)
+
+    monkeypatch.setattr(sql_broker, "_take", counting_take)
+    monkeypatch.setattr(sql, "MIN_RETRY_INTERVAL", 0.01)
+
+    # 空闲时间隔逐步增长到超时，其后每次dequeue只查询一次队列
+    for _ in range(10):
+        await sql_broker.dequeue(10, timeout=0.05)
+    takes.clear()
+    for _ in range(3):
+        assert await sql_broker.dequeue(10, timeout=0.05) == []
+    assert len(takes) == 3
+
+    # 取到引用后间隔复位
+    await sql_broker.enqueue(_refs(1))
+    assert await sql_broker.dequeue(10, timeout=0.05) == _refs(1)
+    assert sql_broker._retry_interval == sql.MIN_RETRY_INTERVAL
+
+
+async def test_sql_broker_trims_refs_to_jobs_no_longer_pending(
+    sql_broker, db, workflow_def
+):
+    jobs = await create_jobs(db, workflow_def, 3)
+    await sql_broker.enqueue(
+        [
+            JobRef(id_str=job.id_str, ai_workflow_def_id=workflow_def.id_str)
+            for job in jobs
+        ]
+        + _refs(1, prefix="deleted")
+    )
+    await crud.ai_workflow_job.claim_pending_jobs(db, limit=1, worker_id="worker-1")
+    await crud.ai_workflow_job.cancel_workflow_job(db, jobs[1].id_str)
+
+    assert await sql_broker.trim() == 3
+
+    assert await _queue_length() == 1
+    (ref,) = await sql_broker.dequeue(10, timeout=0.05)
+    assert ref.id_str == jobs[2].id_str
+
+
+@pytest.fixture(params=["memory", "redis"])
+def capped_broker(request):
+    if request.param == "memory":
+        return MemoryBroker()
+    return request.getfixturevalue("redis_broker")
+
+
+async def test_capped_brokers_trim_the_oldest_refs(capped_broker):
+    capped_broker.max_refs = 3
+    await capped_broker.enqueue(_refs(5))
+
+    assert await capped_broker.trim() == 2
+    assert await capped_broker.trim() == 0
+
+    assert await capped_broker.dequeue(10, timeout=0.05) == _refs(5)[2:]
+
+
+async def test_cancelled_caller_keeps_an_idle_redis_connection(resp_server):
+    _, port = resp_server
+    connection = RespConnection("127.0.0.1", port)
+    assert await connection.execute("PING") == "PONG"
+    writer = connection._writer
+
+    # 等待锁时被取消：命令尚未发送，连接保持
+    blocking = asyncio.create_task(connection.execute("BRPOP", KEY, 0.1))
+    queued = asyncio.create_task(connection.execute("PING"))
+    await asyncio.sleep(0.02)
+    queued.cancel()
+    assert await blocking is None
+    assert connection._writer is writer
+
+    # 等待回复时被取消：回复仍会到达，连接必须丢弃
+    blocking = asyncio.create_task(connection.execute("BRPOP", KEY, 5))
+    await asyncio.sleep(0.02)
+    blocking.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await blocking
+    assert connection._writer is None
+    assert await connection.execute("PING") == "PONG"
+    await connection.close()
+
+
+async def test_idle_worker_does_not_cancel_redis_dequeue(redis_broker):
+    worker = Worker(poll_interval=0.05, worker_id="worker-1", broker=redis_broker)
+    worker._stop_event = asyncio.Event()
+    await worker._idle()
+    connection = redis_broker._pop._writer
+    assert connection is not None
+
+    for _ in range(5):
+        await worker._idle()
+
+    assert redis_broker._pop._writer is connection
+
+
+async def test_disconnected_brpop_client_does_not_take_values(resp_server):
+    state, port = resp_server
+    consumer = RespConnection("127.0.0.1", port)
+    producer = RespConnection("127.0.0.1", port)
+
+    blocking = asyncio.create_task(consumer.execute("BRPOP", KEY, 0))
+
+    async def waiting() -> bool:
+        return bool(state._waiters[KEY.encode()])
+
+    await wait_until(waiting)
+    blocking.cancel()
+    await asyncio.gather(blocking, return_exceptions=True)
+    await consumer.close()
+
+    async def dropped() -> bool:
+        return not state._waiters[KEY.encode()]
+
+    await wait_until(dropped)
+    await producer.execute("LPUSH", KEY, "ref")
+    assert await producer.execute("BRPOP", KEY, 1) == [KEY.encode(), b"ref"]
+    await producer.close()
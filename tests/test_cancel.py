@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.config import settings
+from src.api_server.models.ai_workflow_def import AIWorkflowDefCreate
+from src.api_server.models.ai_workflow_job import AIWorkflowJob, JobStatus
+from src.worker.worker import Worker
+from tests.utils import create_jobs, wait_until
+
+# 运行较慢且不重试的pipeline
+SLOW_YAML = """\
+components:
+  slow:
+    type: tests.test_branches.Tag
+    init_parameters:
+      tag: slow
+      delay: 1.5
+connections: []
+metadata:
+  retry:
+    max_attempts: 1
+"""
+
+
+async def _slow_job(db, timeout_seconds=None) -> AIWorkflowJob:
+    workflow_def = await crud.ai_workflow_def.create_workflow_def(
+        db,
+        AIWorkflowDefCreate(name_str="slow", hs_yaml_content=SLOW_YAML),
+        user_id="user_id",
+    )
+    job = AIWorkflowJob(
+        user_id_str="user_id",
+        ai_workflow_def_id=workflow_def.id_str,
+        job_name_str="slow",
+        trigger_data_json=json.dumps({"slow": {"text": "x"}}),
+        timeout_seconds=timeout_seconds,
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+async def _status(job_id: str):
+    async with session_maker() as db:
+        job = await crud.ai_workflow_job.get(db, id=job_id)
+        return job.status_str if job else None
+
+
+async def test_cancel_endpoint(client, db, workflow_def):
+    (job,) = await create_jobs(db, workflow_def, 1)
+
+    response = await client.post(f"/api/v1/ai_workflow_job/{job.id_str}/cancel")
+    assert response.status_code == 200
+    assert response.json()["result"]["status_str"] == JobStatus.CANCELLED
+
+    response = await client.post(f"/api/v1/ai_workflow_job/{job.id_str}/cancel")
+    assert response.status_code == 409
+    response = await client.post("/api/v1/ai_workflow_job/missing/cancel")
+    assert response.status_code == 404
+
+    # 已取消的任务不会被认领
+    assert (
+        await crud.ai_workflow_job.claim_pending_jobs(
+            db, limit=10, worker_id="worker-1", lease_seconds=60
+        )
+        == []
+    )
+
+
+async def test_cancelled_running_job_frees_its_slot(db, workflow_def, monkeypatch):
+    monkeypatch.setattr(settings, "WORKER_CANCEL_POLL_INTERVAL_SECONDS", 0.05)
+    slow = await _slow_job(db)
+    worker = Worker(concurrency=1, poll_interval=0.05, worker_id="worker-1")
+
+    run = asyncio.create_task(worker.run())
+    try:
+        await wait_until(lambda: _is(slow.id_str, JobStatus.RUNNING))
+        await crud.ai_workflow_job.cancel_workflow_job(db, slow.id_str)
+        (quick,) = await create_jobs(db, workflow_def, 1)
+        # 取消后槽位立即释放，无需等待运行中的pipeline返回
+        await wait_until(lambda: _is(quick.id_str, JobStatus.COMPLETED), timeout=1)
+    finally:
+        worker.stop()
+        await run
+
+    assert await _status(slow.id_str) == JobStatus.CANCELLED
+
+
+async def test_job_over_its_timeout_fails(db):
+    job = await _slow_job(db, timeout_seconds=0.2)
+    worker = Worker(concurrency=1, poll_interval=0.05, worker_id="worker-1")
+
+    run = asyncio.create_task(worker.run())
+    try:
+        await wait_until(lambda: _dead_lettered(job.id_str))
+    finally:
+        worker.stop()
+        await run
+
+    async with session_maker() as session:
+        dead_letter = await crud.ai_workflow_job.get_dead_letter(session, job.id_str)
+    assert dead_letter.status_str == JobStatus.FAILED
+    assert "timed out after 0.2s" in dead_letter.error_message_text
+    assert dead_letter.execution_time_seconds < 1.5
+
+
+async def _is(job_id: str, status: JobStatus) -> bool:
+    return await _status(job_id) == status
+
+
+async def _dead_lettered(job_id: str) -> bool:
+    async with session_maker() as db:
+        return await crud.ai_workflow_job.get_dead_letter(db, job_id) is not None
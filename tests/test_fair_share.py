@@ -0,0 +1,107 @@
+from src.api_server import crud
+from src.api_server.config import settings
+from src.api_server.models.ai_workflow_def import AIWorkflowDefCreate
+from src.worker.scheduler import FairShareScheduler
+from src.worker.worker import Worker
+from tests.conftest import PIPELINE_YAML
+from tests.utils import create_jobs
+
+USERS = [f"user-{i}" for i in range(5)]
+
+
+async def _create_user_jobs(db, workflow_def, count: int = 1, **fields) -> None:
+    for user_id in USERS:
+        await create_jobs(db, workflow_def, count, user_id=user_id, **fields)
+
+
+def test_slots_follow_the_weights():
+    scheduler = FairShareScheduler({"heavy": 3.0})
+
+    assert scheduler.allocate(["heavy", "light"], 8) == {"heavy": 6, "light": 2}
+
+
+def test_returning_users_do_not_bank_credit():
+    scheduler = FairShareScheduler()
+    scheduler.allocate(["busy", "idle"], 2)
+    scheduler.record("idle", 1)
+    # idle没有待执行任务期间，busy被服务了更多任务
+    scheduler.allocate(["busy"], 4)
+    scheduler.record("busy", 5)
+
+    assert scheduler.allocate(["busy", "idle"], 2) == {"busy": 1, "idle": 1}
+
+
+def test_ties_go_to_the_user_listed_first():
+    # 用户列表按轮转顺序给出，不按用户ID
+    assert FairShareScheduler().allocate(["b", "a"], 1) == {"b": 1}
+
+
+async def test_pending_users_ignore_deleted_jobs(db, workflow_def):
+    await create_jobs(db, workflow_def, 1, user_id="deleted", is_deleted_flag=True)
+    await create_jobs(
+        db,
+        workflow_def,
+        1,
+        user_id="urgent-deleted",
+        priority_int=9,
+        is_deleted_flag=True,
+    )
+    await create_jobs(db, workflow_def, 1, user_id="live")
+
+    assert await crud.ai_workflow_job.get_top_pending_priority(db) == 5
+    assert await crud.ai_workflow_job.get_pending_user_ids(
+        db, priority=5, max_users=10
+    ) == ["live"]
+
+
+async def test_pending_users_wrap_around_after_a_cursor(db, workflow_def):
+    await _create_user_jobs(db, workflow_def)
+
+    async def window(after):
+        return await crud.ai_workflow_job.get_pending_user_ids(
+            db, priority=5, max_users=2, after=after
+        )
+
+    assert await window(None) == USERS[:2]
+    assert await window(USERS[1]) == USERS[2:4]
+    assert await window(USERS[3]) == [USERS[4], USERS[0]]
+    assert await crud.ai_workflow_job.get_pending_user_ids(
+        db, priority=5, max_users=10, after=USERS[2]
+    ) == [*USERS[3:], *USERS[:3]]
+
+
+async def test_claims_rotate_through_users_beyond_the_window(
+    db, workflow_def, monkeypatch
+):
+    monkeypatch.setattr(settings, "WORKER_FAIR_SHARE_MAX_USERS", 2)
+    await _create_user_jobs(db, workflow_def, count=3)
+    worker = Worker(worker_id="worker-1")
+
+    served = []
+    for _ in range(5):
+        served += [job.user_id_str for job in await worker._claim_scheduled(limit=1)]
+
+    assert served == USERS
+
+
+async def test_batch_top_ups_keep_priority_and_fair_share(db, workflow_def):
+    other_def = await crud.ai_workflow_def.create_workflow_def(
+        db,
+        AIWorkflowDefCreate(name_str="other", hs_yaml_content=PIPELINE_YAML),
+        user_id="user_id",
+    )
+    await _create_user_jobs(db, workflow_def, count=3)
+    (urgent,) = await create_jobs(db, other_def, 1, priority_int=9)
+    worker = Worker(worker_id="worker-1")
+
+    # 更高优先级的任务等待时，不为低优先级的微批补充任务
+    assert (
+        await worker._claim_scheduled(limit=5, ai_workflow_def_id=workflow_def.id_str)
+        == []
+    )
+    await crud.ai_workflow_job.cancel_workflow_job(db, urgent.id_str)
+
+    claimed = await worker._claim_scheduled(
+        limit=5, ai_workflow_def_id=workflow_def.id_str
+    )
+    assert sorted(job.user_id_str for job in claimed) == USERS
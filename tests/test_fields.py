@@ -0,0 +1,76 @@
+from tests.utils import create_jobs
+
+
+async def test_jobs_return_only_the_selected_fields(client, db, workflow_def):
+    (job,) = await create_jobs(db, workflow_def, 1)
+
+    response = await client.get(
+        "/api/v1/ai_workflow_job",
+        params={"fields": "job_name_str, status_str", "order_by": "created_at_time"},
+    )
+
+    assert response.status_code == 200
+    # id_str与排序字段总会返回，载荷字段不会出现
+    assert response.json()["result"] == [
+        {
+            "id_str": job.id_str,
+            "created_at_time": job.created_at_time.isoformat(),
+            "job_name_str": job.job_name_str,
+            "status_str": job.status_str,
+        }
+    ]
+
+
+async def test_selected_fields_page_by_cursor(client, db, workflow_def):
+    await create_jobs(db, workflow_def, 5)
+    ids, cursor = [], None
+    while True:
+        response = await client.get(
+            "/api/v1/ai_workflow_job",
+            params={
+                "fields": "status_str",
+                "limit": 2,
+                **({"cursor": cursor} if cursor else {}),
+            },
+        )
+        body = response.json()
+        ids += [job["id_str"] for job in body["result"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(set(ids)) == 5
+
+
+async def test_without_fields_whole_rows_are_returned(client, db, workflow_def):
+    await create_jobs(db, workflow_def, 1)
+
+    response = await client.get("/api/v1/ai_workflow_job")
+
+    (job,) = response.json()["result"]
+    assert "trigger_data_json" in job and "ai_workflow_def_id" in job
+
+
+async def test_unknown_fields_are_rejected(client, workflow_def):
+    response = await client.get(
+        "/api/v1/ai_workflow_job", params={"fields": "id_str,password"}
+    )
+
+    assert response.status_code == 422
+    assert "Invalid fields" in response.json()["message"]
+    assert "password" in response.json()["message"]
+
+
+async def test_definitions_return_only_the_selected_fields(client, workflow_def):
+    response = await client.get(
+        "/api/v1/ai_workflow_def",
+        params={"fields": "name_str", "order_by": "name_str"},
+    )
+
+    assert response.json()["result"] == [
+        {"id_str": workflow_def.id_str, "name_str": workflow_def.name_str}
+    ]
+    response = await client.get(
+        "/api/v1/ai_workflow_def", params={"fields": "name_str,secret"}
+    )
+    assert response.status_code == 422
@@ -0,0 +1,163 @@
+import pytest
+from sqlalchemy import text
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.libs.fulltext import SEARCH_MAX_TERMS, search_terms
+from src.api_server.migrations import run_migrations
+from src.api_server.models.ai_workflow_def import (
+    AIWorkflowDefCreate,
+    AIWorkflowDefUpdate,
+)
+from tests.conftest import PIPELINE_YAML
+from tests.test_migrations import _create_baseline_schema
+from tests.utils import create_jobs
+
+DEFINITIONS = [
+    ("Document retrieval", "Retrieves documents for RAG", None),
+    ("Summarizer", "Summarizes retrieved documents", "nlp"),
+    ("Translator", "Translates text", "nlp, retrieval"),
+    ("Greeting", "Says hello", None),
+]
+
+
+@pytest.fixture
+async def definitions(db):
+    return [
+        await crud.ai_workflow_def.create_workflow_def(
+            db,
+            AIWorkflowDefCreate(
+                name_str=name,
+                description_text=description,
+                tags_str=tags_str,
+                hs_yaml_content=PIPELINE_YAML,
+            ),
+            user_id="user_id",
+        )
+        for name, description, tags_str in DEFINITIONS
+    ]
+
+
+async def _search(db, search: str, **params):
+    workflow_defs, _ = await crud.ai_workflow_def.get_workflow_def(
+        db, user_id="user_id", search=search, **params
+    )
+    return sorted(workflow_def.name_str for workflow_def in workflow_defs)
+
+
+def test_search_syntax_is_dropped():
+    assert search_terms('NEAR("rag" OR retr*) -x') == ["near", "rag", "or", "retr", "x"]
+    assert search_terms("a a A") == ["a"]
+    assert len(search_terms(" ".join(f"w{i}" for i in range(40)))) == SEARCH_MAX_TERMS
+
+
+async def test_every_keyword_matches_a_word_prefix(db, definitions):
+    # 名称、描述与标签均被索引
+    assert await _search(db, "retriev") == [
+        "Document retrieval",
+        "Summarizer",
+        "Translator",
+    ]
+    assert await _search(db, "retriev documents") == [
+        "Document retrieval",
+        "Summarizer",
+    ]
+    assert await _search(db, "retrieval nlp") == ["Translator"]
+    assert await _search(db, "etrieval") == []
+    assert await _search(db, '") OR *') == []
+
+
+async def test_relevance_order_pages_by_cursor(db, definitions):
+    best_first, _ = await crud.ai_workflow_def.get_workflow_def(
+        db, user_id="user_id", search="documents", order_by="relevance"
+    )
+    names, cursor = [], None
+    while True:
+        page, cursor = await crud.ai_workflow_def.get_workflow_def(
+            db,
+            user_id="user_id",
+            search="documents",
+            order_by="relevance",
+            limit=1,
+            cursor=cursor,
+        )
+        names += [workflow_def.name_str for workflow_def in page]
+        if cursor is None:
+            break
+
+    assert names == [workflow_def.name_str for workflow_def in best_first]
+    assert sorted(names) == ["Document retrieval", "Summarizer"]
+
+
+async def test_definitions_are_searched_over_http(client, definitions):
+    response = await client.get(
+        "/api/v1/ai_workflow_def",
+        params={"search": "retriev documents", "order_by": "relevance", "limit": 1},
+    )
+    body = response.json()
+    response = await client.get(
+        "/api/v1/ai_workflow_def",
+        params={
+            "search": "retriev documents",
+            "order_by": "relevance",
+            "cursor": body["next_cursor"],
+        },
+    )
+
+    names = [
+        workflow_def["name_str"]
+        for workflow_def in body["result"] + response.json()["result"]
+    ]
+    assert sorted(names) == ["Document retrieval", "Summarizer"]
+    assert response.json()["next_cursor"] is None
+
+
+async def test_index_follows_updates_and_deletes(db, definitions):
+    _, summarizer, _, greeting = definitions
+
+    await crud.ai_workflow_def.update_workflow_def(
+        db, greeting, AIWorkflowDefUpdate(description_text="Retrieves greetings")
+    )
+    await crud.ai_workflow_def.remove(db, id=summarizer.id_str)
+
+    assert await _search(db, "retriev") == [
+        "Document retrieval",
+        "Greeting",
+        "Translator",
+    ]
+
+
+async def test_index_survives_renumbered_rowids(db, definitions):
+    _, _, translator, _ = definitions
+    # VACUUM可能这样重新编号没有INTEGER PRIMARY KEY的表的rowid
+    await db.exec(text("UPDATE ai_workflow_def SET rowid = rowid + 100"))
+    await db.commit()
+
+    await crud.ai_workflow_def.update_workflow_def(
+        db, translator, AIWorkflowDefUpdate(tags_str=None)
+    )
+
+    assert await _search(db, "retriev") == ["Document retrieval", "Summarizer"]
+    assert await _search(db, "hello") == ["Greeting"]
+
+
+async def test_jobs_are_searched_by_name(client, db, workflow_def):
+    await create_jobs(db, workflow_def, 1, job_name_str="nightly report")
+    await create_jobs(db, workflow_def, 1, job_name_str="hourly sync")
+
+    response = await client.get(
+        "/api/v1/ai_workflow_job", params={"search": "report night"}
+    )
+
+    assert [job["job_name_str"] for job in response.json()["result"]] == [
+        "nightly report"
+    ]
+
+
+async def test_migration_indexes_existing_definitions(empty_database):
+    await _create_baseline_schema(empty_database)
+
+    await run_migrations(empty_database)
+
+    async with session_maker() as db:
+        assert await _search(db, "greet") == ["greeting"]
@@ -0,0 +1,127 @@
+import json
+
+import pytest
+
+from src.api_server.libs import hs_pipeline
+from src.api_server.libs.hs_pipeline import InvalidPipelineError
+from tests.conftest import PIPELINE_YAML
+
+PROMPT_BUILDER = "haystack.components.builders.prompt_builder.PromptBuilder"
+
+# 两个PromptBuilder串联，前者的prompt作为后者的变量
+CHAIN_YAML = f"""\
+components:
+  second:
+    type: {PROMPT_BUILDER}
+    init_parameters:
+      template: "Re: {{{{ first }}}}"
+  first:
+    type: {PROMPT_BUILDER}
+    init_parameters:
+      template: "Hello {{{{ name }}}}"
+connections:
+  - sender: first.prompt
+    receiver: second.first
+"""
+
+
+def test_compiled_pipeline_records_hash_and_order():
+    compiled = hs_pipeline.compile_pipeline(CHAIN_YAML)
+
+    assert compiled["yaml_hash"] == hs_pipeline.content_hash(CHAIN_YAML)
+    assert compiled["topological_order"] == ["first", "second"]
+    assert set(compiled["pipeline"]["components"]) == {"first", "second"}
+    # 编译结果可序列化后原样读回
+    stored = json.dumps(compiled)
+    assert hs_pipeline.load_compiled(stored, CHAIN_YAML) == compiled
+
+
+def test_compiled_pipeline_keeps_init_parameters():
+    # TextCleaner的to_dict()不含convert_to_lowercase，编译结果应保留定义原样的参数
+    hs_yaml_content = (
+        "components:\n"
+        "  cleaner:\n"
+        "    type: haystack.components.preprocessors.text_cleaner.TextCleaner\n"
+        "    init_parameters:\n"
+        "      convert_to_lowercase: true\n"
+        "connections: []\n"
+    )
+
+    compiled = hs_pipeline.compile_pipeline(hs_yaml_content)
+
+    cleaner = compiled["pipeline"]["components"]["cleaner"]
+    assert cleaner["init_parameters"] == {"convert_to_lowercase": True}
+
+
+def test_stale_compiled_pipelines_are_ignored():
+    compiled = hs_pipeline.compile_pipeline(PIPELINE_YAML)
+
+    assert hs_pipeline.load_compiled(json.dumps(compiled), CHAIN_YAML) is None
+    compiled["format_version"] += 1
+    assert hs_pipeline.load_compiled(json.dumps(compiled), PIPELINE_YAML) is None
+    assert hs_pipeline.load_compiled("not json", PIPELINE_YAML) is None
+    assert hs_pipeline.load_compiled(None, PIPELINE_YAML) is None
+
+
+def test_loops_are_listed_together():
+    data = {
+        "components": {name: {"type": PROMPT_BUILDER} for name in "abcd"},
+        "connections": [
+            {"sender": "a.out", "receiver": "c.in"},
+            {"sender": "c.out", "receiver": "b.in"},
+            {"sender": "b.out", "receiver": "c.in"},
+            {"sender": "b.out", "receiver": "d.in"},
+        ],
+    }
+
+    assert hs_pipeline._topological_order(data) == ["a", "b", "c", "d"]
+
+
+@pytest.mark.parametrize(
+    "hs_yaml_content",
+    [
+        "components: [",
+        "- a list",
+        "components: {}",
+        "components:\n  a:\n    init_parameters: {}",
+        f"components:\n  a:\n    type: {PROMPT_BUILDER}\n    init_parameters: []",
+        PIPELINE_YAML.replace("connections: []", "connections: {}"),
+        PIPELINE_YAML.replace(
+            "connections: []",
+            "connections:\n  - sender: prompt.prompt\n    receiver: missing.x",
+        ),
+        PIPELINE_YAML + "metadata:\n  batching:\n    max_size: 0\n",
+        PIPELINE_YAML + "metadata:\n  retry:\n    jitter: 2\n",
+    ],
+)
+def test_invalid_definitions_are_rejected(hs_yaml_content):
+    with pytest.raises(InvalidPipelineError):
+        hs_pipeline.compile_pipeline(hs_yaml_content, instantiate=False)
+
+
+def test_instantiation_checks_components():
+    unknown = PIPELINE_YAML.replace(PROMPT_BUILDER, "haystack.components.Missing")
+    bad_parameters = PIPELINE_YAML.replace("template:", "no_such_parameter:")
+
+    for hs_yaml_content in (unknown, bad_parameters):
+        # 只检查结构时可以通过
+        hs_pipeline.compile_pipeline(hs_yaml_content, instantiate=False)
+        with pytest.raises(InvalidPipelineError):
+            hs_pipeline.compile_pipeline(hs_yaml_content)
+
+
+async def test_definitions_are_compiled_when_written(client):
+    response = await client.post(
+        "/api/v1/ai_workflow_def",
+        json={"name_str": "chain", "hs_yaml_content": CHAIN_YAML},
+    )
+    assert response.status_code == 200
+    created = response.json()["result"]
+    assert created["hs_yaml_hash_str"] == hs_pipeline.content_hash(CHAIN_YAML)
+
+    response = await client.post(
+        "/api/v1/ai_workflow_def",
+        json={"name_str": "broken", "hs_yaml_content": "components: 3"},
+    )
+    assert response.status_code == 422
+    assert response.json()["error_code"] == "VALIDATION_ERROR"
@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import pytest
+
+from src.api_server import crud
+from src.api_server.libs import job_events
+from src.api_server.libs.job_events import JobEventFilter, JobEventHub
+from src.api_server.models.ai_workflow_job import JobStatus
+from tests.utils import create_jobs
+
+
+@pytest.fixture
+async def hub():
+    hub = JobEventHub(poll_interval=0.02, lookback_seconds=5)
+    yield hub
+    await hub.close()
+
+
+async def _next(subscription, timeout: float = 2.0):
+    return await asyncio.wait_for(subscription.queue.get(), timeout)
+
+
+def _sse_events(body: str):
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def test_changes_reach_matching_subscribers_once(db, workflow_def, hub):
+    first, _ = await create_jobs(db, workflow_def, 2)
+    mine = hub.subscribe(JobEventFilter(job_ids=frozenset([first.id_str])))
+    cancelled = hub.subscribe(JobEventFilter(statuses=frozenset([JobStatus.CANCELLED])))
+
+    assert (await _next(mine)).status_str == JobStatus.PENDING
+    await crud.ai_workflow_job.cancel_workflow_job(db, first.id_str)
+
+    event = await _next(mine)
+    assert (event.id_str, event.status_str) == (first.id_str, JobStatus.CANCELLED)
+    assert (await _next(cancelled)).id_str == first.id_str
+    # 回看窗口内重复读取的变更不会再次推送
+    await asyncio.sleep(0.2)
+    assert mine.queue.empty() and cancelled.queue.empty()
+
+
+async def test_progress_events_go_to_progress_subscribers(db, workflow_def, hub):
+    await create_jobs(db, workflow_def, 1)
+    (job,) = await crud.ai_workflow_job.claim_pending_jobs(
+        db, limit=1, worker_id="worker-1", lease_seconds=60
+    )
+    with_progress = hub.subscribe(JobEventFilter(progress=True))
+    status_only = hub.subscribe(JobEventFilter())
+    assert (await _next(with_progress)).status_str == JobStatus.RUNNING
+    assert (await _next(status_only)).status_str == JobStatus.RUNNING
+
+    await crud.ai_workflow_job.save_progress(
+        db, worker_id="worker-1", progress={job.id_str: '{"prompt": "done"}'}
+    )
+
+    event = await _next(with_progress)
+    assert event.event == "progress"
+    assert event.to_dict()["progress"] == {"prompt": "done"}
+    await asyncio.sleep(0.2)
+    assert status_only.queue.empty()
+
+
+async def test_job_stream_ends_at_a_terminal_status(
+    client, db, workflow_def, fast_job_event_hub
+):
+    (job,) = await create_jobs(db, workflow_def, 1)
+
+    async def cancel_later():
+        await asyncio.sleep(0.2)
+        await crud.ai_workflow_job.cancel_workflow_job(db, job.id_str)
+
+    cancelling = asyncio.create_task(cancel_later())
+    response = await client.get(f"/api/v1/ai_workflow_job/{job.id_str}/events")
+    await cancelling
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert [
+        (event, data["status_str"]) for event, data in _sse_events(response.text)
+    ] == [("status", JobStatus.PENDING), ("status", JobStatus.CANCELLED)]
+
+
+async def test_stream_of_a_finished_job_is_its_snapshot(client, db, workflow_def):
+    (job,) = await create_jobs(db, workflow_def, 1, status_str=JobStatus.COMPLETED)
+
+    response = await client.get(f"/api/v1/ai_workflow_job/{job.id_str}/events")
+
+    assert [data["status_str"] for _, data in _sse_events(response.text)] == [
+        JobStatus.COMPLETED
+    ]
+    response = await client.get("/api/v1/ai_workflow_job/missing/events")
+    assert response.status_code == 404
+
+
+async def test_changes_made_while_idle_are_not_replayed(db, workflow_def):
+    hub = JobEventHub(poll_interval=0.02, lookback_seconds=0.1)
+    try:
+        hub.unsubscribe(hub.subscribe(JobEventFilter()))
+        await hub._task
+        (idle,) = await create_jobs(db, workflow_def, 1)
+        await asyncio.sleep(0.3)
+
+        subscription = hub.subscribe(JobEventFilter())
+        (fresh,) = await create_jobs(db, workflow_def, 1)
+
+        assert (await _next(subscription)).id_str == fresh.id_str
+        await asyncio.sleep(0.2)
+        assert subscription.queue.empty()
+        assert idle.id_str not in hub._last_seen
+    finally:
+        await hub.close()
+
+
+async def test_a_backlog_of_changes_is_read_without_waiting(
+    db, workflow_def, monkeypatch
+):
+    monkeypatch.setattr(job_events, "CHANGE_FEED_BATCH_SIZE", 2)
+    jobs = await create_jobs(db, workflow_def, 5)
+    hub = JobEventHub(poll_interval=60, lookback_seconds=5)
+    try:
+        subscription = hub.subscribe(JobEventFilter())
+
+        events = [await _next(subscription) for _ in jobs]
+
+        assert {event.id_str for event in events} == {job.id_str for job in jobs}
+    finally:
+        await hub.close()
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.config import settings
+from src.api_server.models.ai_workflow_job import JobStatus
+from tests.utils import create_jobs
+
+
+async def _finish_later(job_id: str, dead_letter: bool = False):
+    await asyncio.sleep(0.2)
+    async with session_maker() as db:
+        await crud.ai_workflow_job.finish_leased_jobs(
+            db,
+            worker_id="worker-1",
+            outcomes={
+                job_id: {
+                    "status_str": (
+                        JobStatus.FAILED if dead_letter else JobStatus.COMPLETED
+                    ),
+                    "result_data_json": '{"ok": true}',
+                }
+            },
+            dead_letter=[job_id] if dead_letter else (),
+        )
+
+
+async def _claimed_job(db, workflow_def):
+    await create_jobs(db, workflow_def, 1)
+    (job,) = await crud.ai_workflow_job.claim_pending_jobs(
+        db, limit=1, worker_id="worker-1", lease_seconds=60
+    )
+    return job
+
+
+async def _get(client, job_id: str, wait: float):
+    started = time.perf_counter()
+    response = await client.get(
+        f"/api/v1/ai_workflow_job/{job_id}", params={"wait": wait}
+    )
+    return response, time.perf_counter() - started
+
+
+async def test_wait_returns_once_the_job_finishes(
+    client, db, workflow_def, fast_job_event_hub
+):
+    job = await _claimed_job(db, workflow_def)
+
+    finishing = asyncio.create_task(_finish_later(job.id_str))
+    response, elapsed = await _get(client, job.id_str, wait=5)
+    await finishing
+
+    assert response.status_code == 200
+    result = response.json()["result"]
+    assert result["status_str"] == JobStatus.COMPLETED
+    assert result["result_data_json"] == '{"ok": true}'
+    assert elapsed < 2
+
+
+async def test_wait_times_out_with_the_current_status(
+    client, db, workflow_def, fast_job_event_hub
+):
+    job = await _claimed_job(db, workflow_def)
+
+    response, elapsed = await _get(client, job.id_str, wait=0.3)
+
+    assert response.json()["result"]["status_str"] == JobStatus.RUNNING
+    assert elapsed >= 0.3
+
+
+async def test_wait_follows_a_job_into_the_dead_letter_table(
+    client, db, workflow_def, fast_job_event_hub
+):
+    job = await _claimed_job(db, workflow_def)
+
+    finishing = asyncio.create_task(_finish_later(job.id_str, dead_letter=True))
+    response, _ = await _get(client, job.id_str, wait=5)
+    await finishing
+
+    assert response.status_code == 200
+    assert response.json()["result"]["status_str"] == JobStatus.FAILED
+
+
+async def test_finished_jobs_and_bad_waits_return_at_once(client, db, workflow_def):
+    (job,) = await create_jobs(db, workflow_def, 1, status_str=JobStatus.COMPLETED)
+
+    response, elapsed = await _get(client, job.id_str, wait=5)
+    assert response.json()["result"]["status_str"] == JobStatus.COMPLETED
+    assert elapsed < 1
+
+    response, _ = await _get(client, job.id_str, wait=settings.JOB_WAIT_MAX_SECONDS + 1)
+    assert response.status_code == 422
+    response, _ = await _get(client, "missing", wait=1)
+    assert response.status_code == 404
@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+from sqlmodel import select
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.config import Settings, settings
+from src.api_server.libs.hs_pipeline import RetryPolicy
+from src.api_server.models.ai_workflow_def import AIWorkflowDefCreate
+from src.api_server.models.ai_workflow_job import AIWorkflowJob, JobStatus
+from src.worker.lease import LeaseKeeper
+from src.worker.worker import Worker
+from tests.conftest import PIPELINE_YAML
+from tests.utils import create_jobs, wait_until
+
+
+async def _claim(worker_id: str, limit: int, lease_seconds: float = 60):
+    async with session_maker() as db:
+        return await crud.ai_workflow_job.claim_pending_jobs(
+            db, limit=limit, worker_id=worker_id, lease_seconds=lease_seconds
+        )
+
+
+async def _jobs():
+    async with session_maker() as db:
+        return {job.id_str: job for job in await db.exec(select(AIWorkflowJob))}
+
+
+async def _reap(max_attempts: int = 3):
+    async with session_maker() as db:
+        return await crud.ai_workflow_job.reap_expired_leases(
+            db, max_attempts=max_attempts
+        )
+
+
+async def test_renewal_only_extends_the_workers_own_leases(db, workflow_def):
+    await create_jobs(db, workflow_def, 3)
+    (mine,) = await _claim("worker-1", 1, lease_seconds=1)
+    (theirs,) = await _claim("worker-2", 1, lease_seconds=1)
+    (cancelled,) = await _claim("worker-1", 1, lease_seconds=1)
+    await crud.ai_workflow_job.cancel_workflow_job(db, cancelled.id_str)
+
+    renewed = await crud.ai_workflow_job.renew_leases(
+        db,
+        worker_id="worker-1",
+        job_ids=[mine.id_str, theirs.id_str, cancelled.id_str],
+        lease_seconds=60,
+    )
+
+    assert renewed == 1
+    jobs = await _jobs()
+    assert jobs[mine.id_str].lease_expires_at_time > mine.lease_expires_at_time
+    assert jobs[theirs.id_str].lease_expires_at_time == theirs.lease_expires_at_time
+
+
+async def test_expired_leases_are_requeued_until_attempts_run_out(db, workflow_def):
+    fresh, exhausted, alive = await create_jobs(db, workflow_def, 3)
+    async with session_maker() as session:
+        job = await session.get(AIWorkflowJob, exhausted.id_str)
+        job.attempt_int = 2
+        session.add(job)
+        await session.commit()
+    await _claim("dead-worker", 2, lease_seconds=0.01)
+    await _claim("live-worker", 1)
+    await asyncio.sleep(0.05)
+
+    assert await _reap(max_attempts=3) == (1, 1)
+
+    jobs = await _jobs()
+    assert jobs[fresh.id_str].status_str == JobStatus.PENDING
+    assert jobs[fresh.id_str].worker_id_str is None
+    # 重试次数用尽的任务失败并移入死信表
+    assert exhausted.id_str not in jobs
+    dead_letter = await crud.ai_workflow_job.get_dead_letter(db, exhausted.id_str)
+    assert dead_letter.status_str == JobStatus.FAILED
+    assert "Lease expired" in dead_letter.error_message_text
+    assert jobs[alive.id_str].status_str == JobStatus.RUNNING
+    # 已回收的任务不会被再次回收
+    assert await _reap(max_attempts=3) == (0, 0)
+
+
+async def test_heartbeats_keep_held_jobs_from_being_reaped(db, workflow_def):
+    await create_jobs(db, workflow_def, 1)
+    (job,) = await _claim("worker-1", 1, lease_seconds=0.3)
+    keeper = LeaseKeeper(
+        worker_id="worker-1",
+        lease_seconds=0.3,
+        heartbeat_interval=0.1,
+        reaper_interval=60,
+        retry_policy=RetryPolicy(max_attempts=3),
+    )
+    keeper.hold(job.id_str)
+    stop_event = asyncio.Event()
+    run = asyncio.create_task(keeper.run(stop_event))
+
+    await asyncio.sleep(0.6)
+    assert await _reap() == (0, 0)
+
+    stop_event.set()
+    await run
+    await asyncio.sleep(0.4)
+    assert await _reap() == (1, 0)
+
+
+async def test_reaper_follows_each_definitions_retry_policy(db, workflow_def):
+    patient_def = await crud.ai_workflow_def.create_workflow_def(
+        db,
+        AIWorkflowDefCreate(
+            name_str="patient",
+            hs_yaml_content=PIPELINE_YAML
+            + "metadata:\n  retry:\n    max_attempts: 5\n",
+        ),
+        user_id="user_id",
+    )
+    (default_job,) = await create_jobs(db, workflow_def, 1, attempt_int=2)
+    (patient_job,) = await create_jobs(db, patient_def, 1, attempt_int=2)
+    await _claim("dead-worker", 2, lease_seconds=0.01)
+    await asyncio.sleep(0.05)
+    keeper = LeaseKeeper(
+        worker_id="worker-1",
+        lease_seconds=60,
+        heartbeat_interval=1,
+        reaper_interval=60,
+        retry_policy=RetryPolicy(max_attempts=3),
+    )
+
+    await keeper.reap()
+
+    jobs = await _jobs()
+    assert default_job.id_str not in jobs
+    assert jobs[patient_job.id_str].status_str == JobStatus.PENDING
+    assert jobs[patient_job.id_str].attempt_int == 3
+
+
+async def _all_completed() -> bool:
+    jobs = await _jobs()
+    return all(job.status_str == JobStatus.COMPLETED for job in jobs.values())
+
+
+async def test_jobs_of_a_crashed_worker_are_run_by_another(
+    db, workflow_def, monkeypatch
+):
+    await create_jobs(db, workflow_def, 2)
+    await _claim("crashed-worker", 2, lease_seconds=0.1)
+    monkeypatch.setattr(settings, "WORKER_HEARTBEAT_INTERVAL_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "WORKER_REAPER_INTERVAL_SECONDS", 0.1)
+    worker = Worker(concurrency=2, poll_interval=0.05, worker_id="worker-1")
+
+    run = asyncio.create_task(worker.run())
+    try:
+        await wait_until(_all_completed)
+    finally:
+        worker.stop()
+        await run
+
+    jobs = await _jobs()
+    assert {job.worker_id_str for job in jobs.values()} == {"worker-1"}
+    assert {job.attempt_int for job in jobs.values()} == {2}
+
+
+def test_heartbeat_must_fit_twice_in_a_lease():
+    with pytest.raises(ValidationError):
+        Settings(WORKER_LEASE_SECONDS=10, WORKER_HEARTBEAT_INTERVAL_SECONDS=6)
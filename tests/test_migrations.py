@@ -0,0 +1,165 @@
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import inspect, text
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.main import app
+from src.api_server.migrations import MIGRATIONS, run_migrations
+from src.api_server.models.ai_workflow_job import GLOBAL_BACKLOG_KEY, JobStatus
+from tests.conftest import PIPELINE_YAML
+
+# 引入迁移前 (首个提交) 的表结构
+BASELINE_DDL = (
+    """
+    CREATE TABLE ai_workflow_def (
+        created_at_time DATETIME NOT NULL,
+        updated_at_time DATETIME NOT NULL,
+        is_deleted_flag BOOLEAN NOT NULL,
+        id_str VARCHAR(36) NOT NULL PRIMARY KEY,
+        user_id_str VARCHAR(100) NOT NULL,
+        name_str VARCHAR(255) NOT NULL,
+        description_text VARCHAR(1000),
+        hs_yaml_content VARCHAR NOT NULL,
+        version_str VARCHAR(50) NOT NULL,
+        is_active_flag BOOLEAN NOT NULL,
+        tags_str VARCHAR(500)
+    )
+    """,
+    """
+    CREATE TABLE ai_workflow_job (
+        created_at_time DATETIME NOT NULL,
+        updated_at_time DATETIME NOT NULL,
+        is_deleted_flag BOOLEAN NOT NULL,
+        id_str VARCHAR(36) NOT NULL PRIMARY KEY,
+        user_id_str VARCHAR(100) NOT NULL,
+        ai_workflow_def_id VARCHAR(36) NOT NULL,
+        job_name_str VARCHAR(255) NOT NULL,
+        trigger_data_json VARCHAR NOT NULL,
+        status_str VARCHAR(50) NOT NULL,
+        result_data_json VARCHAR,
+        error_message_text VARCHAR(2000),
+        started_at_time VARCHAR,
+        completed_at_time VARCHAR,
+        execution_time_seconds FLOAT
+    )
+    """,
+    """
+    INSERT INTO ai_workflow_def VALUES
+        ('2025-01-01 00:00:00', '2025-01-01 00:00:00', 0, 'def-valid', 'user_id',
+         'greeting', NULL, :valid_yaml, '1.0.0', 1, 'demo, NLP'),
+        ('2025-01-01 00:00:00', '2025-01-01 00:00:00', 0, 'def-invalid', 'user_id',
+         'broken', NULL, 'components: 3', '1.0.0', 1, NULL)
+    """,
+    """
+    INSERT INTO ai_workflow_job VALUES
+        ('2025-01-02 00:00:00', '2025-01-02 00:00:00', 0, 'job-1', 'user_id',
+         'def-valid', 'job', '{"name": "a"}', 'completed', '{}', NULL,
+         '2025-01-02T00:00:01+00:00', '2025-01-02T00:00:03+00:00', 2.0),
+        ('2025-01-02 00:00:01', '2025-01-02 00:00:01', 0, 'job-2', 'user_id',
+         'def-valid', 'job', '{"name": "b"}', 'pending', NULL, NULL,
+         NULL, NULL, NULL)
+    """,
+)
+
+
+async def _create_baseline_schema(engine) -> None:
+    async with engine.begin() as conn:
+        for statement in BASELINE_DDL:
+            await conn.execute(text(statement), {"valid_yaml": PIPELINE_YAML})
+
+
+async def _schema(engine):
+    def read(connection):
+        inspector = inspect(connection)
+        return {
+            table: (
+                {column["name"] for column in inspector.get_columns(table)},
+                {index["name"] for index in inspector.get_indexes(table)},
+            )
+            for table in inspector.get_table_names()
+        }
+
+    async with engine.connect() as conn:
+        return await conn.run_sync(read)
+
+
+async def test_baseline_database_is_migrated_to_current_schema(empty_database):
+    await _create_baseline_schema(empty_database)
+
+    applied = await run_migrations(empty_database)
+
+    assert applied == [migration.version for migration in MIGRATIONS]
+    job_columns, job_indexes = (await _schema(empty_database))["ai_workflow_job"]
+    assert {
+        "priority_int",
+        "timeout_seconds",
+        "not_before_time",
+        "worker_id_str",
+        "lease_expires_at_time",
+        "attempt_int",
+        "progress_json",
+        "timings_json",
+        "trigger_data_blob_str",
+    } <= job_columns
+    assert {
+        "ix_ai_workflow_job_claim",
+        "ix_ai_workflow_job_lease",
+        "ix_ai_workflow_job_updated",
+        "ix_ai_workflow_job_user_status",
+    } <= job_indexes
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.get("/api/v1/ai_workflow_job", params={"order": "asc"})
+    assert response.status_code == 200
+    jobs = response.json()["result"]
+    assert [job["id_str"] for job in jobs] == ["job-1", "job-2"]
+    assert jobs[0]["started_at_time"] == "2025-01-02T00:00:01"
+    assert all(job["priority_int"] == 5 and job["attempt_int"] == 0 for job in jobs)
+
+
+async def test_definitions_are_compiled_by_the_migration(empty_database):
+    await _create_baseline_schema(empty_database)
+
+    await run_migrations(empty_database)
+
+    async with empty_database.connect() as conn:
+        rows = dict(
+            (
+                await conn.execute(
+                    text("SELECT id_str, hs_yaml_hash_str FROM ai_workflow_def")
+                )
+            ).all()
+        )
+    assert rows["def-valid"] is not None and len(rows["def-valid"]) == 64
+    # 无法编译的定义保持为空，执行时回退为解析YAML
+    assert rows["def-invalid"] is None
+
+
+async def test_migrated_jobs_can_be_claimed(empty_database):
+    await _create_baseline_schema(empty_database)
+    await run_migrations(empty_database)
+
+    async with session_maker() as db:
+        claimed = await crud.ai_workflow_job.claim_pending_jobs(
+            db, limit=10, worker_id="worker-1", lease_seconds=60
+        )
+    assert [job.id_str for job in claimed] == ["job-2"]
+    assert claimed[0].status_str == JobStatus.RUNNING
+
+
+async def test_migration_counts_the_pending_backlog(empty_database):
+    await _create_baseline_schema(empty_database)
+    await run_migrations(empty_database)
+
+    async with session_maker() as db:
+        backlog = await crud.ai_workflow_job.get_backlog(db, user_id="user_id")
+        assert backlog["user_id"].pending_int == 1
+        assert backlog[GLOBAL_BACKLOG_KEY].pending_int == 1
+
+
+async def test_migrations_run_once_and_fit_created_tables(database):
+    # create_tables()建立的库已是最新结构，各步骤检查已有对象后跳过
+    assert await run_migrations(database) == [m.version for m in MIGRATIONS]
+    assert await run_migrations(database) == []
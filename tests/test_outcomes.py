@@ -0,0 +1,190 @@
+import asyncio
+
+import pytest
+from sqlmodel import select
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.models.ai_workflow_job import AIWorkflowJob, JobStatus
+from src.worker import outcomes
+from src.worker.outcomes import OutcomeWriter
+from tests.utils import create_jobs
+
+COMPLETED = {"status_str": JobStatus.COMPLETED, "result_data_json": '{"ok": true}'}
+
+
+async def _claim(db, worker_id: str, limit: int):
+    return await crud.ai_workflow_job.claim_pending_jobs(
+        db, limit=limit, worker_id=worker_id, lease_seconds=60
+    )
+
+
+async def _statuses():
+    async with session_maker() as db:
+        jobs = await db.exec(select(AIWorkflowJob))
+        return {job.id_str: job.status_str for job in jobs}
+
+
+async def test_outcomes_only_finish_jobs_leased_to_the_writer(db, workflow_def):
+    jobs = await create_jobs(db, workflow_def, 4)
+    (mine,) = await _claim(db, "worker-1", 1)
+    (theirs,) = await _claim(db, "worker-2", 1)
+    (cancelled,) = await _claim(db, "worker-1", 1)
+    await crud.ai_workflow_job.cancel_workflow_job(db, cancelled.id_str)
+    pending = jobs[3]
+
+    written = await crud.ai_workflow_job.finish_leased_jobs(
+        db,
+        worker_id="worker-1",
+        outcomes={job.id_str: COMPLETED for job in (mine, theirs, cancelled, pending)},
+    )
+
+    assert written == [mine.id_str]
+    assert await _statuses() == {
+        mine.id_str: JobStatus.COMPLETED,
+        theirs.id_str: JobStatus.RUNNING,
+        cancelled.id_str: JobStatus.CANCELLED,
+        pending.id_str: JobStatus.PENDING,
+    }
+
+
+async def test_outcomes_set_each_jobs_own_values(db, workflow_def):
+    await create_jobs(db, workflow_def, 2)
+    first, second = await _claim(db, "worker-1", 2)
+
+    await crud.ai_workflow_job.finish_leased_jobs(
+        db,
+        worker_id="worker-1",
+        outcomes={
+            first.id_str: COMPLETED,
+            second.id_str: {
+                "status_str": JobStatus.FAILED,
+                "error_message_text": "boom",
+            },
+        },
+    )
+
+    async with session_maker() as session:
+        rows = {job.id_str: job for job in await session.exec(select(AIWorkflowJob))}
+    assert rows[first.id_str].result_data_json == '{"ok": true}'
+    assert rows[first.id_str].error_message_text is None
+    assert rows[second.id_str].status_str == JobStatus.FAILED
+    assert rows[second.id_str].error_message_text == "boom"
+    assert rows[second.id_str].result_data_json is None
+    assert all(row.lease_expires_at_time is None for row in rows.values())
+
+
+async def test_dead_letter_outcomes_move_the_job(db, workflow_def):
+    await create_jobs(db, workflow_def, 1)
+    (job,) = await _claim(db, "worker-1", 1)
+
+    await crud.ai_workflow_job.finish_leased_jobs(
+        db,
+        worker_id="worker-1",
+        outcomes={job.id_str: {"status_str": JobStatus.FAILED}},
+        dead_letter={job.id_str},
+    )
+
+    assert await _statuses() == {}
+    dead = await crud.ai_workflow_job.get_dead_letter(db, job.id_str)
+    assert dead.status_str == JobStatus.FAILED
+
+
+async def test_outcomes_must_be_final_statuses(db, workflow_def):
+    await create_jobs(db, workflow_def, 1)
+    (job,) = await _claim(db, "worker-1", 1)
+
+    with pytest.raises(ValueError):
+        await crud.ai_workflow_job.finish_leased_jobs(
+            db,
+            worker_id="worker-1",
+            outcomes={job.id_str: {"status_str": JobStatus.PENDING}},
+        )
+
+
+class _Writes:
+    def __init__(self) -> None:
+        self.batches = []
+        # 包含这些任务的批次写入时抛出异常
+        self.fail = set()
+        # 接下来这么多次写入抛出异常
+        self.failures = 0
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Records the job ids of every batch the outcome writer writes."""
+    writes = _Writes()
+    finish = crud.ai_workflow_job.finish_leased_jobs
+
+    async def finish_leased_jobs(db, worker_id, outcomes, dead_letter=()):
+        writes.batches.append(sorted(outcomes))
+        if writes.failures or writes.fail & set(outcomes):
+            writes.failures = max(writes.failures - 1, 0)
+            raise RuntimeError("write failed")
+        return await finish(db, worker_id, outcomes, dead_letter)
+
+    monkeypatch.setattr(crud.ai_workflow_job, "finish_leased_jobs", finish_leased_jobs)
+    monkeypatch.setattr(outcomes, "BATCH_RETRY_DELAY_SECONDS", 0)
+    return writes
+
+
+async def test_writer_groups_concurrent_outcomes(db, workflow_def, writes):
+    await create_jobs(db, workflow_def, 10)
+    jobs = await _claim(db, "worker-1", 10)
+    writer = OutcomeWriter("worker-1", max_batch=4)
+
+    written = await asyncio.gather(
+        *(writer.write(job.id_str, COMPLETED) for job in jobs)
+    )
+
+    assert written == [True] * 10
+    assert [len(batch) for batch in writes.batches] == [4, 4, 2]
+    assert set((await _statuses()).values()) == {JobStatus.COMPLETED}
+
+
+async def test_writer_reports_lost_leases(db, workflow_def, writes):
+    await create_jobs(db, workflow_def, 1)
+    (job,) = await _claim(db, "worker-2", 1)
+
+    assert (
+        await OutcomeWriter("worker-1", max_batch=4).write(job.id_str, COMPLETED)
+        is False
+    )
+
+
+async def test_failed_batch_only_fails_the_offending_job(db, workflow_def, writes):
+    await create_jobs(db, workflow_def, 3)
+    jobs = await _claim(db, "worker-1", 3)
+    bad = jobs[1].id_str
+    writes.fail.add(bad)
+    writer = OutcomeWriter("worker-1", max_batch=10)
+
+    results = await asyncio.gather(
+        *(writer.write(job.id_str, COMPLETED) for job in jobs),
+        return_exceptions=True,
+    )
+
+    assert results[0] is True and results[2] is True
+    assert isinstance(results[1], RuntimeError)
+    batch = [job.id_str for job in jobs]
+    # 整批两次尝试，之后逐个任务写入
+    assert writes.batches == [sorted(batch), sorted(batch), *([i] for i in batch)]
+    statuses = await _statuses()
+    assert statuses.pop(bad) == JobStatus.RUNNING
+    assert set(statuses.values()) == {JobStatus.COMPLETED}
+
+
+async def test_batch_that_fails_once_is_retried_whole(db, workflow_def, writes):
+    await create_jobs(db, workflow_def, 3)
+    jobs = await _claim(db, "worker-1", 3)
+    writes.failures = 1
+    writer = OutcomeWriter("worker-1", max_batch=10)
+
+    written = await asyncio.gather(
+        *(writer.write(job.id_str, COMPLETED) for job in jobs)
+    )
+
+    assert written == [True, True, True]
+    batch = sorted(job.id_str for job in jobs)
+    assert writes.batches == [batch, batch]
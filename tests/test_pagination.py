@@ -0,0 +1,149 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.api_server import crud
+from src.api_server.crud.base import InvalidCursorError
+from src.api_server.models.ai_workflow_def import AIWorkflowDefCreate
+from tests.conftest import PIPELINE_YAML
+from tests.utils import create_jobs
+
+T0 = datetime(2025, 1, 1)
+
+
+@pytest.fixture
+async def jobs(db, workflow_def):
+    """Jobs with tied and NULL sort values, so pages split inside the ties."""
+    created = []
+    for i in range(11):
+        (job,) = await create_jobs(
+            db,
+            workflow_def,
+            created_at_time=T0 + timedelta(minutes=i // 3),
+            completed_at_time=T0 + timedelta(minutes=i % 4) if i % 3 else None,
+            execution_time_seconds=float(i % 2),
+        )
+        created.append(job)
+    return created
+
+
+async def _pages(client, limit: int, **params):
+    ids, cursor, pages = [], None, 0
+    while True:
+        response = await client.get(
+            "/api/v1/ai_workflow_job",
+            params={**params, "limit": limit, **({"cursor": cursor} if cursor else {})},
+        )
+        assert response.status_code == 200
+        body = response.json()
+        ids += [job["id_str"] for job in body["result"]]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return ids, pages
+
+
+@pytest.mark.parametrize(
+    "order_by", ["created_at_time", "completed_at_time", "execution_time_seconds"]
+)
+@pytest.mark.parametrize("order", ["asc", "desc"])
+async def test_cursor_pages_match_a_single_page(client, jobs, order_by, order):
+    params = {"order_by": order_by, "order": order}
+    expected, _ = await _pages(client, limit=1000, **params)
+
+    ids, pages = await _pages(client, limit=3, **params)
+
+    assert ids == expected
+    assert len(set(ids)) == len(jobs)
+    assert pages == 4
+
+
+async def test_offsets_still_page(client, jobs):
+    expected, _ = await _pages(client, limit=1000, order="asc")
+
+    response = await client.get(
+        "/api/v1/ai_workflow_job", params={"order": "asc", "offset": 4, "limit": 3}
+    )
+
+    assert [job["id_str"] for job in response.json()["result"]] == expected[4:7]
+
+
+async def test_bad_cursors_are_rejected(client, jobs):
+    response = await client.get("/api/v1/ai_workflow_job", params={"limit": 3})
+    cursor = response.json()["next_cursor"]
+
+    for params in (
+        {"cursor": "not a cursor"},
+        {"cursor": cursor, "order": "asc"},
+        {"cursor": cursor, "order_by": "created_at_time"},
+        {"cursor": cursor, "offset": 3},
+    ):
+        response = await client.get("/api/v1/ai_workflow_job", params=params)
+        assert response.status_code == 422, params
+        assert "Invalid cursor" in response.json()["message"]
+
+
+async def test_definitions_page_by_cursor(db):
+    for name in ["b", "a", "c", "a", "b"]:
+        await crud.ai_workflow_def.create_workflow_def(
+            db,
+            AIWorkflowDefCreate(name_str=name, hs_yaml_content=PIPELINE_YAML),
+            user_id="user_id",
+        )
+    names, cursors, cursor = [], [], None
+    while True:
+        page, cursor = await crud.ai_workflow_def.get_workflow_def(
+            db,
+            user_id="user_id",
+            order_by="name_str",
+            order="asc",
+            limit=2,
+            cursor=cursor,
+        )
+        names += [workflow_def.name_str for workflow_def in page]
+        if cursor is None:
+            break
+        cursors.append(cursor)
+
+    assert names == ["a", "a", "b", "b", "c"]
+    # 游标只能用于签发它的排序
+    with pytest.raises(InvalidCursorError):
+        await crud.ai_workflow_def.get_workflow_def(
+            db,
+            user_id="user_id",
+            order_by="created_at_time",
+            order="asc",
+            cursor=cursors[0],
+        )
+
+
+async def test_definitions_page_by_cursor_over_http(client, db):
+    for name in ["b", "a", "c"]:
+        await crud.ai_workflow_def.create_workflow_def(
+            db,
+            AIWorkflowDefCreate(name_str=name, hs_yaml_content=PIPELINE_YAML),
+            user_id="user_id",
+        )
+    names, cursor = [], None
+    while True:
+        response = await client.get(
+            "/api/v1/ai_workflow_def",
+            params={
+                "order_by": "name_str",
+                "order": "asc",
+                "limit": 2,
+                **({"cursor": cursor} if cursor else {}),
+            },
+        )
+        body = response.json()
+        names += [workflow_def["name_str"] for workflow_def in body["result"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert names == ["a", "b", "c"]
+    response = await client.get(
+        "/api/v1/ai_workflow_def", params={"cursor": "not a cursor"}
+    )
+    assert response.status_code == 422
+    assert "Invalid cursor" in response.json()["message"]
@@ -0,0 +1,111 @@
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.worker import pipeline_cache
+from src.worker.pipeline_cache import PipelineCache
+from tests.conftest import PIPELINE_YAML
+
+OTHER_YAML = PIPELINE_YAML.replace("Hello", "Hi")
+
+
+@pytest.fixture
+def fake_rss(monkeypatch):
+    """Each pipeline build grows the RSS by 10 MB."""
+    counter = itertools.count()
+    monkeypatch.setattr(
+        pipeline_cache, "rss_bytes", lambda: (next(counter) + 1) // 2 * 10 * 2**20
+    )
+
+
+def test_pipelines_are_built_once_per_definition():
+    cache = PipelineCache(max_entries=4)
+
+    first = cache.get("def-1", PIPELINE_YAML)
+    second = cache.get("def-1", PIPELINE_YAML)
+
+    assert first is second
+    assert first.run({"prompt": {"name": "a"}}) == {"prompt": {"prompt": "Hello a"}}
+    stats = cache.snapshot()
+    assert (stats["hits"], stats["misses"], stats["builds"]) == (1, 1, 1)
+
+
+def test_changed_yaml_replaces_the_stale_pipeline():
+    cache = PipelineCache(max_entries=4)
+    stale = cache.get("def-1", PIPELINE_YAML)
+
+    fresh = cache.get("def-1", OTHER_YAML)
+
+    assert fresh is not stale
+    assert len(cache) == 1
+    assert cache.snapshot()["invalidations"] == 1
+    assert fresh.run({"prompt": {"name": "a"}})["prompt"]["prompt"] == "Hi a"
+
+
+def test_least_recently_used_pipelines_are_evicted():
+    cache = PipelineCache(max_entries=2)
+    first = cache.get("def-1", PIPELINE_YAML)
+    cache.get("def-2", PIPELINE_YAML)
+    cache.get("def-1", PIPELINE_YAML)
+
+    cache.get("def-3", PIPELINE_YAML)
+
+    assert cache.get("def-1", PIPELINE_YAML) is first
+    assert cache.snapshot()["evictions"] == 1
+    cache.get("def-2", PIPELINE_YAML)
+    assert cache.snapshot()["builds"] == 4
+
+
+def test_memory_budget_bounds_the_cache(fake_rss):
+    cache = PipelineCache(max_entries=10, max_memory_bytes=25 * 2**20)
+
+    for def_id in ("def-1", "def-2", "def-3"):
+        cache.get(def_id, PIPELINE_YAML)
+
+    assert len(cache) == 2
+    assert cache.snapshot()["memory_bytes"] == 20 * 2**20
+
+
+def test_concurrent_misses_build_once():
+    cache = PipelineCache(max_entries=4)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        pipelines = list(
+            pool.map(lambda _: cache.get("def-1", PIPELINE_YAML), range(16))
+        )
+
+    assert len({id(pipeline) for pipeline in pipelines}) == 1
+    assert cache.snapshot()["builds"] == 1
+
+
+def test_different_definitions_build_in_parallel(monkeypatch):
+    cache = PipelineCache(max_entries=4)
+    build_pipeline = pipeline_cache.executor.build_pipeline
+    # 两次构建须同时进行才能越过屏障
+    barrier = threading.Barrier(2, timeout=5)
+
+    def build_together(*args):
+        barrier.wait()
+        return build_pipeline(*args)
+
+    monkeypatch.setattr(pipeline_cache.executor, "build_pipeline", build_together)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        pipelines = list(
+            pool.map(lambda def_id: cache.get(def_id, PIPELINE_YAML), ["a", "b"])
+        )
+
+    assert pipelines[0] is not pipelines[1]
+    assert cache.snapshot()["builds"] == 2
+    assert cache._build_locks == {}
+
+
+def test_invalidate_drops_the_definition():
+    cache = PipelineCache(max_entries=4)
+    stale = cache.get("def-1", PIPELINE_YAML)
+
+    cache.invalidate("def-1")
+
+    assert len(cache) == 0
+    assert cache.get("def-1", PIPELINE_YAML) is not stale
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import multiprocessing
+
+import pytest
+from sqlmodel import select
+
+from src.api_server.api.deps import session_maker
+from src.api_server.config import settings
+from src.api_server.libs.hs_pipeline import BatchingConfig
+from src.api_server.models.ai_workflow_def import AIWorkflowDef
+from src.api_server.models.ai_workflow_job import AIWorkflowJob, JobStatus
+from src.worker.executor import PipelineRunError
+from src.worker.process_pool import PipelineProcessPool
+from src.worker.worker import Worker
+from tests.conftest import PIPELINE_YAML
+from tests.utils import create_jobs, wait_until
+
+# 运行时间较长的pipeline，用于取消任务
+SLOW_YAML = """\
+components:
+  slow:
+    type: tests.test_branches.Tag
+    init_parameters:
+      tag: slow
+      delay: 30
+connections: []
+"""
+FAILING_YAML = """\
+components:
+  fail:
+    type: tests.test_branches.Fail
+connections: []
+"""
+
+
+def _definition(def_id: str, hs_yaml_content: str = PIPELINE_YAML) -> AIWorkflowDef:
+    return AIWorkflowDef(
+        id_str=def_id,
+        user_id_str="user_id",
+        name_str=def_id,
+        hs_yaml_content=hs_yaml_content,
+    )
+
+
+@pytest.fixture
+async def pool():
+    pool = PipelineProcessPool(processes=2)
+    yield pool
+    await asyncio.to_thread(pool.shutdown)
+
+
+def test_definitions_keep_their_slot_while_it_is_idle():
+    pool = PipelineProcessPool(processes=4)
+    try:
+        slots = {def_id: pool._pick_slot(def_id) for def_id in ("a", "b", "c", "d")}
+        assert all(pool._pick_slot(d) == slot for d, slot in slots.items())
+
+        # 亲和的slot繁忙时溢出到其他slot
+        pool._inflight[slots["a"]] = 1
+        assert pool._pick_slot("a") != slots["a"]
+    finally:
+        pool.shutdown()
+
+
+async def test_jobs_run_in_a_subprocess(pool):
+    workflow_def = _definition("def-1")
+
+    result_json, timings = await pool.run(workflow_def, {"prompt": {"name": "a"}})
+
+    assert json.loads(result_json) == {"prompt": {"prompt": "Hello a"}}
+    assert list(json.loads(timings.to_json())) == ["prompt"]
+
+
+async def test_batches_run_in_a_subprocess(pool):
+    outcomes, _ = await pool.run_batch(
+        _definition("def-1"),
+        [{"prompt": {"name": "a"}}, {"prompt": {}}],
+        BatchingConfig(max_size=2),
+    )
+
+    assert json.loads(outcomes[0]) == {"prompt": {"prompt": "Hello a"}}
+    assert isinstance(outcomes[1], PipelineRunError)
+
+
+async def test_pipeline_errors_cross_the_process_boundary(pool):
+    with pytest.raises(PipelineRunError) as error:
+        await pool.run(_definition("failing", FAILING_YAML), {"fail": {"text": "x"}})
+
+    # 异常链的类名随错误返回，用于判断是否重试
+    assert {"PipelineRuntimeError", "ValueError"} <= error.value.error_types
+    assert "boom" in str(error.value)
+
+
+async def test_cancelled_job_terminates_its_subprocess(pool):
+    workflow_def = _definition("slow", SLOW_YAML)
+    slot = pool._pick_slot(workflow_def.id_str)
+    slot_executor = pool._slots[slot]
+
+    # 先在子进程中构建pipeline，任务提交后立即开始执行
+    await pool.warm_up(workflow_def)
+    pid = pool._pids[slot_executor].value
+    assert pid in [child.pid for child in multiprocessing.active_children()]
+    running = asyncio.create_task(pool.run(workflow_def, {"slow": {"text": "x"}}))
+    await asyncio.sleep(0.5)
+    running.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await running
+
+    assert pool._slots[slot] is not slot_executor
+
+    async def terminated():
+        return pid not in [child.pid for child in multiprocessing.active_children()]
+
+    await wait_until(terminated, timeout=5)
+    result_json, _ = await pool.run(_definition("def-1"), {"prompt": {"name": "b"}})
+    assert json.loads(result_json) == {"prompt": {"prompt": "Hello b"}}
+
+
+async def test_subprocess_over_the_memory_ceiling_is_replaced():
+    pool = PipelineProcessPool(processes=1, max_memory_bytes=1)
+    try:
+        slot_executor = pool._slots[0]
+
+        await pool.run(_definition("def-1"), {"prompt": {"name": "a"}})
+
+        assert pool._slots[0] is not slot_executor
+    finally:
+        await asyncio.to_thread(pool.shutdown)
+
+
+async def test_worker_runs_jobs_in_process_mode(db, workflow_def, monkeypatch):
+    monkeypatch.setattr(settings, "WORKER_EXECUTION_MODE", "process")
+    monkeypatch.setattr(settings, "WORKER_PROCESSES", 1)
+    await create_jobs(db, workflow_def, 3)
+    worker = Worker(concurrency=2, poll_interval=0.05, worker_id="worker-1")
+    assert worker.process_pool is not None
+
+    run = asyncio.create_task(worker.run())
+    try:
+        await wait_until(lambda: _all_completed(3), timeout=60)
+    finally:
+        worker.stop()
+        await run
+
+
+async def _all_completed(count: int) -> bool:
+    async with session_maker() as db:
+        jobs = list(await db.exec(select(AIWorkflowJob)))
+    return len(jobs) == count and all(
+        job.status_str == JobStatus.COMPLETED for job in jobs
+    )
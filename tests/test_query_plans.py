@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+from src.api_server.crud import query_plans
+
+CASE_NAMES = [case.name for case in query_plans._cases()]
+
+
+@pytest.fixture(scope="module")
+def plans(tmp_path_factory):
+    results = asyncio.run(
+        query_plans.check_scratch_database(str(tmp_path_factory.mktemp("plans")))
+    )
+    return {name: (plan, problems) for name, plan, problems in results}
+
+
+@pytest.mark.parametrize("name", CASE_NAMES)
+def test_query_uses_its_index(plans, name):
+    plan, problems = plans[name]
+    assert not problems, "\n".join([*problems, "plan:", *plan])
+
+
+def test_plan_check_flags_a_table_scan():
+    case = query_plans.Case("scan", None, "ix_ai_workflow_job_claim")
+
+    assert query_plans._plan_problems(["SCAN ai_workflow_job"], case) == [
+        "does not use ix_ai_workflow_job_claim",
+        "SCAN ai_workflow_job",
+    ]
@@ -0,0 +1,195 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from haystack import component
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.libs import hs_pipeline
+from src.api_server.libs.hs_pipeline import RetryPolicy
+from src.api_server.models.ai_workflow_def import AIWorkflowDefCreate
+from src.api_server.models.ai_workflow_job import AIWorkflowJob, JobStatus
+from src.worker import executor
+from src.worker.worker import Worker
+from tests.utils import create_jobs, wait_until
+
+
+@component
+class Flaky:
+    """Raises ``ConnectionError`` on its first ``failures`` runs."""
+
+    def __init__(self, failures: int) -> None:
+        self.failures = failures
+        self.runs = 0
+
+    @component.output_types(value=str)
+    def run(self, text: str):
+        self.runs += 1
+        if self.runs <= self.failures:
+            raise ConnectionError("connection reset")
+        return {"value": text}
+
+
+def _flaky_yaml(failures: int, max_attempts: int) -> str:
+    return (
+        "components:\n"
+        "  flaky:\n"
+        "    type: tests.test_retries.Flaky\n"
+        f"    init_parameters:\n      failures: {failures}\n"
+        "connections: []\n"
+        "metadata:\n"
+        f"  retry:\n    max_attempts: {max_attempts}\n    backoff_seconds: 0\n"
+    )
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_delay_doubles_up_to_the_cap(monkeypatch):
+    policy = RetryPolicy(backoff_seconds=2, max_backoff_seconds=10, jitter=0.5)
+
+    monkeypatch.setattr(hs_pipeline.random, "random", lambda: 0.0)
+    assert [policy.delay(attempt) for attempt in (1, 2, 3, 4)] == [2, 4, 8, 10]
+    # 抖动最多减去延迟的jitter比例
+    monkeypatch.setattr(hs_pipeline.random, "random", lambda: 1.0)
+    assert policy.delay(3) == 4
+
+
+def test_errors_are_matched_along_their_cause_chain():
+    policy = RetryPolicy(
+        retry_on=frozenset(["ConnectionError"]), retry_on_status=frozenset([503])
+    )
+    try:
+        try:
+            raise ConnectionResetError("reset")
+        except ConnectionResetError as e:
+            raise RuntimeError("component failed") from e
+    except RuntimeError as e:
+        wrapped = e
+
+    assert policy.is_retryable(*executor.error_signature(wrapped))
+    assert policy.is_retryable(*executor.error_signature(HTTPError(503)))
+    assert not policy.is_retryable(*executor.error_signature(HTTPError(400)))
+    assert not policy.is_retryable(*executor.error_signature(ValueError("bad")))
+
+
+def test_definitions_override_the_default_policy():
+    default = RetryPolicy(max_attempts=3, retry_on=frozenset(["TimeoutError"]))
+
+    policy = hs_pipeline.parse_retry_policy(
+        {"retry": {"max_attempts": 5, "retry_on": ["ValueError"]}}, default
+    )
+
+    assert policy.max_attempts == 5
+    assert policy.retry_on == frozenset(["ValueError"])
+    assert policy.backoff_seconds == default.backoff_seconds
+
+
+async def test_retried_jobs_wait_for_their_backoff(db, workflow_def):
+    await create_jobs(db, workflow_def, 1)
+    (job,) = await _claim()
+
+    assert await crud.ai_workflow_job.retry_leased_job(
+        db,
+        job,
+        worker_id="worker-1",
+        not_before=datetime.utcnow() + timedelta(seconds=0.3),
+        error_message="connection reset",
+    )
+    assert not await crud.ai_workflow_job.retry_leased_job(
+        db,
+        job,
+        worker_id="worker-1",
+        not_before=datetime.utcnow(),
+        error_message="connection reset",
+    )
+
+    assert await _claim() == []
+    await asyncio.sleep(0.3)
+    (retried,) = await _claim()
+    assert retried.attempt_int == 2
+    assert retried.error_message_text == "connection reset"
+
+
+async def _claim():
+    async with session_maker() as db:
+        return await crud.ai_workflow_job.claim_pending_jobs(
+            db, limit=1, worker_id="worker-1", lease_seconds=60
+        )
+
+
+async def _create_flaky_job(db, failures: int, max_attempts: int) -> AIWorkflowJob:
+    workflow_def = await crud.ai_workflow_def.create_workflow_def(
+        db,
+        AIWorkflowDefCreate(
+            name_str="flaky", hs_yaml_content=_flaky_yaml(failures, max_attempts)
+        ),
+        user_id="user_id",
+    )
+    job = AIWorkflowJob(
+        user_id_str="user_id",
+        ai_workflow_def_id=workflow_def.id_str,
+        job_name_str="flaky",
+        trigger_data_json=json.dumps({"flaky": {"text": "x"}}),
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+async def _run_worker_until(condition) -> None:
+    worker = Worker(concurrency=1, poll_interval=0.05, worker_id="worker-1")
+    run = asyncio.create_task(worker.run())
+    try:
+        await wait_until(condition)
+    finally:
+        worker.stop()
+        await run
+
+
+@pytest.mark.parametrize("failures", [1, 2])
+async def test_transient_failures_are_retried(db, failures):
+    job = await _create_flaky_job(db, failures=failures, max_attempts=3)
+
+    async def completed():
+        async with session_maker() as session:
+            current = await crud.ai_workflow_job.get(session, id=job.id_str)
+            return current.status_str == JobStatus.COMPLETED and current
+
+    await _run_worker_until(completed)
+
+    assert (await completed()).attempt_int == failures + 1
+
+
+async def test_exhausted_jobs_are_dead_lettered_and_requeued(client, db):
+    job = await _create_flaky_job(db, failures=5, max_attempts=2)
+
+    async def dead_lettered():
+        async with session_maker() as session:
+            return await crud.ai_workflow_job.get_dead_letter(session, job.id_str)
+
+    await _run_worker_until(dead_lettered)
+
+    response = await client.get("/api/v1/ai_workflow_job/dead_letter")
+    (dead_job,) = response.json()["result"]
+    assert dead_job["id_str"] == job.id_str
+    assert dead_job["attempt_int"] == 2
+    assert "connection reset" in dead_job["error_message_text"]
+
+    response = await client.post(
+        f"/api/v1/ai_workflow_job/dead_letter/{job.id_str}/requeue"
+    )
+    assert response.status_code == 200
+    requeued = response.json()["result"]
+    assert (requeued["status_str"], requeued["attempt_int"]) == (JobStatus.PENDING, 0)
+    assert await dead_lettered() is None
+    response = await client.post(
+        f"/api/v1/ai_workflow_job/dead_letter/{job.id_str}/requeue"
+    )
+    assert response.status_code == 404
@@ -0,0 +1,111 @@
+import pytest
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.libs.tags import TAG_MAX_LENGTH, parse_tags
+from src.api_server.migrations import run_migrations
+from src.api_server.models.ai_workflow_def import (
+    AIWorkflowDefCreate,
+    AIWorkflowDefUpdate,
+)
+from tests.conftest import PIPELINE_YAML
+from tests.test_migrations import _create_baseline_schema
+
+DEFINITIONS = {
+    "rag": "RAG, search",
+    "dragon": "dragon, search",
+    "chat": "chat, rag",
+    "untagged": None,
+}
+
+
+@pytest.fixture
+async def definitions(db):
+    return {
+        name: await crud.ai_workflow_def.create_workflow_def(
+            db,
+            AIWorkflowDefCreate(
+                name_str=name, hs_yaml_content=PIPELINE_YAML, tags_str=tags_str
+            ),
+            user_id="user_id",
+        )
+        for name, tags_str in DEFINITIONS.items()
+    }
+
+
+async def _names(db, tags: str, tags_mode: str = "all"):
+    workflow_defs, _ = await crud.ai_workflow_def.get_workflow_def(
+        db, user_id="user_id", tags=tags, tags_mode=tags_mode, order_by="name_str"
+    )
+    return sorted(workflow_def.name_str for workflow_def in workflow_defs)
+
+
+def test_tags_are_normalized():
+    assert parse_tags(" RAG, rag ,, Search ") == ["rag", "search"]
+    assert parse_tags(None) == []
+    assert parse_tags("x" * (TAG_MAX_LENGTH + 5)) == ["x" * TAG_MAX_LENGTH]
+
+
+async def test_tags_match_exactly(db, definitions):
+    assert await _names(db, "rag") == ["chat", "rag"]
+    assert await _names(db, "Rag, SEARCH") == ["rag"]
+    assert await _names(db, "rag, search", tags_mode="any") == [
+        "chat",
+        "dragon",
+        "rag",
+    ]
+    assert await _names(db, "drag") == []
+
+
+async def test_updates_and_deletes_keep_the_index_in_sync(db, definitions):
+    await crud.ai_workflow_def.update_workflow_def(
+        db, definitions["dragon"], AIWorkflowDefUpdate(tags_str="rag")
+    )
+    await crud.ai_workflow_def.remove(db, id=definitions["chat"].id_str)
+
+    assert await _names(db, "rag") == ["dragon", "rag"]
+    assert await _names(db, "search") == ["rag"]
+
+
+async def test_definitions_are_listed_by_tag(client, definitions):
+    response = await client.get(
+        "/api/v1/ai_workflow_def",
+        params={"tags": "Rag,dragon", "tags_mode": "any", "order_by": "name_str"},
+    )
+
+    assert [workflow_def["name_str"] for workflow_def in response.json()["result"]] == [
+        "rag",
+        "dragon",
+        "chat",
+    ]
+
+
+async def test_tag_facets(client, definitions):
+    response = await client.get("/api/v1/ai_workflow_def/tags")
+    assert response.json()["result"] == [
+        {"tag_str": "rag", "count_int": 2},
+        {"tag_str": "search", "count_int": 2},
+        {"tag_str": "chat", "count_int": 1},
+        {"tag_str": "dragon", "count_int": 1},
+    ]
+
+    # 逐级筛选：只统计已带有所选标签的定义
+    response = await client.get(
+        "/api/v1/ai_workflow_def/tags", params={"tags": "search", "limit": 2}
+    )
+    assert response.json()["result"] == [
+        {"tag_str": "search", "count_int": 2},
+        {"tag_str": "dragon", "count_int": 1},
+    ]
+
+
+async def test_migration_indexes_existing_tags(empty_database):
+    await _create_baseline_schema(empty_database)
+
+    await run_migrations(empty_database)
+
+    async with session_maker() as db:
+        assert await crud.ai_workflow_def.get_tag_counts(db, user_id="user_id") == [
+            ("demo", 1),
+            ("nlp", 1),
+        ]
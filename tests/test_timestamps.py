@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+
+from src.api_server.main import app
+from src.api_server.migrations import _parse_timestamp, run_migrations
+from tests.test_migrations import _create_baseline_schema
+from tests.utils import create_jobs
+
+T0 = datetime(2025, 1, 1)
+
+# 迁移前以文本存储、格式不一的完成时间
+LEGACY_COMPLETED_AT = {
+    "job-offset": "2025-01-02T08:00:05+08:00",
+    "job-utc": "2025-01-02T00:00:04Z",
+    "job-space": "2025-01-02 00:00:06",
+    "job-micro": "2025-01-02T00:00:03.250000",
+    "job-garbage": "yesterday",
+}
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2025-01-02T08:00:00+08:00", datetime(2025, 1, 2)),
+        ("2025-01-02T00:00:00Z", datetime(2025, 1, 2)),
+        (" 2025-01-02 00:00:00.5 ", datetime(2025, 1, 2, 0, 0, 0, 500000)),
+        ("2025-01-02", datetime(2025, 1, 2)),
+        ("not a time", None),
+    ],
+)
+def test_legacy_timestamps_are_parsed_as_naive_utc(value, expected):
+    assert _parse_timestamp(value) == expected
+
+
+async def test_migrated_timestamps_sort_and_filter_chronologically(empty_database):
+    await _create_baseline_schema(empty_database)
+    async with empty_database.begin() as conn:
+        for id_str, completed_at in LEGACY_COMPLETED_AT.items():
+            await conn.execute(
+                text(
+                    "INSERT INTO ai_workflow_job VALUES ('2025-01-02 00:00:00', "
+                    "'2025-01-02 00:00:00', 0, :id, 'user_id', 'def-valid', 'job', "
+                    "'{}', 'completed', '{}', NULL, NULL, :completed_at, 1.0)"
+                ),
+                {"id": id_str, "completed_at": completed_at},
+            )
+
+    await run_migrations(empty_database)
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.get(
+            "/api/v1/ai_workflow_job",
+            params={
+                "order_by": "completed_at_time",
+                "order": "asc",
+                "completed_after": "2025-01-02T00:00:03.5",
+            },
+        )
+    jobs = response.json()["result"]
+    assert [job["id_str"] for job in jobs] == ["job-utc", "job-offset", "job-space"]
+    assert jobs[1]["completed_at_time"] == "2025-01-02T00:00:05"
+
+
+async def test_jobs_filter_by_start_and_completion_time(client, db, workflow_def):
+    jobs = []
+    for i in range(4):
+        (job,) = await create_jobs(
+            db,
+            workflow_def,
+            started_at_time=T0 + timedelta(minutes=i),
+            completed_at_time=T0 + timedelta(minutes=i, seconds=30),
+        )
+        jobs.append(job)
+    await create_jobs(db, workflow_def)
+
+    response = await client.get(
+        "/api/v1/ai_workflow_job",
+        params={
+            "started_after": (T0 + timedelta(minutes=1)).isoformat(),
+            "completed_before": (T0 + timedelta(minutes=2, seconds=30)).isoformat(),
+            "order_by": "started_at_time",
+            "order": "asc",
+        },
+    )
+
+    assert [job["id_str"] for job in response.json()["result"]] == [
+        jobs[1].id_str,
+        jobs[2].id_str,
+    ]
@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+from sqlmodel import select
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.models.ai_workflow_job import AIWorkflowJob, JobStatus
+from src.worker import executor
+from src.worker.progress import install_tracer
+from src.worker.timings import (
+    CALLS,
+    OUTPUT_BYTES,
+    WALL,
+    ComponentTimings,
+    estimate_size,
+)
+from src.worker.worker import Worker
+from tests.test_branches import diamond_yaml
+from tests.utils import create_jobs, wait_until
+
+
+def test_output_sizes_are_estimated_without_serializing():
+    assert estimate_size("hello") == 5
+    assert estimate_size([0.5] * 1024) == 8 * 1024
+    # 长列表按前几项外推
+    assert estimate_size(["ab", "cd"] + ["efgh"] * 8) == 2 * 10
+    assert estimate_size({"texts": ["abc"]}) == len("texts") + 3
+
+    nested = "x"
+    for _ in range(10):
+        nested = [nested]
+    assert estimate_size(nested) == 0
+
+
+def test_timings_cover_every_component_of_a_branched_run():
+    install_tracer()
+    pipeline = executor.build_pipeline(diamond_yaml())
+    timings = ComponentTimings()
+
+    with timings.collect():
+        executor.run_pipeline(pipeline, {"source": {"text": "x"}})
+
+    assert set(timings.components) == {"source", "left", "right", "join"}
+    left = timings.components["left"]
+    assert left[CALLS] == 1
+    assert left[WALL] >= 0.3
+    assert left[OUTPUT_BYTES] == len("value") + len("left:source:x")
+    assert json.loads(timings.to_json())["left"][0] == 1
+
+
+def test_merged_timings_sum_and_keep_the_slowest_call():
+    first, second = ComponentTimings(), ComponentTimings()
+    first.components["llm"] = [1, 2.0, 0.5, 100, 2.0]
+    second.components["llm"] = [2, 3.0, 1.0, 50, 1.75]
+    second.components["ranker"] = [1, 0.1, 0.1, 10, 0.1]
+
+    first.merge(second)
+
+    assert first.components["llm"] == [3, 5.0, 1.5, 150, 2.0]
+    assert first.components["ranker"] == [1, 0.1, 0.1, 10, 0.1]
+    assert ComponentTimings().to_json() is None
+
+
+async def test_component_stats_accumulate_per_definition(db, workflow_def):
+    def_id = workflow_def.id_str
+
+    await crud.ai_workflow_def.add_component_stats(
+        db, stats={def_id: {"llm": [1, 2.0, 0.5, 100, 2.0]}}
+    )
+    await crud.ai_workflow_def.add_component_stats(
+        db,
+        stats={
+            def_id: {"llm": [2, 3.0, 1.0, 50, 1.75], "ranker": [1, 0.1, 0.1, 10, 0.1]}
+        },
+    )
+
+    stats = await crud.ai_workflow_def.get_component_stats(db, workflow_def_id=def_id)
+    assert [row.component_name_str for row in stats] == ["llm", "ranker"]
+    llm = stats[0]
+    assert (llm.calls_int, llm.wall_seconds, llm.output_bytes_int) == (3, 5.0, 150)
+    assert llm.max_wall_seconds == 2.0
+
+
+async def _jobs():
+    async with session_maker() as db:
+        return list(await db.exec(select(AIWorkflowJob)))
+
+
+async def _jobs_completed() -> bool:
+    return all(job.status_str == JobStatus.COMPLETED for job in await _jobs())
+
+
+async def test_worker_records_timings_of_each_job(client, db, workflow_def):
+    await create_jobs(db, workflow_def, 2)
+    worker = Worker(concurrency=2, poll_interval=0.05, worker_id="worker-1")
+
+    run = asyncio.create_task(worker.run())
+    try:
+        await wait_until(_jobs_completed)
+    finally:
+        worker.stop()
+        await run
+
+    for job in await _jobs():
+        calls, wall_ms, cpu_ms, output_bytes = json.loads(job.timings_json)["prompt"]
+        assert calls == 1 and wall_ms >= 0 and cpu_ms >= 0 and output_bytes > 0
+
+    response = await client.get(
+        f"/api/v1/ai_workflow_def/{workflow_def.id_str}/component_stats"
+    )
+    (stats,) = response.json()["result"]
+    assert (stats["component_name_str"], stats["calls_int"]) == ("prompt", 2)
+    assert stats["max_wall_seconds"] <= stats["wall_seconds"]
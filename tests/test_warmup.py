@@ -0,0 +1,110 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from src.api_server import crud
+from src.api_server.config import settings
+from src.api_server.models.ai_workflow_def import (
+    AIWorkflowDefCreate,
+    AIWorkflowDefUpdate,
+)
+from src.worker import warmup
+from src.worker.worker import Worker
+from tests.conftest import PIPELINE_YAML
+from tests.utils import create_jobs
+
+MB = 1024 * 1024
+
+
+async def _definitions(db, *names: str):
+    return [
+        await crud.ai_workflow_def.create_workflow_def(
+            db,
+            AIWorkflowDefCreate(name_str=name, hs_yaml_content=PIPELINE_YAML),
+            user_id="user_id",
+        )
+        for name in names
+    ]
+
+
+async def test_candidates_are_the_busiest_active_definitions(db):
+    quiet, busy, inactive, stale = await _definitions(
+        db, "quiet", "busy", "inactive", "stale"
+    )
+    await create_jobs(db, quiet, 1)
+    await create_jobs(db, busy, 3)
+    await create_jobs(db, inactive, 5)
+    await create_jobs(
+        db, stale, 5, created_at_time=datetime.utcnow() - timedelta(hours=48)
+    )
+    await crud.ai_workflow_def.update_workflow_def(
+        db, inactive, AIWorkflowDefUpdate(is_active_flag=False)
+    )
+
+    candidates = await warmup.load_candidates(max_defs=10, lookback_hours=24)
+
+    assert [workflow_def.name_str for workflow_def in candidates] == ["busy", "quiet"]
+    assert await warmup.load_candidates(max_defs=1, lookback_hours=24) == [
+        candidates[0]
+    ]
+
+
+async def test_warm_up_stops_at_the_memory_budget(db):
+    for count, workflow_def in enumerate(await _definitions(db, "c", "b", "a"), 1):
+        await create_jobs(db, workflow_def, count)
+    built = []
+
+    async def build(workflow_def):
+        built.append(workflow_def.name_str)
+        if workflow_def.name_str == "a":
+            raise ValueError("broken")
+        return 10 * MB
+
+    report = await warmup.warm_up(
+        build, max_defs=10, lookback_hours=24, timeout=5, max_memory_bytes=5 * MB
+    )
+
+    assert built == ["a", "b"]
+    assert (report.candidates, report.warmed, report.failed) == (3, 1, 1)
+    assert (report.memory_bytes, report.stopped_by) == (10 * MB, "memory")
+
+
+async def test_warm_up_stops_at_the_time_budget(db):
+    for workflow_def in await _definitions(db, "a", "b"):
+        await create_jobs(db, workflow_def, 1)
+    finished = []
+
+    async def build(workflow_def):
+        await asyncio.sleep(0.3)
+        finished.append(workflow_def.name_str)
+        return 0
+
+    report = await warmup.warm_up(build, max_defs=10, lookback_hours=24, timeout=0.1)
+
+    assert (report.warmed, report.stopped_by) == (0, "timeout")
+    assert report.seconds < 0.3
+    # 超时的构建不被取消，在后台完成
+    await asyncio.sleep(0.4)
+    assert len(finished) == 1
+
+
+async def test_worker_is_ready_with_pipelines_built(
+    db, workflow_def, tmp_path, monkeypatch
+):
+    await create_jobs(db, workflow_def, 1, status_str="completed")
+    ready_file = tmp_path / "{worker_id}.ready"
+    monkeypatch.setattr(settings, "WORKER_READY_FILE", str(ready_file))
+    worker = Worker(concurrency=1, poll_interval=0.05, worker_id="worker-1")
+
+    run = asyncio.create_task(worker.run())
+    try:
+        while not worker.ready:
+            await asyncio.sleep(0.02)
+        ready = json.loads((tmp_path / "worker-1.ready").read_text())
+    finally:
+        worker.stop()
+        await run
+
+    assert ready["warm_up"]["warmed"] == 1
+    assert len(worker.pipeline_cache) == 1
+    assert not (tmp_path / "worker-1.ready").exists()
@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+from sqlmodel import func, select
+
+from src.api_server import crud
+from src.api_server.api.deps import session_maker
+from src.api_server.models.ai_workflow_job import AIWorkflowJob, JobStatus
+from src.worker.worker import Worker
+from tests.utils import create_jobs, wait_until
+
+
+async def _claim(worker_id: str, limit: int):
+    async with session_maker() as db:
+        return await crud.ai_workflow_job.claim_pending_jobs(
+            db, limit=limit, worker_id=worker_id, lease_seconds=60
+        )
+
+
+async def _count(status: JobStatus) -> int:
+    async with session_maker() as db:
+        return await db.scalar(
+            select(func.count()).where(AIWorkflowJob.status_str == status)
+        )
+
+
+async def test_claim_marks_jobs_running_oldest_first(db, workflow_def):
+    jobs = await create_jobs(db, workflow_def, 3)
+
+    claimed = await _claim("worker-1", limit=2)
+
+    assert [job.id_str for job in claimed] == [job.id_str for job in jobs[:2]]
+    for job in claimed:
+        assert job.status_str == JobStatus.RUNNING
+        assert job.worker_id_str == "worker-1"
+        assert job.attempt_int == 1
+        assert job.started_at_time is not None
+        assert job.lease_expires_at_time > job.started_at_time
+    assert await _count(JobStatus.PENDING) == 1
+
+
+async def test_concurrent_claims_never_share_a_job(db, workflow_def):
+    await create_jobs(db, workflow_def, 40)
+
+    claims = await asyncio.gather(*(_claim(f"worker-{i}", limit=7) for i in range(8)))
+
+    claimed_ids = [job.id_str for jobs in claims for job in jobs]
+    assert len(claimed_ids) == 40
+    assert len(set(claimed_ids)) == 40
+    for i, jobs in enumerate(claims):
+        assert all(job.worker_id_str == f"worker-{i}" for job in jobs)
+
+
+async def test_claim_skips_deleted_and_finished_jobs(db, workflow_def):
+    await create_jobs(db, workflow_def, 1, is_deleted_flag=True)
+    await create_jobs(db, workflow_def, 1, status_str=JobStatus.COMPLETED)
+    await create_jobs(db, workflow_def, 1, status_str=JobStatus.RUNNING)
+
+    assert await _claim("worker-1", limit=10) == []
+
+
+async def _count_done(expected: int) -> bool:
+    return await _count(JobStatus.COMPLETED) == expected
+
+
+async def test_worker_runs_pending_jobs(db, workflow_def):
+    jobs = await create_jobs(db, workflow_def, 5)
+    worker = Worker(concurrency=2, poll_interval=0.05, worker_id="worker-1")
+    run = asyncio.create_task(worker.run())
+    try:
+        await wait_until(lambda: _count_done(len(jobs)))
+    finally:
+        worker.stop()
+        await run
+
+    async with session_maker() as session:
+        finished = list(await session.exec(select(AIWorkflowJob)))
+    assert {job.status_str for job in finished} == {JobStatus.COMPLETED}
+    for job in finished:
+        result = json.loads(job.result_data_json)
+        assert (
+            result["prompt"]["prompt"]
+            == f"Hello {json.loads(job.trigger_data_json)['name']}"
+        )
+        assert job.lease_expires_at_time is None
+        assert job.execution_time_seconds is not None
@@ -0,0 +1,46 @@
+import asyncio
+import json
+from typing import Any, Callable, List
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.api_server.models.ai_workflow_def import AIWorkflowDef
+from src.api_server.models.ai_workflow_job import AIWorkflowJob
+
+
+async def create_jobs(
+    db: AsyncSession,
+    workflow_def: AIWorkflowDef,
+    count: int = 1,
+    user_id: str = "user_id",
+    **fields: Any,
+) -> List[AIWorkflowJob]:
+    """Insert ``count`` pending jobs directly, bypassing the API; ``fields`` override."""
+    jobs = [
+        AIWorkflowJob(
+            **{
+                "user_id_str": user_id,
+                "ai_workflow_def_id": workflow_def.id_str,
+                "job_name_str": f"job-{i}",
+                "trigger_data_json": json.dumps({"name": f"{user_id}-{i}"}),
+                **fields,
+            }
+        )
+        for i in range(count)
+    ]
+    db.add_all(jobs)
+    await db.commit()
+    for job in jobs:
+        await db.refresh(job)
+    return jobs
+
+
+async def wait_until(
+    condition: Callable[[], Any], timeout: float = 10.0, interval: float = 0.02
+) -> None:
+    """Poll an async ``condition`` until it returns a truthy value."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not await condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise TimeoutError("Condition not met in time")
+        await asyncio.sleep(interval)